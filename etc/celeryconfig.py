@@ -55,4 +55,12 @@ CELERYBEAT_SCHEDULE = {
         'schedule': timedelta(days=7),
         'options': {'queue': WORKER_QUEUE_REGION},
     },
+
+    # Periodically have the clusters poll their nodes' power states.  The
+    # clusters only report the states that changed.
+    'query-power-states': {
+        'task': 'maasserver.tasks.query_power_states_on_schedule',
+        'schedule': timedelta(minutes=5),
+        'options': {'queue': WORKER_QUEUE_REGION},
+    },
 }
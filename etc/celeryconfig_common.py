@@ -22,6 +22,21 @@ POWER_TEMPLATES_DIR = None
 # None to use the files installed with the running version of MAAS.
 POWER_CONFIG_DIR = None
 
+# Maximum number of power actions that a worker runs at the same time.
+POWER_ACTION_CONCURRENCY = 16
+
+# Number of seconds after which a power action is aborted.
+POWER_ACTION_TIMEOUT = 120
+
+# Minimum delay (in seconds) between two power actions on the same target,
+# e.g. the same BMC, chassis or PDU.  Actions on the same target are never
+# run concurrently.
+POWER_ACTION_TARGET_INTERVAL = 0.5
+
+# Location of the lock files that serialise power actions on the same
+# target across all the processes on the cluster.
+POWER_ACTION_LOCK_DIR = '/var/lib/maas/power-locks'
+
 # Location of MAAS' bind configuration files.
 DNS_CONFIG_DIR = '/etc/bind/maas'
 
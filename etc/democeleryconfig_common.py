@@ -41,3 +41,7 @@ DHCP_CONFIG_FILE = os.path.join(
 
 DHCP_LEASES_FILE = os.path.join(
     DEV_ROOT_DIRECTORY, 'run/dhcpd.leases')
+
+
+POWER_ACTION_LOCK_DIR = os.path.join(
+    DEV_ROOT_DIRECTORY, 'run/power-locks')
@@ -75,6 +75,9 @@ DATABASES = {
 # Example: "/home/media/media.lawrence.com/media/"
 MEDIA_ROOT = abspath("media/development")
 
+# Cache the boot images served to the cluster controllers in-branch.
+BOOT_IMAGES_CACHE_DIR = abspath("media/development/boot-images")
+
 INSTALLED_APPS += (
     'django.contrib.admin',
     'maastesting',
@@ -92,6 +92,14 @@ PISTON_DISPLAY_ERRORS = False
 # from the others.
 LOCAL_CLUSTER_CONFIG = "/etc/maas/maas_cluster.conf"
 
+# Where the region controller caches the boot images it serves to the
+# cluster controllers (see maasserver.image_cache).
+BOOT_IMAGES_CACHE_DIR = "/var/cache/maas/boot-images"
+
+# How large the cache of boot images may grow, in bytes, before the least
+# recently used files are removed.
+BOOT_IMAGES_CACHE_MAX_SIZE = 20 * 1024 ** 3
+
 TEMPLATE_DEBUG = DEBUG
 
 # Set this to where RaphaelJS files can be found.
@@ -210,6 +218,10 @@ CACHES = {
     #}
 }
 
+# Keep OAuth nonces, consumers and tokens in the cache rather than
+# writing and reading them in the database on every API request.
+OAUTH_DATA_STORE = 'maasserver.oauth_store.CachingDataStore'
+
 # List of finder classes that know how to find static files in
 # various locations.
 STATICFILES_FINDERS = (
@@ -252,6 +264,10 @@ MIDDLEWARE_CLASSES = (
     'maasserver.middleware.APIErrorsMiddleware',
     'maasserver.middleware.ExternalComponentsMiddleware',
     'metadataserver.middleware.MetadataErrorsMiddleware',
+    # CollectionVersionMiddleware and OAuthCacheMiddleware must see
+    # responses after the transaction has been committed.
+    'maasserver.middleware.CollectionVersionMiddleware',
+    'maasserver.middleware.OAuthCacheMiddleware',
     'django.middleware.transaction.TransactionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'maasserver.middleware.ExceptionLoggerMiddleware',
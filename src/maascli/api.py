@@ -64,18 +64,30 @@ def http_request(url, method, body=None, headers=None,
             "disable the certificate check.")
 
 
-def fetch_api_description(url, insecure=False):
-    """Obtain the description of remote API given its base URL."""
+def fetch_api_description(url, insecure=False, etag=None):
+    """Obtain the description of remote API given its base URL.
+
+    :param etag: The ETag of a description obtained earlier from the same
+        API, if any.  If the remote API has not changed since, the
+        description is not downloaded again.
+    :return: A tuple of the description, or None if it has not changed
+        since `etag`, and its ETag, or None if the server gave none.
+    """
     url_describe = urljoin(url, "describe/")
+    headers = None
+    if etag is not None:
+        headers = {"If-None-Match": etag}
     response, content = http_request(
-        ascii_url(url_describe), "GET", insecure=insecure)
+        ascii_url(url_describe), "GET", headers=headers, insecure=insecure)
+    if response.status == httplib.NOT_MODIFIED and headers is not None:
+        return None, etag
     if response.status != httplib.OK:
         raise CommandError(
             "{0.status} {0.reason}:\n{1}".format(response, content))
     if response["content-type"] != "application/json":
         raise CommandError(
             "Expected application/json, got: %(content-type)s" % response)
-    return json.loads(content)
+    return json.loads(content), response.get("etag")
 
 
 def get_response_content_type(response):
@@ -67,13 +67,15 @@ class cmd_login(Command):
         # read them from stdin if they're specified as "-".
         credentials = obtain_credentials(options.credentials)
         # Get description of remote API.
-        description = fetch_api_description(options.url, options.insecure)
+        description, etag = fetch_api_description(
+            options.url, options.insecure)
         # Save the config.
         profile_name = options.profile_name
         with ProfileConfig.open() as config:
             config[profile_name] = {
                 "credentials": credentials,
                 "description": description,
+                "description_etag": etag,
                 "name": profile_name,
                 "url": options.url,
                 }
@@ -109,8 +111,12 @@ class cmd_refresh(Command):
             for profile_name in config:
                 profile = config[profile_name]
                 url = profile["url"]
-                profile["description"] = fetch_api_description(url)
-                config[profile_name] = profile
+                description, etag = fetch_api_description(
+                    url, etag=profile.get("description_etag"))
+                if description is not None:
+                    profile["description"] = description
+                    profile["description_etag"] = etag
+                    config[profile_name] = profile
 
 
 class cmd_logout(Command):
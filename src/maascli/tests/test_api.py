@@ -92,11 +92,36 @@ class TestFunctions(MAASTestCase):
         response["content-type"] = "application/json"
         request.return_value = response, json.dumps(content)
         self.assertEqual(
-            content, api.fetch_api_description("http://example.com/api/1.0/"))
+            (content, None),
+            api.fetch_api_description("http://example.com/api/1.0/"))
         request.assert_called_once_with(
             b"http://example.com/api/1.0/describe/", "GET", body=None,
             headers=None)
 
+    def test_fetch_api_description_returns_etag(self):
+        request = self.patch(httplib2.Http, "request")
+        response = httplib2.Response({})
+        response.status = httplib.OK
+        response["content-type"] = "application/json"
+        response["etag"] = '"%s"' % factory.make_name("etag")
+        request.return_value = response, json.dumps({})
+        self.assertEqual(
+            ({}, response["etag"]),
+            api.fetch_api_description("http://example.com/api/1.0/"))
+
+    def test_fetch_api_description_revalidates_previous_description(self):
+        etag = '"%s"' % factory.make_name("etag")
+        request = self.patch(httplib2.Http, "request")
+        response = httplib2.Response({})
+        response.status = httplib.NOT_MODIFIED
+        request.return_value = response, b""
+        self.assertEqual(
+            (None, etag), api.fetch_api_description(
+                "http://example.com/api/1.0/", etag=etag))
+        request.assert_called_once_with(
+            b"http://example.com/api/1.0/describe/", "GET", body=None,
+            headers={"If-None-Match": etag})
+
     def test_fetch_api_description_not_okay(self):
         # If the response is not 200 OK, fetch_api_description throws toys.
         content = factory.make_name("content")
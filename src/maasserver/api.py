@@ -68,6 +68,7 @@ __all__ = [
     "FileHandler",
     "FilesHandler",
     "get_oauth_token",
+    "image_cache",
     "MaasHandler",
     "NodeGroupHandler",
     "NodeGroupsHandler",
@@ -91,14 +92,18 @@ from base64 import (
     b64decode,
     b64encode,
     )
+from copy import deepcopy
 from cStringIO import StringIO
 from datetime import (
     datetime,
     timedelta,
     )
 from functools import partial
+import hashlib
 import httplib
 from inspect import getdoc
+import os
+import re
 import sys
 from textwrap import dedent
 from urlparse import urlparse
@@ -112,7 +117,10 @@ from django.core.exceptions import (
     PermissionDenied,
     ValidationError,
     )
-from django.core.urlresolvers import reverse
+from django.core.urlresolvers import (
+    get_script_prefix,
+    reverse,
+    )
 from django.db.utils import DatabaseError
 from django.forms.models import model_to_dict
 from django.http import (
@@ -124,12 +132,15 @@ from django.shortcuts import (
     render_to_response,
     )
 from django.template import RequestContext
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date
 from docutils import core
 from formencode import validators
 from maasserver.api_support import (
     AnonymousOperationsHandler,
     operation,
     OperationsHandler,
+    StreamingResponse,
     )
 from maasserver.api_utils import (
     extract_bool,
@@ -145,6 +156,12 @@ from maasserver.apidoc import (
     find_api_resources,
     generate_api_docs,
     )
+from maasserver.collection_version import (
+    bump_collection_version,
+    COLLECTION,
+    conditional_on_collections,
+    is_not_modified,
+    )
 from maasserver.components import (
     discard_persistent_error,
     register_persistent_error,
@@ -178,12 +195,23 @@ from maasserver.forms import (
     NodeGroupWithInterfacesForm,
     SSHKeyForm,
     TagForm,
+    update_download_progress,
     )
 from maasserver.forms_settings import (
     get_config_doc,
     get_config_form,
     validate_config_name,
     )
+from maasserver.image_cache import (
+    get_cached_file,
+    get_image_cache_key,
+    iter_fetched_bytes,
+    iter_file_bytes,
+    NotInArchive,
+    open_fetched_file,
+    RETRY_AFTER,
+    UnknownArchive,
+    )
 from maasserver.models import (
     BootImage,
     Config,
@@ -201,7 +229,11 @@ from maasserver.models.nodeprobeddetails import (
     get_single_probed_details,
     )
 from maasserver.node_action import Commission
-from maasserver.node_constraint_filter_forms import AcquireNodeForm
+from maasserver.node_constraint_filter_forms import (
+    AcquireNodeForm,
+    order_by_smallest_sufficient,
+    )
+from maasserver.node_serializer import render_nodes
 from maasserver.preseed import (
     compose_enlistment_preseed_url,
     compose_preseed_url,
@@ -215,11 +247,11 @@ from maasserver.utils import (
     map_enum,
     strip_domain,
     )
-from maasserver.utils.orm import (
-    get_first,
-    get_one,
+from maasserver.utils.orm import get_one
+from metadataserver.fields import (
+    Bin,
+    ZlibBin,
     )
-from metadataserver.fields import Bin
 from metadataserver.models import (
     CommissioningScript,
     NodeCommissionResult,
@@ -227,8 +259,12 @@ from metadataserver.models import (
 from piston.emitters import JSONEmitter
 from piston.handler import typemapper
 from piston.utils import rc
-from provisioningserver.enum import POWER_TYPE
+from provisioningserver.enum import (
+    POWER_STATE,
+    POWER_TYPE,
+    )
 from provisioningserver.kernel_opts import KernelParameters
+from provisioningserver.tags import ZLIB_DETAILS_SUBTYPE
 import simplejson as json
 
 from logging import getLogger
@@ -248,6 +284,7 @@ DISPLAYED_NODE_FIELDS = (
     'status',
     'netboot',
     'power_type',
+    'power_state',
     'tag_names',
     'ip_addresses',
     'routers',
@@ -305,6 +342,7 @@ class NodeHandler(OperationsHandler):
             return None
         return node.owner.username
 
+    @conditional_on_collections(COLLECTION.NODES)
     def read(self, request, system_id):
         """Read a specific Node."""
         return Node.objects.get_node_or_404(
@@ -685,6 +723,7 @@ class NodesHandler(OperationsHandler):
             status=NODE_STATUS.COMMISSIONING, updated__lte=cutoff)
         results = list(query)
         query.update(status=NODE_STATUS.FAILED_TESTS)
+        bump_collection_version(COLLECTION.NODES)
         # Note that Django doesn't call save() on updated nodes here,
         # but I don't think anything requires its effects anyway.
         return results
@@ -735,6 +774,7 @@ class NodesHandler(OperationsHandler):
         return released_ids
 
     @operation(idempotent=True)
+    @conditional_on_collections(COLLECTION.NODES)
     def list(self, request):
         """List Nodes visible to the user, optionally filtered by criteria.
 
@@ -771,22 +811,18 @@ class NodesHandler(OperationsHandler):
         match_agent_name = request.GET.get('agent_name', None)
         if match_agent_name is not None:
             nodes = nodes.filter(agent_name=match_agent_name)
-        # Prefetch related macaddresses, tags and nodegroups (plus
-        # related interfaces).
-        nodes = nodes.prefetch_related('macaddress_set__node')
-        nodes = nodes.prefetch_related('tags')
-        nodes = nodes.select_related('nodegroup')
-        nodes = nodes.prefetch_related('nodegroup__dhcplease_set')
-        nodes = nodes.prefetch_related('nodegroup__nodegroupinterface_set')
-        return nodes.order_by('id')
+        # Serialise the nodes in bulk, rather than one by one through
+        # Piston's emitter.
+        return render_nodes(nodes.order_by('id'))
 
     @operation(idempotent=True)
+    @conditional_on_collections(COLLECTION.NODES)
     def list_allocated(self, request):
         """Fetch Nodes that were allocated to the User/oauth token."""
         token = get_oauth_token(request)
         match_ids = get_optional_list(request.GET, 'id')
         nodes = Node.objects.get_allocated_visible_nodes(token, match_ids)
-        return nodes.order_by('id')
+        return render_nodes(nodes.order_by('id'))
 
     @operation(idempotent=False)
     def acquire(self, request):
@@ -823,20 +859,48 @@ class NodesHandler(OperationsHandler):
             acquired node.
         :type agent_name: unicode
          """
+        [node] = self._acquire_nodes(request, count=1)
+        return node
+
+    @operation(idempotent=False)
+    def acquire_many(self, request):
+        """Acquire several available nodes for deployment, in one go.
+
+        This takes the same constraints as the "acquire" operation, and
+        allocates up to `count` nodes matching them.  Nodes that are
+        being acquired concurrently by other requests are skipped, so
+        parallel callers don't get in each other's way.
+
+        :param count: The maximum number of nodes to acquire.
+        :type count: int
+        :return: The acquired nodes.  There may be fewer than `count` of
+            them, but there is always at least one: if no matching node is
+            available, a Conflict error is returned instead.
+        """
+        count = get_mandatory_param(
+            request.data, 'count', validators.Int(min=1))
+        return self._acquire_nodes(request, count=count)
+
+    def _acquire_nodes(self, request, count):
+        """Acquire up to `count` available nodes matching the constraints.
+
+        The nodes are locked before they are acquired, so no two requests
+        can acquire the same node.
+        """
         form = AcquireNodeForm(data=request.data)
-        if form.is_valid():
-            nodes = Node.objects.get_available_nodes_for_acquisition(
-                request.user)
-            nodes = form.filter_nodes(nodes)
-            node = get_first(nodes)
-            if node is None:
-                raise NodesNotAvailable("No matching node is available.")
-            agent_name = request.data.get('agent_name', '')
-            node.acquire(
-                request.user, get_oauth_token(request),
-                agent_name=agent_name)
-            return node
-        raise ValidationError(form.errors)
+        if not form.is_valid():
+            raise ValidationError(form.errors)
+        nodes = Node.objects.get_available_nodes_for_acquisition(
+            request.user)
+        nodes = order_by_smallest_sufficient(form.filter_nodes(nodes))
+        nodes = Node.objects.lock_nodes_for_acquisition(nodes, count)
+        if len(nodes) == 0:
+            raise NodesNotAvailable("No matching node is available.")
+        agent_name = request.data.get('agent_name', '')
+        token = get_oauth_token(request)
+        for node in nodes:
+            node.acquire(request.user, token, agent_name=agent_name)
+        return nodes
 
     @classmethod
     def resource_uri(cls, *args, **kwargs):
@@ -911,6 +975,74 @@ class NodeMacHandler(OperationsHandler):
         return ('node_mac_handler', [node_system_id, mac_address])
 
 
+def get_requested_range(request, size):
+    """Return the byte range that `request` asks for, if any.
+
+    Only a single range is supported: a request for several ranges, or
+    with a malformed Range header, gets the whole file.
+
+    :param size: The size of the requested file.
+    :return: A tuple of the start and stop offsets of the range, None for
+        the whole file, or the empty tuple if the range is unsatisfiable.
+    """
+    match = re.match(
+        r'^bytes=(\d*)-(\d*)$', request.META.get('HTTP_RANGE', '').strip())
+    if match is None or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        # A suffix range: the last bytes of the file.
+        start, stop = max(size - int(last), 0), size
+    elif last == '':
+        start, stop = int(first), size
+    elif int(last) < int(first):
+        return None
+    else:
+        start, stop = int(first), min(int(last) + 1, size)
+    if start >= stop:
+        return ()
+    return start, stop
+
+
+def make_range_response(request, size, iter_bytes):
+    """Return a response streaming `size` bytes, or the range requested.
+
+    :param iter_bytes: A callable that returns an iterable of the bytes
+        between the start and stop offsets it is passed.
+    """
+    byte_range = get_requested_range(request, size)
+    if byte_range == ():
+        response = HttpResponse(
+            status=httplib.REQUESTED_RANGE_NOT_SATISFIABLE)
+        response['Content-Range'] = 'bytes */%d' % size
+        return response
+    if byte_range is None:
+        start, stop = 0, size
+        response = StreamingResponse(iter_bytes(start, stop))
+    else:
+        start, stop = byte_range
+        response = StreamingResponse(
+            iter_bytes(start, stop), status=httplib.PARTIAL_CONTENT)
+        response['Content-Range'] = 'bytes %d-%d/%d' % (
+            start, stop - 1, size)
+    response['Content-Length'] = '%d' % (stop - start)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def make_file_response(request, db_file):
+    """Return a response streaming the content of `db_file`.
+
+    The content is read from the database a chunk at a time.  A single
+    byte range may be requested, to resume or split a download.
+    """
+    content = db_file.file_content
+    response = make_range_response(request, content.size, content.iter_bytes)
+    if response.status_code != httplib.REQUESTED_RANGE_NOT_SATISFIABLE:
+        response['ETag'] = '"%s"' % content.sha256
+    return response
+
+
 def get_file_by_name(handler, request):
     """Get a named file from the file storage.
 
@@ -923,7 +1055,7 @@ def get_file_by_name(handler, request):
         db_file = FileStorage.objects.filter(filename=filename).latest('id')
     except FileStorage.DoesNotExist:
         raise MAASAPINotFound("File not found")
-    return HttpResponse(db_file.content, status=httplib.OK)
+    return make_file_response(request, db_file)
 
 
 def get_file_by_key(handler, request):
@@ -935,7 +1067,7 @@ def get_file_by_key(handler, request):
     """
     key = get_mandatory_param(request.GET, 'key')
     db_file = get_object_or_404(FileStorage, key=key)
-    return HttpResponse(db_file.content, status=httplib.OK)
+    return make_file_response(request, db_file)
 
 
 class AnonFilesHandler(AnonymousOperationsHandler):
@@ -1130,9 +1262,6 @@ class FilesHandler(OperationsHandler):
             raise MAASAPIBadRequest("Exactly one file must be supplied")
         uploaded_file = files['file']
 
-        # As per the comment in FileStorage, this ought to deal in
-        # chunks instead of reading the file into memory, but large
-        # files are not expected.
         FileStorage.objects.save_file(filename, uploaded_file, request.user)
         return HttpResponse('', status=httplib.CREATED)
 
@@ -1240,6 +1369,7 @@ class AnonNodeGroupsHandler(AnonymousOperationsHandler):
     fields = DISPLAYED_NODEGROUP_FIELDS
 
     @operation(idempotent=True)
+    @conditional_on_collections(COLLECTION.NODEGROUPS)
     def list(self, request):
         """List of node groups."""
         return NodeGroup.objects.all()
@@ -1325,6 +1455,7 @@ class NodeGroupsHandler(OperationsHandler):
     fields = DISPLAYED_NODEGROUP_FIELDS
 
     @operation(idempotent=True)
+    @conditional_on_collections(COLLECTION.NODEGROUPS)
     def list(self, request):
         """List of node groups."""
         return NodeGroup.objects.all()
@@ -1413,6 +1544,7 @@ class NodeGroupHandler(OperationsHandler):
     create = delete = None
     fields = DISPLAYED_NODEGROUP_FIELDS
 
+    @conditional_on_collections(COLLECTION.NODEGROUPS)
     def read(self, request, uuid):
         """GET a node group."""
         return get_object_or_404(NodeGroup, uuid=uuid)
@@ -1464,6 +1596,29 @@ class NodeGroupHandler(OperationsHandler):
                 {ip: leases[ip] for ip in new_leases if ip in leases})
         return HttpResponse("Leases updated.", status=httplib.OK)
 
+    @operation(idempotent=False)
+    def report_power_states(self, request, uuid):
+        """Report changes in the power states of the cluster's nodes.
+
+        The cluster controller periodically queries the power states of its
+        nodes, and calls this with those that changed since its last report.
+
+        :param power_states: A JSON-encoded dict mapping system_ids to
+            power states (see vocabulary `POWER_STATE`).
+        """
+        power_states = get_mandatory_param(request.data, 'power_states')
+        nodegroup = get_object_or_404(NodeGroup, uuid=uuid)
+        check_nodegroup_access(request, nodegroup)
+        power_states = json.loads(power_states)
+        valid_states = set(map_enum(POWER_STATE).values())
+        invalid_states = set(power_states.values()) - valid_states
+        if len(invalid_states) != 0:
+            raise MAASAPIBadRequest(
+                "Unknown power state(s): %s."
+                % ', '.join(sorted(invalid_states)))
+        Node.objects.update_power_states(nodegroup, power_states)
+        return HttpResponse("Power states updated.", status=httplib.OK)
+
     @operation(idempotent=False)
     def import_boot_images(self, request, uuid):
         """Import the pxe files on this cluster controller."""
@@ -1510,6 +1665,9 @@ class NodeGroupHandler(OperationsHandler):
         b) Requests for nodes that are not part of the nodegroup are
            just ignored.
 
+        :param compression: Optional.  If "zlib", details stored
+            compressed are sent as they are, as BSON binaries of subtype
+            `ZLIB_DETAILS_SUBTYPE`, for the client to decompress.
         """
         nodegroup = get_object_or_404(NodeGroup, uuid=uuid)
         if not request.user.is_superuser:
@@ -1525,10 +1683,14 @@ class NodeGroupHandler(OperationsHandler):
             system_ids.values_list('system_id')
         }
         # Obtain details and prepare for BSON encoding.
-        details = get_probed_details(system_ids)
+        pass_compressed = request.data.get('compression') == 'zlib'
+        details = get_probed_details(
+            system_ids, decompress=not pass_compressed)
         for detail in details.itervalues():
             for name, value in detail.iteritems():
-                if value is not None:
+                if isinstance(value, ZlibBin):
+                    detail[name] = bson.Binary(value, ZLIB_DETAILS_SUBTYPE)
+                elif value is not None:
                     detail[name] = bson.Binary(value)
         return HttpResponse(
             bson.BSON.encode(details),
@@ -1598,6 +1760,39 @@ class NodeGroupHandler(OperationsHandler):
 
         return HttpResponse(status=httplib.OK)
 
+    @operation(idempotent=False)
+    def report_download_progress_batch(self, request, uuid):
+        """Report progress of several downloads at once.
+
+        Cluster controllers can call this to send the progress reports of
+        their downloads in batches, rather than one by one with
+        `report_download_progress`.  An invalid report in the batch does
+        not stop the others from being applied.
+
+        :param reports: A JSON list of progress reports, in the order they
+            were made.  Each is an object with the parameters of a
+            `report_download_progress` call: `filename`, and optionally
+            `size`, `bytes_downloaded` and `error`.
+        :type reports: unicode
+        :return: A JSON list of the reports' errors, in order: null for
+            a report that was applied, or an object mapping the invalid
+            parameters of the report to lists of error messages.
+        """
+        nodegroup = get_object_or_404(NodeGroup, uuid=uuid)
+        check_nodegroup_access(request, nodegroup)
+        try:
+            reports = json.loads(get_mandatory_param(request.data, 'reports'))
+        except ValueError:
+            raise ValidationError("Invalid JSON in reports.")
+        if not isinstance(reports, list) or not all(
+                isinstance(report, dict) and 'filename' in report
+                for report in reports):
+            raise ValidationError(
+                "reports must be a list of objects with a filename.")
+        errors = update_download_progress(nodegroup, reports)
+        return HttpResponse(
+            json.dumps(errors), content_type="application/json")
+
     @operation(idempotent=False)
     def probe_and_enlist_hardware(self, request, uuid):
         """Add special hardware types.
@@ -1826,6 +2021,7 @@ class TagHandler(OperationsHandler):
         'kernel_opts',
         )
 
+    @conditional_on_collections(COLLECTION.TAGS)
     def read(self, request, name):
         """Read a specific Tag"""
         return Tag.objects.get_tag_or_404(name=name, user=request.user)
@@ -1864,6 +2060,7 @@ class TagHandler(OperationsHandler):
         return rc.DELETED
 
     @operation(idempotent=True)
+    @conditional_on_collections(COLLECTION.NODES, COLLECTION.TAGS)
     def nodes(self, request, name):
         """Get the list of nodes that have this tag."""
         tag = Tag.objects.get_tag_or_404(name=name, user=request.user)
@@ -1972,6 +2169,7 @@ class TagsHandler(OperationsHandler):
             raise ValidationError(form.errors)
 
     @operation(idempotent=True)
+    @conditional_on_collections(COLLECTION.TAGS)
     def list(self, request):
         """List Tags.
 
@@ -2153,14 +2351,23 @@ def reST_to_html_fragment(a_str):
     return parts['body_pre_docinfo'] + parts['fragment']
 
 
+# The API documentation rendered as HTML, by script prefix.  The API
+# only changes when MAAS is upgraded, which restarts the server process.
+api_doc_html_cache = {}
+
+
 def api_doc(request):
     """Get ReST documentation for the REST API."""
     # Generate the documentation and keep it cached.  Note that we can't do
     # that at the module level because the API doc generation needs Django
     # fully initialized.
+    script_prefix = get_script_prefix()
+    doc = api_doc_html_cache.get(script_prefix)
+    if doc is None:
+        doc = reST_to_html_fragment(render_api_docs())
+        api_doc_html_cache[script_prefix] = doc
     return render_to_response(
-        'maasserver/api_doc.html',
-        {'doc': reST_to_html_fragment(render_api_docs())},
+        'maasserver/api_doc.html', {'doc': doc},
         context_instance=RequestContext(request))
 
 
@@ -2330,7 +2537,7 @@ def pxeconfig(request):
     if node is not None:
         # We don't care if the kernel opts is from the global setting or a tag,
         # just get the options
-        _, extra_kernel_opts = node.get_effective_kernel_options()
+        extra_kernel_opts = node.get_extra_kernel_opts()
     else:
         # If there's no node defined then we must be enlisting here, but
         # we still need to return the global kernel options.
@@ -2350,6 +2557,80 @@ def pxeconfig(request):
         content_type="application/json")
 
 
+def image_cache(request, uuid, key, archive, path):
+    """Serve a file from the region's cache of the boot images archives.
+
+    The cluster controllers download their boot images from here when the
+    'boot_images_from_region' setting is on.  A file that is not cached
+    yet is served as it is fetched into the cache in the background, so
+    that it is downloaded from the upstream archive only once.  A single
+    byte range may be requested, to resume or split a download.
+
+    :param uuid: The UUID of the cluster controller.
+    :param key: The cluster's key to the cache, see `get_image_cache_key`.
+    :param archive: The name of the archive: 'main', 'ports' or
+        'ephemerals'.
+    :param path: The path of the file in the archive.
+    """
+    nodegroup = get_object_or_404(
+        NodeGroup, uuid=uuid, status=NODEGROUP_STATUS.ACCEPTED)
+    if not constant_time_compare(key, get_image_cache_key(nodegroup)):
+        raise PermissionDenied("Not a key to the boot images cache.")
+    try:
+        cached = get_cached_file(archive, path)
+        if cached is None:
+            return make_fetched_file_response(request, archive, path)
+    except (NotInArchive, UnknownArchive, ValueError):
+        raise Http404
+    response = make_range_response(
+        request, os.path.getsize(cached), partial(iter_file_bytes, cached))
+    response['Last-Modified'] = http_date(os.path.getmtime(cached))
+    return response
+
+
+def make_fetched_file_response(request, archive, path):
+    """Return a response streaming a file as it is fetched into the cache.
+
+    If the fetch does not start in time, or fails, the client is asked to
+    try again later.
+    """
+    fetched = open_fetched_file(archive, path)
+    if fetched is None:
+        response = HttpResponse(status=httplib.SERVICE_UNAVAILABLE)
+        response['Retry-After'] = '%d' % RETRY_AFTER
+        return response
+    input_file, size, cached = fetched
+    iter_bytes = partial(iter_fetched_bytes, cached, input_file)
+    if size is None:
+        # Without a size, ranges cannot be served.
+        response = StreamingResponse(iter_bytes(0, None))
+    else:
+        response = make_range_response(request, size, iter_bytes)
+    return response
+
+
+def update_missing_boot_images_error():
+    """Warn about accepted node groups without boot images, if any."""
+    nodegroup_ids_with_images = BootImage.objects.values_list(
+        "nodegroup_id", flat=True)
+    nodegroups_missing_images = NodeGroup.objects.exclude(
+        id__in=nodegroup_ids_with_images)
+    nodegroups_missing_images = nodegroups_missing_images.filter(
+        status=NODEGROUP_STATUS.ACCEPTED)
+    if nodegroups_missing_images.exists():
+        accepted_clusters_url = (
+            "%s#accepted-clusters" % absolute_reverse("settings"))
+        warning = dedent("""\
+            Some cluster controllers are missing boot images.  Either the
+            import task has not been initiated (for each cluster, the task
+            must be <a href=%s>initiated by hand</a> the first time), or
+            the import task failed.
+            """ % quoteattr(accepted_clusters_url))
+        register_persistent_error(COMPONENT.IMPORT_PXE_FILES, warning)
+    else:
+        discard_persistent_error(COMPONENT.IMPORT_PXE_FILES)
+
+
 class BootImagesHandler(OperationsHandler):
 
     create = replace = update = delete = None
@@ -2365,40 +2646,27 @@ class BootImagesHandler(OperationsHandler):
         :param images: A list of dicts, each describing a boot image with
             these properties: `architecture`, `subarchitecture`, `release`,
             `purpose`, all as in the code that determines TFTP paths for
-            these images.
+            these images.  Images that the cluster reported before but no
+            longer does are forgotten.
         """
         nodegroup_uuid = get_mandatory_param(request.data, "nodegroup")
         nodegroup = get_object_or_404(NodeGroup, uuid=nodegroup_uuid)
         check_nodegroup_access(request, nodegroup)
         images = json.loads(get_mandatory_param(request.data, 'images'))
-
-        for image in images:
-            BootImage.objects.register_image(
-                nodegroup=nodegroup,
-                architecture=image['architecture'],
-                subarchitecture=image.get('subarchitecture', 'generic'),
-                release=image['release'],
-                purpose=image['purpose'])
-
-        # Work out if any nodegroups are missing images.
-        nodegroup_ids_with_images = BootImage.objects.values_list(
-            "nodegroup_id", flat=True)
-        nodegroups_missing_images = NodeGroup.objects.exclude(
-            id__in=nodegroup_ids_with_images)
-        nodegroups_missing_images = nodegroups_missing_images.filter(
-            status=NODEGROUP_STATUS.ACCEPTED)
-        if nodegroups_missing_images.exists():
-            accepted_clusters_url = (
-                "%s#accepted-clusters" % absolute_reverse("settings"))
-            warning = dedent("""\
-                Some cluster controllers are missing boot images.  Either the
-                import task has not been initiated (for each cluster, the task
-                must be <a href=%s>initiated by hand</a> the first time), or
-                the import task failed.
-                """ % quoteattr(accepted_clusters_url))
-            register_persistent_error(COMPONENT.IMPORT_PXE_FILES, warning)
-        else:
-            discard_persistent_error(COMPONENT.IMPORT_PXE_FILES)
+        images = {
+            (
+                image['architecture'],
+                image.get('subarchitecture', 'generic'),
+                image['release'],
+                image['purpose'],
+            )
+            for image in images
+            }
+        changed = BootImage.objects.update_images(nodegroup, images)
+        # Whether a node group is missing images only changes along with
+        # its images, but a cluster without any is worth a fresh warning.
+        if changed or len(images) == 0:
+            update_missing_boot_images_error()
 
         return HttpResponse("OK")
 
@@ -2537,20 +2805,37 @@ class CommissioningResultsHandler(OperationsHandler):
         return ('commissioning_results_handler', [])
 
 
-def describe(request):
-    """Return a description of the whole MAAS API.
+# The descriptions of the API's resources, with the paths of the handlers
+# but not their URIs, which depend on the request.  The API only changes
+# when MAAS is upgraded, which restarts the server process.
+api_resources = None
 
-    :param request: The http request for this document.  This is used to
+
+def describe_api_resources():
+    """Describe the API's resources, once for the life of the process.
+
+    :return: A list of resource descriptions, as from `describe_resource`.
+        It is shared, so must be copied before being changed.
+    """
+    global api_resources
+    if api_resources is None:
+        from maasserver import urls_api as urlconf
+        api_resources = [
+            describe_resource(resource)
+            for resource in find_api_resources(urlconf)
+            ]
+    return api_resources
+
+
+def describe_api(request):
+    """Describe the whole MAAS API.
+
+    :param request: The http request for the description.  This is used to
         derive the URL where the client expects to see the MAAS API.
-    :return: A JSON object describing the whole MAAS API.  Links to the API
-        will use the same scheme and hostname that the client used in
-        `request`.
+    :return: A dict describing the whole MAAS API.  Links to the API will
+        use the same scheme and hostname that the client used in `request`.
     """
-    from maasserver import urls_api as urlconf
-    resources = [
-        describe_resource(resource)
-        for resource in find_api_resources(urlconf)
-        ]
+    resources = deepcopy(describe_api_resources())
     # Make all URIs absolute. Clients - maas-cli in particular - expect that
     # all handler URIs are absolute, not just paths. The handler URIs returned
     # by describe_resource() are relative paths.
@@ -2574,6 +2859,27 @@ def describe(request):
     description["handlers"].extend(
         resource["auth"] for resource in description["resources"]
         if resource["auth"] is not None)
-    return HttpResponse(
-        json.dumps(description),
-        content_type="application/json")
+    return description
+
+
+def describe(request):
+    """Return a description of the whole MAAS API.
+
+    The resources are described once, and the links to them are added
+    for each request.  Clients can revalidate the copy they have with
+    `If-None-Match`.
+
+    :param request: The http request for this document.  This is used to
+        derive the URL where the client expects to see the MAAS API.
+    :return: A JSON object describing the whole MAAS API.  Links to the API
+        will use the same scheme and hostname that the client used in
+        `request`.
+    """
+    content = json.dumps(describe_api(request))
+    etag = '"%s"' % hashlib.sha1(content).hexdigest()
+    if is_not_modified(request, etag):
+        response = HttpResponse(status=httplib.NOT_MODIFIED)
+    else:
+        response = HttpResponse(content, content_type="application/json")
+    response['ETag'] = etag
+    return response
@@ -16,11 +16,13 @@ __all__ = [
     'AnonymousOperationsHandler',
     'operation',
     'OperationsHandler',
+    'StreamingResponse',
     ]
 
 from django.core.exceptions import PermissionDenied
 from django.http import (
     Http404,
+    HttpResponse,
     HttpResponseBadRequest,
     )
 from piston.handler import (
@@ -35,6 +37,38 @@ from piston.utils import (
     )
 
 
+class StreamingResponse(HttpResponse):
+    """An `HttpResponse` whose content is sent as it is produced.
+
+    Piston passes the `HttpResponse`s that handlers return through as they
+    are, but would try to serialise Django's `StreamingHttpResponse`.  This
+    is an `HttpResponse` that middleware treats as streaming, and so does
+    not read into memory.  The content is set as `streaming_content`
+    rather than passed to `HttpResponse`, which no longer takes iterators.
+
+    :param streaming_content: An iterable of byte strings.
+    """
+
+    streaming = True
+
+    def __init__(self, streaming_content=(), *args, **kwargs):
+        # Skip HttpResponse.__init__, which would set `content`.
+        super(HttpResponse, self).__init__(*args, **kwargs)
+        self.streaming_content = streaming_content
+
+    @property
+    def streaming_content(self):
+        return iter(self._container)
+
+    @streaming_content.setter
+    def streaming_content(self, value):
+        self._container = value
+        # Have the iterable closed once the response is sent, as Django
+        # does for its own streaming responses.
+        if hasattr(value, 'close'):
+            self._closable_objects.append(value)
+
+
 class OperationsResource(Resource):
     """A resource supporting operation dispatch.
 
@@ -45,6 +79,17 @@ class OperationsResource(Resource):
     crudmap = Resource.callmap
     callmap = dict.fromkeys(crudmap, "dispatch")
 
+    def __call__(self, request, *args, **kwargs):
+        response = super(OperationsResource, self).__call__(
+            request, *args, **kwargs)
+        # Operations decorated with `conditional_on_collections` leave
+        # their cache validators on the request.
+        validators = getattr(request, 'cache_validators', None)
+        if validators is not None and response.status_code == 200:
+            for header, value in validators.items():
+                response[header] = value
+        return response
+
     def error_handler(self, e, request, meth, em_format):
         """
         Override piston's error_handler to fix bug #1228205 and generally
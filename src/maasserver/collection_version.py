@@ -0,0 +1,206 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Change counters for collections of objects, for conditional GETs.
+
+API clients such as Juju poll the node lists every few seconds.  Each
+collection (nodes, tags, node groups) has a version number, kept in the
+shared Django cache, that changes whenever anything shown in the
+collection's API representation changes.  Read operations derive an ETag
+and a Last-Modified date from the versions they depend on, so that they
+can answer 304 Not Modified without querying or serialising anything.
+
+Config items and commissioning scripts are tracked the same way, so that
+each process knows when to drop what it caches of them.
+
+A version is the time of the latest change, in milliseconds, and always
+goes up.  If the cache loses a version, the next read starts afresh from
+the current time, which is newer than anything a client may have seen.
+
+Changes made within a transaction bump the versions immediately, and
+again once the transaction is committed (see
+`CollectionVersionMiddleware`), so that no client can be handed the
+pre-commit state under a post-commit version.
+"""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = [
+    'bump_collection_version',
+    'COLLECTION',
+    'conditional_on_collections',
+    'flush_collection_changes',
+    'get_collection_version',
+    ]
+
+from functools import wraps
+import httplib
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.http import (
+    http_date,
+    parse_http_date_safe,
+    )
+
+
+class COLLECTION:
+    """The collections whose changes are tracked."""
+
+    NODES = 'nodes'
+    TAGS = 'tags'
+    NODEGROUPS = 'nodegroups'
+    CONFIG = 'config'
+    COMMISSIONING_SCRIPTS = 'commissioning-scripts'
+
+
+# Prefix of the cache keys holding the collection versions.
+COLLECTION_VERSION_CACHE_KEY = 'collection-version-%s'
+
+
+# Collections changed by the current thread's transaction, to be bumped
+# again once it is committed.
+pending_changes = threading.local()
+
+
+def current_version():
+    """Return a version number for a change happening now."""
+    return int(time.time() * 1000)
+
+
+def get_collection_version(collection):
+    """Return the version number of `collection`."""
+    key = COLLECTION_VERSION_CACHE_KEY % collection
+    version = cache.get(key)
+    if version is None:
+        version = current_version()
+        if not cache.add(key, version, None):
+            # Another process got there first.
+            version = cache.get(key, version)
+    return version
+
+
+def _bump(collection):
+    key = COLLECTION_VERSION_CACHE_KEY % collection
+    version = cache.get(key)
+    new_version = current_version()
+    if version is not None and new_version <= version:
+        new_version = version + 1
+    cache.set(key, new_version, None)
+
+
+def bump_collection_version(collection):
+    """Record that `collection` changed.
+
+    If a transaction is under way, the version will be bumped once more
+    by `flush_collection_changes`, after it commits.
+    """
+    _bump(collection)
+    if transaction.is_managed():
+        if not hasattr(pending_changes, 'collections'):
+            pending_changes.collections = set()
+        pending_changes.collections.add(collection)
+
+
+def flush_collection_changes():
+    """Bump the versions of the collections changed by this thread."""
+    collections = getattr(pending_changes, 'collections', set())
+    pending_changes.collections = set()
+    for collection in collections:
+        _bump(collection)
+
+
+def get_validators(request, collections):
+    """Return the ETag and Last-Modified date for a read of `collections`.
+
+    The ETag also identifies the user, because what a user gets to see
+    depends on their permissions.  Last-Modified dates only have a
+    resolution of one second, so a change within the current second gets
+    none: it could not be told apart from another change later in the
+    same second.
+    """
+    versions = [
+        get_collection_version(collection) for collection in collections]
+    user_id = getattr(request.user, 'id', None)
+    etag = '"%s"' % '-'.join(
+        '%x' % value for value in versions + [user_id or 0])
+    modified = max(versions) // 1000
+    if modified < int(time.time()):
+        last_modified = http_date(modified)
+    else:
+        last_modified = None
+    return etag, last_modified
+
+
+def is_not_modified(request, etag, last_modified=None, exists=True):
+    """Do the request's conditional headers match `etag`/`last_modified`?
+
+    :param last_modified: The resource's modification time, as an HTTP
+        date, or None if it has none; `If-Modified-Since` is then ignored.
+    :param exists: Whether the resource is known to exist, and to be
+        visible to the client.  `If-None-Match: *` only matches if so.
+    """
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        etags = [value.strip() for value in if_none_match.split(',')]
+        return etag in etags or (exists and '*' in etags)
+    if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+    if if_modified_since is not None and last_modified is not None:
+        since = parse_http_date_safe(if_modified_since)
+        return (
+            since is not None and
+            since >= parse_http_date_safe(last_modified))
+    return False
+
+
+def make_validators(etag, last_modified):
+    """Return the headers for the validators that are set."""
+    validators = {'ETag': etag}
+    if last_modified is not None:
+        validators['Last-Modified'] = last_modified
+    return validators
+
+
+def conditional_on_collections(*collections):
+    """Decorator for read operations that depend only on `collections`.
+
+    If the client already has the current representation, the operation
+    is skipped and the response is a 304.  Otherwise, the validators are
+    attached to the request, for `OperationsResource` to send along with
+    the response.  `If-None-Match: *` can only be answered once the
+    operation has found the resource, so the operation is run for it.
+    """
+    def not_modified(etag, last_modified):
+        response = HttpResponse(status=httplib.NOT_MODIFIED)
+        for header, value in make_validators(etag, last_modified).items():
+            response[header] = value
+        return response
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            etag, last_modified = get_validators(request, collections)
+            if is_not_modified(request, etag, last_modified, exists=False):
+                return not_modified(etag, last_modified)
+            request.cache_validators = make_validators(etag, last_modified)
+            result = method(self, request, *args, **kwargs)
+            # The operation raises an exception if the resource does not
+            # exist, or the client may not see it.
+            succeeded = (
+                not isinstance(result, HttpResponse) or
+                result.status_code == httplib.OK)
+            if succeeded and is_not_modified(request, etag, last_modified):
+                return not_modified(etag, last_modified)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,70 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Bump collection versions when the objects they show change.
+
+See `maasserver.collection_version`.  Changes that bypass the model
+signals (query set updates, raw SQL) bump the versions explicitly.
+"""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = [
+    ]
+
+from django.contrib.auth.models import User
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    )
+from maasserver.collection_version import (
+    bump_collection_version,
+    COLLECTION,
+    )
+from maasserver.models import (
+    DHCPLease,
+    MACAddress,
+    Node,
+    NodeGroup,
+    NodeGroupInterface,
+    Tag,
+    )
+
+# The collections whose representation shows each model.  The node
+# representation includes the owner's name, the MAC addresses, the IP
+# addresses from the leases, the tag names and, through the node group's
+# interfaces, the DNS domain.
+COLLECTIONS_SHOWING = {
+    Node: [COLLECTION.NODES],
+    MACAddress: [COLLECTION.NODES],
+    DHCPLease: [COLLECTION.NODES],
+    User: [COLLECTION.NODES],
+    NodeGroupInterface: [COLLECTION.NODES, COLLECTION.NODEGROUPS],
+    NodeGroup: [COLLECTION.NODES, COLLECTION.NODEGROUPS],
+    Tag: [COLLECTION.NODES, COLLECTION.TAGS],
+    Node.tags.through: [COLLECTION.NODES],
+    }
+
+
+def bump_collections_showing(sender, **kwargs):
+    """Bump the versions of the collections showing `sender` objects."""
+    for collection in COLLECTIONS_SHOWING[sender]:
+        bump_collection_version(collection)
+
+
+for model in COLLECTIONS_SHOWING:
+    if model is Node.tags.through:
+        m2m_changed.connect(
+            bump_collections_showing, sender=model, weak=False)
+    else:
+        post_save.connect(bump_collections_showing, sender=model, weak=False)
+        post_delete.connect(
+            bump_collections_showing, sender=model, weak=False)
@@ -31,9 +31,11 @@ __all__ = [
     "UbuntuForm",
     "AdminNodeForm",
     "TagForm",
+    "update_download_progress",
     ]
 
 import collections
+from copy import copy
 import json
 import pipes
 import re
@@ -688,6 +690,8 @@ class UbuntuForm(ConfigForm):
     main_archive = get_config_field('main_archive')
     ports_archive = get_config_field('ports_archive')
     cloud_images_archive = get_config_field('cloud_images_archive')
+    ephemerals_archive = get_config_field('ephemerals_archive')
+    boot_images_from_region = get_config_field('boot_images_from_region')
 
 
 class GlobalKernelOptsForm(ConfigForm):
@@ -1041,3 +1045,50 @@ class DownloadProgressForm(ModelForm):
                 "bytes_downloaded was passed on a new download.")
 
         return super(DownloadProgressForm, self).clean()
+
+
+def update_download_progress(nodegroup, reports):
+    """Apply a batch of download progress reports from a cluster.
+
+    The reports are applied in order, by the rules of single reports to the
+    `report_download_progress` API call.  An invalid report is skipped; the
+    others are still applied.  The downloads' latest progress records are
+    looked up all at once, and each is saved once.
+
+    :param reports: A list of dicts of the parameters of progress reports.
+    :return: A list of the reports' errors, in order: None for a report
+        that was applied, or a dict of error messages by field.
+    """
+    latest = DownloadProgress.objects.get_latest_downloads(
+        nodegroup, {report['filename'] for report in reports})
+    changed = {}
+    errors = []
+    for report in reports:
+        filename = report['filename']
+        new_download = report.get('bytes_downloaded') is None
+        if new_download:
+            download = DownloadProgress.objects.create(
+                nodegroup=nodegroup, filename=filename)
+        else:
+            download = latest.get(filename)
+        data = dict(report)
+        if 'size' not in data and download is not None:
+            # No size given.  If one was specified previously, use that.
+            data['size'] = download.size
+        # The form changes its instance even if the report is invalid, so
+        # it gets a copy.
+        form = DownloadProgressForm(data=data, instance=copy(download))
+        if form.is_valid():
+            download = latest[filename] = form.save(commit=False)
+            changed[download.id] = download
+            errors.append(None)
+        else:
+            if new_download:
+                download.delete()
+            errors.append({
+                field: [unicode(message) for message in messages]
+                for field, messages in form.errors.items()
+                })
+    for download in changed.values():
+        download.save()
+    return errors
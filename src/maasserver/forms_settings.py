@@ -34,6 +34,7 @@ from provisioningserver.enum import (
     POWER_TYPE,
     POWER_TYPE_CHOICES,
     )
+from provisioningserver.import_images.config import RELEASES_URL
 
 
 def compose_invalid_choice_text(choice_of_what, valid_choices):
@@ -129,6 +130,31 @@ CONFIG_ITEMS = {
             )
         }
     },
+    'ephemerals_archive': {
+        'default': RELEASES_URL,
+        'form': forms.URLField,
+        'form_kwargs': {
+            'label': "Ephemeral images archive",
+            'error_messages': {'invalid': INVALID_URL_MESSAGE},
+            'help_text': (
+                "Archive used by cluster controllers to retrieve ephemeral "
+                "images. E.g. %s." % RELEASES_URL
+            )
+        }
+    },
+    'boot_images_from_region': {
+        'default': False,
+        'form': forms.BooleanField,
+        'form_kwargs': {
+            'required': False,
+            'label': "Cluster controllers download boot images through "
+                     "the region controller",
+            'help_text': (
+                "The region controller then downloads each boot image "
+                "from the archives once, and caches it for all the "
+                "cluster controllers.")
+        }
+    },
     'maas_name': {
         'default': gethostname(),
         'form': forms.CharField,
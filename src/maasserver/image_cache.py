@@ -0,0 +1,476 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Region-side cache of the archives that boot images come from.
+
+Left to themselves, the cluster controllers each download the same boot
+images from the Ubuntu archives and the ephemeral images mirror.  With
+the 'boot_images_from_region' config setting on, they download them
+from the region controller instead, which fetches each file from the
+upstream archive once, through the configured proxy, and serves it to
+all the clusters from its cache.
+
+Only the accepted cluster controllers may use the cache: the URL given
+to each of them contains a key derived from its API credentials (see
+`get_image_cache_key`).
+
+The cached files are checked against the upstream archive at most once
+every `CACHE_MAX_AGE` seconds, with a conditional request.  That leaves
+the index files of the archives, which change in place, reasonably
+current, at the cost of a small request for the files that never
+change.  Signatures and checksums are still verified by the clusters,
+as they would be for files downloaded from the archives themselves.
+
+Files are fetched into the cache by a Celery task, one at a time, never
+by the web requests themselves.  Meanwhile, a stale copy is served, or
+failing that the file is served as it is being fetched: however many
+clusters ask for a new file at once, it is downloaded from the upstream
+archive only once.  The least recently checked files are removed when
+the cache grows beyond `BOOT_IMAGES_CACHE_MAX_SIZE`.
+"""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = [
+    'get_cached_file',
+    'get_image_cache_key',
+    'get_image_cache_url',
+    'get_upstream_archives',
+    'iter_fetched_bytes',
+    'iter_file_bytes',
+    'NotInArchive',
+    'open_fetched_file',
+    'refresh_cached_file',
+    'UnknownArchive',
+    ]
+
+from email.utils import (
+    formatdate,
+    mktime_tz,
+    parsedate_tz,
+    )
+import httplib
+import io
+import os
+import posixpath
+from time import (
+    sleep,
+    time,
+    )
+import urllib2
+
+from celery.app import app_or_default
+from django.conf import settings
+from django.utils.crypto import salted_hmac
+from lockfile import (
+    FileLock,
+    LockError,
+    )
+from maasserver import logger
+from maasserver.models import Config
+from maasserver.utils import absolute_reverse
+from provisioningserver.utils import ensure_dir
+
+# How long a cached file is served without checking it against the
+# upstream archive, in seconds.
+CACHE_MAX_AGE = 60 * 60
+
+# Suffix of the files that record when a cached file was last checked.
+CHECKED_SUFFIX = '.checked'
+
+# Suffix of the file a cached file is fetched into.
+PARTIAL_SUFFIX = '.part'
+
+# Suffix of the file that records the size of a file being fetched.
+SIZE_SUFFIX = '.size'
+
+# Size of the pieces cached files are served in, in bytes.
+READ_CHUNK_SIZE = 256 * 1024
+
+# How long to wait for the lock on a cached file, in seconds.  It is held
+# by a task fetching the file, which the waiting task leaves it to.
+LOCK_TIMEOUT = 1
+
+# How long a request for a file that is not cached waits for its fetch to
+# start, in seconds.
+FETCH_START_TIMEOUT = 30
+
+# How often a request served a file being fetched checks for more of it,
+# in seconds.
+POLL_INTERVAL = 0.1
+
+# How long to tell clients to wait before asking again for a file that
+# could not be fetched, in seconds.
+RETRY_AFTER = 60
+
+
+class UnknownArchive(Exception):
+    """No archive is known by the given name."""
+
+
+class NotInArchive(Exception):
+    """The upstream archive does not have the requested file."""
+
+
+def get_upstream_archives():
+    """Return the URLs of the cached archives, keyed by name."""
+    return {
+        'main': Config.objects.get_config('main_archive'),
+        'ports': Config.objects.get_config('ports_archive'),
+        'ephemerals': Config.objects.get_config('ephemerals_archive'),
+        }
+
+
+def get_image_cache_key(nodegroup):
+    """Return the key `nodegroup` uses the region's cache with.
+
+    It is derived from the secret of the cluster's API credentials, so
+    only the region and the cluster itself know it.
+    """
+    return salted_hmac(
+        'maasserver.image_cache', nodegroup.uuid,
+        secret=nodegroup.api_token.secret).hexdigest()
+
+
+def get_image_cache_url(nodegroup, archive):
+    """Return the URL of the region's cache of `archive` for `nodegroup`."""
+    return absolute_reverse(
+        'image_cache', kwargs={
+            'uuid': nodegroup.uuid,
+            'key': get_image_cache_key(nodegroup),
+            'archive': archive,
+            'path': '',
+            })
+
+
+def get_upstream_url(archive, path):
+    """Return the URL of the file at `path` in the upstream `archive`."""
+    try:
+        base_url = get_upstream_archives()[archive]
+    except KeyError:
+        raise UnknownArchive("No archive named %s." % archive)
+    if not base_url.endswith('/'):
+        base_url += '/'
+    return base_url + path
+
+
+def get_cache_path(archive, path):
+    """Return where the file at `path` in `archive` is cached.
+
+    :raise ValueError: If `path` is not that of a file in the archive.
+    """
+    normalised = posixpath.normpath(path)
+    if normalised.startswith('/') or normalised.split('/')[0] in ('.', '..'):
+        raise ValueError("Not a file in the archive: %s" % path)
+    return os.path.join(settings.BOOT_IMAGES_CACHE_DIR, archive, normalised)
+
+
+def was_checked_recently(cached):
+    """Was the file cached at `cached` checked upstream recently enough?"""
+    try:
+        checked = os.path.getmtime(cached + CHECKED_SUFFIX)
+    except OSError:
+        return False
+    return time() - checked < CACHE_MAX_AGE
+
+
+def is_fresh(cached):
+    """Is there a recently checked copy of the file at `cached`?"""
+    return was_checked_recently(cached) and os.path.isfile(cached)
+
+
+def is_known_missing(cached):
+    """Was the file for `cached` recently found missing upstream?"""
+    return was_checked_recently(cached) and not os.path.isfile(cached)
+
+
+def mark_checked(cached):
+    """Record that the cached file at `cached` is up to date."""
+    with open(cached + CHECKED_SUFFIX, 'wb'):
+        pass
+
+
+def is_being_fetched(cached):
+    """Is the file for `cached` being fetched?"""
+    return FileLock(cached).is_locked()
+
+
+def remove_cached_file(cached):
+    """Remove the cached file at `cached`, if it is there."""
+    for path in (cached, cached + CHECKED_SUFFIX):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def make_opener():
+    """Return a function that opens URLs through the configured proxy."""
+    handlers = []
+    http_proxy = Config.objects.get_config('http_proxy')
+    if http_proxy:
+        handlers.append(
+            urllib2.ProxyHandler({'http': http_proxy, 'https': http_proxy}))
+    return urllib2.build_opener(*handlers).open
+
+
+def fetch(url, cached, opener):
+    """Fetch `url` into `cached`, unless the cached copy is up to date.
+
+    The file is written to a partial file first, and its size, if known,
+    to another, so that requests for it can be served as it is fetched
+    (see `open_fetched_file`).  The cached copy's modification time is
+    that of the upstream file, so that it can be checked with a
+    conditional request.
+
+    :raise urllib2.HTTPError: If the upstream archive refuses the file.
+    """
+    request = urllib2.Request(url)
+    if os.path.isfile(cached):
+        request.add_header(
+            'If-Modified-Since',
+            formatdate(os.path.getmtime(cached), usegmt=True))
+    try:
+        response = opener(request)
+    except urllib2.HTTPError as error:
+        if error.code == httplib.NOT_MODIFIED:
+            return
+        raise
+    partial_path = cached + PARTIAL_SUFFIX
+    size_path = cached + SIZE_SUFFIX
+    try:
+        with open(partial_path, 'wb') as output:
+            with open(size_path, 'wb') as size_file:
+                size_file.write(
+                    (response.info().getheader('Content-Length') or '')
+                    .encode('ascii'))
+            for data in iter_response_bytes(response):
+                output.write(data)
+                # Make the data available to the requests being served.
+                output.flush()
+        last_modified = response.info().getheader('Last-Modified')
+        if last_modified is not None:
+            last_modified = parsedate_tz(last_modified)
+        if last_modified is not None:
+            mtime = mktime_tz(last_modified)
+            os.utime(partial_path, (mtime, mtime))
+        os.rename(partial_path, cached)
+    finally:
+        for path in (partial_path, size_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def get_cached_file(archive, path):
+    """Return the location of a cached copy of a file in an archive.
+
+    If the file is not cached, or its cached copy has not been checked
+    for a while, a Celery task is queued to fetch it from the upstream
+    archive (see `refresh_cached_file`).  The stale copy is returned in
+    the meantime.
+
+    :param archive: The name of the archive, as in `get_upstream_archives`.
+    :param path: The file's path in the archive.
+    :return: The location of the cached copy, or None if there is none.
+    :raise UnknownArchive: If there is no archive named `archive`.
+    :raise NotInArchive: If the upstream archive was recently found not
+        to have the file.
+    :raise ValueError: If `path` is not that of a file in the archive.
+    """
+    # Check that the archive exists.
+    get_upstream_url(archive, path)
+    cached = get_cache_path(archive, path)
+    if is_fresh(cached):
+        return cached
+    if is_known_missing(cached):
+        raise NotInArchive("%s has no file %s." % (archive, path))
+    # Don't bother queueing a fetch when one is already running.
+    if not is_being_fetched(cached):
+        # Avoid circular imports.
+        from maasserver.tasks import fetch_cached_file
+        fetch_cached_file.apply_async(
+            queue=app_or_default().conf.WORKER_QUEUE_REGION,
+            args=[archive, path])
+    if os.path.isfile(cached):
+        return cached
+    else:
+        return None
+
+
+def refresh_cached_file(archive, path, opener=None):
+    """Bring the cached copy of a file in an archive up to date.
+
+    This runs in a Celery task.  It does nothing if another task is
+    fetching the same file already, or if the file was checked recently.
+    A file that the upstream archive does not have is removed from the
+    cache, and recorded as checked, so that it is not asked for again
+    for a while.
+
+    :param archive: The name of the archive, as in `get_upstream_archives`.
+    :param path: The file's path in the archive.
+    :raise urllib2.URLError: If the upstream archive fails.
+    """
+    url = get_upstream_url(archive, path)
+    cached = get_cache_path(archive, path)
+    ensure_dir(os.path.dirname(cached))
+    lock = FileLock(cached)
+    try:
+        lock.acquire(timeout=LOCK_TIMEOUT)
+    except LockError:
+        return
+    try:
+        if was_checked_recently(cached):
+            return
+        if opener is None:
+            opener = make_opener()
+        try:
+            fetch(url, cached, opener)
+        except urllib2.HTTPError as error:
+            if error.code != httplib.NOT_FOUND:
+                raise
+            remove_cached_file(cached)
+        mark_checked(cached)
+    finally:
+        lock.release()
+    prune_cache(settings.BOOT_IMAGES_CACHE_MAX_SIZE)
+
+
+def prune_cache(max_size):
+    """Remove the least recently checked files beyond `max_size` bytes.
+
+    The cached files in use are checked at least every `CACHE_MAX_AGE`
+    seconds, so it is the files no longer in use that go first, along
+    with the records of files missing upstream.  Files being fetched are
+    left alone.  Files that are being served can be removed: they have
+    been opened already.
+    """
+    cached_files = []
+    for directory, _, filenames in os.walk(settings.BOOT_IMAGES_CACHE_DIR):
+        for filename in filenames:
+            if filename.endswith(CHECKED_SUFFIX):
+                cached = os.path.join(
+                    directory, filename[:-len(CHECKED_SUFFIX)])
+                try:
+                    checked = os.path.getmtime(cached + CHECKED_SUFFIX)
+                    if os.path.isfile(cached):
+                        size = os.path.getsize(cached)
+                    else:
+                        size = 0
+                except OSError:
+                    continue
+                cached_files.append((checked, size, cached))
+    total_size = sum(size for _, size, _ in cached_files)
+    for _, size, cached in sorted(cached_files):
+        if total_size <= max_size:
+            break
+        if not is_being_fetched(cached):
+            logger.info("Removing %s from the boot images cache.", cached)
+            remove_cached_file(cached)
+            total_size -= size
+
+
+def open_fetched_file(archive, path):
+    """Open a file that is not cached yet, as it is being fetched.
+
+    Waits up to `FETCH_START_TIMEOUT` seconds for the fetch queued by
+    `get_cached_file` to start.  If it is over by then, the cached copy
+    is opened instead.
+
+    :param archive: The name of the archive, as in `get_upstream_archives`.
+    :param path: The file's path in the archive.
+    :return: A tuple of the file, open for reading, its size, or None if
+        it is unknown, and the location of the cached copy.  None if the
+        fetch did not start in time, or failed.
+    :raise NotInArchive: If the upstream archive does not have the file.
+    """
+    cached = get_cache_path(archive, path)
+    deadline = time() + FETCH_START_TIMEOUT
+    seen_fetching = False
+    while True:
+        fetching = is_being_fetched(cached)
+        try:
+            if fetching:
+                with open(cached + SIZE_SUFFIX, 'rb') as size_file:
+                    size = size_file.read()
+                input_file = io.open(cached + PARTIAL_SUFFIX, 'rb', 0)
+                return input_file, int(size) if size else None, cached
+            else:
+                input_file = io.open(cached, 'rb', 0)
+                size = os.fstat(input_file.fileno()).st_size
+                return input_file, size, cached
+        except (IOError, OSError):
+            # The fetch has not got to writing the file yet, or has just
+            # finished or failed.
+            pass
+        if is_known_missing(cached):
+            raise NotInArchive("%s has no file %s." % (archive, path))
+        if (seen_fetching and not fetching) or time() >= deadline:
+            return None
+        seen_fetching = seen_fetching or fetching
+        sleep(POLL_INTERVAL)
+
+
+def iter_fetched_bytes(cached, input_file, start, stop):
+    """Iterate over the bytes of a file being fetched, as they come in.
+
+    :param cached: The location of the file's cached copy.
+    :param input_file: The file, as opened by `open_fetched_file`.
+    :param start: The offset to start at.
+    :param stop: The offset to stop at, or None to read to the end.
+    """
+    with input_file:
+        input_file.seek(start)
+        position = start
+        while stop is None or position < stop:
+            # Once the fetch is over, the whole file has been written.
+            fetching = is_being_fetched(cached)
+            size = READ_CHUNK_SIZE
+            if stop is not None:
+                size = min(size, stop - position)
+            data = input_file.read(size)
+            if data == b'':
+                if not fetching:
+                    break
+                sleep(POLL_INTERVAL)
+                continue
+            position += len(data)
+            yield data
+
+
+def iter_file_bytes(path, start, stop):
+    """Iterate over the bytes of the file at `path` from `start` to `stop`.
+
+    The file is opened straight away, so that it can be served even if a
+    newer version replaces it in the cache in the meantime.
+    """
+    input_file = open(path, 'rb')
+
+    def read_pieces():
+        with input_file:
+            input_file.seek(start)
+            remaining = stop - start
+            while remaining > 0:
+                data = input_file.read(min(remaining, READ_CHUNK_SIZE))
+                if data == b'':
+                    break
+                remaining -= len(data)
+                yield data
+
+    return read_pieces()
+
+
+def iter_response_bytes(response):
+    """Iterate over the body of the HTTP `response`, then close it."""
+    try:
+        while True:
+            data = response.read(READ_CHUNK_SIZE)
+            if data == b'':
+                break
+            yield data
+    finally:
+        response.close()
@@ -15,8 +15,10 @@ __metaclass__ = type
 __all__ = [
     "AccessMiddleware",
     "APIErrorsMiddleware",
+    "CollectionVersionMiddleware",
     "ErrorsMiddleware",
     "ExceptionMiddleware",
+    "OAuthCacheMiddleware",
     ]
 
 from abc import (
@@ -44,10 +46,12 @@ from django.http import (
 from django.http.request import build_request_repr
 from django.utils.http import urlquote_plus
 from maasserver import logger
+from maasserver.collection_version import flush_collection_changes
 from maasserver.exceptions import (
     ExternalComponentException,
     MAASAPIException,
     )
+from maasserver.oauth_store import flush_forgotten_keys
 
 
 def get_relative_path(path):
@@ -208,6 +212,40 @@ class ErrorsMiddleware:
             return None
 
 
+class CollectionVersionMiddleware:
+    """Bump the versions of collections changed by a request.
+
+    This must be listed before `TransactionMiddleware`, so that it
+    processes the response once the transaction has been committed.  See
+    `maasserver.collection_version`.
+    """
+
+    def process_response(self, request, response):
+        flush_collection_changes()
+        return response
+
+    def process_exception(self, request, exception):
+        flush_collection_changes()
+        return None
+
+
+class OAuthCacheMiddleware:
+    """Drop the OAuth objects changed by a request from the cache again.
+
+    This must be listed before `TransactionMiddleware`, so that it
+    processes the response once the transaction has been committed.  See
+    `maasserver.oauth_store`.
+    """
+
+    def process_response(self, request, response):
+        flush_forgotten_keys()
+        return response
+
+    def process_exception(self, request, exception):
+        flush_forgotten_keys()
+        return None
+
+
 class ExceptionLoggerMiddleware:
 
     def process_exception(self, request, exception):
@@ -233,7 +271,10 @@ class DebuggingLoggerMiddleware:
     def process_response(self, request, response):
         if logger.isEnabledFor(self.log_level):
             header = " Response dump ".center(79, "#")
-            content = getattr(response, "content", "{no content}")
+            if getattr(response, "streaming", False):
+                content = "{streaming content}"
+            else:
+                content = getattr(response, "content", "{no content}")
             try:
                 decoded_content = content.decode('utf-8')
             except UnicodeDecodeError:
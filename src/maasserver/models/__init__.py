@@ -18,6 +18,8 @@ __all__ = [
     'Config',
     'DHCPLease',
     'DownloadProgress',
+    'FileChunk',
+    'FileContent',
     'FileStorage',
     'logger',
     'MACAddress',
@@ -46,6 +48,10 @@ from maasserver.models.component_error import ComponentError
 from maasserver.models.config import Config
 from maasserver.models.dhcplease import DHCPLease
 from maasserver.models.downloadprogress import DownloadProgress
+from maasserver.models.filecontent import (
+    FileChunk,
+    FileContent,
+    )
 from maasserver.models.filestorage import FileStorage
 from maasserver.models.macaddress import MACAddress
 from maasserver.models.node import Node
@@ -63,8 +69,8 @@ from piston.models import Consumer
 # Suppress warning about symbols being imported, but only used for
 # export in __all__.
 ignore_unused(
-    ComponentError, Config, DHCPLease, FileStorage, MACAddress, NodeGroup,
-    SSHKey, Tag, UserProfile, NodeGroupInterface)
+    ComponentError, Config, DHCPLease, FileChunk, FileContent, FileStorage,
+    MACAddress, NodeGroup, SSHKey, Tag, UserProfile, NodeGroupInterface)
 
 
 # Connect the 'create_user' method to the post save signal of User.
@@ -176,3 +182,9 @@ ignore_unused(dns_connect)
 
 from maasserver import dhcp_connect
 ignore_unused(dhcp_connect)
+
+from maasserver import collection_version_connect
+ignore_unused(collection_version_connect)
+
+from maasserver import oauth_store
+ignore_unused(oauth_store)
@@ -17,6 +17,10 @@ __all__ = [
     ]
 
 
+from django.db import (
+    IntegrityError,
+    transaction,
+    )
 from django.db.models import (
     CharField,
     ForeignKey,
@@ -50,6 +54,52 @@ class BootImageManager(Manager):
             subarchitecture=subarchitecture, release=release,
             purpose=purpose)
 
+    def update_images(self, nodegroup, images):
+        """Make `images` the boot images `nodegroup` has, and only those.
+
+        The images the node group already has are read in one query; only
+        new images are inserted, and those no longer reported are deleted.
+
+        :param images: An iterable of (architecture, subarchitecture,
+            release, purpose) tuples.
+        :return: Whether the node group's images changed.
+        """
+        return self._update_images(nodegroup, set(images), retry=True)
+
+    def _update_images(self, nodegroup, images, retry):
+        """Do the work of `update_images`.
+
+        :param retry: Whether to start over if a concurrent update inserts
+            some of the same images first.
+        """
+        fields = ('architecture', 'subarchitecture', 'release', 'purpose')
+        existing = {
+            tuple(row[1:]): row[0]
+            for row in self.filter(nodegroup=nodegroup).values_list(
+                'id', *fields)
+            }
+        new_images = images.difference(existing)
+        obsolete_ids = [
+            existing[image] for image in set(existing).difference(images)]
+        if len(new_images) != 0:
+            savepoint = transaction.savepoint()
+            try:
+                self.bulk_create([
+                    BootImage(nodegroup=nodegroup, **dict(zip(fields, image)))
+                    for image in new_images
+                    ])
+            except IntegrityError:
+                # A concurrent update inserted some of the same images
+                # since they were read.  Read them again.
+                if not retry:
+                    raise
+                transaction.savepoint_rollback(savepoint)
+                return self._update_images(nodegroup, images, retry=False)
+            transaction.savepoint_commit(savepoint)
+        if len(obsolete_ids) != 0:
+            self.filter(id__in=obsolete_ids).delete()
+        return len(new_images) != 0 or len(obsolete_ids) != 0
+
     def have_image(self, nodegroup, architecture, subarchitecture, release,
                    purpose):
         """Is an image for the given kind of boot available?"""
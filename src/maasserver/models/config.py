@@ -26,14 +26,23 @@ from django.db.models import (
     Manager,
     Model,
     )
-from django.db.models.signals import post_save
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    )
 from maasserver import DefaultMeta
+from maasserver.collection_version import (
+    bump_collection_version,
+    COLLECTION,
+    get_collection_version,
+    )
 from maasserver.enum import (
     DISTRO_SERIES,
     NODE_AFTER_COMMISSIONING_ACTION,
     )
 from maasserver.fields import JSONObjectField
 from provisioningserver.enum import POWER_TYPE
+from provisioningserver.import_images.config import RELEASES_URL
 
 
 def get_default_config():
@@ -50,6 +59,8 @@ def get_default_config():
         'main_archive': 'http://archive.ubuntu.com/ubuntu',
         'ports_archive': 'http://ports.ubuntu.com/ubuntu-ports',
         'cloud_images_archive': 'https://maas.ubuntu.com/images',
+        'ephemerals_archive': RELEASES_URL,
+        'boot_images_from_region': False,
         # Network section configuration.
         'maas_name': gethostname(),
         'enlistment_domain': b'local',
@@ -66,15 +77,48 @@ def get_default_config():
 DEFAULT_CONFIG = get_default_config()
 
 
+# Marks config items known not to be in the database.
+MISSING = object()
+
+
 class ConfigManager(Manager):
     """Manager for Config model class.
 
     Don't import or instantiate this directly; access as `Config.objects.
+
+    Config values are cached in the process.  Every change to a config
+    item bumps the version of the config "collection" (see
+    `maasserver.collection_version`), which is shared between processes;
+    a process drops its cached values when it sees a new version.
     """
 
     def __init__(self):
         super(ConfigManager, self).__init__()
         self._config_changed_connections = defaultdict(set)
+        self._cache = {}
+        self._cache_version = None
+
+    def clear_cache(self):
+        """Forget the config values cached in this process."""
+        self._cache = {}
+        self._cache_version = None
+
+    def _get_cached_value(self, name):
+        """Return the value of config item `name`, from the cache if possible.
+
+        :return: The value, or `MISSING` if there is no such config item.
+        """
+        version = get_collection_version(COLLECTION.CONFIG)
+        if version != self._cache_version:
+            self._cache = {}
+            self._cache_version = version
+        cache = self._cache
+        if name not in cache:
+            try:
+                cache[name] = self.get(name=name).value
+            except Config.DoesNotExist:
+                cache[name] = MISSING
+        return cache[name]
 
     def get_config(self, name, default=None):
         """Return the config value corresponding to the given config name.
@@ -89,10 +133,12 @@ class ConfigManager(Manager):
         :return: A config value.
         :raises: Config.MultipleObjectsReturned
         """
-        try:
-            return self.get(name=name).value
-        except Config.DoesNotExist:
+        value = self._get_cached_value(name)
+        if value is MISSING:
             return copy.deepcopy(DEFAULT_CONFIG.get(name, default))
+        else:
+            # Callers may modify the value they get.
+            return copy.deepcopy(value)
 
     def get_config_list(self, name):
         """Return the config value list corresponding to the given config
@@ -138,9 +184,14 @@ class ConfigManager(Manager):
         self._config_changed_connections[config_name].add(method)
 
     def _config_changed(self, sender, instance, created, **kwargs):
+        self._config_deleted(sender, instance)
         for connection in self._config_changed_connections[instance.name]:
             connection(sender, instance, created, **kwargs)
 
+    def _config_deleted(self, sender, instance, **kwargs):
+        self.clear_cache()
+        bump_collection_version(COLLECTION.CONFIG)
+
 
 class Config(Model):
     """Configuration settings item.
@@ -165,3 +216,4 @@ class Config(Model):
 
 # Connect config manager's _config_changed to Config's post-save signal.
 post_save.connect(Config.objects._config_changed, sender=Config)
+post_delete.connect(Config.objects._config_deleted, sender=Config)
@@ -17,6 +17,8 @@ __all__ = [
     ]
 
 
+from collections import defaultdict
+
 from django.db import connection
 from django.db.models import (
     ForeignKey,
@@ -27,6 +29,10 @@ from django.db.models import (
 from django.db.models.signals import post_delete
 from django.dispatch import receiver
 from maasserver import DefaultMeta
+from maasserver.collection_version import (
+    bump_collection_version,
+    COLLECTION,
+    )
 from maasserver.fields import MACAddressField
 from maasserver.models.cleansave import CleanSave
 from maasserver.models.macaddress import MACAddress
@@ -108,6 +114,9 @@ class DHCPLeaseManager(Manager):
 
         self._delete_obsolete_leases(nodegroup, leases)
         new_leases = self._add_missing_leases(nodegroup, leases)
+        # The leases are written in raw SQL, bypassing the model signals,
+        # and nodes show their IP addresses.
+        bump_collection_version(COLLECTION.NODES)
         if len(new_leases) > 0:
             dns.change_dns_zones([nodegroup])
         return new_leases
@@ -147,6 +156,36 @@ class DHCPLeaseManager(Manager):
             for hostname, ip in cursor.fetchall()
             )
 
+    def get_ip_addresses_by_node(self, node_ids):
+        """Return the IP addresses leased to each of the given nodes.
+
+        As with `Node.ip_addresses`, only the leases from a node's own node
+        group count.  This takes a single query, however many nodes and
+        leases there are.
+
+        :param node_ids: Database ids of the nodes to look up.
+        :return: A dict mapping node ids to lists of IP addresses.  Nodes
+            without any leases are left out.
+        """
+        node_ids = list(node_ids)
+        if len(node_ids) == 0:
+            return {}
+        cursor = connection.cursor()
+        cursor.execute("""
+            SELECT mac.node_id, lease.ip
+            FROM maasserver_macaddress AS mac
+            JOIN maasserver_node AS node ON node.id = mac.node_id
+            JOIN maasserver_dhcplease AS lease
+                ON lease.mac = mac.mac_address
+                AND lease.nodegroup_id = node.nodegroup_id
+            WHERE mac.node_id = ANY(%s)
+            ORDER BY lease.id
+            """, (node_ids, ))
+        ip_addresses = defaultdict(list)
+        for node_id, ip in cursor.fetchall():
+            ip_addresses[node_id].append(ip)
+        return dict(ip_addresses)
+
 
 class DHCPLease(CleanSave, Model):
     """A known mapping of an IP address to a MAC address.
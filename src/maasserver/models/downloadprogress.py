@@ -23,6 +23,7 @@ from django.db.models import (
     ForeignKey,
     IntegerField,
     Manager,
+    Max,
     )
 from maasserver import DefaultMeta
 from maasserver.models.cleansave import CleanSave
@@ -45,6 +46,18 @@ class DownloadProgressManager(Manager):
         else:
             return None
 
+    def get_latest_downloads(self, nodegroup, filenames):
+        """Return the latest `DownloadProgress` for each of `filenames`.
+
+        :return: A dict mapping the filenames that have downloads to their
+            latest `DownloadProgress`.
+        """
+        reports = self.filter(nodegroup=nodegroup, filename__in=filenames)
+        latest_ids = reports.values('filename').annotate(latest=Max('id'))
+        latest = self.filter(
+            id__in=[download['latest'] for download in latest_ids])
+        return {download.filename: download for download in latest}
+
 
 def validate_nonnegative_if_given(value):
     """Django validator: `value` must be either `None`, zero, or positive."""
@@ -0,0 +1,178 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Contents of stored files, kept in chunks.
+
+Files such as Juju charms and tools can be large, so their contents are
+stored as a series of chunks, which are written and read one at a time:
+neither storing nor serving a file needs to hold all of it in memory.
+
+Contents are identified by their SHA-256 hash, and shared between all the
+`FileStorage` objects holding the same data, whoever owns them.
+"""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = [
+    'FileChunk',
+    'FileContent',
+    ]
+
+from functools import partial
+import hashlib
+
+from django.db import connection
+from django.db.models import (
+    BigIntegerField,
+    CharField,
+    ForeignKey,
+    IntegerField,
+    Manager,
+    Model,
+    )
+from maasserver import DefaultMeta
+from metadataserver.fields import (
+    Bin,
+    BinaryField,
+    )
+
+# Size of the chunks contents are stored in, in bytes.
+CHUNK_SIZE = 1024 * 1024
+
+
+def read_chunks(file_object):
+    """Iterate over what is left of `file_object`, a chunk at a time."""
+    return iter(partial(file_object.read, CHUNK_SIZE), b'')
+
+
+def iter_chunks(chunk_ids, offset, start, stop):
+    """Iterate over the data of the chunks `chunk_ids`, fetching each in turn.
+
+    :param offset: The offset of the first chunk in the content.
+    :param start: The offset to start at, in the first chunk.
+    :param stop: The offset to stop at, in the last chunk.
+    """
+    for chunk_id in chunk_ids:
+        chunks = list(FileChunk.objects.filter(id=chunk_id))
+        if len(chunks) == 0:
+            return
+        yield chunks[0].data[max(start - offset, 0):stop - offset]
+        offset += CHUNK_SIZE
+
+
+class FileContentManager(Manager):
+    """Manager for `FileContent` objects."""
+
+    def store(self, file_object):
+        """Store what is left of `file_object`, unless it is stored already.
+
+        The file is read twice: once to hash it, and once more, from the
+        same position, to store it if there is no identical content yet.
+
+        :param file_object: A seekable file-like object.
+        :return: The `FileContent` holding the file's data.
+        """
+        start = file_object.tell()
+        digest = hashlib.sha256()
+        size = 0
+        for data in read_chunks(file_object):
+            digest.update(data)
+            size += len(data)
+        # Lock existing content, so that it cannot be deleted as unused
+        # before the caller refers to it; see `delete_unused`.
+        content, created = self.select_for_update().get_or_create(
+            sha256=digest.hexdigest(), defaults={'size': size})
+        if created:
+            file_object.seek(start)
+            for index, data in enumerate(read_chunks(file_object)):
+                FileChunk(content=content, index=index, data=Bin(data)).save()
+        return content
+
+    def delete_unused(self, ids):
+        """Delete those of the contents `ids` that no file refers to.
+
+        The contents are locked first: a concurrent `store` of identical
+        data waits, and then stores it anew, while a file that came to
+        refer to one of them in the meantime keeps it in use.
+        """
+        ids = list(
+            self.select_for_update().filter(id__in=ids).values_list(
+                'id', flat=True))
+        unused = list(
+            self.filter(id__in=ids, filestorage=None).values_list(
+                'id', flat=True))
+        if len(unused) != 0:
+            # Deleting the chunks through the ORM would load them all.
+            cursor = connection.cursor()
+            cursor.execute(
+                "DELETE FROM maasserver_filechunk WHERE content_id IN %s",
+                [tuple(unused)])
+            self.filter(id__in=unused).delete()
+
+
+class FileContent(Model):
+    """The data of one or more stored files.
+
+    :ivar sha256: The SHA-256 hash of the data, in hexadecimal.
+    :ivar size: The size of the data, in bytes.
+    """
+
+    class Meta(DefaultMeta):
+        """Needed for South to recognize this model."""
+
+    sha256 = CharField(max_length=64, unique=True, editable=False)
+    size = BigIntegerField(editable=False)
+
+    objects = FileContentManager()
+
+    def __unicode__(self):
+        return self.sha256
+
+    def iter_bytes(self, start=0, stop=None):
+        """Iterate over the data from offset `start` up to `stop`.
+
+        The chunks are looked up straight away, but each one is fetched
+        only as it is needed, which may be after the current transaction
+        is over: a response streams its content after the view returns.
+        Chunks never change, so the data is consistent; if the content is
+        deleted in the meantime, the iteration ends early.
+
+        :param stop: The offset to stop at, or None to read to the end.
+        """
+        if stop is None or stop > self.size:
+            stop = self.size
+        first = start // CHUNK_SIZE
+        chunk_ids = FileChunk.objects.filter(
+            content=self, index__gte=first,
+            index__lt=(stop + CHUNK_SIZE - 1) // CHUNK_SIZE)
+        chunk_ids = chunk_ids.order_by('index').values_list('id', flat=True)
+        return iter_chunks(list(chunk_ids), first * CHUNK_SIZE, start, stop)
+
+    def read(self):
+        """Return all of the data, as a byte string."""
+        return b''.join(self.iter_bytes())
+
+
+class FileChunk(Model):
+    """A piece of a `FileContent`'s data.
+
+    :ivar content: The `FileContent` this is part of.
+    :ivar index: The chunk's position in the content, starting at zero.
+        Each chunk but the last is `CHUNK_SIZE` bytes long.
+    :ivar data: The chunk's bytes.
+    """
+
+    class Meta(DefaultMeta):
+        """Needed for South to recognize this model."""
+        unique_together = ('content', 'index')
+
+    content = ForeignKey(FileContent, editable=False)
+    index = IntegerField(editable=False)
+    data = BinaryField(null=False, blank=True)
@@ -27,28 +27,24 @@ from django.db.models import (
     Manager,
     Model,
     )
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.utils.http import urlencode
 from maasserver import DefaultMeta
 from maasserver.models.cleansave import CleanSave
-from metadataserver.fields import (
-    Bin,
-    BinaryField,
-    )
+from maasserver.models.filecontent import FileContent
 
 
 class FileStorageManager(Manager):
     """Manager for `FileStorage` objects.
 
     Store files by calling `save_file`.  No two `FileStorage` objects can
-    have the same filename at the same time.  Writing new data to a file
-    whose name is already in use, replaces its `FileStorage` with one
-    pointing to the new data.
-
-    Underneath, however, the storage layer will keep the old version of the
-    file around indefinitely.  Thus, if the overwriting transaction rolls
-    back, it may leave the new file as garbage on the filesystem; but the
-    original file will not be affected.  Also, any ongoing reads from the
-    old file will continue without iterruption.
+    have the same filename and owner at the same time.  Writing new data
+    to a file whose name is already in use replaces its data.
+
+    Underneath, the data is kept as a `FileContent`, shared by all the
+    files with identical data.  Once no file refers to a `FileContent`
+    any more, it is deleted.
     """
 
     def save_file(self, filename, file_object, owner):
@@ -56,15 +52,19 @@ class FileStorageManager(Manager):
 
         If a file of that name/owner already existed, it will be replaced by
         the new contents.
+
+        :param file_object: A seekable file-like object.  It is read a
+            chunk at a time.
         """
-        # This probably ought to read in chunks but large files are
-        # not expected.
-        content = Bin(file_object.read())
+        content = FileContent.objects.store(file_object)
         storage, created = self.get_or_create(
-            filename=filename, owner=owner, defaults={'content': content})
-        if not created:
-            storage.content = content
+            filename=filename, owner=owner,
+            defaults={'file_content': content})
+        if not created and storage.file_content_id != content.id:
+            old_content_id = storage.file_content_id
+            storage.file_content = content
             storage.save()
+            FileContent.objects.delete_unused([old_content_id])
         return storage
 
 
@@ -77,7 +77,7 @@ class FileStorage(CleanSave, Model):
 
     :ivar filename: A file name to use for the data being stored.
     :ivar owner: This file's owner..
-    :ivar content: The file's actual data.
+    :ivar file_content: The `FileContent` holding the file's data.
     """
 
     class Meta(DefaultMeta):
@@ -85,7 +85,7 @@ class FileStorage(CleanSave, Model):
         unique_together = ('filename', 'owner')
 
     filename = CharField(max_length=255, unique=False, editable=False)
-    content = BinaryField(null=False, blank=True)
+    file_content = ForeignKey(FileContent, editable=False)
     # owner can be None: this is to support upgrading existing
     # installations where the files were not linked to users yet.
     owner = ForeignKey(
@@ -99,9 +99,23 @@ class FileStorage(CleanSave, Model):
     def __unicode__(self):
         return self.filename
 
+    @property
+    def content(self):
+        """The file's data, read into memory all at once.
+
+        Use `file_content.iter_bytes` to go through a large file.
+        """
+        return self.file_content.read()
+
     @property
     def anon_resource_uri(self):
         """URI where the content of the file can be retrieved anonymously."""
         params = {'op': 'get_by_key', 'key': self.key}
         url = '%s?%s' % (reverse('files_handler'), urlencode(params))
         return url
+
+
+@receiver(post_delete, sender=FileStorage)
+def delete_unused_content(sender, instance, **kwargs):
+    """Delete the data of a deleted file, unless other files share it."""
+    FileContent.objects.delete_unused([instance.file_content_id])
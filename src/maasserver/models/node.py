@@ -17,6 +17,7 @@ __all__ = [
     "Node",
     ]
 
+from collections import defaultdict
 from itertools import (
     imap,
     islice,
@@ -31,18 +32,30 @@ from django.core.exceptions import (
     PermissionDenied,
     ValidationError,
     )
+from django.db import connection
 from django.db.models import (
     BooleanField,
     CharField,
+    DateTimeField,
     ForeignKey,
     IntegerField,
     Manager,
     ManyToManyField,
     Q,
+    TextField,
     )
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    )
+from django.dispatch import receiver
 from django.shortcuts import get_object_or_404
 import djorm_pgarray.fields
 from maasserver import DefaultMeta
+from maasserver.collection_version import (
+    bump_collection_version,
+    COLLECTION,
+    )
 from maasserver.enum import (
     ARCHITECTURE,
     ARCHITECTURE_CHOICES,
@@ -65,23 +78,35 @@ from maasserver.models.config import Config
 from maasserver.models.dhcplease import DHCPLease
 from maasserver.models.tag import Tag
 from maasserver.models.zone import Zone
-from maasserver.models.timestampedmodel import TimestampedModel
+from maasserver.models.timestampedmodel import (
+    now,
+    TimestampedModel,
+    )
 from maasserver.utils import (
     get_db_state,
     strip_domain,
     )
 from piston.models import Token
 from provisioningserver.enum import (
+    POWER_STATE,
+    POWER_STATE_CHOICES,
     POWER_TYPE,
     POWER_TYPE_CHOICES,
     )
 from provisioningserver.tasks import (
     power_off,
+    power_off_nodes,
     power_on,
+    power_on_nodes,
     remove_dhcp_host_map,
     )
 
 
+# Key space for the advisory locks taken on nodes being acquired.  The
+# two-key form of pg_try_advisory_xact_lock takes this and the node's id.
+NODE_ACQUISITION_LOCK_CLASS = 0x4E4F  # "NO"
+
+
 def generate_node_system_id():
     return 'node-%s' % uuid1()
 
@@ -152,6 +177,32 @@ NODE_TRANSITIONS = {
     }
 
 
+def dispatch_power_actions(single_task, batch_task, power_actions):
+    """Send power actions to the clusters, one message per cluster.
+
+    The actions are grouped by the work queue of the nodes' cluster.  A
+    cluster with a single node to act upon gets `single_task`, as it
+    always has; a cluster with several nodes gets them all in one
+    `batch_task`.
+
+    :param single_task: The task for acting upon one node, e.g. `power_on`.
+    :param batch_task: The task for acting upon several nodes, e.g.
+        `power_on_nodes`.
+    :param power_actions: A sequence of (node, power_type, power_parameters)
+        tuples.
+    """
+    actions_by_queue = defaultdict(list)
+    for node, power_type, power_params in power_actions:
+        actions_by_queue[node.work_queue].append((power_type, power_params))
+    for queue, actions in actions_by_queue.items():
+        if len(actions) == 1:
+            [(power_type, power_params)] = actions
+            single_task.apply_async(
+                queue=queue, args=[power_type], kwargs=power_params)
+        else:
+            batch_task.apply_async(queue=queue, args=[actions])
+
+
 class NodeManager(Manager):
     """A utility to manage the collection of Nodes."""
 
@@ -282,6 +333,117 @@ class NodeManager(Manager):
         available_nodes = self.get_nodes(for_user, NODE_PERMISSION.VIEW)
         return available_nodes.filter(status=NODE_STATUS.READY)
 
+    def lock_nodes_for_acquisition(self, nodes, count=1):
+        """Lock up to `count` of the given available nodes for acquisition.
+
+        The returned nodes are row-locked (SELECT ... FOR UPDATE) until the
+        end of the current transaction, so they can be acquired without
+        racing against concurrent acquirers.  Nodes already locked by
+        another transaction that is acquiring them are skipped rather than
+        waited on, so parallel allocators don't collide: an advisory lock,
+        taken with `pg_try_advisory_xact_lock`, marks each candidate as
+        claimed.  (PostgreSQL 9.1 has no SKIP LOCKED.)
+
+        This must be called inside a transaction; the API runs every
+        request in one.
+
+        :param nodes: A `Node` query set, typically obtained from
+            `get_available_nodes_for_acquisition` and further filtered by
+            constraints.  It may contain joins; only the nodes' own rows
+            get locked.
+        :param count: The maximum number of nodes to lock.
+        :return: The locked nodes, at most `count` of them, in the order
+            of `nodes` if it is ordered by fields of the node itself, or in
+            id order otherwise.
+        :rtype: list
+        """
+        # Claim candidates a batch at a time, in order, trying advisory
+        # locks only on as many candidates as are still needed: trying them
+        # in the filter of the whole query would claim every candidate.
+        # Rows are then locked from a query on the node table alone: FOR
+        # UPDATE on the filtered query would also lock any joined rows
+        # (tags, nodegroups), serializing unrelated acquisitions.
+        ordering = nodes.query.order_by or ['id']
+        candidates = self.filter(
+            id__in=nodes.values('id'), status=NODE_STATUS.READY)
+        candidates = candidates.order_by(*ordering)
+        cursor = connection.cursor()
+        locked = []
+        tried_ids = []
+        while len(locked) < count:
+            untried = candidates
+            if len(tried_ids) > 0:
+                untried = untried.exclude(id__in=tried_ids)
+            batch_ids = list(
+                untried.values_list('id', flat=True)[:count - len(locked)])
+            if len(batch_ids) == 0:
+                break
+            tried_ids.extend(batch_ids)
+            cursor.execute(
+                "SELECT id FROM unnest(%s) AS id "
+                "WHERE pg_try_advisory_xact_lock(%s, id)",
+                [batch_ids, NODE_ACQUISITION_LOCK_CLASS])
+            claimed_ids = [row[0] for row in cursor.fetchall()]
+            if len(claimed_ids) > 0:
+                # The status is checked again once the row is locked: the
+                # node may have been acquired since the candidates were
+                # selected.
+                locked.extend(
+                    self.filter(id__in=claimed_ids, status=NODE_STATUS.READY)
+                    .select_for_update().order_by(*ordering))
+        return locked
+
+    def update_power_states(self, nodegroup, power_states):
+        """Record the power states reported by a cluster controller.
+
+        This issues one UPDATE per distinct power state, however many nodes
+        changed.
+
+        :param nodegroup: The :class:`NodeGroup` that reported the states.
+            Nodes that are not in this node group are left untouched.
+        :param power_states: A dict mapping system_ids to power states (see
+            vocabulary `POWER_STATE`).
+        """
+        system_ids_by_state = defaultdict(list)
+        for system_id, power_state in power_states.items():
+            system_ids_by_state[power_state].append(system_id)
+        updated = now()
+        for power_state, system_ids in system_ids_by_state.items():
+            self.filter(nodegroup=nodegroup, system_id__in=system_ids).update(
+                power_state=power_state, power_state_updated=updated)
+        bump_collection_version(COLLECTION.NODES)
+
+    def update_tag_kernel_opts(self, node_ids):
+        """Recompute the `tag_kernel_opts` of the given nodes.
+
+        This takes a single query, however many nodes there are.
+
+        :param node_ids: The ids of the nodes to update.
+        :return: A dict mapping the ids of the nodes to their new
+            `tag_kernel_opts`.
+        """
+        node_ids = list(node_ids)
+        if len(node_ids) == 0:
+            return {}
+        cursor = connection.cursor()
+        cursor.execute("""
+            UPDATE %(node)s AS node SET tag_kernel_opts = (
+                SELECT tag.kernel_opts
+                FROM %(node_tags)s AS node_tag
+                JOIN %(tag)s AS tag ON tag.id = node_tag.tag_id
+                WHERE node_tag.node_id = node.id AND tag.kernel_opts <> ''
+                ORDER BY tag.name
+                LIMIT 1)
+            WHERE node.id = ANY(%%s)
+            RETURNING node.id, node.tag_kernel_opts
+            """ % {
+                'node': Node._meta.db_table,
+                'node_tags': Node.tags.through._meta.db_table,
+                'tag': Tag._meta.db_table,
+            },
+            [node_ids])
+        return dict(cursor.fetchall())
+
     def stop_nodes(self, ids, by_user):
         """Request on given user's behalf that the given nodes be shut down.
 
@@ -296,16 +458,17 @@ class NodeManager(Manager):
         :rtype: list
         """
         nodes = self.get_nodes(by_user, NODE_PERMISSION.EDIT, ids=ids)
+        nodes = nodes.select_related('nodegroup')
         processed_nodes = []
+        power_actions = []
         for node in nodes:
             power_params = node.get_effective_power_parameters()
             node_power_type = node.get_effective_power_type()
             # WAKE_ON_LAN does not support poweroff.
             if node_power_type != POWER_TYPE.WAKE_ON_LAN:
-                power_off.apply_async(
-                    queue=node.work_queue, args=[node_power_type],
-                    kwargs=power_params)
+                power_actions.append((node, node_power_type, power_params))
             processed_nodes.append(node)
+        dispatch_power_actions(power_off, power_off_nodes, power_actions)
         return processed_nodes
 
     def start_nodes(self, ids, by_user, user_data=None):
@@ -329,9 +492,10 @@ class NodeManager(Manager):
         from metadataserver.models import NodeUserData
 
         nodes = self.get_nodes(by_user, NODE_PERMISSION.EDIT, ids=ids)
-        for node in nodes:
-            NodeUserData.objects.set_user_data(node, user_data)
+        nodes = list(nodes.select_related('nodegroup'))
+        NodeUserData.objects.bulk_set_user_data(nodes, user_data)
         processed_nodes = []
+        power_actions = []
         for node in nodes:
             power_params = node.get_effective_power_parameters()
             node_power_type = node.get_effective_power_type()
@@ -341,10 +505,9 @@ class NodeManager(Manager):
             else:
                 do_start = True
             if do_start:
-                power_on.apply_async(
-                    queue=node.work_queue, args=[node_power_type],
-                    kwargs=power_params)
+                power_actions.append((node, node_power_type, power_params))
                 processed_nodes.append(node)
+        dispatch_power_actions(power_on, power_on_nodes, power_actions)
         return processed_nodes
 
 
@@ -407,6 +570,9 @@ class Node(CleanSave, TimestampedModel):
 
     class Meta(DefaultMeta):
         """Needed for South to recognize this model."""
+        # Used to pick the smallest sufficient node among the available
+        # ones; see `order_by_smallest_sufficient`.
+        index_together = [['status', 'cpu_count', 'memory', 'storage']]
 
     system_id = CharField(
         max_length=41, unique=True, default=generate_node_system_id,
@@ -416,7 +582,7 @@ class Node(CleanSave, TimestampedModel):
 
     status = IntegerField(
         max_length=10, choices=NODE_STATUS_CHOICES, editable=False,
-        default=NODE_STATUS.DEFAULT_STATUS)
+        default=NODE_STATUS.DEFAULT_STATUS, db_index=True)
 
     owner = ForeignKey(
         User, default=None, blank=True, null=True, editable=False)
@@ -431,7 +597,7 @@ class Node(CleanSave, TimestampedModel):
 
     architecture = CharField(
         max_length=31, choices=ARCHITECTURE_CHOICES, blank=False,
-        default=ARCHITECTURE.i386)
+        default=ARCHITECTURE.i386, db_index=True)
 
     routers = djorm_pgarray.fields.ArrayField(dbtype="macaddr")
 
@@ -456,6 +622,14 @@ class Node(CleanSave, TimestampedModel):
     # JSON-encoded set of parameters for power control.
     power_parameters = JSONObjectField(blank=True, default="")
 
+    # The power state last reported by the node's cluster controller, and
+    # when it was reported.  See `NodeGroup.query_power_states`.
+    power_state = CharField(
+        max_length=10, choices=POWER_STATE_CHOICES, null=False, blank=False,
+        default=POWER_STATE.UNKNOWN, editable=False)
+
+    power_state_updated = DateTimeField(null=True, blank=True, editable=False)
+
     token = ForeignKey(
         Token, db_index=True, null=True, editable=False, unique=False)
 
@@ -478,6 +652,11 @@ class Node(CleanSave, TimestampedModel):
 
     tags = ManyToManyField(Tag)
 
+    # The kernel options of this node's first tag, by name, that has any;
+    # None if there is no such tag.  This is derived from the tags, and
+    # kept up to date by `NodeManager.update_tag_kernel_opts`.
+    tag_kernel_opts = TextField(null=True, blank=True, editable=False)
+
     objects = NodeManager()
 
     def __unicode__(self):
@@ -726,6 +905,20 @@ class Node(CleanSave, TimestampedModel):
         global_value = Config.objects.get_config('kernel_opts')
         return None, global_value
 
+    def get_extra_kernel_opts(self):
+        """Return the extra kernel parameters to boot this node with.
+
+        This is the value `get_effective_kernel_options` finds, without
+        looking at the node's tags: it comes from `tag_kernel_opts`, or from
+        the global setting.
+
+        :return: A string of kernel options, or None.
+        """
+        if self.tag_kernel_opts is None:
+            return Config.objects.get_config('kernel_opts')
+        else:
+            return self.tag_kernel_opts
+
     @property
     def work_queue(self):
         """The name of the queue for tasks specific to this node."""
@@ -856,3 +1049,36 @@ class Node(CleanSave, TimestampedModel):
                 "expression. This expression must be updated to make this "
                 "node boot with the Fast Path Installer.")
         self.tags.add(uti_tag)
+
+
+@receiver(m2m_changed, sender=Node.tags.through)
+def update_tag_kernel_opts_on_tagging(sender, instance, action, reverse,
+                                      pk_set, **kwargs):
+    """Update `tag_kernel_opts` of nodes that gain or lose tags."""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            updated = Node.objects.update_tag_kernel_opts([instance.id])
+            instance.tag_kernel_opts = updated.get(instance.id)
+    elif instance.kernel_opts:
+        # Tags without kernel options make no difference.
+        if action in ('post_add', 'post_remove'):
+            Node.objects.update_tag_kernel_opts(pk_set)
+        elif action == 'post_clear':
+            update_tag_kernel_opts_from_tag(instance)
+
+
+@receiver(post_delete, sender=Tag)
+def update_tag_kernel_opts_on_tag_deletion(sender, instance, **kwargs):
+    """Update `tag_kernel_opts` of the nodes of a deleted tag."""
+    if instance.kernel_opts:
+        update_tag_kernel_opts_from_tag(instance)
+
+
+def update_tag_kernel_opts_from_tag(tag):
+    """Update `tag_kernel_opts` of nodes that may have it from `tag`.
+
+    Use this once the tag's nodes are gone: they are among the nodes whose
+    `tag_kernel_opts` are the tag's.
+    """
+    nodes = Node.objects.filter(tag_kernel_opts=tag.kernel_opts)
+    Node.objects.update_tag_kernel_opts(nodes.values_list('id', flat=True))
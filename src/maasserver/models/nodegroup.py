@@ -25,6 +25,10 @@ from django.db.models import (
     Manager,
     )
 from maasserver import DefaultMeta
+from maasserver.collection_version import (
+    bump_collection_version,
+    COLLECTION,
+    )
 from maasserver.enum import (
     NODEGROUP_STATUS,
     NODEGROUP_STATUS_CHOICES,
@@ -37,11 +41,13 @@ from piston.models import (
     KEY_SIZE,
     Token,
     )
+from provisioningserver.enum import QUERYABLE_POWER_TYPES
 from provisioningserver.omshell import generate_omapi_key
 from provisioningserver.tasks import (
     add_new_dhcp_host_map,
     add_seamicro15k,
     import_boot_images,
+    query_power_states,
     )
 
 
@@ -104,6 +110,7 @@ class NodeGroupManager(Manager):
             # If any legacy nodes were still not associated with a node
             # group, enroll them in the master node group.
             Node.objects.filter(nodegroup=None).update(nodegroup=master)
+            bump_collection_version(COLLECTION.NODES)
 
         return master
 
@@ -143,6 +150,13 @@ class NodeGroupManager(Manager):
         for nodegroup in accepted_nodegroups:
             nodegroup.import_boot_images()
 
+    def query_power_states_accepted_clusters(self):
+        """Poll the nodes' power states on all the accepted clusters."""
+        accepted_nodegroups = NodeGroup.objects.filter(
+            status=NODEGROUP_STATUS.ACCEPTED)
+        for nodegroup in accepted_nodegroups:
+            nodegroup.query_power_states()
+
 
 NODEGROUP_CLUSTER_NAME_TEMPLATE = "Cluster %(uuid)s"
 
@@ -248,23 +262,58 @@ class NodeGroup(TimestampedModel):
         """Import the pxe files on this cluster controller.
 
         The files are downloaded through the proxy defined in the config
-        setting 'http_proxy' if defined.
+        setting 'http_proxy' if defined.  With the config setting
+        'boot_images_from_region' on, they are downloaded from the region
+        controller's cache instead (see `maasserver.image_cache`), and it
+        is the region controller that uses the proxy.
         """
         # Avoid circular imports.
+        from maasserver.image_cache import get_image_cache_url
         from maasserver.models import Config
         config_parameters = {
             'http_proxy',
             'main_archive',
             'ports_archive',
             'cloud_images_archive',
+            'ephemerals_archive',
         }
         task_kwargs = {
             name: Config.objects.get_config(name)
             for name in config_parameters
             if Config.objects.get_config(name) is not None
         }
+        if Config.objects.get_config('boot_images_from_region'):
+            task_kwargs.pop('http_proxy', None)
+            task_kwargs.update(
+                main_archive=get_image_cache_url(self, 'main'),
+                ports_archive=get_image_cache_url(self, 'ports'),
+                ephemerals_archive=get_image_cache_url(self, 'ephemerals'))
         import_boot_images.apply_async(queue=self.uuid, kwargs=task_kwargs)
 
+    def query_power_states(self):
+        """Have this cluster controller poll its nodes' power states.
+
+        Only the nodes whose power type can be queried are sent.  The
+        cluster controller reports the states that changed through the
+        `report_power_states` API call.
+        """
+        nodes = []
+        for node in self.node_set.all():
+            try:
+                power_type = node.get_effective_power_type()
+            except ValueError:
+                # No default power type has been configured yet.
+                continue
+            if power_type in QUERYABLE_POWER_TYPES:
+                nodes.append({
+                    'system_id': node.system_id,
+                    'power_type': power_type,
+                    'power_parameters': node.get_effective_power_parameters(),
+                    })
+        if len(nodes) != 0:
+            query_power_states.apply_async(
+                queue=self.work_queue, args=[nodes])
+
     def add_seamicro15k(self, mac, username, password):
         """ Add all of the specified cards the Seamicro SM15000 chassis at the
         specified MAC. """
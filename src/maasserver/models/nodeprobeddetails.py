@@ -20,9 +20,9 @@ __all__ = [
     "script_output_nsmap",
 ]
 
-from base64 import b64decode
 from collections import Sequence
 
+from metadataserver.fields import decode_binary_value
 from metadataserver.models import (
     commissioningscript,
     NodeCommissionResult,
@@ -53,9 +53,11 @@ def get_single_probed_details(system_id):
     return probe_details[system_id]
 
 
-def get_probed_details(system_ids):
+def get_probed_details(system_ids, decompress=True):
     """Return details of the nodes identified by `system_ids`.
 
+    :param decompress: Whether to decompress details that are stored
+        compressed.  If False, they are returned as `ZlibBin`s.
     :return: A ``{system_id: {...details...}, ...}`` map, where the
         inner dictionaries have the same form as those returned by
         `get_single_probed_details`.
@@ -77,8 +79,9 @@ def get_probed_details(system_ids):
         system_id: detail_template.copy()
         for system_id in system_ids
     }
-    for system_id, script_output_name, b64data in results:
+    for system_id, script_output_name, db_data in results:
         namespace = script_output_nsmap[script_output_name]
-        details[system_id][namespace] = b64decode(b64data)
+        details[system_id][namespace] = decode_binary_value(
+            db_data, decompress=decompress)
 
     return details
@@ -95,6 +95,10 @@ class Tag(CleanSave, TimestampedModel):
             self._original_definition = None
         else:
             self._original_definition = self.definition
+        # Nodes with this tag need to know when its kernel options, or its
+        # name which sets its precedence over other tags, change.
+        self._original_kernel_opts = self.kernel_opts
+        self._original_name = self.name
 
     def __unicode__(self):
         return self.name
@@ -114,11 +118,34 @@ class Tag(CleanSave, TimestampedModel):
         self.node_set.clear()
         populate_tags(self)
 
+    def update_node_kernel_opts(self, node_ids=()):
+        """Update the `tag_kernel_opts` of the nodes with this tag.
+
+        :param node_ids: The ids of other nodes to update as well, such as
+            those that had this tag before it was repopulated.
+        """
+        # Avoid circular imports.
+        from maasserver.models import Node
+        node_ids = set(node_ids)
+        node_ids.update(self.node_set.values_list('id', flat=True))
+        Node.objects.update_tag_kernel_opts(node_ids)
+
     def save(self, *args, **kwargs):
         super(Tag, self).save(*args, **kwargs)
+        kernel_opts_changed = (
+            self.kernel_opts != self._original_kernel_opts or
+            (self.kernel_opts and self.name != self._original_name))
+        if kernel_opts_changed:
+            # Repopulating the tag below takes it off nodes that may still
+            # have its old kernel options.
+            old_node_ids = list(self.node_set.values_list('id', flat=True))
         if self.definition != self._original_definition:
             self.populate_nodes()
         self._original_definition = self.definition
+        if kernel_opts_changed:
+            self.update_node_kernel_opts(old_node_ids)
+        self._original_kernel_opts = self.kernel_opts
+        self._original_name = self.name
 
     @property
     def is_defined(self):
@@ -54,6 +54,60 @@ class TestBootImageManager(MAASServerTestCase):
         self.assertTrue(
             BootImage.objects.have_image(self.nodegroup, **params))
 
+    def get_images(self):
+        return set(
+            BootImage.objects.filter(nodegroup=self.nodegroup).values_list(
+                'architecture', 'subarchitecture', 'release', 'purpose'))
+
+    def make_image_tuple(self):
+        params = make_boot_image_params()
+        return (
+            params['architecture'], params['subarchitecture'],
+            params['release'], params['purpose'])
+
+    def test_update_images_adds_new_images(self):
+        images = {self.make_image_tuple() for counter in range(3)}
+        changed = BootImage.objects.update_images(self.nodegroup, images)
+        self.assertEqual((True, images), (changed, self.get_images()))
+
+    def test_update_images_removes_images_not_reported(self):
+        old_image = self.make_image_tuple()
+        BootImage.objects.update_images(self.nodegroup, {old_image})
+        image = self.make_image_tuple()
+        changed = BootImage.objects.update_images(self.nodegroup, {image})
+        self.assertEqual((True, {image}), (changed, self.get_images()))
+
+    def test_update_images_reports_no_change(self):
+        images = {self.make_image_tuple() for counter in range(3)}
+        BootImage.objects.update_images(self.nodegroup, images)
+        num_queries, changed = self.getNumQueries(
+            BootImage.objects.update_images, self.nodegroup, images)
+        self.assertEqual((1, False), (num_queries, changed))
+
+    def test_update_images_copes_with_concurrent_update(self):
+        image = self.make_image_tuple()
+        bulk_create = BootImage.objects.bulk_create
+        inserts = []
+
+        def racing_bulk_create(objs):
+            if len(inserts) == 0:
+                # Another request inserts the same image first.
+                BootImage.objects.register_image(self.nodegroup, *image)
+            inserts.append(objs)
+            return bulk_create(objs)
+
+        self.patch(BootImage.objects, 'bulk_create', racing_bulk_create)
+        BootImage.objects.update_images(self.nodegroup, {image})
+        self.assertEqual((2, {image}), (len(inserts), self.get_images()))
+
+    def test_update_images_leaves_other_nodegroups_alone(self):
+        other_nodegroup = factory.make_node_group()
+        params = make_boot_image_params()
+        factory.make_boot_image(nodegroup=other_nodegroup, **params)
+        BootImage.objects.update_images(self.nodegroup, [])
+        self.assertTrue(
+            BootImage.objects.have_image(other_nodegroup, **params))
+
     def test_default_arch_image_none(self):
         series = Config.objects.get_config('commissioning_distro_series')
         result = BootImage.objects.get_default_arch_image_in_nodegroup(
@@ -17,6 +17,10 @@ __all__ = []
 from socket import gethostname
 
 from fixtures import TestWithFixtures
+from maasserver.collection_version import (
+    bump_collection_version,
+    COLLECTION,
+    )
 from maasserver.models import Config
 import maasserver.models.config
 from maasserver.models.config import get_default_config
@@ -142,3 +146,46 @@ class ConfigTest(MAASServerTestCase):
         Config.objects.set_config(another_name, value)
 
         self.assertEqual(0, len(recorder.calls))
+
+
+class ConfigCacheTest(MAASServerTestCase):
+    """Testing of the config values cached by :class:`ConfigManager`."""
+
+    def test_get_config_caches_values(self):
+        Config.objects.set_config('name', 'config')
+        Config.objects.get_config('name')
+        num_queries, config = self.getNumQueries(
+            Config.objects.get_config, 'name')
+        self.assertEqual((0, 'config'), (num_queries, config))
+
+    def test_get_config_caches_missing_values(self):
+        Config.objects.get_config('name')
+        num_queries, config = self.getNumQueries(
+            Config.objects.get_config, 'name', 'default value')
+        self.assertEqual((0, 'default value'), (num_queries, config))
+
+    def test_get_config_sees_changed_values(self):
+        Config.objects.set_config('name', 'config1')
+        Config.objects.get_config('name')
+        Config.objects.set_config('name', 'config2')
+        self.assertEqual('config2', Config.objects.get_config('name'))
+
+    def test_get_config_sees_deleted_values(self):
+        Config.objects.set_config('name', 'config')
+        Config.objects.get_config('name')
+        Config.objects.filter(name='name').delete()
+        self.assertIsNone(Config.objects.get_config('name'))
+
+    def test_get_config_sees_changes_made_by_other_processes(self):
+        Config.objects.set_config('name', 'config1')
+        Config.objects.get_config('name')
+        # Another process changes the value, and bumps the version.
+        Config.objects.filter(name='name').update(value='config2')
+        bump_collection_version(COLLECTION.CONFIG)
+        self.assertEqual('config2', Config.objects.get_config('name'))
+
+    def test_cached_values_cannot_be_changed(self):
+        Config.objects.set_config('name', {'key': 'value'})
+        config = Config.objects.get_config('name')
+        config.update({'key2': 'value2'})
+        self.assertEqual({'key': 'value'}, Config.objects.get_config('name'))
@@ -233,3 +233,30 @@ class TestDHCPLeaseManager(MAASServerTestCase):
         mapping = DHCPLease.objects.get_hostname_ip_mapping(
             another_nodegroup)
         self.assertEqual({}, mapping)
+
+    def test_get_ip_addresses_by_node_returns_leased_ips(self):
+        node = factory.make_node()
+        macs = [factory.make_mac_address(node=node) for i in range(2)]
+        leases = [
+            factory.make_dhcp_lease(
+                nodegroup=node.nodegroup, mac=mac.mac_address)
+            for mac in macs]
+        self.assertEqual(
+            {node.id: [lease.ip for lease in leases]},
+            DHCPLease.objects.get_ip_addresses_by_node(
+                [node.id, factory.make_node().id]))
+
+    def test_get_ip_addresses_by_node_ignores_other_nodegroups_leases(self):
+        node = factory.make_node()
+        mac = factory.make_mac_address(node=node)
+        factory.make_dhcp_lease(
+            nodegroup=factory.make_node_group(), mac=mac.mac_address)
+        self.assertEqual(
+            {}, DHCPLease.objects.get_ip_addresses_by_node([node.id]))
+
+    def test_get_ip_addresses_by_node_issues_one_query(self):
+        nodes = [factory.make_node(mac=True) for i in range(3)]
+        num_queries, _ = self.getNumQueries(
+            DHCPLease.objects.get_ip_addresses_by_node,
+            [node.id for node in nodes])
+        self.assertEqual(1, num_queries)
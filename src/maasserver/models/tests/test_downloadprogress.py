@@ -61,6 +61,21 @@ class TestDownloadProgressManager(MAASServerTestCase):
             DownloadProgress.objects.get_latest_download(
                 progress.nodegroup, factory.getRandomString()))
 
+    def test_get_latest_downloads_returns_latest_of_each_file(self):
+        nodegroup = factory.make_node_group()
+        latest = {}
+        for filename in ('a', 'b'):
+            for counter in range(3):
+                latest[filename] = factory.make_download_progress(
+                    nodegroup=nodegroup, filename=filename)
+        factory.make_download_progress(filename='a')
+        factory.make_download_progress(nodegroup=nodegroup, filename='c')
+        self.assertEqual(
+            latest,
+            DownloadProgress.objects.get_latest_downloads(
+                nodegroup, ['a', 'b', 'd']))
+
+
 
 class TestDownloadProgress(MAASServerTestCase):
 
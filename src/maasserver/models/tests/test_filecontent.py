@@ -0,0 +1,101 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for the FileContent model."""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = []
+
+import hashlib
+from io import BytesIO
+
+from maasserver.models import (
+    FileChunk,
+    FileContent,
+    )
+from maasserver.models import filecontent as filecontent_module
+from maasserver.testing.factory import factory
+from maasserver.testing.testcase import MAASServerTestCase
+from maastesting.utils import sample_binary_data
+
+
+class FileContentTest(MAASServerTestCase):
+    """Testing of the :class:`FileContent` model."""
+
+    def setUp(self):
+        super(FileContentTest, self).setUp()
+        # Small chunks, so that contents span several of them.
+        self.patch(filecontent_module, 'CHUNK_SIZE', 4)
+
+    def test_store_records_hash_and_size(self):
+        data = factory.getRandomString(10).encode('ascii')
+        content = FileContent.objects.store(BytesIO(data))
+        self.assertEqual(
+            (hashlib.sha256(data).hexdigest(), len(data)),
+            (content.sha256, content.size))
+
+    def test_store_splits_data_in_chunks(self):
+        content = FileContent.objects.store(BytesIO(b'0123456789'))
+        chunks = FileChunk.objects.filter(content=content).order_by('index')
+        self.assertEqual(
+            [b'0123', b'4567', b'89'], [chunk.data for chunk in chunks])
+
+    def test_store_stores_what_is_left_of_file(self):
+        file_object = BytesIO(b'0123456789')
+        file_object.seek(3)
+        content = FileContent.objects.store(file_object)
+        self.assertEqual(b'3456789', content.read())
+
+    def test_store_reuses_identical_content(self):
+        data = factory.getRandomString(10).encode('ascii')
+        content = FileContent.objects.store(BytesIO(data))
+        self.assertEqual(content, FileContent.objects.store(BytesIO(data)))
+        self.assertEqual(3, FileChunk.objects.count())
+
+    def test_store_stores_empty_file(self):
+        content = FileContent.objects.store(BytesIO())
+        self.assertEqual((0, b''), (content.size, content.read()))
+
+    def test_read_returns_binary_data(self):
+        content = FileContent.objects.store(BytesIO(sample_binary_data))
+        self.assertEqual(sample_binary_data, content.read())
+
+    def test_iter_bytes_yields_chunks(self):
+        content = FileContent.objects.store(BytesIO(b'0123456789'))
+        self.assertEqual(
+            [b'0123', b'4567', b'89'], list(content.iter_bytes()))
+
+    def test_iter_bytes_yields_range(self):
+        content = FileContent.objects.store(BytesIO(b'0123456789'))
+        self.assertEqual(
+            [b'23', b'4567', b'8'], list(content.iter_bytes(2, 9)))
+
+    def test_iter_bytes_stops_at_end_of_content(self):
+        content = FileContent.objects.store(BytesIO(b'0123456789'))
+        self.assertEqual(b'89', b''.join(content.iter_bytes(8, 100)))
+
+    def test_iter_bytes_ends_early_if_content_is_deleted(self):
+        content = FileContent.objects.store(BytesIO(b'0123456789'))
+        chunks = content.iter_bytes()
+        FileContent.objects.delete_unused([content.id])
+        self.assertEqual([], list(chunks))
+
+    def test_delete_unused_deletes_content_and_chunks(self):
+        content = FileContent.objects.store(BytesIO(b'0123456789'))
+        FileContent.objects.delete_unused([content.id])
+        self.assertItemsEqual([], FileContent.objects.all())
+        self.assertItemsEqual([], FileChunk.objects.all())
+
+    def test_delete_unused_keeps_used_content(self):
+        storage = factory.make_file_storage()
+        FileContent.objects.delete_unused([storage.file_content_id])
+        self.assertItemsEqual(
+            [storage.file_content], FileContent.objects.all())
@@ -16,7 +16,12 @@ __all__ = []
 
 from io import BytesIO
 
-from maasserver.models import FileStorage
+from maasserver.models import (
+    FileChunk,
+    FileContent,
+    FileStorage,
+    )
+from maasserver.testing import reload_object
 from maasserver.testing.factory import factory
 from maasserver.testing.testcase import MAASServerTestCase
 from maastesting.utils import sample_binary_data
@@ -85,3 +90,37 @@ class FileStorageTest(MAASServerTestCase):
         storage1 = factory.make_file_storage()
         storage2 = factory.make_file_storage()
         self.assertNotEqual(storage1.key, storage2.key)
+
+    def test_shares_content_between_identical_files(self):
+        content = self.make_data()
+        storage1 = factory.make_file_storage(
+            content=content, owner=factory.make_user())
+        storage2 = factory.make_file_storage(
+            content=content, owner=factory.make_user())
+        self.assertEqual(storage1.file_content, storage2.file_content)
+        self.assertEqual(1, FileContent.objects.count())
+
+    def test_overwriting_file_deletes_unused_content(self):
+        filename = factory.make_name('filename')
+        old_storage = factory.make_file_storage(
+            filename=filename, content=self.make_data('old data'))
+        factory.make_file_storage(
+            filename=filename, content=self.make_data('new data'))
+        self.assertFalse(
+            FileContent.objects.filter(
+                id=old_storage.file_content_id).exists())
+
+    def test_deleting_file_deletes_unused_content(self):
+        storage = factory.make_file_storage()
+        storage.delete()
+        self.assertItemsEqual([], FileContent.objects.all())
+        self.assertItemsEqual([], FileChunk.objects.all())
+
+    def test_deleting_file_keeps_shared_content(self):
+        content = self.make_data()
+        storage = factory.make_file_storage(
+            content=content, owner=factory.make_user())
+        other_storage = factory.make_file_storage(
+            content=content, owner=factory.make_user())
+        storage.delete()
+        self.assertEqual(content, reload_object(other_storage).content)
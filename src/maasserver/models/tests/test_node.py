@@ -15,9 +15,15 @@ __metaclass__ = type
 __all__ = []
 
 from datetime import timedelta
+from operator import attrgetter
 import random
+from threading import Thread
 
 from django.core.exceptions import ValidationError
+from django.db import (
+    connection,
+    transaction,
+    )
 from maasserver.enum import (
     DISTRO_SERIES,
     NODE_PERMISSION,
@@ -45,6 +51,7 @@ from maasserver.testing import reload_object
 from maasserver.testing.factory import factory
 from maasserver.testing.testcase import MAASServerTestCase
 from maasserver.utils import map_enum
+from maastesting.djangotestcase import TransactionTestCase
 from maastesting.testcase import MAASTestCase
 from metadataserver import commissioning
 from metadataserver.fields import Bin
@@ -52,7 +59,10 @@ from metadataserver.models import (
     NodeCommissionResult,
     NodeUserData,
     )
-from provisioningserver.enum import POWER_TYPE
+from provisioningserver.enum import (
+    POWER_STATE,
+    POWER_TYPE,
+    )
 from provisioningserver.power.poweraction import PowerAction
 from testtools.matchers import (
     AllMatch,
@@ -397,6 +407,98 @@ class NodeTest(MAASServerTestCase):
         self.assertEqual(
             (tag2, tag2.kernel_opts), node.get_effective_kernel_options())
 
+    def test_get_extra_kernel_opts_uses_global_config(self):
+        node = factory.make_node()
+        Config.objects.set_config('kernel_opts', 'fish-n-chips')
+        self.assertEqual('fish-n-chips', node.get_extra_kernel_opts())
+
+    def test_get_extra_kernel_opts_uses_tag_value(self):
+        node = factory.make_node()
+        Config.objects.set_config('kernel_opts', 'fish-n-chips')
+        node.tags.add(factory.make_tag(kernel_opts='bacon-n-eggs'))
+        self.assertEqual(
+            'bacon-n-eggs', reload_object(node).get_extra_kernel_opts())
+
+    def test_get_extra_kernel_opts_issues_no_query(self):
+        node = factory.make_node()
+        node.tags.add(factory.make_tag(kernel_opts='bacon-n-eggs'))
+        node = reload_object(node)
+        num_queries, _ = self.getNumQueries(node.get_extra_kernel_opts)
+        self.assertEqual(0, num_queries)
+
+    def test_tag_kernel_opts_follows_first_tag_by_name(self):
+        node = factory.make_node()
+        tag2 = factory.make_tag('tag_2', kernel_opts='two')
+        tag1 = factory.make_tag('tag_1', kernel_opts='one')
+        node.tags.add(tag2)
+        node.tags.add(tag1)
+        self.assertEqual(
+            ('one', 'one'),
+            (node.tag_kernel_opts, reload_object(node).tag_kernel_opts))
+
+    def test_tag_kernel_opts_follows_tag_removal(self):
+        node = factory.make_node()
+        tag = factory.make_tag(kernel_opts='bacon-n-eggs')
+        node.tags.add(tag)
+        node.tags.remove(tag)
+        self.assertIsNone(reload_object(node).tag_kernel_opts)
+
+    def test_tag_kernel_opts_follows_tagging_from_tag_side(self):
+        node = factory.make_node()
+        tag = factory.make_tag(kernel_opts='bacon-n-eggs')
+        tag.node_set.add(node)
+        tagged = reload_object(node).tag_kernel_opts
+        tag.node_set.clear()
+        self.assertEqual(
+            ('bacon-n-eggs', None),
+            (tagged, reload_object(node).tag_kernel_opts))
+
+    def test_tag_kernel_opts_follows_tag_kernel_opts_changes(self):
+        node = factory.make_node()
+        tag = factory.make_tag(kernel_opts='bacon-n-eggs')
+        node.tags.add(tag)
+        tag.kernel_opts = 'fish-n-chips'
+        tag.save()
+        self.assertEqual(
+            'fish-n-chips', reload_object(node).tag_kernel_opts)
+
+    def test_tag_kernel_opts_follows_tag_redefinition(self):
+        # Changing the definition and the kernel options at once takes the
+        # tag, and its old kernel options, off the nodes it no longer
+        # matches.
+        node = factory.make_node()
+        tag = factory.make_tag(kernel_opts='a')
+        node.tags.add(tag)
+        tag.definition = '//node/nothing'
+        tag.kernel_opts = ''
+        tag.save()
+        self.assertIsNone(reload_object(node).tag_kernel_opts)
+
+    def test_tag_kernel_opts_follows_tag_renames(self):
+        node = factory.make_node()
+        tag_a = factory.make_tag('tag_a', kernel_opts='a')
+        tag_b = factory.make_tag('tag_b', kernel_opts='b')
+        node.tags.add(tag_a, tag_b)
+        tag_a.name = 'tag_c'
+        tag_a.save()
+        self.assertEqual('b', reload_object(node).tag_kernel_opts)
+
+    def test_tag_kernel_opts_follows_tag_deletion(self):
+        node = factory.make_node()
+        tag = factory.make_tag(kernel_opts='bacon-n-eggs')
+        node.tags.add(tag)
+        tag.delete()
+        self.assertIsNone(reload_object(node).tag_kernel_opts)
+
+    def test_tagging_updates_tag_kernel_opts_in_memory(self):
+        # The tagged node object can be saved afterwards without writing
+        # back the old tag_kernel_opts.
+        node = factory.make_node()
+        node.tags.add(factory.make_tag(kernel_opts='bacon-n-eggs'))
+        node.save()
+        self.assertEqual(
+            'bacon-n-eggs', reload_object(node).tag_kernel_opts)
+
     def test_acquire(self):
         node = factory.make_node(status=NODE_STATUS.READY)
         user = factory.make_user()
@@ -991,6 +1093,69 @@ class NodeManagerTest(MAASServerTestCase):
         self.assertEqual(
             [], list(Node.objects.get_available_nodes_for_acquisition(user)))
 
+    def test_lock_nodes_for_acquisition_returns_up_to_count_nodes(self):
+        nodes = [self.make_node(None) for counter in range(3)]
+        locked = Node.objects.lock_nodes_for_acquisition(
+            Node.objects.all(), count=2)
+        self.assertEqual(sorted(nodes, key=attrgetter('id'))[:2], locked)
+
+    def test_lock_nodes_for_acquisition_ignores_unavailable_nodes(self):
+        node = self.make_node(None)
+        factory.make_node(status=NODE_STATUS.ALLOCATED)
+        factory.make_node(status=NODE_STATUS.DECLARED)
+        self.assertEqual(
+            [node],
+            Node.objects.lock_nodes_for_acquisition(
+                Node.objects.all(), count=3))
+
+    def test_lock_nodes_for_acquisition_restricts_to_given_nodes(self):
+        nodes = [self.make_node(None) for counter in range(3)]
+        self.assertEqual(
+            [nodes[1]],
+            Node.objects.lock_nodes_for_acquisition(
+                Node.objects.filter(id=nodes[1].id), count=3))
+
+    def test_lock_nodes_for_acquisition_handles_joins(self):
+        tag = factory.make_tag()
+        node = self.make_node(None)
+        node.tags.add(tag)
+        self.make_node(None)
+        self.assertEqual(
+            [node],
+            Node.objects.lock_nodes_for_acquisition(
+                Node.objects.filter(tags__name=tag.name), count=2))
+
+    def test_update_power_states_stores_states(self):
+        nodegroup = factory.make_node_group()
+        on_node = factory.make_node(nodegroup=nodegroup)
+        off_node = factory.make_node(nodegroup=nodegroup)
+        Node.objects.update_power_states(nodegroup, {
+            on_node.system_id: POWER_STATE.ON,
+            off_node.system_id: POWER_STATE.OFF,
+            })
+        self.assertEqual(
+            (POWER_STATE.ON, POWER_STATE.OFF),
+            (
+                reload_object(on_node).power_state,
+                reload_object(off_node).power_state,
+            ))
+        self.assertIsNotNone(reload_object(on_node).power_state_updated)
+
+    def test_update_power_states_issues_one_update_per_state(self):
+        nodegroup = factory.make_node_group()
+        nodes = [factory.make_node(nodegroup=nodegroup) for i in range(4)]
+        power_states = {node.system_id: POWER_STATE.ON for node in nodes}
+        num_queries, _ = self.getNumQueries(
+            Node.objects.update_power_states, nodegroup, power_states)
+        self.assertEqual(1, num_queries)
+
+    def test_update_power_states_ignores_other_nodegroups(self):
+        node = factory.make_node()
+        Node.objects.update_power_states(
+            factory.make_node_group(), {node.system_id: POWER_STATE.ON})
+        self.assertEqual(
+            POWER_STATE.UNKNOWN, reload_object(node).power_state)
+
     def test_stop_nodes_stops_nodes(self):
         # We don't actually want to fire off power events, but we'll go
         # through the motions right up to the point where we'd normally
@@ -1105,6 +1270,73 @@ class NodeManagerTest(MAASServerTestCase):
         self.assertItemsEqual([], output)
         self.assertEqual([], self.celery.tasks)
 
+    def test_start_nodes_batches_power_on_per_nodegroup(self):
+        user = factory.make_user()
+        nodegroup = factory.make_node_group()
+        nodes = [
+            self.make_node_with_mac(
+                user, power_type=POWER_TYPE.WAKE_ON_LAN,
+                nodegroup=nodegroup)[0]
+            for counter in range(3)]
+        single_task = self.patch(node_module, 'power_on')
+        batch_task = self.patch(node_module, 'power_on_nodes')
+        Node.objects.start_nodes([node.system_id for node in nodes], user)
+        self.assertEqual(0, single_task.apply_async.call_count)
+        args, kwargs = batch_task.apply_async.call_args
+        [power_actions] = kwargs['args']
+        self.assertEqual(
+            (nodegroup.work_queue, [POWER_TYPE.WAKE_ON_LAN] * 3),
+            (kwargs['queue'], [power_type for power_type, _ in power_actions]))
+        self.assertItemsEqual(
+            [node.system_id for node in nodes],
+            [params['system_id'] for _, params in power_actions])
+
+    def test_start_nodes_sends_one_message_per_nodegroup(self):
+        user = factory.make_user()
+        nodes = [
+            self.make_node_with_mac(user, power_type=POWER_TYPE.WAKE_ON_LAN)[0]
+            for counter in range(2)]
+        nodes.append(
+            self.make_node_with_mac(
+                user, power_type=POWER_TYPE.WAKE_ON_LAN,
+                nodegroup=nodes[0].nodegroup)[0])
+        single_task = self.patch(node_module, 'power_on')
+        batch_task = self.patch(node_module, 'power_on_nodes')
+        Node.objects.start_nodes([node.system_id for node in nodes], user)
+        self.assertEqual(
+            ([nodes[1].work_queue], [nodes[0].work_queue]),
+            (
+                [kwargs['queue']
+                 for _, kwargs in single_task.apply_async.call_args_list],
+                [kwargs['queue']
+                 for _, kwargs in batch_task.apply_async.call_args_list],
+            ))
+
+    def test_start_nodes_stores_user_data_for_all_nodes(self):
+        user = factory.make_user()
+        nodes = [self.make_node(user) for counter in range(3)]
+        user_data = self.make_user_data()
+        Node.objects.start_nodes(
+            [node.system_id for node in nodes], user, user_data=user_data)
+        self.assertEqual(
+            [user_data] * 3,
+            [NodeUserData.objects.get_user_data(node) for node in nodes])
+
+    def test_stop_nodes_batches_power_off_per_nodegroup(self):
+        user = factory.make_user()
+        nodegroup = factory.make_node_group()
+        nodes = [
+            self.make_node_with_mac(
+                user, power_type=POWER_TYPE.VIRSH, nodegroup=nodegroup)[0]
+            for counter in range(2)]
+        batch_task = self.patch(node_module, 'power_off_nodes')
+        Node.objects.stop_nodes([node.system_id for node in nodes], user)
+        args, kwargs = batch_task.apply_async.call_args
+        [power_actions] = kwargs['args']
+        self.assertEqual(
+            (nodegroup.work_queue, [POWER_TYPE.VIRSH] * 2),
+            (kwargs['queue'], [power_type for power_type, _ in power_actions]))
+
     def test_start_nodes_ignores_nodes_without_mac(self):
         user = factory.make_user()
         node = self.make_node(user)
@@ -1167,3 +1399,50 @@ class NodeManagerTest(MAASServerTestCase):
         node = factory.make_node(netboot=True)
         node.set_netboot(False)
         self.assertFalse(node.netboot)
+
+
+class NodeAcquisitionLockingTest(TransactionTestCase):
+    """Tests for concurrent calls to `lock_nodes_for_acquisition`."""
+
+    def lock_in_thread(self, count):
+        """Lock `count` nodes in another thread, with its own connection.
+
+        The other transaction is rolled back before this returns.
+        """
+        results = []
+
+        def lock():
+            try:
+                with transaction.commit_manually():
+                    try:
+                        results.append(
+                            Node.objects.lock_nodes_for_acquisition(
+                                Node.objects.all(), count))
+                    finally:
+                        transaction.rollback()
+            finally:
+                connection.close()
+
+        thread = Thread(target=lock)
+        thread.start()
+        thread.join()
+        return results[0]
+
+    def test_concurrent_acquirers_lock_different_nodes(self):
+        nodes = [
+            factory.make_node(status=NODE_STATUS.READY)
+            for counter in range(4)]
+        transaction.commit()
+        with transaction.commit_manually():
+            try:
+                first = Node.objects.lock_nodes_for_acquisition(
+                    Node.objects.all(), count=2)
+                second = self.lock_in_thread(count=2)
+            finally:
+                transaction.rollback()
+        self.assertEqual(
+            (nodes[:2], nodes[2:]),
+            (
+                first,
+                sorted(second, key=attrgetter('id')),
+            ))
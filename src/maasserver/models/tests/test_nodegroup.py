@@ -21,6 +21,7 @@ from maasserver.enum import (
     NODEGROUP_STATUS,
     NODEGROUPINTERFACE_MANAGEMENT,
     )
+from maasserver.image_cache import get_image_cache_url
 from maasserver.models import (
     Config,
     NodeGroup,
@@ -39,6 +40,7 @@ from mock import (
     Mock,
     )
 from provisioningserver import tasks
+from provisioningserver.enum import POWER_TYPE
 from provisioningserver.omshell import (
     generate_omapi_key,
     Omshell,
@@ -268,6 +270,14 @@ class TestNodeGroupManager(MAASServerTestCase):
             for args, kwargs in recorder.apply_async.call_args_list]
         self.assertItemsEqual(expected_queues, actual_queues)
 
+    def test_query_power_states_accepted_clusters_calls_clusters(self):
+        self.patch(NodeGroup, 'query_power_states')
+        nodegroup = factory.make_node_group(status=NODEGROUP_STATUS.ACCEPTED)
+        factory.make_node_group(status=NODEGROUP_STATUS.PENDING)
+        NodeGroup.objects.query_power_states_accepted_clusters()
+        self.assertEqual(
+            [call()], nodegroup.query_power_states.mock_calls)
+
 
 def make_archive_url(name):
     """Create a fake archive URL."""
@@ -409,6 +419,7 @@ class TestNodeGroup(MAASServerTestCase):
             'main_archive': make_archive_url('main'),
             'ports_archive': make_archive_url('ports'),
             'cloud_images_archive': make_archive_url('cloud_images'),
+            'ephemerals_archive': make_archive_url('ephemerals'),
         }
         for key, value in archives.items():
             Config.objects.set_config(key, value)
@@ -419,6 +430,27 @@ class TestNodeGroup(MAASServerTestCase):
         archive_options = {arg: kwargs.get(arg) for arg in archives}
         self.assertEqual(archives, archive_options)
 
+    def test_import_boot_images_uses_region_cache_if_configured(self):
+        recorder = self.patch(nodegroup_module, 'import_boot_images')
+        Config.objects.set_config('http_proxy', factory.make_name('proxy'))
+        Config.objects.set_config('boot_images_from_region', True)
+        nodegroup = factory.make_node_group()
+        nodegroup.import_boot_images()
+        kwargs = recorder.apply_async.call_args[1]['kwargs']
+        self.assertEqual(
+            (
+                get_image_cache_url(nodegroup, 'main'),
+                get_image_cache_url(nodegroup, 'ports'),
+                get_image_cache_url(nodegroup, 'ephemerals'),
+                None,
+            ),
+            (
+                kwargs['main_archive'],
+                kwargs['ports_archive'],
+                kwargs['ephemerals_archive'],
+                kwargs.get('http_proxy'),
+            ))
+
     def test_import_boot_images_sent_to_nodegroup_queue(self):
         recorder = self.patch(nodegroup_module, 'import_boot_images', Mock())
         nodegroup = factory.make_node_group()
@@ -427,3 +459,28 @@ class TestNodeGroup(MAASServerTestCase):
         nodegroup.import_boot_images()
         args, kwargs = recorder.apply_async.call_args
         self.assertEqual(nodegroup.uuid, kwargs['queue'])
+
+    def test_query_power_states_sends_queryable_nodes_to_cluster(self):
+        recorder = self.patch(nodegroup_module, 'query_power_states')
+        nodegroup = factory.make_node_group()
+        node = factory.make_node(
+            nodegroup=nodegroup, power_type=POWER_TYPE.VIRSH)
+        factory.make_node(
+            nodegroup=nodegroup, power_type=POWER_TYPE.WAKE_ON_LAN)
+        nodegroup.query_power_states()
+        args, kwargs = recorder.apply_async.call_args
+        self.assertEqual(
+            (nodegroup.work_queue, [[{
+                'system_id': node.system_id,
+                'power_type': POWER_TYPE.VIRSH,
+                'power_parameters': node.get_effective_power_parameters(),
+                }]]),
+            (kwargs['queue'], kwargs['args']))
+
+    def test_query_power_states_does_nothing_without_queryable_nodes(self):
+        recorder = self.patch(nodegroup_module, 'query_power_states')
+        nodegroup = factory.make_node_group()
+        factory.make_node(
+            nodegroup=nodegroup, power_type=POWER_TYPE.WAKE_ON_LAN)
+        nodegroup.query_power_states()
+        self.assertEqual(0, recorder.apply_async.call_count)
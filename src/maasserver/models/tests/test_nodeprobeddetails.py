@@ -12,9 +12,12 @@ from __future__ import (
 __metaclass__ = type
 __all__ = []
 
+import zlib
+
 from maasserver.models import nodeprobeddetails
 from maasserver.testing.factory import factory
 from maasserver.testing.testcase import MAASServerTestCase
+from metadataserver.fields import ZlibBin
 from metadataserver.models import commissioningscript
 from mock import create_autospec
 
@@ -97,3 +100,20 @@ class TestNodesDetail(MAASServerTestCase):
                 "lldp": None,
             }
         self.assertDictEqual(expected, self.get_details(nodes))
+
+    def test_decompresses_details(self):
+        node = factory.make_node()
+        lshw = b"<list>%s</list>" % (b"<node />" * 100)
+        make_lshw_result(node, lshw)
+        details = self.get_details([node])
+        self.assertEqual(lshw, details[node.system_id]["lshw"])
+
+    def test_can_return_details_compressed(self):
+        node = factory.make_node()
+        lshw = b"<list>%s</list>" % (b"<node />" * 100)
+        make_lshw_result(node, lshw)
+        details = nodeprobeddetails.get_probed_details(
+            [node.system_id], decompress=False)
+        compressed = details[node.system_id]["lshw"]
+        self.assertIsInstance(compressed, ZlibBin)
+        self.assertEqual(lshw, zlib.decompress(compressed))
@@ -12,6 +12,7 @@ str = None
 __metaclass__ = type
 __all__ = [
     'AcquireNodeForm',
+    'order_by_smallest_sufficient',
     ]
 
 
@@ -32,6 +33,7 @@ from maasserver.forms import (
     ValidatorMultipleChoiceField,
     )
 from maasserver.models import (
+    Node,
     Tag,
     Zone,
     )
@@ -79,6 +81,47 @@ def parse_legacy_tags(values):
     return list(result)
 
 
+def compose_tags_clause(tag_names):
+    """Get the Django ORM predicate: the node has all the given tags.
+
+    Rather than joining the tags table once per tag, this matches the
+    node's id against a single grouped subquery on the node/tag relation,
+    so the query's cost doesn't grow with the number of tags requested.
+
+    This method returns a tuple of the where clause (as a string) and the
+    parameters (as a list) used to format the where clause, in the same
+    way as :func:`maasserver.utils.orm.macs_contain`.
+
+    :param tag_names: A non-empty collection of unique tag names.
+    """
+    tag_names = list(tag_names)
+    relation = Node.tags.through._meta.db_table
+    where_clause = (
+        "%(node)s.id IN ("
+        "SELECT %(relation)s.node_id FROM %(relation)s "
+        "JOIN %(tag)s ON %(tag)s.id = %(relation)s.tag_id "
+        "WHERE %(tag)s.name IN (%(names)s) "
+        "GROUP BY %(relation)s.node_id "
+        "HAVING COUNT(*) = %%s)" % {
+            'node': Node._meta.db_table,
+            'relation': relation,
+            'tag': Tag._meta.db_table,
+            'names': ', '.join(["%s"] * len(tag_names)),
+            })
+    return where_clause, tag_names + [len(tag_names)]
+
+
+def order_by_smallest_sufficient(nodes):
+    """Order `nodes` so that the least powerful ones come first.
+
+    When picking among nodes that all satisfy the requested constraints,
+    prefer the smallest sufficient one so that bigger machines remain
+    available for the requests that need them.  The node id breaks ties,
+    to keep the order stable.
+    """
+    return nodes.order_by('cpu_count', 'memory', 'storage', 'id')
+
+
 # Mapping used to rename the fields from the AcquireNodeForm form.
 # The new names correspond to the names used by Juju.  This is used so
 # that the search form present on the node listing page can be used to
@@ -252,8 +295,9 @@ class AcquireNodeForm(RenamableFieldsForm):
         # Filter by tags.
         tags = self.cleaned_data.get(self.get_field_name('tags'))
         if tags:
-            for tag in tags:
-                filtered_nodes = filtered_nodes.filter(tags__name=tag)
+            where, params = compose_tags_clause(tags)
+            filtered_nodes = filtered_nodes.extra(
+                where=[where], params=params)
 
         # Filter by zone.
         zone = self.cleaned_data.get(self.get_field_name('zone'))
@@ -0,0 +1,170 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""OAuth data store backed by the Django cache.
+
+Piston's own data store records every nonce in the database, and looks
+up the consumer and the token in the database, for every authenticated
+request.  This store keeps nonces in the cache instead, for as long as
+OAuth accepts the request's timestamp, and caches consumers and tokens
+for a short while.
+
+It is installed with the `OAUTH_DATA_STORE` setting.
+"""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = [
+    'CachingDataStore',
+    'flush_forgotten_keys',
+    ]
+
+import hashlib
+import threading
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    )
+from django.dispatch import receiver
+from oauth.oauth import OAuthServer
+from piston.models import (
+    Consumer,
+    Token,
+    )
+from piston.store import DataStore
+
+# How long to remember consumers and tokens, in seconds.  Changes to them
+# invalidate the cache, so this only bounds the damage of a missed
+# invalidation.
+LOOKUP_CACHE_TIMEOUT = 60
+
+# How long to remember nonces, in seconds.  Older requests are refused
+# because of their timestamp, so there is no need to remember more.
+NONCE_CACHE_TIMEOUT = OAuthServer.timestamp_threshold
+
+# Cache keys dropped by the current thread's transaction, to be dropped
+# again once it is committed.
+pending_invalidations = threading.local()
+
+
+def make_cache_key(kind, *parts):
+    """Return a cache key for the OAuth object identified by `parts`.
+
+    The parts come from the client, so they are hashed to make a valid
+    memcached key.
+    """
+    digest = hashlib.sha1('\0'.join(parts).encode('utf-8')).hexdigest()
+    return 'oauth-%s-%s' % (kind, digest)
+
+
+def token_cache_key(key, token_type):
+    return make_cache_key('token', key, '%d' % token_type)
+
+
+class CachingDataStore(DataStore):
+    """Piston's OAuth data store, with nonces and lookups in the cache."""
+
+    def lookup_consumer(self, key):
+        cache_key = make_cache_key('consumer', key)
+        consumer = cache.get(cache_key)
+        if consumer is None:
+            consumer = super(CachingDataStore, self).lookup_consumer(key)
+            if consumer is not None:
+                cache.set(cache_key, consumer, LOOKUP_CACHE_TIMEOUT)
+        self.consumer = consumer
+        return consumer
+
+    def lookup_token(self, token_type, token):
+        if token_type == 'request':
+            token_type = Token.REQUEST
+        elif token_type == 'access':
+            token_type = Token.ACCESS
+        cache_key = token_cache_key(token, token_type)
+        request_token = cache.get(cache_key)
+        if request_token is None:
+            # Fetch what the API's authentication will look at along with
+            # the token, so that it gets cached too.
+            tokens = Token.objects.select_related('user', 'consumer')
+            try:
+                request_token = tokens.get(key=token, token_type=token_type)
+            except Token.DoesNotExist:
+                return None
+            cache.set(cache_key, request_token, LOOKUP_CACHE_TIMEOUT)
+        self.request_token = request_token
+        return request_token
+
+    def lookup_nonce(self, oauth_consumer, oauth_token, nonce):
+        if oauth_token is None:
+            return None
+        cache_key = make_cache_key(
+            'nonce', oauth_consumer.key, oauth_token.key, nonce)
+        # Adding to the cache is atomic: only the first request using this
+        # nonce gets to add it.
+        if cache.add(cache_key, True, NONCE_CACHE_TIMEOUT):
+            return None
+        elif cache.get(cache_key) is not None:
+            return nonce
+        else:
+            # The cache is not working: record the nonce in the database.
+            return super(CachingDataStore, self).lookup_nonce(
+                oauth_consumer, oauth_token, nonce)
+
+
+def forget(cache_keys):
+    """Drop `cache_keys` from the cache.
+
+    Until a transaction under way commits, other requests can still read
+    the old objects from the database and cache them again, so the keys
+    will be dropped once more by `flush_forgotten_keys`, after it commits.
+    """
+    cache.delete_many(cache_keys)
+    if transaction.is_managed():
+        if not hasattr(pending_invalidations, 'keys'):
+            pending_invalidations.keys = set()
+        pending_invalidations.keys.update(cache_keys)
+
+
+def flush_forgotten_keys():
+    """Drop the cache keys forgotten by this thread from the cache again."""
+    keys = getattr(pending_invalidations, 'keys', set())
+    pending_invalidations.keys = set()
+    if len(keys) != 0:
+        cache.delete_many(list(keys))
+
+
+@receiver(post_save, sender=Consumer)
+@receiver(post_delete, sender=Consumer)
+def forget_consumer(sender, instance, **kwargs):
+    """Drop a changed or deleted consumer from the cache."""
+    forget([make_cache_key('consumer', instance.key)])
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def forget_token(sender, instance, **kwargs):
+    """Drop a changed or deleted token from the cache."""
+    forget([token_cache_key(instance.key, instance.token_type)])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user_tokens(sender, instance, **kwargs):
+    """Drop the tokens of a changed or deleted user from the cache.
+
+    Cached tokens carry their user, whose status matters to the API.
+    """
+    tokens = Token.objects.filter(user=instance)
+    forget([
+        token_cache_key(key, token_type)
+        for key, token_type in tokens.values_list('key', 'token_type')])
@@ -22,7 +22,7 @@ __all__ = [
     ]
 
 from collections import namedtuple
-from os.path import join
+import copy
 from pipes import quote
 from urllib import urlencode
 from urlparse import urlparse
@@ -43,6 +43,7 @@ from maasserver.server_address import get_maas_facing_server_host
 from maasserver.utils import absolute_reverse
 from metadataserver.commissioning.snippets import get_snippet_context
 from metadataserver.models import NodeKey
+from provisioningserver.template_cache import template_cache
 import tempita
 
 
@@ -214,17 +215,12 @@ def get_preseed_template(filenames):
     """
     assert not isinstance(filenames, (bytes, unicode))
     assert all(isinstance(filename, unicode) for filename in filenames)
-    for location in settings.PRESEED_TEMPLATE_LOCATIONS:
-        for filename in filenames:
-            filepath = join(location, filename)
-            try:
-                with open(filepath, "rb") as stream:
-                    content = stream.read()
-                    return filepath, content
-            except IOError:
-                pass  # Ignore.
-    else:
+    filepath = template_cache.find(
+        settings.PRESEED_TEMPLATE_LOCATIONS, filenames)
+    if filepath is None:
         return None, None
+    else:
+        return filepath, template_cache.get(filepath, PreseedTemplate).content
 
 
 def get_escape_singleton():
@@ -269,13 +265,15 @@ def load_preseed_template(node, prefix, release=''):
         since this will be called (by Tempita) called out of scope.
         """
         filenames = list(get_preseed_filenames(node, name, release, default))
-        filepath, content = get_preseed_template(filenames)
+        filepath = template_cache.find(
+            settings.PRESEED_TEMPLATE_LOCATIONS, filenames)
         if filepath is None:
             raise TemplateNotFoundError(name)
-        # This is where the closure happens: pass `get_template` when
-        # instanciating PreseedTemplate.
-        return PreseedTemplate(
-            content, name=filepath, get_template=get_template)
+        # The compiled template is shared: this is where the closure
+        # happens, on a copy of it.
+        template = copy.copy(template_cache.get(filepath, PreseedTemplate))
+        template.get_template = get_template
+        return template
 
     return get_template(prefix, None, default=True)
 
@@ -14,12 +14,15 @@ str = None
 __metaclass__ = type
 __all__ = [
     'cleanup_old_nonces',
+    'fetch_cached_file',
     'import_boot_images_on_schedule',
+    'query_power_states_on_schedule',
     ]
 
 
 from celery.task import task
 from maasserver import (
+    image_cache,
     logger,
     nonces_cleanup,
     )
@@ -32,7 +35,19 @@ def cleanup_old_nonces(**kwargs):
     logger.info("%d expired nonce(s) cleaned up." % nb_nonces_deleted)
 
 
+@task
+def fetch_cached_file(archive, path, **kwargs):
+    """Fetch a file into the region's cache of the boot images archives."""
+    image_cache.refresh_cached_file(archive, path)
+
+
 @task
 def import_boot_images_on_schedule(**kwargs):
     """Periodic import of boot images, triggered from Celery schedule."""
     NodeGroup.objects.import_boot_images_accepted_clusters()
+
+
+@task
+def query_power_states_on_schedule(**kwargs):
+    """Periodic poll of node power states, triggered from Celery schedule."""
+    NodeGroup.objects.query_power_states_accepted_clusters()
@@ -29,6 +29,7 @@ from django.db import connection
 from django.test.client import encode_multipart
 from fixtures import Fixture
 from maasserver.fields import register_mac_type
+from maasserver.models import Config
 from maasserver.testing.factory import factory
 from maastesting.celery import CeleryFixture
 from maastesting.djangotestcase import (
@@ -37,6 +38,7 @@ from maastesting.djangotestcase import (
     )
 from maastesting.fixtures import DisplayFixture
 from maastesting.testcase import MAASTestCase
+from metadataserver.models import CommissioningScript
 from mock import Mock
 from provisioningserver.testing.tags import TagCachedKnowledgeFixture
 from provisioningserver.testing.worker_cache import WorkerCacheFixture
@@ -58,6 +60,10 @@ class MAASServerTestCase(DjangoTestCase):
         self.useFixture(WorkerCacheFixture())
         self.useFixture(TagCachedKnowledgeFixture())
         self.addCleanup(django_cache.clear)
+        # Config values and commissioning scripts cached in the process may
+        # come from a transaction that was rolled back.
+        self.addCleanup(Config.objects.clear_cache)
+        self.addCleanup(CommissioningScript.objects.clear_cache)
         self.celery = self.useFixture(CeleryFixture())
 
     def client_put(self, path, data=None):
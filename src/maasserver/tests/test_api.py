@@ -847,6 +847,31 @@ class TestBootImagesAPI(APITestCase):
         api.discard_persistent_error.assert_called_once_with(
             COMPONENT.IMPORT_PXE_FILES)
 
+    def test_report_boot_images_removes_images_no_longer_reported(self):
+        nodegroup = factory.make_node_group()
+        old_image = make_boot_image_params()
+        factory.make_boot_image(nodegroup=nodegroup, **old_image)
+        image = make_boot_image_params()
+        client = make_worker_client(nodegroup)
+        response = self.report_images(nodegroup, [image], client=client)
+        self.assertEqual(httplib.OK, response.status_code)
+        self.assertEqual(
+            (False, True),
+            (
+                BootImage.objects.have_image(nodegroup=nodegroup, **old_image),
+                BootImage.objects.have_image(nodegroup=nodegroup, **image),
+            ))
+
+    def test_report_boot_images_leaves_warning_if_images_unchanged(self):
+        nodegroup = factory.make_node_group()
+        image = make_boot_image_params()
+        factory.make_boot_image(nodegroup=nodegroup, **image)
+        recorder = self.patch(api, 'update_missing_boot_images_error')
+        client = make_worker_client(nodegroup)
+        response = self.report_images(nodegroup, [image], client=client)
+        self.assertEqual(httplib.OK, response.status_code)
+        self.assertEqual(0, recorder.call_count)
+
     def test_worker_calls_report_boot_images(self):
         # report_boot_images() uses the report_boot_images op on the nodes
         # handlers to send image information.
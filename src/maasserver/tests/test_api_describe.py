@@ -14,6 +14,7 @@ str = None
 __metaclass__ = type
 __all__ = []
 
+import hashlib
 import httplib
 import json
 from operator import itemgetter
@@ -25,6 +26,7 @@ from django.core.urlresolvers import (
     get_script_prefix,
     )
 from django.test.client import RequestFactory
+from maasserver import api
 from maasserver.api import describe
 from maasserver.testing.api import AnonAPITestCase
 from maasserver.testing.factory import factory
@@ -68,6 +70,31 @@ class TestDescribe(AnonAPITestCase):
         self.assertIsInstance(description["handlers"], list)
 
 
+    def test_describe_returns_etag(self):
+        response = self.client.get(reverse('describe'))
+        self.assertEqual(
+            '"%s"' % hashlib.sha1(response.content).hexdigest(),
+            response['ETag'])
+
+    def test_describe_returns_not_modified_for_matching_etag(self):
+        etag = self.client.get(reverse('describe'))['ETag']
+        response = self.client.get(
+            reverse('describe'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(
+            (httplib.NOT_MODIFIED, b"", etag),
+            (response.status_code, response.content, response['ETag']))
+
+    def test_describe_describes_resources_once_for_all_hosts(self):
+        self.patch(api, 'api_resources', None)
+        describe_resource = self.patch(api, 'describe_resource')
+        describe_resource.return_value = {"anon": None, "auth": None}
+        for _ in range(3):
+            describe(RequestFactory().get(
+                '/describe', SERVER_NAME=factory.make_name('server').lower()))
+        self.assertEqual(
+            len(api.describe_api_resources()), describe_resource.call_count)
+
+
 class TestDescribeAbsoluteURIs(AnonAPITestCase):
     """Tests for the `describe` view's URI manipulation."""
 
@@ -494,6 +494,7 @@ class AnonymousEnlistmentAPITest(MAASServerTestCase):
                 'status',
                 'netboot',
                 'power_type',
+                'power_state',
                 'tag_names',
                 'ip_addresses',
                 'resource_uri',
@@ -576,6 +577,7 @@ class SimpleUserLoggedInEnlistmentAPITest(LoggedInTestCase):
                 'status',
                 'netboot',
                 'power_type',
+                'power_state',
                 'resource_uri',
                 'tag_names',
                 'ip_addresses',
@@ -722,6 +724,7 @@ class AdminLoggedInEnlistmentAPITest(AdminLoggedInTestCase):
                 'status',
                 'netboot',
                 'power_type',
+                'power_state',
                 'resource_uri',
                 'tag_names',
                 'ip_addresses',
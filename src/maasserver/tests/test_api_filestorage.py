@@ -224,6 +224,62 @@ class FileStorageAPITest(FileStorageAPITestMixin, APITestCase):
         self.assertEqual(httplib.OK, response.status_code)
         self.assertEqual(b"give me rope", response.content)
 
+    def get_file_range(self, filename, byte_range):
+        return self.client.get(
+            reverse('files_handler'), {'op': 'get', 'filename': filename},
+            HTTP_RANGE=byte_range)
+
+    def test_get_file_sends_length_and_etag(self):
+        storage = factory.make_file_storage(content=b"give me rope")
+        response = self.make_API_GET_request("get", storage.filename)
+        self.assertEqual(
+            ('12', 'bytes', '"%s"' % storage.file_content.sha256),
+            (
+                response['Content-Length'],
+                response['Accept-Ranges'],
+                response['ETag'],
+            ))
+
+    def test_get_file_returns_requested_range(self):
+        storage = factory.make_file_storage(content=b"give me rope")
+        response = self.get_file_range(storage.filename, 'bytes=5-6')
+        self.assertEqual(
+            (httplib.PARTIAL_CONTENT, b"me", 'bytes 5-6/12', '2'),
+            (
+                response.status_code,
+                response.content,
+                response['Content-Range'],
+                response['Content-Length'],
+            ))
+
+    def test_get_file_returns_open_ended_range(self):
+        storage = factory.make_file_storage(content=b"give me rope")
+        response = self.get_file_range(storage.filename, 'bytes=8-')
+        self.assertEqual(
+            (httplib.PARTIAL_CONTENT, b"rope"),
+            (response.status_code, response.content))
+
+    def test_get_file_returns_suffix_range(self):
+        storage = factory.make_file_storage(content=b"give me rope")
+        response = self.get_file_range(storage.filename, 'bytes=-7')
+        self.assertEqual(
+            (httplib.PARTIAL_CONTENT, b"me rope"),
+            (response.status_code, response.content))
+
+    def test_get_file_ignores_multiple_ranges(self):
+        storage = factory.make_file_storage(content=b"give me rope")
+        response = self.get_file_range(storage.filename, 'bytes=0-1,5-6')
+        self.assertEqual(
+            (httplib.OK, b"give me rope"),
+            (response.status_code, response.content))
+
+    def test_get_file_refuses_unsatisfiable_range(self):
+        storage = factory.make_file_storage(content=b"give me rope")
+        response = self.get_file_range(storage.filename, 'bytes=12-')
+        self.assertEqual(
+            (httplib.REQUESTED_RANGE_NOT_SATISFIABLE, 'bytes */12'),
+            (response.status_code, response['Content-Range']))
+
     def test_get_file_fails_with_no_filename(self):
         response = self.make_API_GET_request("get")
 
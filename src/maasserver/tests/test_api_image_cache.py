@@ -0,0 +1,213 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for serving the region's cache of boot images from the API."""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = []
+
+import httplib
+import os.path
+import threading
+
+from django.conf import settings
+from django.core.urlresolvers import reverse
+from maasserver import (
+    image_cache,
+    tasks,
+    )
+from maasserver.enum import NODEGROUP_STATUS
+from maasserver.image_cache import (
+    get_cache_path,
+    get_image_cache_key,
+    mark_checked,
+    refresh_cached_file,
+    RETRY_AFTER,
+    )
+from maasserver.testing.api import AnonAPITestCase
+from maasserver.testing.factory import factory
+from mock import Mock
+from provisioningserver.utils import ensure_dir
+
+
+class SlowUpstream:
+    """Fake upstream archive, serving a file in two halves.
+
+    The second half is only served once `release` is set.
+    """
+
+    def __init__(self, content):
+        self.content = content
+        self.release = threading.Event()
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append(request)
+        half = len(self.content) // 2
+        pieces = [self.content[:half], self.content[half:], b'']
+
+        def read(size):
+            if len(pieces) < 3:
+                self.release.wait()
+            return pieces.pop(0)
+
+        response = Mock()
+        response.read = read
+        response.info.return_value.getheader = {
+            'Content-Length': '%d' % len(self.content)}.get
+        return response
+
+
+class TestImageCacheAPI(AnonAPITestCase):
+
+    def setUp(self):
+        super(TestImageCacheAPI, self).setUp()
+        self.patch(settings, 'BOOT_IMAGES_CACHE_DIR', self.make_dir())
+        self.fetch_cached_file = self.patch(tasks, 'fetch_cached_file')
+        # Fetches are queued, but never run.
+        self.patch(image_cache, 'FETCH_START_TIMEOUT', 0)
+        self.nodegroup = factory.make_node_group(
+            status=NODEGROUP_STATUS.ACCEPTED)
+
+    def cache_file(self, archive, path, content):
+        """Put a file in the cache, as if just fetched."""
+        cached = get_cache_path(archive, path)
+        ensure_dir(os.path.dirname(cached))
+        with open(cached, 'wb') as cached_file:
+            cached_file.write(content)
+        mark_checked(cached)
+
+    def get_cached(self, archive, path, nodegroup=None, key=None,
+                   **headers):
+        if nodegroup is None:
+            nodegroup = self.nodegroup
+        if key is None:
+            key = get_image_cache_key(nodegroup)
+        return self.client.get(
+            reverse(
+                'image_cache', kwargs={
+                    'uuid': nodegroup.uuid,
+                    'key': key,
+                    'archive': archive,
+                    'path': path,
+                    }),
+            **headers)
+
+    def test_serves_cached_file(self):
+        self.cache_file('main', 'dists/linux', b'kernel')
+        response = self.get_cached('main', 'dists/linux')
+        self.assertEqual(
+            (httplib.OK, b'kernel', '6'),
+            (
+                response.status_code,
+                response.content,
+                response['Content-Length'],
+            ))
+
+    def test_serves_requested_range(self):
+        self.cache_file('main', 'linux', b'give me rope')
+        response = self.get_cached('main', 'linux', HTTP_RANGE='bytes=5-6')
+        self.assertEqual(
+            (httplib.PARTIAL_CONTENT, b'me', 'bytes 5-6/12'),
+            (
+                response.status_code,
+                response.content,
+                response['Content-Range'],
+            ))
+
+    def test_fetches_uncached_file_once_for_concurrent_requests(self):
+        self.patch(image_cache, 'FETCH_START_TIMEOUT', 5)
+        self.patch(image_cache, 'POLL_INTERVAL', 0.01)
+        self.patch(
+            image_cache, 'get_upstream_archives',
+            Mock(return_value={'main': 'http://example.com/'}))
+        upstream = SlowUpstream(b'kernel')
+        fetches = []
+
+        def fetch_in_background(queue, args):
+            fetch = threading.Thread(
+                target=refresh_cached_file, args=args,
+                kwargs={'opener': upstream})
+            fetch.start()
+            fetches.append(fetch)
+
+        self.fetch_cached_file.apply_async.side_effect = fetch_in_background
+        # All the requests come in while the file is being fetched.
+        responses = [self.get_cached('main', 'linux') for _ in range(3)]
+        upstream.release.set()
+        contents = [
+            b''.join(response.streaming_content) for response in responses]
+        for fetch in fetches:
+            fetch.join()
+        self.assertEqual(
+            ([b'kernel'] * 3, ['6'] * 3, 1),
+            (
+                contents,
+                [response['Content-Length'] for response in responses],
+                len(upstream.requests),
+            ))
+
+    def test_serves_range_of_uncached_file(self):
+        self.patch(image_cache, 'FETCH_START_TIMEOUT', 5)
+        self.patch(
+            image_cache, 'get_upstream_archives',
+            Mock(return_value={'main': 'http://example.com/'}))
+        upstream = SlowUpstream(b'kernel')
+        upstream.release.set()
+        self.fetch_cached_file.apply_async.side_effect = (
+            lambda queue, args: refresh_cached_file(*args, opener=upstream))
+        response = self.get_cached('main', 'linux', HTTP_RANGE='bytes=2-3')
+        self.assertEqual(
+            (httplib.PARTIAL_CONTENT, b'rn', 'bytes 2-3/6'),
+            (
+                response.status_code,
+                b''.join(response.streaming_content),
+                response['Content-Range'],
+            ))
+
+    def test_queues_fetch_of_uncached_file(self):
+        self.get_cached('main', 'linux')
+        self.assertEqual(
+            [['main', 'linux']],
+            [
+                call[2]['args']
+                for call in self.fetch_cached_file.apply_async.mock_calls
+            ])
+
+    def test_returns_403_for_wrong_key(self):
+        self.cache_file('main', 'linux', b'kernel')
+        response = self.get_cached(
+            'main', 'linux', key=factory.make_name('key'))
+        self.assertEqual(httplib.FORBIDDEN, response.status_code)
+
+    def test_returns_404_for_cluster_not_accepted(self):
+        nodegroup = factory.make_node_group(
+            status=NODEGROUP_STATUS.PENDING)
+        self.cache_file('main', 'linux', b'kernel')
+        response = self.get_cached('main', 'linux', nodegroup=nodegroup)
+        self.assertEqual(httplib.NOT_FOUND, response.status_code)
+
+    def test_returns_404_for_unknown_archive(self):
+        response = self.get_cached(factory.make_name('archive'), 'linux')
+        self.assertEqual(httplib.NOT_FOUND, response.status_code)
+
+    def test_returns_404_for_file_missing_upstream(self):
+        cached = get_cache_path('main', 'linux')
+        ensure_dir(os.path.dirname(cached))
+        mark_checked(cached)
+        response = self.get_cached('main', 'linux')
+        self.assertEqual(httplib.NOT_FOUND, response.status_code)
+
+    def test_returns_503_if_fetch_does_not_start(self):
+        response = self.get_cached('main', 'linux')
+        self.assertEqual(
+            (httplib.SERVICE_UNAVAILABLE, '%d' % RETRY_AFTER),
+            (response.status_code, response['Retry-After']))
@@ -53,6 +53,7 @@ from metadataserver.models import (
     )
 from metadataserver.nodeinituser import get_node_init_user
 from provisioningserver.enum import (
+    POWER_STATE,
     POWER_TYPE,
     POWER_TYPE_CHOICES,
     )
@@ -151,6 +152,16 @@ class TestNodeAPI(APITestCase):
         self.assertItemsEqual(
             [mac.get_raw() for mac in macs], parsed_result['routers'])
 
+    def test_GET_returns_cached_power_state(self):
+        node = factory.make_node()
+        Node.objects.update_power_states(
+            node.nodegroup, {node.system_id: POWER_STATE.OFF})
+        response = self.client.get(self.get_node_uri(node))
+
+        self.assertEqual(httplib.OK, response.status_code)
+        parsed_result = json.loads(response.content)
+        self.assertEqual(POWER_STATE.OFF, parsed_result['power_state'])
+
     def test_GET_refuses_to_access_nonexistent_node(self):
         # When fetching a Node, the api returns a 'Not Found' (404) error
         # if no node is found.
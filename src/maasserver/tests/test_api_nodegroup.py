@@ -17,13 +17,20 @@ __all__ = []
 import httplib
 import json
 from textwrap import dedent
+import time
+import zlib
 
 from apiclient.maas_client import MAASClient
 import bson
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from fixtures import EnvironmentVariableFixture
+from maasserver.collection_version import (
+    COLLECTION,
+    COLLECTION_VERSION_CACHE_KEY,
+    )
 from maasserver.enum import (
     NODEGROUP_STATUS,
     NODEGROUP_STATUS_CHOICES,
@@ -65,7 +72,9 @@ from mock import (
 from provisioningserver import tasks
 from provisioningserver.auth import get_recorded_nodegroup_uuid
 from provisioningserver.dhcp.leases import send_leases
+from provisioningserver.enum import POWER_STATE
 from provisioningserver.omshell import Omshell
+from provisioningserver.tags import ZLIB_DETAILS_SUBTYPE
 from testresources import FixtureResource
 from testtools.matchers import (
     AllMatch,
@@ -152,6 +161,18 @@ class TestNodeGroupAPI(APITestCase):
         self.assertEqual(
             nodegroup.uuid, json.loads(response.content).get('uuid'))
 
+    def test_GET_returns_not_modified_if_node_groups_unchanged(self):
+        nodegroup = factory.make_node_group()
+        # Last-Modified is only given for changes before the current second.
+        cache.set(
+            COLLECTION_VERSION_CACHE_KEY % COLLECTION.NODEGROUPS,
+            (int(time.time()) - 60) * 1000)
+        uri = reverse('nodegroup_handler', args=[nodegroup.uuid])
+        response = self.client.get(uri)
+        response = self.client.get(
+            uri, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(httplib.NOT_MODIFIED, response.status_code)
+
     def test_GET_returns_404_for_unknown_node_group(self):
         response = self.client.get(
             reverse(
@@ -258,6 +279,48 @@ class TestNodeGroupAPI(APITestCase):
             [(new_leases.keys()[0], new_leases.values()[0])],
             Omshell.create.extract_args())
 
+    def test_report_power_states_stores_power_states(self):
+        nodegroup = factory.make_node_group()
+        node = factory.make_node(nodegroup=nodegroup)
+        client = make_worker_client(nodegroup)
+        response = client.post(
+            reverse('nodegroup_handler', args=[nodegroup.uuid]),
+            {
+                'op': 'report_power_states',
+                'power_states': json.dumps({node.system_id: POWER_STATE.ON}),
+            })
+        self.assertEqual(
+            (httplib.OK, "Power states updated."),
+            (response.status_code, response.content))
+        node = reload_object(node)
+        self.assertEqual(POWER_STATE.ON, node.power_state)
+        self.assertIsNotNone(node.power_state_updated)
+
+    def test_report_power_states_ignores_other_nodegroups_nodes(self):
+        nodegroup = factory.make_node_group()
+        node = factory.make_node()
+        client = make_worker_client(nodegroup)
+        client.post(
+            reverse('nodegroup_handler', args=[nodegroup.uuid]),
+            {
+                'op': 'report_power_states',
+                'power_states': json.dumps({node.system_id: POWER_STATE.ON}),
+            })
+        self.assertEqual(
+            POWER_STATE.UNKNOWN, reload_object(node).power_state)
+
+    def test_report_power_states_rejects_unknown_power_states(self):
+        nodegroup = factory.make_node_group()
+        node = factory.make_node(nodegroup=nodegroup)
+        client = make_worker_client(nodegroup)
+        response = client.post(
+            reverse('nodegroup_handler', args=[nodegroup.uuid]),
+            {
+                'op': 'report_power_states',
+                'power_states': json.dumps({node.system_id: 'sleepy'}),
+            })
+        self.assertEqual(httplib.BAD_REQUEST, response.status_code)
+
     def test_update_leases_does_not_add_old_leases(self):
         self.patch(Omshell, 'create')
         nodegroup = factory.make_node_group()
@@ -434,6 +497,71 @@ class TestNodeGroupAPI(APITestCase):
             httplib.BAD_REQUEST, response.status_code,
             explain_unexpected_response(httplib.BAD_REQUEST, response))
 
+    def test_report_download_progress_batch_applies_reports(self):
+        progress = factory.make_download_progress_incomplete()
+        client = make_worker_client(progress.nodegroup)
+        filename = factory.make_name('file')
+
+        response = client.post(
+            reverse('nodegroup_handler', args=[progress.nodegroup.uuid]),
+            {
+                'op': 'report_download_progress_batch',
+                'reports': json.dumps([
+                    {'filename': filename, 'size': 10},
+                    {
+                        'filename': progress.filename,
+                        'bytes_downloaded': progress.bytes_downloaded + 1,
+                    },
+                ]),
+            })
+        self.assertEqual(
+            httplib.OK, response.status_code,
+            explain_unexpected_response(httplib.OK, response))
+
+        new_progress = DownloadProgress.objects.get(filename=filename)
+        self.assertEqual(
+            (10, progress.bytes_downloaded + 1),
+            (new_progress.size, reload_object(progress).bytes_downloaded))
+
+    def test_report_download_progress_batch_reports_invalid_reports(self):
+        progress = factory.make_download_progress_incomplete()
+        client = make_worker_client(progress.nodegroup)
+        filename = factory.make_name('file')
+
+        response = client.post(
+            reverse('nodegroup_handler', args=[progress.nodegroup.uuid]),
+            {
+                'op': 'report_download_progress_batch',
+                'reports': json.dumps([
+                    {'filename': progress.filename, 'bytes_downloaded': -1},
+                    {'filename': filename},
+                ]),
+            })
+        self.assertEqual(
+            httplib.OK, response.status_code,
+            explain_unexpected_response(httplib.OK, response))
+        errors = json.loads(response.content)
+        self.assertEqual(
+            ([['bytes_downloaded'], None], True),
+            (
+                [error and list(error) for error in errors],
+                DownloadProgress.objects.filter(filename=filename).exists(),
+            ))
+
+    def test_report_download_progress_batch_rejects_malformed_batch(self):
+        progress = factory.make_download_progress_incomplete()
+        client = make_worker_client(progress.nodegroup)
+
+        response = client.post(
+            reverse('nodegroup_handler', args=[progress.nodegroup.uuid]),
+            {
+                'op': 'report_download_progress_batch',
+                'reports': json.dumps([{'bytes_downloaded': 1}]),
+            })
+        self.assertEqual(
+            httplib.BAD_REQUEST, response.status_code,
+            explain_unexpected_response(httplib.BAD_REQUEST, response))
+
 
 class TestNodeGroupAPIAuth(MAASServerTestCase):
     """Authorization tests for nodegroup API."""
@@ -501,6 +629,16 @@ class TestNodeGroupAPIAuth(MAASServerTestCase):
             httplib.FORBIDDEN, response.status_code,
             explain_unexpected_response(httplib.FORBIDDEN, response))
 
+    def test_report_power_states_does_not_work_for_normal_user(self):
+        nodegroup = factory.make_node_group()
+        log_in_as_normal_user(self.client)
+        response = self.client.post(
+            reverse('nodegroup_handler', args=[nodegroup.uuid]),
+            {'op': 'report_power_states', 'power_states': json.dumps({})})
+        self.assertEqual(
+            httplib.FORBIDDEN, response.status_code,
+            explain_unexpected_response(httplib.FORBIDDEN, response))
+
     def test_nodegroup_list_nodes_requires_authentication(self):
         nodegroup = factory.make_node_group()
         response = self.client.get(
@@ -623,6 +761,42 @@ class TestNodeGroupAPIAuth(MAASServerTestCase):
             },
             parsed_result)
 
+    def test_details_passes_compressed_details_through(self):
+        nodegroup = factory.make_node_group()
+        node = factory.make_node(nodegroup=nodegroup)
+        lshw_details = b"<list>%s</list>" % (b"<node />" * 100)
+        self.set_lshw_details(node, lshw_details)
+        client = make_worker_client(nodegroup)
+
+        response = client.post(
+            reverse('nodegroup_handler', args=[nodegroup.uuid]),
+            {
+                'op': 'details',
+                'system_ids': [node.system_id],
+                'compression': 'zlib',
+            })
+
+        self.assertEqual(httplib.OK, response.status_code)
+        lshw = bson.BSON(response.content).decode()[node.system_id]["lshw"]
+        self.assertEqual(
+            (ZLIB_DETAILS_SUBTYPE, lshw_details),
+            (lshw.subtype, zlib.decompress(lshw)))
+
+    def test_details_decompresses_details_by_default(self):
+        nodegroup = factory.make_node_group()
+        node = factory.make_node(nodegroup=nodegroup)
+        lshw_details = b"<list>%s</list>" % (b"<node />" * 100)
+        self.set_lshw_details(node, lshw_details)
+        client = make_worker_client(nodegroup)
+
+        response = client.post(
+            reverse('nodegroup_handler', args=[nodegroup.uuid]),
+            {'op': 'details', 'system_ids': [node.system_id]})
+
+        self.assertEqual(httplib.OK, response.status_code)
+        lshw = bson.BSON(response.content).decode()[node.system_id]["lshw"]
+        self.assertEqual(lshw_details, lshw)
+
     def test_details_allows_admin(self):
         nodegroup = factory.make_node_group()
         node = factory.make_node(nodegroup=nodegroup)
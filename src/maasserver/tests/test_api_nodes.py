@@ -192,6 +192,29 @@ class TestNodesAPI(APITestCase):
             [node1.system_id, node2.system_id],
             extract_system_ids(parsed_result))
 
+    def test_GET_list_returns_not_modified_if_nodes_unchanged(self):
+        factory.make_node()
+        response = self.client.get(reverse('nodes_handler'), {'op': 'list'})
+        response = self.client.get(
+            reverse('nodes_handler'), {'op': 'list'},
+            HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(httplib.NOT_MODIFIED, response.status_code)
+
+    def test_GET_list_returns_nodes_again_once_nodes_changed(self):
+        node = factory.make_node()
+        response = self.client.get(reverse('nodes_handler'), {'op': 'list'})
+        node.hostname = factory.make_name('hostname')
+        node.save()
+        response = self.client.get(
+            reverse('nodes_handler'), {'op': 'list'},
+            HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(
+            (httplib.OK, [node.hostname]),
+            (
+                response.status_code,
+                [item['hostname'] for item in json.loads(response.content)],
+            ))
+
     def create_nodes(self, nodegroup, nb):
         [factory.make_node(nodegroup=nodegroup, mac=True)
             for i in range(nb)]
@@ -760,6 +783,98 @@ class TestNodesAPI(APITestCase):
         oauth_key = self.client.token.key
         self.assertEqual(oauth_key, node.token.key)
 
+    def test_POST_acquire_chooses_smallest_sufficient_node(self):
+        factory.make_node(
+            status=NODE_STATUS.READY, owner=None, cpu_count=8, memory=8192)
+        small_node = factory.make_node(
+            status=NODE_STATUS.READY, owner=None, cpu_count=2, memory=2048)
+        factory.make_node(
+            status=NODE_STATUS.READY, owner=None, cpu_count=1, memory=512)
+        response = self.client.post(reverse('nodes_handler'), {
+            'op': 'acquire',
+            'cpu_count': 2,
+        })
+        self.assertResponseCode(httplib.OK, response)
+        self.assertEqual(
+            small_node.system_id,
+            json.loads(response.content)['system_id'])
+
+    def test_POST_acquire_many_acquires_up_to_count_nodes(self):
+        nodes = [
+            factory.make_node(status=NODE_STATUS.READY, owner=None)
+            for counter in range(3)]
+        response = self.client.post(
+            reverse('nodes_handler'), {'op': 'acquire_many', 'count': 2})
+        self.assertResponseCode(httplib.OK, response)
+        acquired_ids = extract_system_ids(json.loads(response.content))
+        self.assertEqual(2, len(acquired_ids))
+        self.assertItemsEqual(
+            [self.logged_in_user] * 2,
+            [node.owner for node in Node.objects.filter(
+                system_id__in=acquired_ids)])
+        [left_over] = set(
+            node.system_id for node in nodes).difference(acquired_ids)
+        self.assertIsNone(Node.objects.get(system_id=left_over).owner)
+
+    def test_POST_acquire_many_returns_fewer_nodes_if_fewer_match(self):
+        node = factory.make_node(status=NODE_STATUS.READY, owner=None)
+        factory.make_node(
+            status=NODE_STATUS.ALLOCATED, owner=factory.make_user())
+        response = self.client.post(
+            reverse('nodes_handler'), {'op': 'acquire_many', 'count': 5})
+        self.assertResponseCode(httplib.OK, response)
+        self.assertEqual(
+            [node.system_id],
+            extract_system_ids(json.loads(response.content)))
+
+    def test_POST_acquire_many_applies_constraints(self):
+        tag = factory.make_tag()
+        tagged_nodes = [
+            factory.make_node(status=NODE_STATUS.READY, owner=None)
+            for counter in range(2)]
+        for node in tagged_nodes:
+            node.tags.add(tag)
+        factory.make_node(status=NODE_STATUS.READY, owner=None)
+        response = self.client.post(reverse('nodes_handler'), {
+            'op': 'acquire_many',
+            'count': 3,
+            'tags': [tag.name],
+        })
+        self.assertResponseCode(httplib.OK, response)
+        self.assertItemsEqual(
+            [node.system_id for node in tagged_nodes],
+            extract_system_ids(json.loads(response.content)))
+
+    def test_POST_acquire_many_sets_agent_name_and_token(self):
+        node = factory.make_node(status=NODE_STATUS.READY, owner=None)
+        agent_name = factory.make_name('agent-name')
+        self.client.post(reverse('nodes_handler'), {
+            'op': 'acquire_many',
+            'count': 1,
+            'agent_name': agent_name,
+        })
+        node = reload_object(node)
+        self.assertEqual(
+            (agent_name, self.client.token.key),
+            (node.agent_name, node.token.key))
+
+    def test_POST_acquire_many_fails_if_no_node_present(self):
+        response = self.client.post(
+            reverse('nodes_handler'), {'op': 'acquire_many', 'count': 2})
+        self.assertEqual(httplib.CONFLICT, response.status_code)
+
+    def test_POST_acquire_many_requires_positive_count(self):
+        factory.make_node(status=NODE_STATUS.READY, owner=None)
+        response = self.client.post(
+            reverse('nodes_handler'), {'op': 'acquire_many', 'count': 0})
+        self.assertEqual(httplib.BAD_REQUEST, response.status_code)
+
+    def test_POST_acquire_many_requires_count(self):
+        factory.make_node(status=NODE_STATUS.READY, owner=None)
+        response = self.client.post(
+            reverse('nodes_handler'), {'op': 'acquire_many'})
+        self.assertEqual(httplib.BAD_REQUEST, response.status_code)
+
     def test_POST_accept_gets_node_out_of_declared_state(self):
         # This will change when we add provisioning.  Until then,
         # acceptance gets a node straight to Ready state.
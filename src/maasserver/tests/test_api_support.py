@@ -18,13 +18,18 @@ __all__ = []
 import httplib
 
 from django.core.urlresolvers import reverse
+from maasserver.api_support import StreamingResponse
 from maasserver.models.config import (
     Config,
     ConfigManager,
     )
 from maasserver.testing.api import APITestCase
 from maasserver.testing.factory import factory
-from mock import Mock
+from maastesting.testcase import MAASTestCase
+from mock import (
+    MagicMock,
+    Mock,
+    )
 
 
 class TestOperationsResource(APITestCase):
@@ -51,3 +56,18 @@ class TestOperationsResource(APITestCase):
         self.assertEqual(
             httplib.INTERNAL_SERVER_ERROR, response.status_code,
             response.content)
+
+
+class TestStreamingResponse(MAASTestCase):
+
+    def test_streams_content(self):
+        response = StreamingResponse(iter([b'foo', b'bar']))
+        self.assertEqual(
+            (True, b'foobar'),
+            (response.streaming, b''.join(response.streaming_content)))
+
+    def test_closes_content(self):
+        content = MagicMock()
+        response = StreamingResponse(content)
+        response.close()
+        content.close.assert_called_once_with()
@@ -140,6 +140,20 @@ class TestTagAPI(APITestCase):
         self.assertEqual([node1.system_id],
                          [r['system_id'] for r in parsed_result])
 
+    def test_GET_nodes_returns_not_modified_until_tagging_changes(self):
+        tag = factory.make_tag()
+        node = factory.make_node()
+        response = self.client.get(self.get_tag_uri(tag), {'op': 'nodes'})
+        etag = response['ETag']
+        unchanged_response = self.client.get(
+            self.get_tag_uri(tag), {'op': 'nodes'}, HTTP_IF_NONE_MATCH=etag)
+        node.tags.add(tag)
+        changed_response = self.client.get(
+            self.get_tag_uri(tag), {'op': 'nodes'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(
+            (httplib.NOT_MODIFIED, httplib.OK),
+            (unchanged_response.status_code, changed_response.status_code))
+
     def test_GET_nodes_hides_invisible_nodes(self):
         user2 = factory.make_user()
         node1 = factory.make_node()
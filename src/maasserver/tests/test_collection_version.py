@@ -0,0 +1,211 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for `maasserver.collection_version`."""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = []
+
+import httplib
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import (
+    Http404,
+    HttpResponse,
+    )
+from django.test.client import RequestFactory
+from maasserver import collection_version
+from maasserver.collection_version import (
+    bump_collection_version,
+    COLLECTION,
+    COLLECTION_VERSION_CACHE_KEY,
+    conditional_on_collections,
+    flush_collection_changes,
+    get_collection_version,
+    )
+from maasserver.enum import NODEGROUPINTERFACE_MANAGEMENT
+from maasserver.models import (
+    DHCPLease,
+    Node,
+    )
+from maasserver.testing.factory import factory
+from maasserver.testing.testcase import MAASServerTestCase
+from mock import Mock
+
+
+class TestCollectionVersion(MAASServerTestCase):
+
+    def test_get_collection_version_is_stable(self):
+        self.assertEqual(
+            get_collection_version(COLLECTION.NODES),
+            get_collection_version(COLLECTION.NODES))
+
+    def test_bump_collection_version_increases_version(self):
+        version = get_collection_version(COLLECTION.TAGS)
+        bump_collection_version(COLLECTION.TAGS)
+        self.assertGreater(get_collection_version(COLLECTION.TAGS), version)
+
+    def test_bump_collection_version_leaves_other_collections_alone(self):
+        version = get_collection_version(COLLECTION.NODEGROUPS)
+        bump_collection_version(COLLECTION.TAGS)
+        self.assertEqual(
+            version, get_collection_version(COLLECTION.NODEGROUPS))
+
+    def test_bump_collection_version_increases_even_if_clock_goes_back(self):
+        self.patch(
+            collection_version, 'current_version', Mock(return_value=1000))
+        bump_collection_version(COLLECTION.NODES)
+        bump_collection_version(COLLECTION.NODES)
+        self.assertEqual(1001, get_collection_version(COLLECTION.NODES))
+
+    def test_flush_collection_changes_bumps_changed_collections_again(self):
+        # The test runs within a transaction, so the change is pending.
+        bump_collection_version(COLLECTION.NODES)
+        nodes_version = get_collection_version(COLLECTION.NODES)
+        tags_version = get_collection_version(COLLECTION.TAGS)
+        flush_collection_changes()
+        self.assertEqual(
+            (True, tags_version),
+            (
+                get_collection_version(COLLECTION.NODES) > nodes_version,
+                get_collection_version(COLLECTION.TAGS),
+            ))
+
+    def test_saving_a_node_bumps_nodes_version(self):
+        node = factory.make_node()
+        version = get_collection_version(COLLECTION.NODES)
+        node.save()
+        self.assertGreater(get_collection_version(COLLECTION.NODES), version)
+
+    def test_tagging_a_node_bumps_nodes_version(self):
+        node = factory.make_node()
+        tag = factory.make_tag()
+        version = get_collection_version(COLLECTION.NODES)
+        node.tags.add(tag)
+        self.assertGreater(get_collection_version(COLLECTION.NODES), version)
+
+    def test_saving_a_tag_bumps_tags_version(self):
+        version = get_collection_version(COLLECTION.TAGS)
+        factory.make_tag()
+        self.assertGreater(get_collection_version(COLLECTION.TAGS), version)
+
+    def test_updating_leases_bumps_nodes_version(self):
+        nodegroup = factory.make_node_group(
+            management=NODEGROUPINTERFACE_MANAGEMENT.DHCP)
+        version = get_collection_version(COLLECTION.NODES)
+        leases = {
+            factory.getRandomIPAddress(): factory.getRandomMACAddress()}
+        DHCPLease.objects.update_leases(nodegroup, leases)
+        self.assertGreater(get_collection_version(COLLECTION.NODES), version)
+
+    def test_updating_power_states_bumps_nodes_version(self):
+        node = factory.make_node()
+        version = get_collection_version(COLLECTION.NODES)
+        Node.objects.update_power_states(node.nodegroup, {})
+        self.assertGreater(get_collection_version(COLLECTION.NODES), version)
+
+
+class TestConditionalOnCollections(MAASServerTestCase):
+
+    def setUp(self):
+        super(TestConditionalOnCollections, self).setUp()
+        # The nodes last changed well before the current second.
+        cache.set(
+            COLLECTION_VERSION_CACHE_KEY % COLLECTION.NODES,
+            (int(time.time()) - 60) * 1000)
+
+    def make_request(self, **headers):
+        request = RequestFactory().get('/', **headers)
+        request.user = AnonymousUser()
+        return request
+
+    def call(self, request, method=None):
+        """Call a read operation that depends on the node collection."""
+        if method is None:
+            method = Mock(return_value=HttpResponse())
+        decorated = conditional_on_collections(COLLECTION.NODES)(method)
+        return decorated(None, request), method
+
+    def test_runs_operation_and_attaches_validators(self):
+        request = self.make_request()
+        response, method = self.call(request)
+        self.assertEqual(
+            (1, ['ETag', 'Last-Modified']),
+            (method.call_count, sorted(request.cache_validators)))
+
+    def test_returns_not_modified_for_matching_etag(self):
+        request = self.make_request()
+        self.call(request)
+        etag = request.cache_validators['ETag']
+        response, method = self.call(
+            self.make_request(HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(
+            (httplib.NOT_MODIFIED, 0, etag),
+            (response.status_code, method.call_count, response['ETag']))
+
+    def test_runs_operation_once_collection_changed(self):
+        request = self.make_request()
+        self.call(request)
+        bump_collection_version(COLLECTION.NODES)
+        response, method = self.call(self.make_request(
+            HTTP_IF_NONE_MATCH=request.cache_validators['ETag']))
+        self.assertEqual(1, method.call_count)
+
+    def test_etag_depends_on_user(self):
+        request = self.make_request()
+        self.call(request)
+        other_request = self.make_request()
+        other_request.user = factory.make_user()
+        self.call(other_request)
+        self.assertNotEqual(
+            request.cache_validators['ETag'],
+            other_request.cache_validators['ETag'])
+
+    def test_returns_not_modified_if_not_modified_since(self):
+        request = self.make_request()
+        self.call(request)
+        response, method = self.call(self.make_request(
+            HTTP_IF_MODIFIED_SINCE=request.cache_validators['Last-Modified']))
+        self.assertEqual(httplib.NOT_MODIFIED, response.status_code)
+
+    def test_if_none_match_takes_precedence_over_if_modified_since(self):
+        request = self.make_request()
+        self.call(request)
+        response, method = self.call(self.make_request(
+            HTTP_IF_NONE_MATCH='"stale"',
+            HTTP_IF_MODIFIED_SINCE=request.cache_validators['Last-Modified']))
+        self.assertEqual(1, method.call_count)
+
+    def test_omits_last_modified_for_change_in_current_second(self):
+        bump_collection_version(COLLECTION.NODES)
+        request = self.make_request()
+        self.call(request)
+        self.assertEqual(['ETag'], list(request.cache_validators))
+
+    def test_if_none_match_star_checks_resource_first(self):
+        response, method = self.call(
+            self.make_request(HTTP_IF_NONE_MATCH='*'))
+        self.assertEqual(
+            (httplib.NOT_MODIFIED, 1),
+            (response.status_code, method.call_count))
+
+    def test_if_none_match_star_does_not_hide_missing_resource(self):
+        self.assertRaises(
+            Http404, self.call, self.make_request(HTTP_IF_NONE_MATCH='*'),
+            Mock(side_effect=Http404))
+
+    def test_if_none_match_star_does_not_hide_failure(self):
+        response, method = self.call(
+            self.make_request(HTTP_IF_NONE_MATCH='*'),
+            Mock(return_value=HttpResponse(status=httplib.FORBIDDEN)))
+        self.assertEqual(httplib.FORBIDDEN, response.status_code)
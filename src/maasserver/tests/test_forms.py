@@ -54,10 +54,12 @@ from maasserver.forms import (
     ProfileForm,
     remove_None_values,
     UnconstrainedMultipleChoiceField,
+    update_download_progress,
     ValidatorMultipleChoiceField,
     )
 from maasserver.models import (
     Config,
+    DownloadProgress,
     MACAddress,
     Node,
     NodeGroup,
@@ -1191,3 +1193,83 @@ class TestDownloadProgressForm(MAASServerTestCase):
         self.assertIsNone(
             DownloadProgressForm.get_download(
                 factory.make_node_group(), factory.getRandomString(), 1))
+
+
+class TestUpdateDownloadProgress(MAASServerTestCase):
+
+    def test_applies_reports_in_order(self):
+        nodegroup = factory.make_node_group()
+        ongoing = factory.make_download_progress_incomplete(
+            nodegroup=nodegroup)
+        update_download_progress(nodegroup, [
+            {'filename': 'new', 'size': 10},
+            {'filename': ongoing.filename,
+             'bytes_downloaded': ongoing.bytes_downloaded + 1},
+            {'filename': 'new', 'bytes_downloaded': 5},
+            ])
+        new = DownloadProgress.objects.get(nodegroup=nodegroup, filename='new')
+        self.assertEqual(
+            (10, 5, ongoing.bytes_downloaded + 1),
+            (new.size, new.bytes_downloaded,
+             reload_object(ongoing).bytes_downloaded))
+
+    def test_starts_new_download_of_same_file(self):
+        progress = factory.make_download_progress_success()
+        update_download_progress(
+            progress.nodegroup, [{'filename': progress.filename}])
+        self.assertEqual(
+            2,
+            DownloadProgress.objects.filter(
+                nodegroup=progress.nodegroup,
+                filename=progress.filename).count())
+
+    def test_returns_no_errors_for_valid_reports(self):
+        progress = factory.make_download_progress_incomplete()
+        self.assertEqual(
+            [None, None],
+            update_download_progress(progress.nodegroup, [
+                {'filename': 'new'},
+                {'filename': progress.filename,
+                 'bytes_downloaded': progress.bytes_downloaded + 1},
+                ]))
+
+    def test_skips_invalid_report(self):
+        progress = factory.make_download_progress_incomplete()
+        bytes_downloaded = progress.bytes_downloaded
+        errors = update_download_progress(
+            progress.nodegroup,
+            [{'filename': progress.filename, 'bytes_downloaded': -1}])
+        self.assertEqual(
+            (['bytes_downloaded'], bytes_downloaded),
+            (list(errors[0]), reload_object(progress).bytes_downloaded))
+
+    def test_applies_valid_reports_despite_invalid_ones(self):
+        nodegroup = factory.make_node_group()
+        ongoing = factory.make_download_progress_incomplete(
+            nodegroup=nodegroup)
+        errors = update_download_progress(nodegroup, [
+            {'filename': 'lost', 'bytes_downloaded': 1},
+            {'filename': ongoing.filename,
+             'bytes_downloaded': ongoing.bytes_downloaded + 1, 'size': -1},
+            {'filename': ongoing.filename,
+             'bytes_downloaded': ongoing.bytes_downloaded + 2},
+            ])
+        self.assertEqual(
+            ([True, True, False], ongoing.bytes_downloaded + 2),
+            (
+                [error is not None for error in errors],
+                reload_object(ongoing).bytes_downloaded,
+            ))
+
+    def test_does_not_create_download_for_invalid_start_report(self):
+        nodegroup = factory.make_node_group()
+        update_download_progress(nodegroup, [{'filename': 'new', 'size': -1}])
+        self.assertFalse(
+            DownloadProgress.objects.filter(
+                nodegroup=nodegroup, filename='new').exists())
+
+    def test_rejects_update_on_unknown_download(self):
+        errors = update_download_progress(
+            factory.make_node_group(),
+            [{'filename': 'file', 'bytes_downloaded': 1}])
+        self.assertIsNotNone(errors[0])
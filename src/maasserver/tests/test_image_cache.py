@@ -0,0 +1,313 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for the region's cache of the boot images archives."""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = []
+
+from email.utils import formatdate
+import httplib
+from io import BytesIO
+import os.path
+import urllib2
+
+from django.conf import settings
+from lockfile import LockTimeout
+from maasserver import (
+    image_cache,
+    tasks,
+    )
+from maasserver.image_cache import (
+    get_cache_path,
+    get_cached_file,
+    get_image_cache_key,
+    get_image_cache_url,
+    iter_fetched_bytes,
+    iter_file_bytes,
+    iter_response_bytes,
+    NotInArchive,
+    open_fetched_file,
+    prune_cache,
+    refresh_cached_file,
+    UnknownArchive,
+    )
+from maasserver.models import Config
+from maasserver.testing.factory import factory
+from maasserver.testing.testcase import MAASServerTestCase
+from mock import Mock
+from provisioningserver.utils import ensure_dir
+from testtools.matchers import (
+    EndsWith,
+    FileContains,
+    MatchesAll,
+    StartsWith,
+    )
+
+
+class FakeOpener:
+    """Fake URL opener, serving the same content for every URL."""
+
+    def __init__(self, content=b'', last_modified=None, status=httplib.OK):
+        self.content = content
+        self.last_modified = last_modified
+        self.status = status
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append(request)
+        if self.status != httplib.OK:
+            raise urllib2.HTTPError(
+                request.get_full_url(), self.status, "Error", {}, None)
+        response = Mock()
+        response.read = BytesIO(self.content).read
+        response.info.return_value.getheader = {
+            'Content-Length': '%d' % len(self.content),
+            'Last-Modified': self.last_modified,
+            }.get
+        return response
+
+
+class TestImageCache(MAASServerTestCase):
+
+    def setUp(self):
+        super(TestImageCache, self).setUp()
+        self.patch(settings, 'BOOT_IMAGES_CACHE_DIR', self.make_dir())
+
+    def cache_file(self, archive, path, content=b''):
+        """Put a file in the cache, as if just fetched."""
+        refresh_cached_file(archive, path, opener=FakeOpener(content))
+        return get_cache_path(archive, path)
+
+    def test_refresh_cached_file_fetches_file_from_upstream_archive(self):
+        Config.objects.set_config('main_archive', 'http://example.com/main')
+        opener = FakeOpener(b'content')
+        refresh_cached_file('main', 'dists/linux', opener=opener)
+        self.assertThat(
+            get_cache_path('main', 'dists/linux'), FileContains(b'content'))
+        self.assertEqual(
+            ['http://example.com/main/dists/linux'],
+            [request.get_full_url() for request in opener.requests])
+
+    def test_refresh_cached_file_fetches_ephemerals_from_mirror(self):
+        Config.objects.set_config(
+            'ephemerals_archive', 'http://example.com/ephemerals/')
+        opener = FakeOpener()
+        refresh_cached_file(
+            'ephemerals', 'streams/v1/index.sjson', opener=opener)
+        self.assertEqual(
+            'http://example.com/ephemerals/streams/v1/index.sjson',
+            opener.requests[0].get_full_url())
+
+    def test_refresh_cached_file_leaves_fresh_file_alone(self):
+        self.cache_file('main', 'linux', b'content')
+        opener = FakeOpener(b'new content')
+        refresh_cached_file('main', 'linux', opener=opener)
+        self.assertThat(
+            get_cache_path('main', 'linux'), FileContains(b'content'))
+        self.assertEqual([], opener.requests)
+
+    def test_refresh_cached_file_keeps_upstream_modification_time(self):
+        opener = FakeOpener(last_modified=formatdate(1000000, usegmt=True))
+        refresh_cached_file('main', 'linux', opener=opener)
+        self.assertEqual(
+            1000000, os.path.getmtime(get_cache_path('main', 'linux')))
+
+    def test_refresh_cached_file_rechecks_stale_file(self):
+        self.patch(image_cache, 'CACHE_MAX_AGE', 0)
+        refresh_cached_file(
+            'main', 'linux', opener=FakeOpener(
+                b'content', last_modified=formatdate(1000000, usegmt=True)))
+        opener = FakeOpener(status=httplib.NOT_MODIFIED)
+        refresh_cached_file('main', 'linux', opener=opener)
+        self.assertThat(
+            get_cache_path('main', 'linux'), FileContains(b'content'))
+        self.assertEqual(
+            formatdate(1000000, usegmt=True),
+            opener.requests[0].get_header('If-modified-since'))
+
+    def test_refresh_cached_file_replaces_changed_file(self):
+        self.patch(image_cache, 'CACHE_MAX_AGE', 0)
+        self.cache_file('main', 'linux', b'old')
+        refresh_cached_file('main', 'linux', opener=FakeOpener(b'new'))
+        self.assertThat(
+            get_cache_path('main', 'linux'), FileContains(b'new'))
+
+    def test_refresh_cached_file_removes_file_missing_upstream(self):
+        self.patch(image_cache, 'CACHE_MAX_AGE', 0)
+        cached = self.cache_file('main', 'linux')
+        refresh_cached_file(
+            'main', 'linux', opener=FakeOpener(status=httplib.NOT_FOUND))
+        self.assertFalse(os.path.exists(cached))
+
+    def test_refresh_cached_file_records_file_missing_upstream(self):
+        refresh_cached_file(
+            'main', 'linux', opener=FakeOpener(status=httplib.NOT_FOUND))
+        opener = FakeOpener()
+        refresh_cached_file('main', 'linux', opener=opener)
+        self.assertEqual([], opener.requests)
+        self.assertRaises(NotInArchive, get_cached_file, 'main', 'linux')
+
+    def test_refresh_cached_file_leaves_no_partial_file(self):
+        cached = self.cache_file('main', 'linux', b'content')
+        self.assertEqual(
+            [], [
+                path for path in os.listdir(os.path.dirname(cached))
+                if path.startswith('linux.') and path != 'linux.checked'])
+
+    def test_refresh_cached_file_passes_on_upstream_errors(self):
+        self.assertRaises(
+            urllib2.HTTPError, refresh_cached_file, 'main', 'linux',
+            opener=FakeOpener(status=httplib.BAD_GATEWAY))
+
+    def test_refresh_cached_file_leaves_file_being_fetched_alone(self):
+        file_lock = self.patch(image_cache, 'FileLock')
+        file_lock.return_value.acquire.side_effect = LockTimeout()
+        opener = FakeOpener()
+        refresh_cached_file('main', 'linux', opener=opener)
+        self.assertEqual([], opener.requests)
+
+    def test_refresh_cached_file_prunes_cache(self):
+        self.patch(settings, 'BOOT_IMAGES_CACHE_MAX_SIZE', 4)
+        old = self.cache_file('main', 'old', b'old')
+        os.utime(old + '.checked', (0, 0))
+        new = self.cache_file('main', 'new', b'new')
+        self.assertEqual(
+            (False, True), (os.path.exists(old), os.path.exists(new)))
+
+    def test_get_cached_file_returns_fresh_file(self):
+        fetch_cached_file = self.patch(tasks, 'fetch_cached_file')
+        cached = self.cache_file('main', 'linux')
+        self.assertEqual(cached, get_cached_file('main', 'linux'))
+        self.assertEqual([], fetch_cached_file.apply_async.mock_calls)
+
+    def test_get_cached_file_queues_fetch_of_missing_file(self):
+        fetch_cached_file = self.patch(tasks, 'fetch_cached_file')
+        self.assertIsNone(get_cached_file('main', 'dists/linux'))
+        self.assertEqual(
+            [['main', 'dists/linux']],
+            [
+                call[2]['args']
+                for call in fetch_cached_file.apply_async.mock_calls
+            ])
+
+    def test_get_cached_file_returns_stale_file_while_fetching(self):
+        self.patch(image_cache, 'CACHE_MAX_AGE', 0)
+        fetch_cached_file = self.patch(tasks, 'fetch_cached_file')
+        cached = self.cache_file('main', 'linux')
+        self.assertEqual(cached, get_cached_file('main', 'linux'))
+        self.assertEqual(1, len(fetch_cached_file.apply_async.mock_calls))
+
+    def test_get_cached_file_refuses_unknown_archive(self):
+        self.assertRaises(
+            UnknownArchive, get_cached_file, factory.make_name('archive'),
+            'linux')
+
+    def test_get_cached_file_refuses_path_outside_archive(self):
+        self.assertRaises(
+            ValueError, get_cached_file, 'main', 'dists/../../secret')
+
+    def test_prune_cache_removes_least_recently_checked_files(self):
+        files = [
+            self.cache_file('main', factory.make_name('file'), b'data')
+            for _ in range(3)
+            ]
+        for age, cached in enumerate(reversed(files)):
+            os.utime(cached + '.checked', (age, age))
+        prune_cache(8)
+        self.assertEqual(
+            [True, True, False],
+            [os.path.exists(cached) for cached in files])
+
+    def test_prune_cache_keeps_files_within_limit(self):
+        cached = self.cache_file('main', 'linux', b'data')
+        prune_cache(4)
+        self.assertThat(cached, FileContains(b'data'))
+
+    def make_fetching_file(self, archive, path, content, size):
+        """Make it look as if a file is being fetched into the cache."""
+        cached = get_cache_path(archive, path)
+        ensure_dir(os.path.dirname(cached))
+        with open(cached + '.part', 'wb') as partial_file:
+            partial_file.write(content)
+        with open(cached + '.size', 'wb') as size_file:
+            size_file.write(size)
+        self.patch(image_cache, 'is_being_fetched', Mock(return_value=True))
+        return cached
+
+    def test_open_fetched_file_opens_file_being_fetched(self):
+        cached = self.make_fetching_file('main', 'linux', b'ker', b'6')
+        input_file, size, location = open_fetched_file('main', 'linux')
+        with input_file:
+            self.assertEqual(
+                (b'ker', 6, cached), (input_file.read(), size, location))
+
+    def test_open_fetched_file_opens_file_fetched_meanwhile(self):
+        self.cache_file('main', 'linux', b'kernel')
+        input_file, size, _ = open_fetched_file('main', 'linux')
+        with input_file:
+            self.assertEqual((b'kernel', 6), (input_file.read(), size))
+
+    def test_open_fetched_file_gives_up_if_fetch_does_not_start(self):
+        self.patch(image_cache, 'FETCH_START_TIMEOUT', 0)
+        self.assertIsNone(open_fetched_file('main', 'linux'))
+
+    def test_open_fetched_file_refuses_file_missing_upstream(self):
+        refresh_cached_file(
+            'main', 'linux', opener=FakeOpener(status=httplib.NOT_FOUND))
+        self.assertRaises(NotInArchive, open_fetched_file, 'main', 'linux')
+
+    def test_iter_fetched_bytes_waits_for_rest_of_file(self):
+        self.patch(image_cache, 'POLL_INTERVAL', 0)
+        cached = self.make_fetching_file('main', 'linux', b'ker', b'6')
+        input_file, size, _ = open_fetched_file('main', 'linux')
+        sleep = self.patch(image_cache, 'sleep')
+
+        def finish_fetch(interval):
+            with open(cached + '.part', 'ab') as partial_file:
+                partial_file.write(b'nel')
+            image_cache.is_being_fetched.return_value = False
+
+        sleep.side_effect = finish_fetch
+        self.assertEqual(
+            [b'ker', b'nel'],
+            list(iter_fetched_bytes(cached, input_file, 0, size)))
+
+    def test_iter_fetched_bytes_reads_range(self):
+        cached = self.make_fetching_file('main', 'linux', b'kernel', b'6')
+        input_file, _, _ = open_fetched_file('main', 'linux')
+        self.assertEqual(
+            b'rn', b''.join(iter_fetched_bytes(cached, input_file, 2, 4)))
+
+    def test_get_image_cache_url_points_to_archive_in_cache(self):
+        nodegroup = factory.make_node_group()
+        self.assertThat(
+            get_image_cache_url(nodegroup, 'ports'),
+            MatchesAll(
+                StartsWith(settings.DEFAULT_MAAS_URL),
+                EndsWith('/image-cache/%s/%s/ports/' % (
+                    nodegroup.uuid, get_image_cache_key(nodegroup)))))
+
+    def test_get_image_cache_key_differs_between_clusters(self):
+        self.assertNotEqual(
+            get_image_cache_key(factory.make_node_group()),
+            get_image_cache_key(factory.make_node_group()))
+
+    def test_iter_file_bytes_reads_range(self):
+        path = self.make_file(contents=b'give me rope')
+        self.assertEqual(
+            b'me', b''.join(iter_file_bytes(path, 5, 7)))
+
+    def test_iter_response_bytes_reads_and_closes_response(self):
+        response = Mock()
+        response.read = BytesIO(b'content').read
+        self.assertEqual(b'content', b''.join(iter_response_bytes(response)))
+        self.assertEqual(1, response.close.call_count)
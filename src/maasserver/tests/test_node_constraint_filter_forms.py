@@ -21,8 +21,10 @@ from maasserver.fields import MAC
 from maasserver.models import Node
 from maasserver.node_constraint_filter_forms import (
     AcquireNodeForm,
+    compose_tags_clause,
     generate_architecture_wildcards,
     JUJU_ACQUIRE_FORM_FIELDS_MAPPING,
+    order_by_smallest_sufficient,
     parse_legacy_tags,
     RenamableFieldsForm,
     )
@@ -69,6 +71,34 @@ class TestUtils(MAASServerTestCase):
         self.assertEquals(
             ['a', 'b', 'c', 'd'], parse_legacy_tags(['a,b', 'c d']))
 
+    def test_compose_tags_clause_matches_nodes_with_all_tags(self):
+        tags = [factory.make_tag() for i in range(3)]
+        node_with_all_tags = factory.make_node()
+        node_with_all_tags.tags.add(*tags)
+        node_with_some_tags = factory.make_node()
+        node_with_some_tags.tags.add(*tags[:2])
+        factory.make_node()
+        where, params = compose_tags_clause(tag.name for tag in tags)
+        self.assertItemsEqual(
+            [node_with_all_tags],
+            Node.objects.extra(where=[where], params=params))
+
+    def test_compose_tags_clause_ignores_extra_tags(self):
+        tags = [factory.make_tag() for i in range(2)]
+        node = factory.make_node()
+        node.tags.add(*tags)
+        where, params = compose_tags_clause([tags[0].name])
+        self.assertItemsEqual(
+            [node], Node.objects.extra(where=[where], params=params))
+
+    def test_order_by_smallest_sufficient_puts_smaller_nodes_first(self):
+        big_node = factory.make_node(cpu_count=8, memory=1024)
+        bigger_memory_node = factory.make_node(cpu_count=2, memory=2048)
+        small_node = factory.make_node(cpu_count=2, memory=1024)
+        self.assertEqual(
+            [small_node, bigger_memory_node, big_node],
+            list(order_by_smallest_sufficient(Node.objects.all())))
+
     def test_JUJU_ACQUIRE_FORM_FIELDS_MAPPING_fields(self):
         self.assertThat(
             list(AcquireNodeForm().fields),
@@ -0,0 +1,111 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for `maasserver.node_serializer`."""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = []
+
+import json
+
+from django.test.client import RequestFactory
+from maasserver.api import (
+    DISPLAYED_NODE_FIELDS,
+    NodeHandler,
+    )
+from maasserver.enum import (
+    NODE_STATUS,
+    NODEGROUP_STATUS,
+    NODEGROUPINTERFACE_MANAGEMENT,
+    )
+from maasserver.json import MAASJSONEncoder
+from maasserver.models import Node
+from maasserver.node_serializer import (
+    render_nodes,
+    serialize_nodes,
+    )
+from maasserver.testing.factory import factory
+from maasserver.testing.testcase import MAASServerTestCase
+from piston.emitters import JSONEmitter
+from piston.handler import typemapper
+
+
+def emit_nodes(nodes):
+    """Serialise `nodes` through Piston's emitter, as `NodeHandler` does."""
+    emitter = JSONEmitter(
+        nodes, typemapper, NodeHandler(), DISPLAYED_NODE_FIELDS, False)
+    return json.loads(emitter.render(RequestFactory().get('/')))
+
+
+def make_node_with_lease(**kwargs):
+    node = factory.make_node(**kwargs)
+    mac = factory.make_mac_address(node=node)
+    factory.make_dhcp_lease(nodegroup=node.nodegroup, mac=mac.mac_address)
+    node.tags.add(factory.make_tag())
+    return node
+
+
+class TestSerializeNodes(MAASServerTestCase):
+
+    def serialize(self, nodes):
+        """Serialise `nodes`, and round-trip the result through JSON."""
+        return json.loads(
+            json.dumps(serialize_nodes(nodes), cls=MAASJSONEncoder))
+
+    def test_matches_piston_emitter(self):
+        make_node_with_lease(
+            status=NODE_STATUS.ALLOCATED, owner=factory.make_user())
+        make_node_with_lease(nodegroup=factory.make_node_group(
+            status=NODEGROUP_STATUS.ACCEPTED,
+            management=NODEGROUPINTERFACE_MANAGEMENT.DHCP_AND_DNS))
+        factory.make_node()
+        nodes = Node.objects.all().order_by('id')
+        self.assertEqual(emit_nodes(nodes), self.serialize(nodes))
+
+    def test_uses_fqdn_for_nodes_in_dns_managed_nodegroups(self):
+        nodegroup = factory.make_node_group(
+            status=NODEGROUP_STATUS.ACCEPTED,
+            management=NODEGROUPINTERFACE_MANAGEMENT.DHCP_AND_DNS)
+        node = factory.make_node(
+            hostname='%s.example.com' % factory.make_name('host'),
+            nodegroup=nodegroup)
+        [representation] = self.serialize(Node.objects.filter(id=node.id))
+        self.assertEqual(node.fqdn, representation['hostname'])
+
+    def test_keeps_query_set_order(self):
+        nodes = [factory.make_node() for i in range(3)]
+        representations = self.serialize(Node.objects.order_by('-id'))
+        self.assertEqual(
+            [node.system_id for node in reversed(nodes)],
+            [representation['system_id'] for representation in
+             representations])
+
+    def test_issues_constant_number_of_queries(self):
+        nodegroup = factory.make_node_group()
+        for i in range(3):
+            make_node_with_lease(nodegroup=nodegroup)
+        num_queries1, _ = self.getNumQueries(
+            serialize_nodes, Node.objects.all())
+        for i in range(3):
+            make_node_with_lease(nodegroup=nodegroup)
+        num_queries2, _ = self.getNumQueries(
+            serialize_nodes, Node.objects.all())
+        self.assertEqual(num_queries1, num_queries2)
+
+    def test_render_nodes_returns_json_response(self):
+        node = factory.make_node()
+        response = render_nodes(Node.objects.all())
+        self.assertEqual(
+            ('application/json; charset=utf-8', [node.system_id]),
+            (
+                response['Content-Type'],
+                [item['system_id'] for item in json.loads(response.content)],
+            ))
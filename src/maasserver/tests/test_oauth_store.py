@@ -0,0 +1,136 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for `maasserver.oauth_store`."""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = []
+
+import httplib
+
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from maasserver import oauth_store
+from maasserver.models.user import create_auth_token
+from maasserver.oauth_store import (
+    CachingDataStore,
+    flush_forgotten_keys,
+    token_cache_key,
+    )
+from maasserver.testing.api import APITestCase
+from maasserver.testing.factory import factory
+from maasserver.testing.testcase import MAASServerTestCase
+from mock import Mock
+from piston.models import (
+    Nonce,
+    Token,
+    )
+
+
+def make_data_store():
+    return CachingDataStore(Mock(parameters={}))
+
+
+class TestCachingDataStore(MAASServerTestCase):
+
+    def test_lookup_nonce_accepts_new_nonce_once(self):
+        token = create_auth_token(factory.make_user())
+        nonce = factory.make_name('nonce')
+        store = make_data_store()
+        self.assertEqual(
+            (None, nonce),
+            (
+                store.lookup_nonce(token.consumer, token, nonce),
+                store.lookup_nonce(token.consumer, token, nonce),
+            ))
+
+    def test_lookup_nonce_does_not_write_to_database(self):
+        token = create_auth_token(factory.make_user())
+        make_data_store().lookup_nonce(
+            token.consumer, token, factory.make_name('nonce'))
+        self.assertFalse(Nonce.objects.exists())
+
+    def test_lookup_nonce_uses_database_if_cache_fails(self):
+        self.patch(oauth_store.cache, 'add', Mock(return_value=False))
+        self.patch(oauth_store.cache, 'get', Mock(return_value=None))
+        token = create_auth_token(factory.make_user())
+        nonce = factory.make_name('nonce')
+        store = make_data_store()
+        self.assertEqual(
+            (None, nonce),
+            (
+                store.lookup_nonce(token.consumer, token, nonce),
+                store.lookup_nonce(token.consumer, token, nonce),
+            ))
+        self.assertEqual(1, Nonce.objects.count())
+
+    def test_lookup_token_returns_token_with_user(self):
+        token = create_auth_token(factory.make_user())
+        found = make_data_store().lookup_token('access', token.key)
+        self.assertEqual(
+            (token, token.user), (found, found.user))
+
+    def test_lookup_token_returns_None_for_unknown_token(self):
+        self.assertIsNone(
+            make_data_store().lookup_token(
+                'access', factory.make_name('token')))
+
+    def test_lookup_token_caches_token_and_user(self):
+        token = create_auth_token(factory.make_user())
+        make_data_store().lookup_token('access', token.key)
+
+        def lookup():
+            found = make_data_store().lookup_token('access', token.key)
+            return found.user.username, found.consumer.key
+
+        num_queries, _ = self.getNumQueries(lookup)
+        self.assertEqual(0, num_queries)
+
+    def test_lookup_token_forgets_deleted_token(self):
+        token = create_auth_token(factory.make_user())
+        make_data_store().lookup_token('access', token.key)
+        Token.objects.filter(id=token.id).delete()
+        self.assertIsNone(make_data_store().lookup_token('access', token.key))
+
+    def test_flush_forgotten_keys_forgets_changed_token_again(self):
+        # The test runs within a transaction, so the change is pending.
+        token = create_auth_token(factory.make_user())
+        token.save()
+        cache_key = token_cache_key(token.key, token.token_type)
+        cache.set(cache_key, token)
+        flush_forgotten_keys()
+        self.assertIsNone(cache.get(cache_key))
+
+    def test_lookup_token_sees_changes_to_user(self):
+        user = factory.make_user()
+        token = create_auth_token(user)
+        make_data_store().lookup_token('access', token.key)
+        user.is_active = False
+        user.save()
+        found = make_data_store().lookup_token('access', token.key)
+        self.assertFalse(found.user.is_active)
+
+    def test_lookup_consumer_caches_consumer(self):
+        token = create_auth_token(factory.make_user())
+        key = token.consumer.key
+        make_data_store().lookup_consumer(key)
+        num_queries, consumer = self.getNumQueries(
+            make_data_store().lookup_consumer, key)
+        self.assertEqual((0, token.consumer), (num_queries, consumer))
+
+
+class TestCachingDataStoreAPI(APITestCase):
+
+    def test_authenticated_requests_do_not_store_nonces(self):
+        response = self.client.get(reverse('nodes_handler'), {'op': 'list'})
+        self.assertEqual(
+            (httplib.OK, False),
+            (response.status_code, Nonce.objects.exists()))
@@ -252,6 +252,15 @@ class TestLoadPreseedTemplate(MAASServerTestCase):
             TemplateNotFoundError, load_preseed_template, node,
             unknown_template_name)
 
+    def test_load_preseed_template_sees_edited_template(self):
+        name = factory.getRandomString()
+        self.create_template(self.location, name)
+        node = factory.make_node()
+        load_preseed_template(node, name)
+        content = self.create_template(self.location, name)
+        self.assertEqual(
+            content, load_preseed_template(node, name).substitute())
+
     def test_load_preseed_template_generic_lookup(self):
         # The template lookup method ends up picking up a template named
         # 'generic' if no more specific template exist.
@@ -51,3 +51,18 @@ class TestCleanupOldNonces(MAASTestCase):
         self.assertEqual(
             [mock.call()],
             nodegroup.import_boot_images.mock_calls)
+
+    def test_query_power_states_on_schedule_queries_clusters(self):
+        self.patch(NodeGroup, 'query_power_states')
+        nodegroup = factory.make_node_group(status=NODEGROUP_STATUS.ACCEPTED)
+        tasks.query_power_states_on_schedule()
+        self.assertEqual(
+            [mock.call()],
+            nodegroup.query_power_states.mock_calls)
+
+    def test_fetch_cached_file_refreshes_cached_file(self):
+        image_cache = self.patch(tasks, 'image_cache')
+        tasks.fetch_cached_file('main', 'linux')
+        self.assertEqual(
+            [mock.call('main', 'linux')],
+            image_cache.refresh_cached_file.mock_calls)
@@ -149,6 +149,7 @@ class SettingsTest(AdminLoggedInTestCase):
         new_main_archive = 'http://test.example.com/archive'
         new_ports_archive = 'http://test2.example.com/archive'
         new_cloud_images_archive = 'http://test3.example.com/archive'
+        new_ephemerals_archive = 'http://test4.example.com/archive'
         new_default_distro_series = factory.getRandomEnum(DISTRO_SERIES)
         response = self.client.post(
             reverse('settings'),
@@ -158,6 +159,7 @@ class SettingsTest(AdminLoggedInTestCase):
                     'main_archive': new_main_archive,
                     'ports_archive': new_ports_archive,
                     'cloud_images_archive': new_cloud_images_archive,
+                    'ephemerals_archive': new_ephemerals_archive,
                     'default_distro_series': new_default_distro_series,
                 }))
 
@@ -167,12 +169,14 @@ class SettingsTest(AdminLoggedInTestCase):
                 new_main_archive,
                 new_ports_archive,
                 new_cloud_images_archive,
+                new_ephemerals_archive,
                 new_default_distro_series,
             ),
             (
                 Config.objects.get_config('main_archive'),
                 Config.objects.get_config('ports_archive'),
                 Config.objects.get_config('cloud_images_archive'),
+                Config.objects.get_config('ephemerals_archive'),
                 Config.objects.get_config('default_distro_series'),
             ))
 
@@ -28,6 +28,7 @@ from maasserver.api import (
     describe,
     FileHandler,
     FilesHandler,
+    image_cache,
     MaasHandler,
     NodeGroupHandler,
     NodeGroupInterfaceHandler,
@@ -94,6 +95,10 @@ urlpatterns = patterns(
     url(r'doc/$', api_doc, name='api-doc'),
     url(r'describe/$', describe, name='describe'),
     url(r'pxeconfig/$', pxeconfig, name='pxeconfig'),
+    url(
+        r'^image-cache/(?P<uuid>[^/]+)/(?P<key>[^/]+)/(?P<archive>[^/]+)/+'
+        r'(?P<path>.*)$', image_cache,
+        name='image_cache'),
 )
 
 
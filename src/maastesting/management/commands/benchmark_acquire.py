@@ -0,0 +1,171 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Django command: benchmark the node acquisition query.
+
+Populates the database with a large inventory of nodes, then compares,
+using PostgreSQL's EXPLAIN ANALYZE, the query produced by
+`AcquireNodeForm` with the historical query that joined the tags table
+once per requested tag.  Everything happens in a transaction that is
+rolled back at the end, so the database is left untouched.
+
+Run it against a development database only::
+
+    $ bin/maas benchmark_acquire --nodes 20000 --tags 4
+"""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = []
+
+from optparse import make_option
+import random
+import re
+
+from django.core.management.base import BaseCommand
+from django.db import (
+    connection,
+    transaction,
+    )
+from maasserver.enum import (
+    ARCHITECTURE,
+    NODE_STATUS,
+    )
+from maasserver.models import Node
+from maasserver.models.timestampedmodel import now
+from maasserver.node_constraint_filter_forms import (
+    AcquireNodeForm,
+    order_by_smallest_sufficient,
+    )
+from maasserver.testing.factory import factory
+from maasserver.utils import map_enum
+
+
+def make_inventory(num_nodes, num_tags):
+    """Create `num_nodes` nodes, spread over `num_tags` tags.
+
+    :return: The created tags.
+    """
+    nodegroup = factory.make_node_group()
+    zones = [factory.make_zone() for i in range(5)]
+    tags = [factory.make_tag() for i in range(num_tags * 3)]
+    architectures = map_enum(ARCHITECTURE).values()
+    statuses = map_enum(NODE_STATUS).values()
+    # bulk_create() bypasses save(), which normally sets the timestamps.
+    timestamp = now()
+    Node.objects.bulk_create(
+        Node(
+            created=timestamp, updated=timestamp,
+            hostname=factory.make_name('node'),
+            status=random.choice(statuses), nodegroup=nodegroup,
+            zone=random.choice(zones),
+            architecture=random.choice(architectures),
+            cpu_count=random.choice([1, 2, 4, 8, 16]),
+            memory=random.choice([512, 1024, 2048, 4096, 16384]),
+            routers=[factory.make_MAC()])
+        for i in range(num_nodes))
+    NodeTags = Node.tags.through
+    NodeTags.objects.bulk_create(
+        NodeTags(node_id=node_id, tag_id=tag.id)
+        for node_id in Node.objects.values_list('id', flat=True)
+        for tag in random.sample(tags, len(tags) // 2))
+    return tags
+
+
+def filter_nodes_with_joins(nodes, tag_names):
+    """Filter `nodes` on `tag_names` by joining the tags table per tag."""
+    for tag_name in tag_names:
+        nodes = nodes.filter(tags__name=tag_name)
+    return nodes
+
+
+def explain(query):
+    """Run EXPLAIN ANALYZE on a query set.
+
+    :return: A tuple of the total run time in milliseconds, and the plan.
+    """
+    sql, params = query.query.sql_with_params()
+    cursor = connection.cursor()
+    cursor.execute("EXPLAIN ANALYZE " + sql, params)
+    plan = [line for line, in cursor.fetchall()]
+    # PostgreSQL 9.1 reports "Total runtime"; newer versions report
+    # "Planning time" and "Execution time" separately.
+    timings = re.findall(
+        r'(?:Total runtime|Planning time|Execution time): ([\d.]+) ms',
+        '\n'.join(plan))
+    return sum(float(timing) for timing in timings), plan
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--nodes', dest='nodes', type='int', default=20000,
+            help="Number of nodes to create."),
+        make_option(
+            '--tags', dest='tags', type='int', default=4,
+            help="Number of tags to require when acquiring."),
+        make_option(
+            '--runs', dest='runs', type='int', default=5,
+            help="Number of times to run each query."),
+        make_option(
+            '--verbose-plans', action='store_true', dest='verbose_plans',
+            default=False, help="Print the query plans."),
+    )
+    help = "Benchmark the queries used to acquire nodes."
+
+    def report(self, label, query, runs, verbose_plans):
+        timings = []
+        for run in range(runs):
+            timing, plan = explain(query)
+            timings.append(timing)
+        self.stdout.write(
+            "%-12s best %8.2f ms, worst %8.2f ms\n"
+            % (label, min(timings), max(timings)))
+        if verbose_plans:
+            self.stdout.write('\n'.join(plan) + '\n\n')
+
+    def handle(self, *args, **options):
+        with transaction.commit_manually():
+            try:
+                tags = make_inventory(options['nodes'], options['tags'])
+                cursor = connection.cursor()
+                cursor.execute("ANALYZE")
+                tag_names = [
+                    tag.name for tag in random.sample(tags, options['tags'])]
+                form = AcquireNodeForm(data={
+                    'tags': tag_names,
+                    'arch': 'i386',
+                    'cpu_count': 2,
+                    'mem': 1024,
+                    })
+                assert form.is_valid(), form.errors
+                available_nodes = Node.objects.filter(
+                    status=NODE_STATUS.READY, owner__isnull=True)
+                compiled_query = order_by_smallest_sufficient(
+                    form.filter_nodes(available_nodes))
+                # Order both queries the same way, so that only the tag
+                # filtering differs between them.
+                joins_query = order_by_smallest_sufficient(
+                    filter_nodes_with_joins(
+                        available_nodes.filter(
+                            architecture__in=form.cleaned_data['arch'],
+                            cpu_count__gte=2, memory__gte=1024),
+                        tag_names))
+                self.stdout.write(
+                    "%d nodes, %d tags required.\n"
+                    % (options['nodes'], len(tag_names)))
+                self.report(
+                    "tag joins", joins_query, options['runs'],
+                    options['verbose_plans'])
+                self.report(
+                    "compiled", compiled_query, options['runs'],
+                    options['verbose_plans'])
+            finally:
+                transaction.rollback()
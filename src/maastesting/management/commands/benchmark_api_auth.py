@@ -0,0 +1,96 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Django command: benchmark OAuth-authenticated API requests.
+
+Issues OAuth-signed requests for an empty node list, first with Piston's
+database-backed OAuth data store and then with
+`maasserver.oauth_store.CachingDataStore`, and reports the request rate
+and the number of queries per request for each.  Everything happens in a
+transaction that is rolled back at the end.  The caching store needs the
+memcached server configured in `CACHES` to be running.
+
+Run it against a development database only::
+
+    $ bin/maas benchmark_api_auth --requests 1000
+"""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = []
+
+import httplib
+from optparse import make_option
+import time
+
+from django.conf import settings
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+    )
+from django.core.urlresolvers import reverse
+from django.db import (
+    connection,
+    reset_queries,
+    transaction,
+    )
+from maasserver.oauth_store import CachingDataStore
+from maasserver.testing.factory import factory
+from maasserver.testing.oauthclient import OAuthAuthenticatedClient
+from piston import authentication
+from piston.store import DataStore
+
+
+def measure(client, num_requests):
+    """Issue `num_requests` requests for the node list with `client`.
+
+    :return: A tuple of the number of requests per second, and the number
+        of queries issued per request.
+    """
+    url = reverse('nodes_handler')
+    reset_queries()
+    start = time.time()
+    for i in range(num_requests):
+        response = client.get(url, {'op': 'list'})
+        if response.status_code != httplib.OK:
+            raise CommandError(
+                "Request failed with %d: %s"
+                % (response.status_code, response.content))
+    duration = time.time() - start
+    return num_requests / duration, len(connection.queries) / num_requests
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--requests', dest='requests', type='int', default=1000,
+            help="Number of requests to issue with each data store."),
+    )
+    help = "Benchmark OAuth-authenticated API requests."
+
+    def handle(self, *args, **options):
+        num_requests = options['requests']
+        # Query counting relies on Django recording the queries.
+        settings.DEBUG = True
+        original_store = authentication.oauth_datastore
+        with transaction.commit_manually():
+            try:
+                client = OAuthAuthenticatedClient(factory.make_user())
+                for label, store in [
+                        ("database", DataStore),
+                        ("cache", CachingDataStore)]:
+                    authentication.oauth_datastore = store
+                    rate, queries = measure(client, num_requests)
+                    self.stdout.write(
+                        "%-8s %8.1f requests/s, %5.1f queries/request\n"
+                        % (label, rate, queries))
+            finally:
+                authentication.oauth_datastore = original_store
+                transaction.rollback()
@@ -0,0 +1,203 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Django command: benchmark boot file transfers from a cluster controller.
+
+Fetches a file from the cluster's TFTP server and then from its HTTP boot
+service, with a number of simultaneous clients to mimic nodes booting
+together, and reports the time taken and the throughput of each.  The
+file is given as a path relative to the TFTP root, for example an initrd::
+
+    $ bin/maas benchmark_boot_transfer --host 10.0.0.1 --clients 20 \\
+        i386/generic/precise/install/initrd.gz
+
+The HTTP boot service needs to be enabled in the cluster's pserv.yaml.
+Use --blksize and --windowsize to have the TFTP client negotiate larger
+blocks and windows, as modern PXE ROMs can.
+"""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = []
+
+from optparse import make_option
+import socket
+import struct
+from threading import Thread
+import time
+import urllib2
+
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+    )
+
+# TFTP opcodes; see RFC 1350 and RFC 2347.
+TFTP_RRQ = 1
+TFTP_DATA = 3
+TFTP_ACK = 4
+TFTP_ERROR = 5
+TFTP_OACK = 6
+
+# The size of a TFTP data block without negotiated options, in bytes.
+TFTP_BLOCK_SIZE = 512
+
+# How long to wait for a TFTP packet before giving up, in seconds.
+TFTP_TIMEOUT = 5
+
+
+def parse_oack(payload):
+    """Return the options acknowledged by a TFTP OACK, as a dict."""
+    fields = payload.split(b"\0")[:-1]
+    return dict(zip(fields[::2], fields[1::2]))
+
+
+def fetch_tftp(host, port, path, block_size=None, window_size=None):
+    """Fetch the file at `path` over TFTP, and return its size.
+
+    :param block_size: The block size to ask for (RFC 2348), if any.
+    :param window_size: The window size to ask for (RFC 7440), if any.
+    """
+    options = b""
+    if block_size is not None:
+        options += b"blksize\0%d\0" % block_size
+    if window_size is not None:
+        options += b"windowsize\0%d\0" % window_size
+    block_size = TFTP_BLOCK_SIZE
+    window_size = 1
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(TFTP_TIMEOUT)
+    try:
+        sock.sendto(
+            struct.pack(b"!H", TFTP_RRQ) + path.encode("ascii") +
+            b"\0octet\0" + options, (host, port))
+        size = 0
+        expected_block = 1
+        unacked = 0
+        gap_acked = False
+        while True:
+            packet, server = sock.recvfrom(4 + 65464)
+            opcode, block = struct.unpack(b"!HH", packet[:4])
+            if opcode == TFTP_ERROR:
+                raise CommandError("TFTP error: %s" % packet[4:-1])
+            if opcode == TFTP_OACK:
+                accepted = parse_oack(packet[2:])
+                block_size = int(accepted.get(b"blksize", block_size))
+                window_size = int(accepted.get(b"windowsize", window_size))
+                sock.sendto(struct.pack(b"!HH", TFTP_ACK, 0), server)
+                continue
+            if opcode != TFTP_DATA:
+                continue
+            if block != expected_block % 0x10000:
+                # A block went missing: acknowledge the last one received
+                # in sequence, once, and the server starts again after it.
+                if not gap_acked:
+                    sock.sendto(
+                        struct.pack(
+                            b"!HH", TFTP_ACK, (expected_block - 1) % 0x10000),
+                        server)
+                    unacked = 0
+                    gap_acked = True
+                continue
+            gap_acked = False
+            data_size = len(packet) - 4
+            size += data_size
+            expected_block += 1
+            unacked += 1
+            last = data_size < block_size
+            if last or unacked == window_size:
+                sock.sendto(struct.pack(b"!HH", TFTP_ACK, block), server)
+                unacked = 0
+            if last:
+                return size
+    finally:
+        sock.close()
+
+
+def fetch_http(host, port, path):
+    """Fetch the file at `path` over HTTP, and return its size."""
+    response = urllib2.urlopen("http://%s:%d/%s" % (host, port, path))
+    size = 0
+    try:
+        while True:
+            data = response.read(64 * 1024)
+            if data == b'':
+                return size
+            size += len(data)
+    finally:
+        response.close()
+
+
+def measure(fetch, num_clients):
+    """Run `fetch` in `num_clients` threads at once.
+
+    :return: A tuple of the time taken by all fetches, in seconds, and the
+        total number of bytes fetched.
+    """
+    sizes = []
+    errors = []
+
+    def run():
+        try:
+            sizes.append(fetch())
+        except Exception as error:
+            errors.append(error)
+
+    threads = [Thread(target=run) for _ in range(num_clients)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.time() - start
+    if len(errors) > 0:
+        raise CommandError("Fetch failed: %s" % errors[0])
+    return duration, sum(sizes)
+
+
+class Command(BaseCommand):
+    args = "<path>"
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--host', dest='host', default='127.0.0.1',
+            help="Address of the cluster controller."),
+        make_option(
+            '--tftp-port', dest='tftp_port', type='int', default=69,
+            help="Port of the TFTP server."),
+        make_option(
+            '--blksize', dest='blksize', type='int', default=None,
+            help="TFTP block size to negotiate, if any."),
+        make_option(
+            '--windowsize', dest='windowsize', type='int', default=None,
+            help="TFTP window size to negotiate, if any."),
+        make_option(
+            '--http-port', dest='http_port', type='int', default=5248,
+            help="Port of the HTTP boot service."),
+        make_option(
+            '--clients', dest='clients', type='int', default=1,
+            help="Number of clients fetching the file at the same time."),
+    )
+    help = "Benchmark boot file transfers over TFTP and HTTP."
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError("Give the path of one file in the TFTP tree.")
+        [path] = args
+        host = options['host']
+        for label, fetch in [
+                ("tftp", lambda: fetch_tftp(
+                    host, options['tftp_port'], path, options['blksize'],
+                    options['windowsize'])),
+                ("http", lambda: fetch_http(
+                    host, options['http_port'], path))]:
+            duration, size = measure(fetch, options['clients'])
+            self.stdout.write(
+                "%-5s %8.2f s, %8.2f MB/s\n"
+                % (label, duration, size / duration / 1e6))
@@ -0,0 +1,153 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Django command: benchmark the serialisation of node lists for the API.
+
+Populates the database with nodes, each with a MAC address, a DHCP lease
+and tags, then compares the time and number of queries it takes to
+serialise them through Piston's emitter (the historical path) and through
+`maasserver.node_serializer`.  Everything happens in a transaction that is
+rolled back at the end, so the database is left untouched.
+
+Run it against a development database only::
+
+    $ bin/maas benchmark_node_list --nodes 1000 --nodes 10000
+"""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = []
+
+from optparse import make_option
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import (
+    connection,
+    reset_queries,
+    transaction,
+    )
+from django.test.client import RequestFactory
+from maasserver.api import (
+    DISPLAYED_NODE_FIELDS,
+    NodeHandler,
+    )
+from maasserver.enum import (
+    NODEGROUP_STATUS,
+    NODEGROUPINTERFACE_MANAGEMENT,
+    )
+from maasserver.json import MAASJSONEncoder
+from maasserver.models import (
+    DHCPLease,
+    MACAddress,
+    Node,
+    )
+from maasserver.models.timestampedmodel import now
+from maasserver.node_serializer import serialize_nodes
+from maasserver.testing.factory import factory
+from piston.emitters import JSONEmitter
+from piston.handler import typemapper
+import simplejson as json
+
+
+def make_inventory(num_nodes, num_tags=10):
+    """Create `num_nodes` nodes with one MAC, one lease and a few tags."""
+    nodegroup = factory.make_node_group(
+        status=NODEGROUP_STATUS.ACCEPTED,
+        management=NODEGROUPINTERFACE_MANAGEMENT.DHCP_AND_DNS)
+    tags = [factory.make_tag() for i in range(num_tags)]
+    # bulk_create() bypasses save(), which normally sets the timestamps.
+    timestamp = now()
+    Node.objects.bulk_create([
+        Node(
+            created=timestamp, updated=timestamp,
+            hostname=factory.make_name('node'), nodegroup=nodegroup,
+            routers=[factory.make_MAC()])
+        for i in range(num_nodes)])
+    node_ids = list(
+        Node.objects.filter(nodegroup=nodegroup).values_list('id', flat=True))
+    macs = [
+        '02:%02x:%02x:%02x:%02x:%02x' % tuple(
+            (index >> shift) & 0xff for shift in (32, 24, 16, 8, 0))
+        for index in range(num_nodes)]
+    MACAddress.objects.bulk_create([
+        MACAddress(
+            created=timestamp, updated=timestamp, node_id=node_id,
+            mac_address=mac)
+        for node_id, mac in zip(node_ids, macs)])
+    DHCPLease.objects.bulk_create([
+        DHCPLease(
+            nodegroup=nodegroup, mac=mac,
+            ip='10.%d.%d.%d' % (
+                (index >> 16) & 0xff, (index >> 8) & 0xff, index & 0xff))
+        for index, mac in enumerate(macs)])
+    NodeTags = Node.tags.through
+    NodeTags.objects.bulk_create([
+        NodeTags(node_id=node_id, tag_id=tags[index % num_tags].id)
+        for index, node_id in enumerate(node_ids)])
+
+
+def emit_nodes(nodes):
+    """Serialise `nodes` the way the API used to: through the emitter."""
+    nodes = nodes.prefetch_related('macaddress_set__node')
+    nodes = nodes.prefetch_related('tags')
+    nodes = nodes.select_related('nodegroup')
+    nodes = nodes.prefetch_related('nodegroup__dhcplease_set')
+    nodes = nodes.prefetch_related('nodegroup__nodegroupinterface_set')
+    emitter = JSONEmitter(
+        nodes, typemapper, NodeHandler(), DISPLAYED_NODE_FIELDS, False)
+    return emitter.render(RequestFactory().get('/'))
+
+
+def bulk_serialize_nodes(nodes):
+    """Serialise `nodes` with `maasserver.node_serializer`."""
+    return json.dumps(serialize_nodes(nodes), cls=MAASJSONEncoder)
+
+
+def measure(serialize, nodes):
+    """Serialise `nodes`.
+
+    :return: A tuple of the time it took, in seconds, and the number of
+        queries it issued.
+    """
+    reset_queries()
+    start = time.time()
+    serialize(nodes)
+    return time.time() - start, len(connection.queries)
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--nodes', dest='nodes', type='int', action='append',
+            help="Number of nodes to list.  May be given several times; "
+                 "defaults to 1000 and 10000."),
+    )
+    help = "Benchmark the serialisation of node lists for the API."
+
+    def handle(self, *args, **options):
+        sizes = options['nodes'] or [1000, 10000]
+        # Query counting relies on Django recording the queries.
+        settings.DEBUG = True
+        for num_nodes in sizes:
+            with transaction.commit_manually():
+                try:
+                    make_inventory(num_nodes)
+                    nodes = Node.objects.all().order_by('id')
+                    for label, serialize in [
+                            ("emitter", emit_nodes),
+                            ("bulk", bulk_serialize_nodes)]:
+                        duration, num_queries = measure(serialize, nodes)
+                        self.stdout.write(
+                            "%6d nodes, %-8s %8.2f s, %5d queries\n"
+                            % (num_nodes, label, duration, num_queries))
+                finally:
+                    transaction.rollback()
@@ -37,6 +37,7 @@ from maasserver.api_utils import (
     extract_oauth_key,
     get_mandatory_param,
     )
+from maasserver.collection_version import is_not_modified
 from maasserver.enum import (
     NODE_STATUS,
     NODE_STATUS_CHOICES_DICT,
@@ -376,9 +377,13 @@ class CommissioningScriptsHandler(MetadataViewHandler):
 
     def read(self, request, version, mac=None):
         check_version(version)
-        return HttpResponse(
-            CommissioningScript.objects.get_archive(),
-            mimetype='application/tar')
+        etag, archive = CommissioningScript.objects.get_cached_archive()
+        if is_not_modified(request, etag):
+            response = HttpResponse(status=httplib.NOT_MODIFIED)
+        else:
+            response = HttpResponse(archive, mimetype='application/tar')
+        response['ETag'] = etag
+        return response
 
 
 class EnlistMetaDataHandler(OperationsHandler):
@@ -32,7 +32,7 @@ from metadataserver.commissioning.snippets import (
     get_snippet_context,
     get_userdata_template_dir,
     )
-import tempita
+from provisioningserver.template_cache import template_cache
 
 
 ENCODING = 'utf-8'
@@ -58,9 +58,9 @@ def generate_user_data(nodegroup=None):
         commissioning_dir, 'user_data.template')
     config_template_file = os.path.join(
         commissioning_dir, 'user_data_config.template')
-    userdata_template = tempita.Template.from_filename(
+    userdata_template = template_cache.get(
         userdata_template_file, encoding=ENCODING)
-    config_template = tempita.Template.from_filename(
+    config_template = template_cache.get(
         config_template_file, encoding=ENCODING)
     # The preseed context is a dict containing various configs that the
     # templates can use.
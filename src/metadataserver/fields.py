@@ -13,7 +13,11 @@ str = None
 
 __metaclass__ = type
 __all__ = [
+    'Bin',
     'BinaryField',
+    'CompressedBinaryField',
+    'decode_binary_value',
+    'ZlibBin',
     ]
 
 from base64 import (
@@ -21,6 +25,8 @@ from base64 import (
     b64encode,
     )
 
+import zlib
+
 from django.db import connection
 from django.db.models import (
     Field,
@@ -65,11 +71,50 @@ class Bin(bytes):
         return b64encode(self)
 
 
+class ZlibBin(bytes):
+    """Binary data that is still zlib-compressed.
+
+    This is not a `Bin`: storing it in a `BinaryField` would store the
+    compressed data as if it were the actual data.  See
+    `decode_binary_value`.
+    """
+
+
+# Marks a compressed value in a BinaryField's database column.  It cannot
+# occur in base64, so uncompressed values stored before compression was
+# introduced are told apart.
+ZLIB_PREFIX = 'zlib:'
+
+
+def decode_binary_value(value, decompress=True):
+    """Convert a `BinaryField`'s database value to binary data.
+
+    Use this on values that are loaded without going through the model,
+    such as those from `values_list`.
+
+    :param value: The database value: base64-encoded text, with a
+        `ZLIB_PREFIX` if it is compressed.
+    :param decompress: Whether to decompress compressed data.  If False,
+        compressed data is returned as it is, wrapped in a `ZlibBin`.
+    :return: A `Bin`, or a `ZlibBin`.
+    """
+    if value.startswith(ZLIB_PREFIX):
+        data = b64decode(value[len(ZLIB_PREFIX):])
+        if decompress:
+            return Bin(zlib.decompress(data))
+        else:
+            return ZlibBin(data)
+    else:
+        return Bin(b64decode(value))
+
+
 # The BinaryField does not introduce any new parameters compared to its
 # parent's constructor so South will handle it just fine.
 # See http://south.aeracode.org/docs/customfields.html#extending-introspection
 # for details.
 add_introspection_rules([], ["^metadataserver\.fields\.BinaryField"])
+add_introspection_rules(
+    [], ["^metadataserver\.fields\.CompressedBinaryField"])
 
 
 class BinaryField(Field):
@@ -93,7 +138,7 @@ class BinaryField(Field):
         """Django overridable: convert database value to python-side value."""
         if isinstance(value, unicode):
             # Encoded binary data from the database.  Convert.
-            return Bin(b64decode(value))
+            return decode_binary_value(value)
         elif value is None or isinstance(value, Bin):
             # Already in python-side form.
             return value
@@ -151,3 +196,21 @@ class BinaryField(Field):
         """Override Django's crack-smoking ``Field.get_default``."""
         default = self._get_default()
         return None if default is None else Bin(default)
+
+
+class CompressedBinaryField(BinaryField):
+    """A `BinaryField` whose data is stored compressed with zlib.
+
+    Values are compressed only when that makes them smaller, and values
+    stored uncompressed, e.g. before a field became a
+    `CompressedBinaryField`, can still be read.
+    """
+
+    def get_db_prep_value(self, value, connection=None, prepared=False):
+        """Django overridable: convert python-side value to database value."""
+        if isinstance(value, Bin):
+            compressed = zlib.compress(value)
+            if len(compressed) < len(value):
+                return ZLIB_PREFIX + b64encode(compressed)
+        return super(CompressedBinaryField, self).get_db_prep_value(
+            value, connection=connection, prepared=prepared)
@@ -24,6 +24,7 @@ __all__ = [
     ]
 
 from functools import partial
+import hashlib
 from inspect import getsource
 from io import BytesIO
 from itertools import chain
@@ -40,7 +41,17 @@ from django.db.models import (
     Manager,
     Model,
     )
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    )
+from django.dispatch import receiver
 from lxml import etree
+from maasserver.collection_version import (
+    bump_collection_version,
+    COLLECTION,
+    get_collection_version,
+    )
 from maasserver.fields import MAC
 from maasserver.models.tag import Tag
 from metadataserver import DefaultMeta
@@ -399,6 +410,12 @@ def add_script_to_archive(tarball, name, content, mtime):
 class CommissioningScriptManager(Manager):
     """Utility for the collection of `CommissioningScript`s."""
 
+    def __init__(self):
+        super(CommissioningScriptManager, self).__init__()
+        # This process's copy of the archive: a tuple of the version of
+        # the scripts it was built from, its ETag, and its bytes.
+        self._archive_cache = None
+
     def _iter_builtin_scripts(self):
         for script in BUILTIN_COMMISSIONING_SCRIPTS.itervalues():
             yield script['name'], script['content']
@@ -412,19 +429,51 @@ class CommissioningScriptManager(Manager):
             self._iter_builtin_scripts(),
             self._iter_user_scripts())
 
-    def get_archive(self):
-        """Produce a tar archive of all commissioning scripts.
-
-        Each of the scripts will be in the `ARCHIVE_PREFIX` directory.
-        """
+    def _make_archive(self, scripts):
         binary = BytesIO()
-        scripts = sorted(self._iter_scripts())
         with tarfile.open(mode='w', fileobj=binary) as tarball:
             add_script = partial(add_script_to_archive, tarball, mtime=now())
             for name, content in scripts:
                 add_script(name, content)
         return binary.getvalue()
 
+    def get_archive(self):
+        """Produce a tar archive of all commissioning scripts.
+
+        Each of the scripts will be in the `ARCHIVE_PREFIX` directory.
+        """
+        return self._make_archive(sorted(self._iter_scripts()))
+
+    def get_cached_archive(self):
+        """Return the archive of all commissioning scripts, and its ETag.
+
+        The archive is built once, and then reused until a script is
+        saved or deleted.  The ETag is a hash of the scripts' names and
+        contents, so all processes agree on it even though each builds
+        its own archive.
+
+        :return: A tuple of the ETag, quoted, and the archive's bytes.
+        """
+        # Read the version first: if a script changes while the archive
+        # is being built, the next call will build it again.
+        version = get_collection_version(COLLECTION.COMMISSIONING_SCRIPTS)
+        cached = self._archive_cache
+        if cached is None or cached[0] != version:
+            scripts = sorted(self._iter_scripts())
+            digest = hashlib.sha1()
+            for name, content in scripts:
+                digest.update(name.encode('utf-8'))
+                digest.update(b'\0%d\0' % len(content))
+                digest.update(content)
+            etag = '"%s"' % digest.hexdigest()
+            cached = version, etag, self._make_archive(scripts)
+            self._archive_cache = cached
+        return cached[1:]
+
+    def clear_cache(self):
+        """Forget this process's copy of the archive."""
+        self._archive_cache = None
+
 
 class CommissioningScript(Model):
     """User-provided commissioning script.
@@ -442,6 +491,13 @@ class CommissioningScript(Model):
     content = BinaryField(null=False)
 
 
+@receiver(post_save, sender=CommissioningScript)
+@receiver(post_delete, sender=CommissioningScript)
+def commissioning_scripts_changed(sender, instance, **kwargs):
+    """Make the archive of commissioning scripts be built again."""
+    bump_collection_version(COLLECTION.COMMISSIONING_SCRIPTS)
+
+
 def inject_result(node, name, output, exit_status=0):
     """Inject a `name` result and trigger related hooks, if any.
 
@@ -27,7 +27,7 @@ from django.shortcuts import get_object_or_404
 from maasserver.models.cleansave import CleanSave
 from maasserver.models.timestampedmodel import TimestampedModel
 from metadataserver import DefaultMeta
-from metadataserver.fields import BinaryField
+from metadataserver.fields import CompressedBinaryField
 
 
 class NodeCommissionResultManager(Manager):
@@ -82,7 +82,8 @@ class NodeCommissionResult(CleanSave, TimestampedModel):
         is the status of this execution.  This can be "OK", "FAILED" or
         "WORKING" for progress reports.
     :ivar name: A unique name to use for the data being stored.
-    :ivar data: The file's actual data, unicode only.
+    :ivar data: The file's actual data, unicode only.  It is stored
+        compressed.
     """
 
     class Meta(DefaultMeta):
@@ -94,6 +95,6 @@ class NodeCommissionResult(CleanSave, TimestampedModel):
         'maasserver.Node', null=False, editable=False, unique=False)
     script_result = IntegerField(editable=False)
     name = CharField(max_length=255, unique=False, editable=False)
-    data = BinaryField(
+    data = CompressedBinaryField(
         max_length=1024 * 1024, editable=True, blank=True, default=b'',
         null=False)
@@ -43,6 +43,24 @@ class NodeUserDataManager(Manager):
         else:
             self._set(node, data)
 
+    def bulk_set_user_data(self, nodes, data):
+        """Set the same user data for all the given nodes.
+
+        This takes a fixed number of queries, regardless of the number of
+        nodes.  If `data` is None, remove user data for the nodes.
+        """
+        if data is None:
+            self.filter(node__in=nodes).delete()
+            return
+        wrapped_data = Bin(data)
+        node_ids = set(node.id for node in nodes)
+        existing_entries = self.filter(node_id__in=node_ids)
+        existing_ids = set(existing_entries.values_list('node_id', flat=True))
+        existing_entries.update(data=wrapped_data)
+        self.bulk_create([
+            self.model(node_id=node_id, data=wrapped_data)
+            for node_id in node_ids.difference(existing_ids)])
+
     def get_user_data(self, node):
         """Retrieve user data for the given node."""
         return self.get(node=node).data
@@ -69,6 +69,7 @@ from mock import (
 from testtools.content import text_content
 from testtools.matchers import (
     DocTestMatches,
+    MatchesRegex,
     MatchesStructure,
     )
 
@@ -143,6 +144,60 @@ class TestCommissioningScriptManager(MAASServerTestCase):
         self.assertLessEqual(timestamp, end_time)
 
 
+class TestCommissioningScriptArchiveCache(MAASServerTestCase):
+
+    def test_get_cached_archive_returns_archive_and_etag(self):
+        script = factory.make_commissioning_script()
+        path = os.path.join(ARCHIVE_PREFIX, script.name)
+        etag, archive = CommissioningScript.objects.get_cached_archive()
+        self.assertEqual(
+            script.content, open_tarfile(archive).extractfile(path).read())
+        self.assertThat(etag, MatchesRegex('^"[0-9a-f]{40}"$'))
+
+    def test_get_cached_archive_builds_archive_once(self):
+        factory.make_commissioning_script()
+        first = CommissioningScript.objects.get_cached_archive()
+        num_queries, second = self.getNumQueries(
+            CommissioningScript.objects.get_cached_archive)
+        self.assertEqual((0, first), (num_queries, second))
+
+    def test_etag_does_not_depend_on_archive_timestamps(self):
+        factory.make_commissioning_script()
+        etag, _ = CommissioningScript.objects.get_cached_archive()
+        CommissioningScript.objects.clear_cache()
+        self.patch(cs_module, 'now').return_value = time.time() + 100
+        self.assertEqual(
+            etag, CommissioningScript.objects.get_cached_archive()[0])
+
+    def test_saving_script_invalidates_archive(self):
+        script = factory.make_commissioning_script()
+        etag, _ = CommissioningScript.objects.get_cached_archive()
+        script.content = factory.getRandomString().encode('ascii')
+        script.save()
+        new_etag, archive = CommissioningScript.objects.get_cached_archive()
+        path = os.path.join(ARCHIVE_PREFIX, script.name)
+        self.assertNotEqual(etag, new_etag)
+        self.assertEqual(
+            script.content, open_tarfile(archive).extractfile(path).read())
+
+    def test_adding_script_invalidates_archive(self):
+        CommissioningScript.objects.get_cached_archive()
+        script = factory.make_commissioning_script()
+        _, archive = CommissioningScript.objects.get_cached_archive()
+        self.assertIn(
+            os.path.join(ARCHIVE_PREFIX, script.name),
+            open_tarfile(archive).getnames())
+
+    def test_deleting_script_invalidates_archive(self):
+        script = factory.make_commissioning_script()
+        CommissioningScript.objects.get_cached_archive()
+        script.delete()
+        _, archive = CommissioningScript.objects.get_cached_archive()
+        self.assertNotIn(
+            os.path.join(ARCHIVE_PREFIX, script.name),
+            open_tarfile(archive).getnames())
+
+
 class TestCommissioningScript(MAASServerTestCase):
 
     def test_scripts_may_be_binary(self):
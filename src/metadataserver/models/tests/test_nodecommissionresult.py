@@ -22,6 +22,7 @@ from maasserver.testing.factory import factory
 from maastesting.djangotestcase import DjangoTestCase
 from metadataserver.fields import Bin
 from metadataserver.models import NodeCommissionResult
+from testtools.matchers import StartsWith
 
 
 class TestNodeCommissionResult(DjangoTestCase):
@@ -93,6 +94,19 @@ class TestNodeCommissionResultManager(DjangoTestCase):
         # store_data() returns the model object.
         self.assertEqual(result, result_in_db)
 
+    def test_store_data_compresses_data(self):
+        node = factory.make_node()
+        data = b"<list>%s</list>" % (b"<node />" * 1000)
+        NodeCommissionResult.objects.store_data(
+            node, name=factory.make_name('result'), script_result=0,
+            data=Bin(data))
+        [db_value] = NodeCommissionResult.objects.filter(
+            node=node).values_list('data', flat=True)
+        self.assertThat(db_value, StartsWith('zlib:'))
+        self.assertLess(len(db_value), len(data))
+        self.assertEqual(
+            data, NodeCommissionResult.objects.get(node=node).data)
+
     def test_store_data_updates_existing(self):
         node = factory.make_node()
         name = factory.getRandomString(255)
@@ -52,6 +52,35 @@ class TestNodeUserDataManager(DjangoTestCase):
         NodeUserData.objects.set_user_data(node, None)
         self.assertItemsEqual([], NodeUserData.objects.filter(node=node))
 
+    def test_bulk_set_user_data_creates_and_overwrites_user_data(self):
+        nodes = [factory.make_node() for counter in range(3)]
+        NodeUserData.objects.set_user_data(nodes[0], b'old data')
+        NodeUserData.objects.bulk_set_user_data(nodes, b'new data')
+        self.assertEqual(
+            [b'new data'] * 3,
+            [NodeUserData.objects.get_user_data(node) for node in nodes])
+
+    def test_bulk_set_user_data_leaves_data_for_other_nodes_alone(self):
+        node = factory.make_node()
+        NodeUserData.objects.set_user_data(node, b'intact')
+        NodeUserData.objects.bulk_set_user_data(
+            [factory.make_node()], b'unrelated')
+        self.assertEqual(b'intact', NodeUserData.objects.get(node=node).data)
+
+    def test_bulk_set_user_data_to_None_removes_user_data(self):
+        nodes = [factory.make_node() for counter in range(2)]
+        NodeUserData.objects.bulk_set_user_data(nodes, b'original')
+        NodeUserData.objects.bulk_set_user_data(nodes, None)
+        self.assertItemsEqual(
+            [], NodeUserData.objects.filter(node__in=nodes))
+
+    def test_bulk_set_user_data_uses_constant_number_of_queries(self):
+        nodes = [factory.make_node() for counter in range(5)]
+        NodeUserData.objects.set_user_data(nodes[0], b'old data')
+        num_queries, _ = self.getNumQueries(
+            NodeUserData.objects.bulk_set_user_data, nodes, b'data')
+        self.assertEqual(3, num_queries)
+
     def test_get_user_data_retrieves_data(self):
         node = factory.make_node()
         data = b'splat'
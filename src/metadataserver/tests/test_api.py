@@ -56,6 +56,7 @@ from metadataserver.api import (
     UnknownMetadataVersion,
     )
 from metadataserver.models import (
+    CommissioningScript,
     NodeCommissionResult,
     NodeKey,
     NodeUserData,
@@ -401,6 +402,38 @@ class TestCurtinMetadataUserData(DjangoTestCase):
 
 class TestCommissioningAPI(DjangoTestCase):
 
+    def setUp(self):
+        super(TestCommissioningAPI, self).setUp()
+        self.addCleanup(CommissioningScript.objects.clear_cache)
+
+    def test_commissioning_scripts_sends_etag(self):
+        factory.make_commissioning_script()
+        etag, _ = CommissioningScript.objects.get_cached_archive()
+        response = make_node_client().get(
+            reverse('commissioning-scripts', args=['latest']))
+        self.assertEqual(
+            (httplib.OK, etag), (response.status_code, response['ETag']))
+
+    def test_commissioning_scripts_not_modified(self):
+        factory.make_commissioning_script()
+        etag, _ = CommissioningScript.objects.get_cached_archive()
+        response = make_node_client().get(
+            reverse('commissioning-scripts', args=['latest']),
+            HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(
+            (httplib.NOT_MODIFIED, b''),
+            (response.status_code, response.content))
+
+    def test_commissioning_scripts_modified_after_script_change(self):
+        script = factory.make_commissioning_script()
+        etag, _ = CommissioningScript.objects.get_cached_archive()
+        script.delete()
+        response = make_node_client().get(
+            reverse('commissioning-scripts', args=['latest']),
+            HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(httplib.OK, response.status_code)
+        self.assertNotEqual(etag, response['ETag'])
+
     def test_commissioning_scripts(self):
         script = factory.make_commissioning_script()
         response = make_node_client().get(
@@ -15,6 +15,7 @@ __metaclass__ = type
 __all__ = []
 
 from base64 import b64encode
+import zlib
 
 from maasserver.testing.testcase import MAASServerTestCase
 from maastesting.djangotestcase import TestModelMixin
@@ -22,6 +23,9 @@ from maastesting.factory import factory
 from metadataserver.fields import (
     Bin,
     BinaryField,
+    CompressedBinaryField,
+    decode_binary_value,
+    ZlibBin,
     )
 from metadataserver.tests.models import BinaryFieldModel
 
@@ -111,3 +115,56 @@ class TestBinaryField(TestModelMixin, MAASServerTestCase):
         field = BinaryField(null=True)
         self.patch(field, "default", b"wotcha")
         self.assertEqual(Bin(b"wotcha"), field.get_default())
+
+
+class TestCompressedBinaryField(MAASServerTestCase):
+    """Test CompressedBinaryField."""
+
+    def test_compresses_compressible_data(self):
+        data = b"<lshw/>" * 100
+        db_value = CompressedBinaryField().get_db_prep_value(Bin(data))
+        self.assertEqual(
+            'zlib:' + b64encode(zlib.compress(data)), db_value)
+
+    def test_does_not_compress_incompressible_data(self):
+        data = b"\x01\x02\xff"
+        db_value = CompressedBinaryField().get_db_prep_value(Bin(data))
+        self.assertEqual(b64encode(data), db_value)
+
+    def test_round_trips_data(self):
+        field = CompressedBinaryField()
+        data = b"<lshw/>" * 100
+        self.assertEqual(
+            data, field.to_python(field.get_db_prep_value(Bin(data))))
+
+    def test_stores_None(self):
+        self.assertIsNone(CompressedBinaryField().get_db_prep_value(None))
+
+
+class TestDecodeBinaryValue(MAASServerTestCase):
+    """Test decode_binary_value."""
+
+    def test_decodes_uncompressed_value(self):
+        data = factory.getRandomBytes()
+        decoded = decode_binary_value(b64encode(data).decode('ascii'))
+        self.assertEqual(data, decoded)
+        self.assertIsInstance(decoded, Bin)
+
+    def test_decompresses_compressed_value(self):
+        data = factory.getRandomBytes()
+        value = 'zlib:' + b64encode(zlib.compress(data))
+        self.assertEqual(data, decode_binary_value(value))
+
+    def test_can_leave_value_compressed(self):
+        compressed = zlib.compress(factory.getRandomBytes())
+        decoded = decode_binary_value(
+            'zlib:' + b64encode(compressed), decompress=False)
+        self.assertEqual(compressed, decoded)
+        self.assertIsInstance(decoded, ZlibBin)
+
+    def test_leaves_uncompressed_value_as_Bin(self):
+        data = factory.getRandomBytes()
+        decoded = decode_binary_value(
+            b64encode(data).decode('ascii'), decompress=False)
+        self.assertEqual(data, decoded)
+        self.assertNotIsInstance(decoded, ZlibBin)
@@ -4,7 +4,8 @@
 """Dealing with boot images.
 
 Most of the lower-level logic is in the `tftppath` module, because it must
-correspond closely to the structure of the TFTP filesystem hierarchy.
+correspond closely to the structure of the TFTP filesystem hierarchy.  The
+images are listed from the index kept by the `image_index` module.
 """
 
 from __future__ import (
@@ -28,13 +29,13 @@ from apiclient.maas_client import (
     MAASDispatcher,
     MAASOAuth,
     )
+from provisioningserver import image_index
 from provisioningserver.auth import get_recorded_api_credentials
 from provisioningserver.cluster_config import (
     get_cluster_uuid,
     get_maas_url,
     )
 from provisioningserver.config import Config
-from provisioningserver.pxe import tftppath
 
 
 logger = getLogger(__name__)
@@ -68,7 +69,6 @@ def report_to_server():
     if not all([maas_url, api_credentials]):
         return
 
-    images = tftppath.list_boot_images(
-        Config.load_from_cache()['tftp']['root'])
+    images = image_index.get_boot_images(Config.get_snapshot().tftp_root)
 
     submit(maas_url, api_credentials, images)
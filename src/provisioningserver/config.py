@@ -31,6 +31,13 @@ An alternative to `Config.load_from_cache()` is `Config.load()`, which loads
 and validates a configuration file while bypassing the cache.  See `Config` for
 other useful functions.
 
+Code that reads the configuration for every request, such as the TFTP
+server's, uses `Config.get_snapshot()` instead.  It returns a
+`ConfigSnapshot`, which is shared rather than copied, and exposes the values
+needed per request as plain attributes.  A new snapshot is taken when the
+configuration file changes, or after `Config.reload_snapshots()`, which the
+cluster's daemon calls on SIGHUP.
+
 `Config.DEFAULT_FILENAME` is a class property, so does not need to be
 referenced via an instance of `Config`. It refers to the
 ``MAAS_PROVISIONING_SETTINGS`` environment variable in the first instance, but
@@ -55,6 +62,7 @@ str = None
 __metaclass__ = type
 __all__ = [
     "Config",
+    "ConfigSnapshot",
     ]
 
 from copy import deepcopy
@@ -67,11 +75,13 @@ from threading import RLock
 from formencode import Schema
 from formencode.declarative import DeclarativeMeta
 from formencode.validators import (
+    Bool,
     Int,
     RequireIfPresent,
     Set,
     String,
     )
+from provisioningserver.template_cache import get_stamp
 from provisioningserver.utils import atomic_write
 import yaml
 
@@ -109,6 +119,17 @@ class ConfigTFTP(Schema):
     root = String(if_missing="/var/lib/maas/tftp")
     port = Int(min=1, max=65535, if_missing=69)
     generator = String(if_missing=b"http://localhost/MAAS/api/1.0/pxeconfig/")
+    max_block_size = Int(min=8, max=65464, if_missing=1468)
+    max_window_size = Int(min=1, max=65535, if_missing=16)
+
+
+class ConfigHTTPBoot(Schema):
+    """Configuration validator for the HTTP boot service."""
+
+    if_key_missing = None
+
+    enabled = Bool(if_missing=False)
+    port = Int(min=1, max=65535, if_missing=5248)
 
 
 class ConfigBootEphemeral(Schema):
@@ -136,6 +157,38 @@ class ConfigWindows(Schema):
     remote_path = String(if_missing="\\\\192.168.100.1\\reminst")
 
 
+class ConfigSnapshot:
+    """A version of a configuration, parsed once and shared.
+
+    The snapshot must be treated as read-only: every caller of
+    `Config.get_snapshot` gets the same one.  Use `Config.load_from_cache`
+    for a copy that can be modified.
+
+    :ivar config: The configuration, as a dict.
+    :ivar version: The number of this version of the configuration file in
+        this process.  It goes up by one each time the file is reloaded.
+    :ivar tftp_root: The root directory of the TFTP server.
+    :ivar windows_remote_path: The share that Windows installs from.
+    :ivar ephemeral_images_directory: Where the ephemeral images are.
+    """
+
+    def __init__(self, config, version=1, stamp=None, generation=0):
+        """
+        :param stamp: The `get_stamp` of the file the configuration was read
+            from, when it was read.
+        :param generation: The value of `Config._snapshot_generation` when
+            the file was read.
+        """
+        self.config = config
+        self.version = version
+        self.stamp = stamp
+        self.generation = generation
+        self.tftp_root = config["tftp"]["root"]
+        self.windows_remote_path = config["windows"]["remote_path"]
+        self.ephemeral_images_directory = (
+            config["boot"]["ephemeral"]["images_directory"])
+
+
 class ConfigMeta(DeclarativeMeta):
     """Metaclass for the root configuration schema."""
 
@@ -176,6 +229,7 @@ class Config(Schema):
     oops = ConfigOops
     broker = ConfigBroker
     tftp = ConfigTFTP
+    http_boot = ConfigHTTPBoot
     boot = ConfigBoot
     windows = ConfigWindows
 
@@ -242,6 +296,56 @@ class Config(Schema):
                     cls._cache[filename] = cls.parse(stream)
             return deepcopy(cls._cache[filename])
 
+    _snapshots = {}
+    # Goes up each time all configuration files must be read again.
+    _snapshot_generation = 0
+
+    @classmethod
+    def get_snapshot(cls, filename=None):
+        """Return the latest `ConfigSnapshot` of a configuration file.
+
+        The file is parsed only if it has changed since the last snapshot of
+        it was taken, or if `reload_snapshots` was called since.  Replacing
+        a snapshot is atomic: callers get either the old or the new one.
+
+        This is thread-safe, so is okay to use from the TFTP server's
+        reactor and from Celery workers alike.
+        """
+        if filename is None:
+            filename = cls.DEFAULT_FILENAME
+        filename = os.path.abspath(filename)
+        stamp = get_stamp(filename)
+        snapshot = cls._snapshots.get(filename)
+        if cls._is_current(snapshot, stamp):
+            return snapshot
+        with cls._cache_lock:
+            snapshot = cls._snapshots.get(filename)
+            if not cls._is_current(snapshot, stamp):
+                generation = Config._snapshot_generation
+                with open(filename, "rb") as stream:
+                    config = cls.parse(stream)
+                version = 1 if snapshot is None else snapshot.version + 1
+                snapshot = ConfigSnapshot(config, version, stamp, generation)
+                cls._snapshots[filename] = snapshot
+            return snapshot
+
+    @classmethod
+    def _is_current(cls, snapshot, stamp):
+        return (
+            snapshot is not None and
+            snapshot.stamp == stamp and
+            snapshot.generation == Config._snapshot_generation)
+
+    @staticmethod
+    def reload_snapshots():
+        """Have `get_snapshot` read all configuration files again.
+
+        This only bumps a counter, so it is safe to call from a signal
+        handler.  The files are read when their snapshots are next asked
+        for.
+        """
+        Config._snapshot_generation += 1
+
     @classmethod
     def field(target, *steps):
         """Obtain a field by following `steps`."""
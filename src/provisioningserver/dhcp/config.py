@@ -21,8 +21,8 @@ __all__ = [
 from platform import linux_distribution
 
 from provisioningserver.pxe.tftppath import compose_bootloader_path
+from provisioningserver.template_cache import template_cache
 from provisioningserver.utils import locate_config
-import tempita
 
 # Location of DHCP templates, relative to the configuration directory.
 TEMPLATES_DIR = "templates/dhcp"
@@ -55,8 +55,7 @@ def get_config(**params):
     params['platform_codename'] = linux_distribution()[2]
     params.setdefault("ntp_server")
     try:
-        template = tempita.Template.from_filename(
-            template_file, encoding="UTF-8")
+        template = template_cache.get(template_file, encoding="UTF-8")
         return template.substitute(params)
     except NameError as error:
         raise DHCPConfigError(*error.args)
@@ -37,6 +37,7 @@ import re
 
 from celery.conf import conf
 from provisioningserver.dns.utils import generated_hostname
+from provisioningserver.template_cache import template_cache
 from provisioningserver.utils import (
     atomic_write,
     call_and_check,
@@ -44,7 +45,6 @@ from provisioningserver.utils import (
     incremental_write,
     locate_config,
     )
-import tempita
 
 
 MAAS_NAMED_CONF_NAME = 'named.conf.maas'
@@ -167,7 +167,7 @@ def set_up_options_conf(overwrite=True, **kwargs):
     template_path = os.path.join(
         locate_config(TEMPLATES_DIR),
         "named.conf.options.inside.maas.template")
-    template = tempita.Template.from_filename(template_path)
+    template = template_cache.get(template_path)
 
     # Make sure "upstream_dns" is set at least to None.  It's a
     # special piece of config that can't be obtained in celery
@@ -210,8 +210,7 @@ class DNSConfigBase:
         return conf.DNS_CONFIG_DIR
 
     def get_template(self):
-        with open(self.template_path, "r") as f:
-            return tempita.Template(f.read(), name=self.template_path)
+        return template_cache.get(self.template_path)
 
     def render_template(self, template, **kwargs):
         """Substitute supplied kwargs into the supplied Tempita template."""
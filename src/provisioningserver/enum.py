@@ -16,8 +16,11 @@ __all__ = [
     'ARP_HTYPE',
     'IPMI_DRIVER',
     'IPMI_DRIVER_CHOICES',
+    'POWER_STATE',
+    'POWER_STATE_CHOICES',
     'POWER_TYPE',
     'POWER_TYPE_CHOICES',
+    'QUERYABLE_POWER_TYPES',
     ]
 
 
@@ -65,6 +68,34 @@ POWER_TYPE_CHOICES = (
     )
 
 
+# Power types whose templates can report a node's current power state,
+# when run with power_change='query'.
+QUERYABLE_POWER_TYPES = frozenset([
+    POWER_TYPE.VIRSH,
+    POWER_TYPE.CDU,
+    POWER_TYPE.IPMI,
+    POWER_TYPE.MOONSHOT,
+    ])
+
+
+class POWER_STATE:
+    """A node's power state, as last reported by its cluster."""
+
+    # The state has not been queried, or could not be determined.
+    UNKNOWN = 'unknown'
+
+    ON = 'on'
+
+    OFF = 'off'
+
+
+POWER_STATE_CHOICES = (
+    (POWER_STATE.UNKNOWN, "Unknown"),
+    (POWER_STATE.ON, "On"),
+    (POWER_STATE.OFF, "Off"),
+    )
+
+
 class IPMI_DRIVER:
     DEFAULT = ''
     LAN = 'LAN'
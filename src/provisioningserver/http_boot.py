@@ -0,0 +1,121 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""HTTP boot service for the cluster controller.
+
+TFTP sends one small block per round trip, so large initrds take a long
+time to reach a node, and longer still when many nodes boot at once.  With
+the HTTP boot service enabled, the TFTP server hands PXELINUX a
+configuration that chainloads iPXE (see the ``chainload`` PXE templates),
+and iPXE fetches an iPXE script from this service, followed by the kernel
+and initrd it names.
+
+The service serves the TFTP tree as static files, with support for range
+requests, and generates iPXE scripts at::
+
+    /ipxe.cfg/<arch>/<subarch>/<mac>
+
+with the parameters it obtains from the region, just as `TFTPBackend`
+generates PXE configurations.
+"""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = [
+    "get_http_boot_url",
+    "make_http_boot_site",
+    ]
+
+import httplib
+import re
+
+from provisioningserver.cluster_config import get_cluster_uuid
+from twisted.python import log
+from twisted.web.resource import (
+    ForbiddenResource,
+    NoResource,
+    Resource,
+    )
+from twisted.web.server import (
+    NOT_DONE_YET,
+    Site,
+    )
+from twisted.web.static import File
+
+
+def get_http_boot_url(host, port):
+    """Return the URL of the HTTP boot service at `host` and `port`."""
+    return "http://%s:%d/" % (host, port)
+
+
+class BootFilesResource(File):
+    """The TFTP tree, served read-only and without directory listings."""
+
+    def directoryListing(self):
+        return ForbiddenResource()
+
+
+class IPXEConfigResource(Resource):
+    """Generates iPXE scripts, as `TFTPBackend` generates PXE configs."""
+
+    isLeaf = True
+
+    def __init__(self, backend):
+        """
+        :param backend: The `TFTPBackend` that obtains the kernel parameters
+            from the region and renders the scripts.
+        """
+        Resource.__init__(self)
+        self.backend = backend
+        self.re_config_path = re.compile(
+            r'^(?P<arch>\w+)/(?P<subarch>\w+)/(?P<mac>%s)$'
+            % backend.re_mac_address.pattern)
+
+    def render_GET(self, request):
+        path = b"/".join(request.postpath).lower()
+        match = self.re_config_path.match(path)
+        if match is None:
+            return NoResource().render(request)
+        params = match.groupdict()
+        host = request.getHost()
+        params["local"] = host.host
+        params["remote"] = request.getClientIP()
+        params["cluster_uuid"] = get_cluster_uuid()
+
+        def render_script(kernel_params):
+            return self.backend.render_pxe_config(
+                kernel_params=kernel_params, prefix="ipxe",
+                boot_url=get_http_boot_url(host.host, host.port), **params)
+
+        def write_script(script):
+            request.setHeader(b"Content-Type", b"text/plain; charset=utf-8")
+            request.write(script.encode("utf-8"))
+            request.finish()
+
+        def report_failure(failure):
+            log.err(failure, "Failed to generate iPXE script for %s" % path)
+            request.setResponseCode(httplib.INTERNAL_SERVER_ERROR)
+            request.finish()
+
+        d = self.backend.get_kernel_params(params)
+        d.addCallback(render_script)
+        d.addCallbacks(write_script, report_failure)
+        return NOT_DONE_YET
+
+
+def make_http_boot_site(root, backend):
+    """Create the HTTP boot service's site.
+
+    :param root: The root directory of the TFTP server.
+    :param backend: The `TFTPBackend` to generate iPXE scripts with.
+    """
+    boot_files = BootFilesResource(root)
+    boot_files.putChild(b"ipxe.cfg", IPXEConfigResource(backend))
+    return Site(boot_files)
@@ -0,0 +1,261 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Indexes of the images installed on the cluster.
+
+Reporting boot images to the region used to walk the whole TFTP tree, and
+composing the kernel options for every commissioning node listed the
+ephemeral images directory and read an info file.  Instead, the code that
+installs images records them in a small JSON index file, kept in the
+directory holding the images: one for the TFTP root, and one for the
+ephemeral images directory.
+
+Each process keeps the indexes it has read in memory, and revalidates
+them with a `stat` of the index file.  If an index file does not exist
+yet, e.g. for images installed before there were indexes, the directory
+is scanned once to build it.
+"""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = [
+    'add_boot_image',
+    'add_ephemeral',
+    'get_boot_images',
+    'get_ephemeral_name',
+    'remove_ephemeral',
+    ]
+
+import json
+import os
+
+from lockfile import (
+    FileLock,
+    LockFailed,
+    LockTimeout,
+    )
+from provisioningserver.pxe import tftppath
+from provisioningserver.template_cache import get_stamp
+from provisioningserver.utils import (
+    atomic_write,
+    parse_key_value_file,
+    )
+
+# Name of the index file in an indexed directory.  The leading dot keeps
+# it out of the way of the code scanning for images.
+INDEX_FILENAME = '.maas-image-index.json'
+
+# How long reading an index waits for the lock to write it out, in
+# seconds.  The TFTP server reads the indexes, and must not hang on a
+# stale lock: it can use the scan without writing it.
+READ_LOCK_TIMEOUT = 1
+
+
+# Indexes read by this process, as (stamp, index) tuples keyed by the path
+# of their index file.
+_indexes = {}
+
+
+def clear_cache():
+    """Forget the indexes read by this process."""
+    _indexes.clear()
+
+
+def get_index_path(directory):
+    return os.path.join(directory, INDEX_FILENAME)
+
+
+def write_index(directory, index):
+    """Write `index` to the index file in `directory`."""
+    path = get_index_path(directory)
+    atomic_write(json.dumps(index, sort_keys=True), path, mode=0644)
+    _indexes[path] = get_stamp(path), index
+
+
+def load_index(directory, scan):
+    """Return the index of `directory`, without writing it.
+
+    :param scan: A function that builds the index by scanning `directory`,
+        for when there is no index file yet.
+    """
+    path = get_index_path(directory)
+    # Take the stamp before reading: if the index changes while it is
+    # being read, the next call will read it again.
+    stamp = get_stamp(path)
+    if stamp is None:
+        return scan(directory)
+    cached = _indexes.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    with open(path, 'rb') as index_file:
+        index = json.load(index_file)
+    _indexes[path] = stamp, index
+    return index
+
+
+def read_index(directory, scan):
+    """Return the index of `directory`.
+
+    :param scan: See `load_index`.  The index it returns is written out,
+        under the same lock as `update_index`, unless `directory` does not
+        exist, this process cannot write to it, or the lock is not free
+        within `READ_LOCK_TIMEOUT` seconds.
+    :return: The index, a JSON-compatible structure.  Do not modify it.
+    """
+    if get_stamp(get_index_path(directory)) is None:
+        if os.path.isdir(directory):
+            try:
+                return update_index(
+                    directory, scan, lambda index: None,
+                    timeout=READ_LOCK_TIMEOUT)
+            except (EnvironmentError, LockFailed, LockTimeout):
+                # The scan is still good, and whoever can write to the
+                # directory will write the index.
+                pass
+        return scan(directory)
+    return load_index(directory, scan)
+
+
+def update_index(directory, scan, update, timeout=None):
+    """Apply `update` to the index of `directory`, and write it out.
+
+    The index is locked meanwhile, so that concurrent updates are not lost.
+
+    :param scan: See `load_index`.
+    :param update: A function that takes a copy of the index, updates it
+        in place, and returns nothing.
+    :param timeout: How long to wait for the lock, in seconds, or None to
+        wait for as long as it takes.
+    :raise LockTimeout: If the lock is not free within `timeout` seconds.
+    :return: The updated index.  Do not modify it.
+    """
+    lock = FileLock(get_index_path(directory))
+    lock.acquire(timeout=timeout)
+    try:
+        # Round-trip through JSON for a deep copy of the shared index.
+        index = json.loads(json.dumps(load_index(directory, scan)))
+        update(index)
+        write_index(directory, index)
+    finally:
+        lock.release()
+    return index
+
+
+# The index of the TFTP root is a sorted list of the images' parameters,
+# as [arch, subarch, release, purpose] lists.
+BOOT_IMAGE_PARAMS = ('architecture', 'subarchitecture', 'release', 'purpose')
+
+
+def scan_boot_images(tftproot):
+    if not os.path.isdir(tftproot):
+        return []
+    return sorted(
+        [image[param] for param in BOOT_IMAGE_PARAMS]
+        for image in tftppath.list_boot_images(tftproot))
+
+
+def get_boot_images(tftproot):
+    """List the boot images installed in `tftproot`.
+
+    :return: A list of dicts, in the same form as from
+        `tftppath.list_boot_images`.
+    """
+    return [
+        dict(zip(BOOT_IMAGE_PARAMS, params))
+        for params in read_index(tftproot, scan_boot_images)]
+
+
+def add_boot_image(tftproot, arch, subarch, release, purpose):
+    """Record a boot image installed in `tftproot`."""
+    params = [arch, subarch, release, purpose]
+
+    def update(index):
+        if params not in index:
+            index.append(params)
+            index.sort()
+
+    update_index(tftproot, scan_boot_images, update)
+
+
+# The index of the ephemeral images directory maps each release/arch key,
+# e.g. "precise/i386", to a dict mapping the names of the image directories
+# for that release and architecture to their ephemeral image names.
+
+def make_ephemeral_key(release, arch):
+    return '%s/%s' % (release, arch)
+
+
+def list_dirs(path):
+    """List the names of the directories in `path`, if it is one."""
+    if not os.path.isdir(path):
+        return []
+    return [
+        name for name in os.listdir(path)
+        if not name.startswith('.') and os.path.isdir(
+            os.path.join(path, name))]
+
+
+def scan_ephemerals(images_directory):
+    index = {}
+    for release in list_dirs(images_directory):
+        releases_dir = os.path.join(images_directory, release, 'ephemeral')
+        for arch in list_dirs(releases_dir):
+            arch_dir = os.path.join(releases_dir, arch)
+            versions = {}
+            for version in list_dirs(arch_dir):
+                info = os.path.join(arch_dir, version, 'info')
+                if os.path.isfile(info):
+                    details = parse_key_value_file(info, separator="=")
+                    versions[version] = details.get('name')
+                else:
+                    versions[version] = None
+            index[make_ephemeral_key(release, arch)] = versions
+    return index
+
+
+def get_ephemeral_name(images_directory, release, arch):
+    """Return the name of the most recent ephemeral image.
+
+    Image directories are named after their release dates, so the most
+    recent one is the last of them by name.
+
+    :return: The image's name, or None if there is no image for `release`
+        and `arch`.
+    """
+    index = read_index(images_directory, scan_ephemerals)
+    versions = index.get(make_ephemeral_key(release, arch))
+    if not versions:
+        return None
+    return versions[max(versions)]
+
+
+def add_ephemeral(images_directory, release, arch, version, name):
+    """Record an ephemeral image installed in `images_directory`.
+
+    :param version: The name of the image's directory.
+    :param name: The image's name, as in its info file.
+    """
+    def update(index):
+        versions = index.setdefault(make_ephemeral_key(release, arch), {})
+        versions[version] = name
+
+    update_index(images_directory, scan_ephemerals, update)
+
+
+def remove_ephemeral(images_directory, release, arch, version):
+    """Record the removal of an ephemeral image from `images_directory`."""
+    def update(index):
+        key = make_ephemeral_key(release, arch)
+        versions = index.get(key, {})
+        versions.pop(version, None)
+        if len(versions) == 0:
+            index.pop(key, None)
+
+    update_index(images_directory, scan_ephemerals, update)
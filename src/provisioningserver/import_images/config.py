@@ -13,6 +13,7 @@ __metaclass__ = type
 __all__ = [
     'EPHEMERALS_LEGACY_CONFIG',
     'merge_legacy_ephemerals_config',
+    'RELEASES_URL',
     'retire_legacy_config',
     ]
 
@@ -27,6 +28,10 @@ from provisioningserver.utils import (
     filter_dict,
     )
 
+# Default location of the ephemeral images mirror.
+# This must end in a slash, for later concatenation.
+RELEASES_URL = 'http://maas.ubuntu.com/images/ephemeral/releases/'
+
 # Legacy shell-style config file for the ephemerals config.
 EPHEMERALS_LEGACY_CONFIG = '/etc/maas/import_ephemerals'
 
@@ -0,0 +1,265 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Download new versions of files by reusing blocks of the old ones.
+
+Consecutive versions of the ephemeral images differ by only a few percent,
+but each new version used to be downloaded in full.  This works like
+zsync: a mirror publishes, next to a file, a "block map" with checksums of
+each of the file's fixed-size blocks.  The client searches the previous
+version of the file for those blocks, with rsync's rolling checksum so
+that blocks are found at any offset, and only downloads the blocks it
+lacks, with HTTP range requests.
+
+This only pays off for files that change locally when their contents do.
+That is true of disk images, and of tarballs compressed with
+``gzip --rsyncable``.
+
+A block map is a JSON object, stored at the file's URL plus
+`BLOCK_MAP_SUFFIX`, with these items:
+
+``block_size``
+    The size of the blocks, in bytes.
+``size``
+    The size of the file, in bytes.  The last block may be short.
+``blocks``
+    The blocks' checksums, in order, as pairs of their weak (rolling)
+    checksum and their MD5 hash in hexadecimal.
+
+Use `write_block_map` to publish block maps on a mirror.
+"""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = [
+    'DeltaUnavailable',
+    'download_delta',
+    'write_block_map',
+    ]
+
+from functools import partial
+import hashlib
+import httplib
+from itertools import groupby
+import json
+from logging import getLogger
+import mmap
+import os
+import urllib2
+
+from provisioningserver.utils import atomic_write
+
+
+logger = getLogger(__name__)
+
+# Suffix added to a file's URL to get its block map.
+BLOCK_MAP_SUFFIX = '.blockmap'
+
+# Size of the blocks that files are compared in, in bytes.
+DEFAULT_BLOCK_SIZE = 64 * 1024
+
+
+class DeltaUnavailable(Exception):
+    """A file cannot be downloaded as a delta; download it in full."""
+
+
+def weak_checksum(data):
+    """Compute rsync's weak checksum of `data`, as a pair of components.
+
+    :param data: A byte string, or anything else that gives bytes when
+        sliced, such as an `mmap`.
+    """
+    values = bytearray(data)
+    length = len(values)
+    a = sum(values) & 0xffff
+    b = sum((length - index) * value
+            for index, value in enumerate(values)) & 0xffff
+    return a, b
+
+
+def combine(a, b):
+    """Combine the components of a weak checksum into a single number."""
+    return a | (b << 16)
+
+
+def strong_checksum(data):
+    return hashlib.md5(data).hexdigest()
+
+
+def make_block_map(path, block_size=DEFAULT_BLOCK_SIZE):
+    """Compute the block map of the file at `path`."""
+    blocks = []
+    with open(path, 'rb') as input_file:
+        for data in iter(partial(input_file.read, block_size), b''):
+            blocks.append(
+                [combine(*weak_checksum(data)), strong_checksum(data)])
+    return {
+        'block_size': block_size,
+        'size': os.path.getsize(path),
+        'blocks': blocks,
+        }
+
+
+def write_block_map(path, block_size=DEFAULT_BLOCK_SIZE):
+    """Write the block map of the file at `path` next to it."""
+    atomic_write(
+        json.dumps(make_block_map(path, block_size)),
+        path + BLOCK_MAP_SUFFIX, mode=0644)
+
+
+def find_blocks(seed, block_map):
+    """Find the blocks of a block map in the file at `seed`.
+
+    Only full-size blocks are looked for.
+
+    :return: A dict mapping the indexes of the blocks that were found to
+        their offsets in `seed`.
+    """
+    block_size = block_map['block_size']
+    full_blocks = block_map['size'] // block_size
+    wanted = {}
+    for index, (weak, strong) in enumerate(block_map['blocks'][:full_blocks]):
+        wanted.setdefault(weak, []).append((strong, index))
+    size = os.path.getsize(seed)
+    found = {}
+    if len(wanted) == 0 or size < block_size:
+        return found
+    with open(seed, 'rb') as seed_file:
+        data = mmap.mmap(seed_file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        offset = 0
+        a, b = weak_checksum(data[:block_size])
+        while True:
+            matched = False
+            candidates = wanted.get(combine(a, b))
+            if candidates is not None:
+                strong = strong_checksum(data[offset:offset + block_size])
+                for candidate, index in candidates:
+                    if candidate == strong and index not in found:
+                        found[index] = offset
+                        matched = True
+            if matched and offset + 2 * block_size <= size:
+                # Look for the next block right after this one.
+                offset += block_size
+                a, b = weak_checksum(data[offset:offset + block_size])
+            elif offset + block_size < size:
+                # Roll the checksum one byte further.
+                old, new = ord(data[offset]), ord(data[offset + block_size])
+                a = (a - old + new) & 0xffff
+                b = (b - block_size * old + a) & 0xffff
+                offset += 1
+            else:
+                break
+    finally:
+        data.close()
+    return found
+
+
+def fetch_block_map(url, opener=urllib2.urlopen):
+    """Fetch the block map for the file at `url`.
+
+    :raise DeltaUnavailable: If there is no usable block map.
+    """
+    try:
+        response = opener(urllib2.Request(url + BLOCK_MAP_SUFFIX))
+        try:
+            return json.load(response)
+        finally:
+            response.close()
+    except (urllib2.URLError, ValueError) as error:
+        raise DeltaUnavailable("No block map for %s: %s" % (url, error))
+
+
+def fetch_range(url, start, stop, write, opener=urllib2.urlopen):
+    """Fetch the bytes of the file at `url` from `start` up to `stop`.
+
+    The bytes are passed to `write` a piece at a time, as they arrive.
+
+    :raise DeltaUnavailable: If the server does not support ranges.
+    """
+    request = urllib2.Request(url)
+    request.add_header('Range', 'bytes=%d-%d' % (start, stop - 1))
+    response = opener(request)
+    received = 0
+    try:
+        if response.getcode() != httplib.PARTIAL_CONTENT:
+            raise DeltaUnavailable("No range support for %s." % url)
+        for data in iter(partial(response.read, DEFAULT_BLOCK_SIZE), b''):
+            received += len(data)
+            if received > stop - start:
+                break
+            write(data)
+    finally:
+        response.close()
+    if received != stop - start:
+        raise DeltaUnavailable("Wrong range size from %s." % url)
+
+
+def download_delta(url, destination, seed, checksums=None, progress=None,
+                   opener=urllib2.urlopen):
+    """Download `url` to `destination`, reusing what blocks `seed` has.
+
+    Contiguous missing blocks are fetched with one range request each.
+
+    :param seed: Path to an earlier version of the file.
+    :param checksums: Optional dict of the file's expected checksums, in
+        hexadecimal, keyed by hashlib algorithm name.  Without them, the
+        new file cannot be verified, and is not assembled.
+    :param progress: Optional callable, called with the number of bytes
+        in place so far and the file's size as the download goes.
+    :raise DeltaUnavailable: If the file cannot be downloaded as a delta.
+    :raise ChecksumMismatch: If the result does not match `checksums`.
+    :return: The file's size.
+    """
+    # Avoid circular imports.
+    from provisioningserver.import_images.download import (
+        ChecksumMismatch,
+        )
+    if not checksums:
+        raise DeltaUnavailable("No checksums for %s." % url)
+    block_map = fetch_block_map(url, opener=opener)
+    block_size = block_map['block_size']
+    size = block_map['size']
+    found = find_blocks(seed, block_map)
+    if len(found) == 0:
+        raise DeltaUnavailable("Nothing to reuse for %s." % url)
+    hashers = {algorithm: hashlib.new(algorithm) for algorithm in checksums}
+    part = destination + '.part'
+    downloaded = 0
+    with open(seed, 'rb') as seed_file, open(part, 'wb') as output:
+
+        def write(data):
+            output.write(data)
+            for hasher in hashers.values():
+                hasher.update(data)
+
+        num_blocks = len(block_map['blocks'])
+        runs = groupby(range(num_blocks), key=lambda index: index in found)
+        for local, indexes in runs:
+            indexes = list(indexes)
+            start = indexes[0] * block_size
+            stop = min((indexes[-1] + 1) * block_size, size)
+            if local:
+                for index in indexes:
+                    seed_file.seek(found[index])
+                    write(seed_file.read(block_size))
+            else:
+                fetch_range(url, start, stop, write, opener=opener)
+                downloaded += stop - start
+            if progress is not None:
+                progress(stop, size)
+    for algorithm, checksum in checksums.items():
+        if hashers[algorithm].hexdigest() != checksum:
+            os.remove(part)
+            raise ChecksumMismatch(
+                "%s checksum mismatch for %s." % (algorithm, url))
+    os.rename(part, destination)
+    logger.info("Downloaded %d of %d bytes of %s.", downloaded, size, url)
+    return size
@@ -0,0 +1,433 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Download boot images concurrently, resuming interrupted downloads.
+
+Importing the ephemeral images used to download and then extract each
+image in turn.  `ImportPipeline` downloads a bounded number of files at a
+time, while the images that are already downloaded get extracted.  The
+extraction tools are not meant to run concurrently, so images are
+extracted one at a time, in the order their downloads complete.
+
+A download goes to a ``.part`` file next to its destination.  If it is
+interrupted, the next attempt asks the server for the rest of the file
+with an HTTP range request.  Files are verified against their checksums
+before they are moved into place.
+"""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = [
+    'ChecksumMismatch',
+    'download_file',
+    'get_item_checksums',
+    'ImportPipeline',
+    'ProgressReporter',
+    ]
+
+from functools import partial
+import hashlib
+import httplib
+import json
+from logging import getLogger
+import os
+from Queue import (
+    Empty,
+    Queue,
+    )
+import threading
+import time
+import urllib2
+
+from apiclient.maas_client import (
+    MAASClient,
+    MAASDispatcher,
+    MAASOAuth,
+    )
+from provisioningserver.import_images.delta import (
+    DeltaUnavailable,
+    download_delta,
+    )
+from provisioningserver.utils import ensure_dir
+
+
+logger = getLogger(__name__)
+
+
+# Checksums that simplestreams may give for an item, by hashlib name.
+CHECKSUM_ALGORITHMS = ('md5', 'sha256', 'sha512')
+
+# Size of the pieces files are downloaded in, in bytes.
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Number of files to download at the same time.
+DEFAULT_CONCURRENCY = 4
+
+# Minimum time between two batches of progress reports, in seconds.
+PROGRESS_INTERVAL = 5
+
+
+class ChecksumMismatch(Exception):
+    """A downloaded file does not match its checksum."""
+
+
+def get_item_checksums(item):
+    """Return the checksums given in simplestreams `item`."""
+    return {
+        algorithm: item[algorithm]
+        for algorithm in CHECKSUM_ALGORITHMS
+        if algorithm in item
+        }
+
+
+def read_pieces(file_object):
+    return iter(partial(file_object.read, DOWNLOAD_CHUNK_SIZE), b'')
+
+
+def hash_file(path, hashers):
+    """Feed the contents of the file at `path` to `hashers`."""
+    with open(path, 'rb') as input_file:
+        for data in read_pieces(input_file):
+            for hasher in hashers.values():
+                hasher.update(data)
+
+
+def verify_checksums(path, checksums):
+    """Does the file at `path` match `checksums`?"""
+    hashers = {algorithm: hashlib.new(algorithm) for algorithm in checksums}
+    hash_file(path, hashers)
+    return all(
+        hashers[algorithm].hexdigest() == checksum
+        for algorithm, checksum in checksums.items())
+
+
+def open_remainder(url, offset, opener=urllib2.urlopen):
+    """Open `url`, asking for the data from `offset` on.
+
+    :return: A tuple of the response, or None if there is nothing left to
+        download, and the offset the response's data starts at.  That is
+        zero if the server does not support range requests.
+    """
+    request = urllib2.Request(url)
+    if offset > 0:
+        request.add_header('Range', 'bytes=%d-' % offset)
+    try:
+        response = opener(request)
+    except urllib2.HTTPError as error:
+        range_refused = (
+            error.code == httplib.REQUESTED_RANGE_NOT_SATISFIABLE)
+        if offset > 0 and range_refused:
+            # The earlier attempt got the whole file.
+            return None, offset
+        raise
+    if offset > 0 and response.getcode() != httplib.PARTIAL_CONTENT:
+        offset = 0
+    return response, offset
+
+
+def download_file(url, destination, checksums=None, progress=None,
+                  opener=urllib2.urlopen):
+    """Download `url` to `destination`, resuming an earlier attempt if any.
+
+    :param checksums: Optional dict of the file's expected checksums, in
+        hexadecimal, keyed by hashlib algorithm name.
+    :param progress: Optional callable, called with the number of bytes
+        downloaded so far and the file's size (or None if unknown) as the
+        download goes.
+    :param opener: Function that opens a `urllib2.Request`.
+    :raise ChecksumMismatch: If the file does not match `checksums`.  The
+        downloaded data is deleted, so that the next attempt starts over.
+    :return: The file's size.
+    """
+    if checksums is None:
+        checksums = {}
+    ensure_dir(os.path.dirname(destination))
+    part = destination + '.part'
+    offset = os.path.getsize(part) if os.path.isfile(part) else 0
+    response, offset = open_remainder(url, offset, opener=opener)
+    hashers = {algorithm: hashlib.new(algorithm) for algorithm in checksums}
+    if offset > 0:
+        hash_file(part, hashers)
+    size = None
+    if response is not None:
+        length = response.info().get('Content-Length')
+        if length is not None:
+            size = offset + int(length)
+    downloaded = offset
+    with open(part, 'ab' if offset > 0 else 'wb') as output:
+        if response is not None:
+            try:
+                for data in read_pieces(response):
+                    output.write(data)
+                    for hasher in hashers.values():
+                        hasher.update(data)
+                    downloaded += len(data)
+                    if progress is not None:
+                        progress(downloaded, size)
+            finally:
+                response.close()
+    for algorithm, checksum in checksums.items():
+        if hashers[algorithm].hexdigest() != checksum:
+            os.remove(part)
+            raise ChecksumMismatch(
+                "%s checksum mismatch for %s." % (algorithm, url))
+    os.rename(part, destination)
+    return downloaded
+
+
+class ProgressReporter:
+    """Report the progress of downloads to the region controller.
+
+    Reports are queued, and sent in batches at most once every
+    `PROGRESS_INTERVAL` seconds, however many files are being downloaded.
+    Of the updates on a download queued in the meantime, only the latest
+    is sent.  Call `flush` to send what is left once the downloads are
+    done.  If the region's URL, the API credentials or the cluster's UUID
+    are missing, nothing is reported.
+    """
+
+    def __init__(self, maas_url=None, api_credentials=None,
+                 cluster_uuid=None):
+        """
+        :param api_credentials: A tuple of the consumer key, the token key
+            and the token secret.
+        """
+        self.maas_url = maas_url
+        self.api_credentials = api_credentials
+        self.cluster_uuid = cluster_uuid
+        # Reports not sent yet, in order.
+        self._pending = []
+        # Positions in `_pending` of the latest updates queued for files.
+        self._updates = {}
+        self._last_flush = 0
+        self._lock = threading.Lock()
+        # Held while a batch is being sent.
+        self._flush_lock = threading.Lock()
+
+    @classmethod
+    def from_environment(cls, environ=os.environ):
+        """Configure from the environment set up by the import task."""
+        api_credentials = environ.get('MAAS_API_CREDENTIALS')
+        if api_credentials is not None:
+            api_credentials = tuple(api_credentials.split(':'))
+        return cls(
+            environ.get('MAAS_URL'), api_credentials,
+            environ.get('CLUSTER_UUID'))
+
+    def is_enabled(self):
+        return None not in (
+            self.maas_url, self.api_credentials, self.cluster_uuid)
+
+    def post(self, reports):
+        client = MAASClient(
+            MAASOAuth(*self.api_credentials), MAASDispatcher(), self.maas_url)
+        try:
+            client.post(
+                'api/1.0/nodegroups/%s/' % self.cluster_uuid,
+                'report_download_progress_batch',
+                reports=json.dumps(reports))
+        except Exception:
+            # Reporting progress must not break the import.
+            logger.exception("Could not report download progress.")
+
+    def queue(self, report, new_download=False):
+        """Queue `report`, and send the queued reports if it is time.
+
+        :param report: A dict of the parameters of a progress report, as
+            for the region's `report_download_progress` API call.
+        :param new_download: Whether `report` is the first one of a
+            download.  If it is not, it replaces any update on the same
+            download that has not been sent yet.
+        """
+        if not self.is_enabled():
+            return
+        filename = report['filename']
+        with self._lock:
+            index = self._updates.get(filename)
+            if new_download or index is None:
+                self._pending.append(report)
+                if new_download:
+                    self._updates.pop(filename, None)
+                else:
+                    self._updates[filename] = len(self._pending) - 1
+            else:
+                self._pending[index] = report
+        self.flush(force=False)
+
+    def flush(self, force=True):
+        """Send the queued reports.
+
+        :param force: Whether to send them even if the last batch was sent
+            less than `PROGRESS_INTERVAL` seconds ago.  If not, they are
+            also left queued while another thread is sending a batch.
+        """
+        if not self._flush_lock.acquire(force):
+            return
+        try:
+            with self._lock:
+                if not force:
+                    if time.time() < self._last_flush + PROGRESS_INTERVAL:
+                        return
+                reports, self._pending, self._updates = self._pending, [], {}
+                self._last_flush = time.time()
+            if len(reports) > 0:
+                self.post(reports)
+        finally:
+            self._flush_lock.release()
+
+    def start(self, filename, size=None):
+        """Report that the download of `filename` is starting."""
+        report = {'filename': filename}
+        if size is not None:
+            report['size'] = size
+        self.queue(report, new_download=True)
+
+    def update(self, filename, bytes_downloaded, size=None):
+        """Report the progress of a download."""
+        report = {'filename': filename, 'bytes_downloaded': bytes_downloaded}
+        if size is not None:
+            report['size'] = size
+        self.queue(report)
+
+    def finish(self, filename, size):
+        """Report that the download of `filename` succeeded."""
+        self.queue(
+            {'filename': filename, 'bytes_downloaded': size, 'size': size})
+
+    def fail(self, filename, error):
+        """Report that the download of `filename` failed."""
+        self.queue(
+            {'filename': filename, 'bytes_downloaded': 0,
+             'error': '%s' % error})
+
+
+class ImportPipeline:
+    """Download files concurrently, and process each once it is complete.
+
+    Files are added with `add`, then `run` downloads them with up to
+    `concurrency` threads and, in the calling thread, passes each one to
+    its `process` callback as soon as it is downloaded.
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, reporter=None,
+                 opener=urllib2.urlopen):
+        """
+        :param reporter: A `ProgressReporter`, or None.
+        :param opener: Function that opens a `urllib2.Request`.
+        """
+        self.concurrency = concurrency
+        self.reporter = reporter or ProgressReporter()
+        self.opener = opener
+        self.jobs = []
+
+    def add(self, url, destination, process, checksums=None, name=None,
+            seed=None):
+        """Queue a download.
+
+        If `destination` exists and matches `checksums`, it is not
+        downloaded again: an earlier import must have got that far.
+
+        :param process: Function to call with no arguments once the file
+            is in place.
+        :param name: The name to report progress under.  Defaults to `url`.
+        :param seed: Optional path to a hard link to an earlier version of
+            the file.  If the mirror publishes a block map for the file,
+            only the blocks that are not in `seed` are downloaded (see the
+            `delta` module).  The link is removed once the download is
+            over, whether it succeeded or not.
+        """
+        self.jobs.append(
+            (url, destination, process, checksums or {}, name, seed))
+
+    def download(self, job):
+        """Download one file, reporting progress.
+
+        :return: Nothing if the download succeeded, or the exception that
+            made it fail.
+        """
+        url, destination, _, checksums, name, seed = job
+        name = url if name is None else name
+        try:
+            if os.path.isfile(destination):
+                if verify_checksums(destination, checksums):
+                    return None
+                os.remove(destination)
+            self.reporter.start(name)
+            progress = partial(self.reporter.update, name)
+            size = None
+            # A partial download is better resumed than done over.
+            if seed is not None and not os.path.isfile(destination + '.part'):
+                try:
+                    size = download_delta(
+                        url, destination, seed, checksums=checksums,
+                        progress=progress, opener=self.opener)
+                except (DeltaUnavailable, ChecksumMismatch) as error:
+                    logger.info("Downloading %s in full: %s", url, error)
+            if size is None:
+                size = download_file(
+                    url, destination, checksums=checksums,
+                    progress=progress, opener=self.opener)
+        except Exception as error:
+            logger.exception("Could not download %s.", url)
+            self.reporter.fail(name, error)
+            return error
+        finally:
+            if seed is not None and os.path.isfile(seed):
+                os.remove(seed)
+        self.reporter.finish(name, size)
+        return None
+
+    def run(self):
+        """Download and process all queued files.
+
+        A failed download does not stop the others, so that as much as
+        possible is in place for the next attempt.
+
+        :raise: The first error that any download or `process` raised.
+        """
+        jobs, self.jobs = self.jobs, []
+        pending = Queue()
+        for job in jobs:
+            pending.put(job)
+        finished = Queue()
+        stopping = threading.Event()
+
+        def work():
+            while not stopping.is_set():
+                try:
+                    job = pending.get_nowait()
+                except Empty:
+                    return
+                finished.put((job, self.download(job)))
+
+        threads = [
+            threading.Thread(target=work)
+            for _ in range(min(self.concurrency, len(jobs)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        first_error = None
+        try:
+            for _ in jobs:
+                job, error = finished.get()
+                if error is None:
+                    job[2]()
+                elif first_error is None:
+                    first_error = error
+        except Exception:
+            # Let the downloads under way finish, but start no more.
+            stopping.set()
+            raise
+        finally:
+            for thread in threads:
+                thread.join()
+            self.reporter.flush()
+        if first_error is not None:
+            raise first_error
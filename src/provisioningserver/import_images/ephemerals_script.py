@@ -19,6 +19,7 @@ __all__ = [
 
 from argparse import ArgumentParser
 import errno
+from functools import partial
 from glob import glob
 from logging import getLogger
 from os import (
@@ -31,8 +32,19 @@ import shutil
 import tempfile
 
 from provisioningserver.config import Config
+from provisioningserver.image_index import (
+    add_ephemeral,
+    remove_ephemeral,
+    )
 from provisioningserver.import_images.config import (
     merge_legacy_ephemerals_config,
+    RELEASES_URL,
+    )
+from provisioningserver.import_images.download import (
+    DEFAULT_CONCURRENCY,
+    get_item_checksums,
+    ImportPipeline,
+    ProgressReporter,
     )
 from provisioningserver.import_images.tgt import (
     clean_up_info_file,
@@ -57,9 +69,6 @@ from simplestreams import (
     util,
     )
 
-# This must end in a slash, for later concatenation.
-RELEASES_URL = 'http://maas.ubuntu.com/images/ephemeral/releases/'
-
 PRODUCTS_REGEX = 'com[.]ubuntu[.]maas:ephemeral:.*'
 
 # Path of the keys used for files on cloud-images.ubuntu.com.
@@ -211,9 +220,24 @@ class MAASMirrorWriter(mirrors.ObjectStoreMirrorWriter):
     """Implement a local simplestreams mirror."""
 
     def __init__(self, local_path, config=None, delete=False,
-                 item_filters=None, product_regex=PRODUCTS_REGEX):
+                 item_filters=None, product_regex=PRODUCTS_REGEX,
+                 source_url=None, pipeline=None):
+        """
+        :param source_url: URL of the mirror being synced from.  Together
+            with `pipeline`, this makes the items get downloaded directly
+            from there, concurrently, once they are all known.
+        :param pipeline: An `ImportPipeline` to download and extract the
+            items with, or None to download and extract them one by one.
+        """
         self.local_path = os.path.abspath(local_path)
         self.delete = delete
+        if source_url is not None and not source_url.endswith('/'):
+            source_url += '/'
+        self.source_url = source_url
+        self.pipeline = pipeline
+        # Removals of obsolete items, deferred until the pipeline has
+        # downloaded the items that replace them.
+        self.pending_removals = []
 
         # Any user specified filters such as arch~(amd64|i386) are in
         # addition to our selecting only tar.gz files.  That's the only type
@@ -241,14 +265,69 @@ class MAASMirrorWriter(mirrors.ObjectStoreMirrorWriter):
         return filters.filter_item(self.item_filters, data, src, pedigree)
 
     def insert_item(self, data, src, target, pedigree, contentsource):
-        """See `ObjectStoreMirrorWriter`."""
-        super(MAASMirrorWriter, self).insert_item(
-            data, src, target, pedigree, contentsource)
+        """See `ObjectStoreMirrorWriter`.
+
+        With a pipeline, the item is only queued for download here; see
+        `insert_products`.
+        """
         path = data.get('path', None)
         flat = util.products_exdata(src, pedigree)
+        if path is not None and self.pipeline is not None:
+            contentsource.close()
+            destination = os.path.join(self._simplestreams_path(), path)
+            self.pipeline.add(
+                self.source_url + path, destination,
+                partial(self.extract_item, path, flat),
+                checksums=get_item_checksums(data), name=path,
+                seed=self._make_seed(destination))
+            return
+        super(MAASMirrorWriter, self).insert_item(
+            data, src, target, pedigree, contentsource)
         if path is not None:
             self.extract_item(path, flat)
 
+    def _make_seed(self, destination):
+        """Link to the latest earlier version of a file, if there is one.
+
+        The versions of a file sit in sibling directories, named after the
+        versions.  Blocks of the earlier version can be reused to download
+        the new one; the link keeps it around until then, even if it gets
+        removed from the local mirror.
+
+        :param destination: Where the new version of the file goes.
+        :return: The path to the link, or None.
+        """
+        seed = destination + '.seed'
+        if os.path.isfile(seed):
+            # Left by an interrupted import.
+            return seed
+        version_dir = os.path.dirname(destination)
+        pattern = os.path.join(
+            os.path.dirname(version_dir), '*', os.path.basename(destination))
+        earlier = sorted(
+            candidate for candidate in glob(pattern)
+            if candidate < destination)
+        if len(earlier) == 0:
+            return None
+        ensure_dir(version_dir)
+        os.link(earlier[-1], seed)
+        return seed
+
+    def insert_products(self, path, target, content):
+        """See `ObjectStoreMirrorWriter`.
+
+        This is called once all of the products' items have been inserted,
+        and records them in the local mirror.  Any queued items must be
+        downloaded and extracted first: if that fails, the next import
+        tries them again, resuming the downloads, and the obsolete items
+        are kept until then.
+        """
+        if self.pipeline is not None:
+            self.pipeline.run()
+        while len(self.pending_removals) > 0:
+            self.pending_removals.pop(0)()
+        super(MAASMirrorWriter, self).insert_products(path, target, content)
+
     def _target_dir(self, metadata):
         """ Generate the target directory in maas land. """
         return os.path.join(
@@ -259,12 +338,19 @@ class MAASMirrorWriter(mirrors.ObjectStoreMirrorWriter):
         """See `ObjectStoreMirrorWriter`.
 
         Remove items from our local mirror that are no longer available
-        upstream.
+        upstream.  With a pipeline, they are only removed once the new
+        items are in place; see `insert_products`.
         """
         if not self.delete:
             # Caller didn't ask for obsolete items to be deleted.
             return
+        if self.pipeline is not None:
+            self.pending_removals.append(
+                partial(self._remove_item, data, src, target, pedigree))
+        else:
+            self._remove_item(data, src, target, pedigree)
 
+    def _remove_item(self, data, src, target, pedigree):
         super(MAASMirrorWriter, self).remove_item(data, src, target, pedigree)
         metadata = util.products_exdata(src, pedigree)
 
@@ -273,6 +359,9 @@ class MAASMirrorWriter(mirrors.ObjectStoreMirrorWriter):
         remove(get_conf_path(self.local_path, name))
 
         shutil.rmtree(self._target_dir(metadata))
+        remove_ephemeral(
+            self.local_path, metadata['release'], metadata['arch'],
+            metadata['version_name'])
 
     def extract_item(self, source, metadata):
         """See `ObjectStoreMirrorWriter`."""
@@ -329,6 +418,7 @@ class MAASMirrorWriter(mirrors.ObjectStoreMirrorWriter):
             for cleanup in reversed(error_cleanups):
                 cleanup()
             raise
+        add_ephemeral(self.local_path, release, arch, version_name, name)
 
 
 def compose_filter(key, values):
@@ -378,7 +468,8 @@ def make_arg_parser(doc):
         '--path', action="store", default="streams/v1/index.sjson",
         help="Path to simplestreams index file, relative to mirror URL")
     parser.add_argument(
-        '--url', action='store', default=RELEASES_URL,
+        '--url', action='store',
+        default=os.environ.get('EPHEMERALS_ARCHIVE', RELEASES_URL),
         help="Simplestreams mirror URL (may use 'file://' for local mirror)")
     parser.add_argument(
         '--output', action='store', default=images_directory,
@@ -389,6 +480,10 @@ def make_arg_parser(doc):
     parser.add_argument(
         '--keyring', action='store', default=DEFAULT_KEYRING,
         help="gpg keyring for verifying boot image metadata")
+    parser.add_argument(
+        '--concurrency', action='store', type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="Number of files to download at the same time [%(default)s].")
     parser.add_argument(
         '--delete', action='store_true', default=False,
         help="Delete local copies of images when no longer available")
@@ -415,9 +510,13 @@ def main(args):
 
     source = mirrors.UrlMirrorReader(args.url, policy=verify_signature)
     config = {'max_items': args.max}
+    pipeline = ImportPipeline(
+        concurrency=args.concurrency,
+        reporter=ProgressReporter.from_environment())
     target = MAASMirrorWriter(
         args.output, config=config, delete=args.delete,
-        item_filters=args.filters, product_regex=args.products)
+        item_filters=args.filters, product_regex=args.products,
+        source_url=args.url, pipeline=pipeline)
 
     set_up_data_dir(args.output)
     target.sync(source, args.path)
@@ -0,0 +1,225 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for the `delta` module."""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = []
+
+import hashlib
+import httplib
+from io import BytesIO
+import json
+import os.path
+
+from maastesting.factory import factory
+from maastesting.testcase import MAASTestCase
+from mock import Mock
+from provisioningserver.import_images import delta
+from provisioningserver.import_images.delta import (
+    BLOCK_MAP_SUFFIX,
+    DeltaUnavailable,
+    download_delta,
+    fetch_range,
+    find_blocks,
+    make_block_map,
+    write_block_map,
+    )
+from provisioningserver.import_images.download import ImportPipeline
+from provisioningserver.testing.mirror import LocalMirrorTestCase
+from testtools.matchers import (
+    FileContains,
+    FileExists,
+    Not,
+    )
+
+# Block size for the tests, in bytes.
+BLOCK_SIZE = 16
+
+
+def make_content(num_blocks):
+    return factory.getRandomString(num_blocks * BLOCK_SIZE).encode('ascii')
+
+
+def sha256(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+class TestBlockMaps(MAASTestCase):
+
+    def test_make_block_map_describes_file(self):
+        content = make_content(2) + b'tail'
+        block_map = make_block_map(
+            self.make_file(contents=content), BLOCK_SIZE)
+        self.assertEqual(
+            (BLOCK_SIZE, len(content), 3),
+            (block_map['block_size'], block_map['size'],
+             len(block_map['blocks'])))
+        self.assertEqual(
+            hashlib.md5(content[:BLOCK_SIZE]).hexdigest(),
+            block_map['blocks'][0][1])
+
+    def test_write_block_map_writes_next_to_file(self):
+        path = self.make_file()
+        write_block_map(path, BLOCK_SIZE)
+        with open(path + BLOCK_MAP_SUFFIX, 'rb') as block_map:
+            self.assertEqual(
+                make_block_map(path, BLOCK_SIZE), json.load(block_map))
+
+    def test_find_blocks_finds_blocks_at_any_offset(self):
+        content = make_content(4)
+        # The seed has the same blocks, shifted and in another order.
+        seed = self.make_file(
+            contents=b'xyz' + content[2 * BLOCK_SIZE:] + b'xy' +
+            content[:2 * BLOCK_SIZE])
+        block_map = make_block_map(
+            self.make_file(contents=content), BLOCK_SIZE)
+        self.assertEqual(
+            {
+                0: 3 + 2 * BLOCK_SIZE + 2,
+                1: 3 + 3 * BLOCK_SIZE + 2,
+                2: 3,
+                3: 3 + BLOCK_SIZE,
+            },
+            find_blocks(seed, block_map))
+
+    def test_find_blocks_ignores_changed_blocks(self):
+        content = make_content(3)
+        seed = self.make_file(
+            contents=content[:BLOCK_SIZE] + make_content(1) +
+            content[2 * BLOCK_SIZE:])
+        block_map = make_block_map(
+            self.make_file(contents=content), BLOCK_SIZE)
+        self.assertEqual(
+            {0: 0, 2: 2 * BLOCK_SIZE}, find_blocks(seed, block_map))
+
+
+class DeltaMirrorTestCase(LocalMirrorTestCase):
+
+    def serve_with_block_map(self, content):
+        """Serve `content` and its block map, and return its URL."""
+        url = self.serve(content)
+        block_map = make_block_map(
+            self.make_file(contents=content), BLOCK_SIZE)
+        self.serve(
+            json.dumps(block_map),
+            name=url.rsplit('/', 1)[1] + BLOCK_MAP_SUFFIX)
+        return url
+
+
+class TestDownloadDelta(DeltaMirrorTestCase):
+
+    def test_downloads_only_missing_blocks(self):
+        content = make_content(4)
+        url = self.serve_with_block_map(content)
+        seed = self.make_file(
+            contents=content[:2 * BLOCK_SIZE] + make_content(2))
+        destination = os.path.join(self.make_dir(), 'file')
+        size = download_delta(
+            url, destination, seed, checksums={'sha256': sha256(content)})
+        self.assertEqual(len(content), size)
+        self.assertThat(destination, FileContains(content))
+        self.assertEqual(
+            [None, 'bytes=%d-%d' % (2 * BLOCK_SIZE, 4 * BLOCK_SIZE - 1)],
+            self.server.requests)
+
+    def test_downloads_short_last_block(self):
+        content = make_content(2) + b'tail'
+        url = self.serve_with_block_map(content)
+        seed = self.make_file(contents=content[:2 * BLOCK_SIZE])
+        destination = os.path.join(self.make_dir(), 'file')
+        download_delta(
+            url, destination, seed, checksums={'sha256': sha256(content)})
+        self.assertThat(destination, FileContains(content))
+
+    def test_refuses_if_seed_has_no_blocks_in_common(self):
+        content = make_content(2)
+        url = self.serve_with_block_map(content)
+        seed = self.make_file(contents=make_content(2))
+        destination = os.path.join(self.make_dir(), 'file')
+        self.assertRaises(
+            DeltaUnavailable, download_delta, url, destination, seed,
+            checksums={'sha256': sha256(content)})
+        self.assertEqual([None], self.server.requests)
+
+    def test_refuses_without_block_map(self):
+        url = self.serve(make_content(2))
+        self.assertRaises(
+            DeltaUnavailable, download_delta, url,
+            os.path.join(self.make_dir(), 'file'), self.make_file(),
+            checksums={'sha256': sha256(b'')})
+
+    def test_refuses_without_checksums(self):
+        url = self.serve_with_block_map(make_content(2))
+        self.assertRaises(
+            DeltaUnavailable, download_delta, url,
+            os.path.join(self.make_dir(), 'file'), self.make_file())
+
+
+class TestImportPipelineDeltas(DeltaMirrorTestCase):
+
+    def test_downloads_delta_and_removes_seed(self):
+        content = make_content(4)
+        url = self.serve_with_block_map(content)
+        directory = self.make_dir()
+        seed = factory.make_file(
+            directory, 'file.seed', content[:2 * BLOCK_SIZE])
+        destination = os.path.join(directory, 'file')
+        pipeline = ImportPipeline()
+        pipeline.add(
+            url, destination, Mock(), checksums={'sha256': sha256(content)},
+            seed=seed)
+        pipeline.run()
+        self.assertThat(destination, FileContains(content))
+        self.assertThat(seed, Not(FileExists()))
+        self.assertIn(
+            'bytes=%d-%d' % (2 * BLOCK_SIZE, 4 * BLOCK_SIZE - 1),
+            self.server.requests)
+
+    def test_falls_back_to_full_download(self):
+        content = make_content(4)
+        url = self.serve(content)
+        directory = self.make_dir()
+        seed = factory.make_file(directory, 'file.seed', content)
+        destination = os.path.join(directory, 'file')
+        pipeline = ImportPipeline()
+        pipeline.add(
+            url, destination, Mock(), checksums={'sha256': sha256(content)},
+            seed=seed)
+        pipeline.run()
+        self.assertThat(destination, FileContains(content))
+
+
+class TestFetchRange(MAASTestCase):
+
+    def make_opener(self, content, status=httplib.PARTIAL_CONTENT):
+        response = Mock()
+        response.getcode.return_value = status
+        response.read = BytesIO(content).read
+        return Mock(return_value=response)
+
+    def test_writes_range_in_pieces(self):
+        self.patch(delta, 'DEFAULT_BLOCK_SIZE', 2)
+        pieces = []
+        fetch_range(
+            'http://example.com/file', 3, 8, pieces.append,
+            opener=self.make_opener(b'range'))
+        self.assertEqual([b'ra', b'ng', b'e'], pieces)
+
+    def test_refuses_short_range(self):
+        self.assertRaises(
+            DeltaUnavailable, fetch_range, 'http://example.com/file', 0, 8,
+            Mock(), opener=self.make_opener(b'range'))
+
+    def test_refuses_response_without_range(self):
+        self.assertRaises(
+            DeltaUnavailable, fetch_range, 'http://example.com/file', 0, 5,
+            Mock(), opener=self.make_opener(b'range', status=httplib.OK))
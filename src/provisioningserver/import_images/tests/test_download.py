@@ -0,0 +1,321 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for the `download` module."""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = []
+
+import hashlib
+import json
+import os.path
+
+from maastesting.factory import factory
+from mock import (
+    call,
+    Mock,
+    )
+from provisioningserver.import_images import download
+from provisioningserver.import_images.download import (
+    ChecksumMismatch,
+    download_file,
+    get_item_checksums,
+    ImportPipeline,
+    ProgressReporter,
+    )
+from provisioningserver.testing.mirror import LocalMirrorTestCase
+from provisioningserver.testing.testcase import PservTestCase
+from testtools.matchers import (
+    FileContains,
+    FileExists,
+    Not,
+    )
+
+
+def sha256(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+class TestDownloadFile(LocalMirrorTestCase):
+
+    def test_downloads_file(self):
+        content = factory.getRandomString(1000).encode('ascii')
+        url = self.serve(content)
+        destination = os.path.join(self.make_dir(), 'file')
+        self.assertEqual(len(content), download_file(url, destination))
+        self.assertThat(destination, FileContains(content))
+        self.assertThat(destination + '.part', Not(FileExists()))
+
+    def test_resumes_partial_download(self):
+        content = factory.getRandomString(1000).encode('ascii')
+        url = self.serve(content)
+        destination = os.path.join(self.make_dir(), 'file')
+        factory.make_file(
+            os.path.dirname(destination), 'file.part', content[:400])
+        download_file(
+            url, destination, checksums={'sha256': sha256(content)})
+        self.assertThat(destination, FileContains(content))
+        self.assertEqual(['bytes=400-'], self.server.requests)
+
+    def test_restarts_if_server_ignores_range(self):
+        self.server.ranges = False
+        content = factory.getRandomString(1000).encode('ascii')
+        url = self.serve(content)
+        destination = os.path.join(self.make_dir(), 'file')
+        factory.make_file(
+            os.path.dirname(destination), 'file.part', content[:400])
+        download_file(url, destination)
+        self.assertThat(destination, FileContains(content))
+
+    def test_completes_download_if_nothing_is_left(self):
+        content = factory.getRandomString(1000).encode('ascii')
+        url = self.serve(content)
+        destination = os.path.join(self.make_dir(), 'file')
+        factory.make_file(os.path.dirname(destination), 'file.part', content)
+        download_file(
+            url, destination, checksums={'sha256': sha256(content)})
+        self.assertThat(destination, FileContains(content))
+
+    def test_deletes_download_on_checksum_mismatch(self):
+        url = self.serve()
+        destination = os.path.join(self.make_dir(), 'file')
+        self.assertRaises(
+            ChecksumMismatch, download_file, url, destination,
+            checksums={'sha256': sha256(b'other')})
+        self.assertThat(destination, Not(FileExists()))
+        self.assertThat(destination + '.part', Not(FileExists()))
+
+    def test_reports_progress(self):
+        content = factory.getRandomString(1000).encode('ascii')
+        url = self.serve(content)
+        progress = Mock()
+        download_file(
+            url, os.path.join(self.make_dir(), 'file'), progress=progress)
+        self.assertEqual(call(1000, 1000), progress.call_args)
+
+
+class TestGetItemChecksums(PservTestCase):
+
+    def test_returns_known_checksums(self):
+        item = {
+            'md5': factory.make_name('md5'),
+            'sha256': factory.make_name('sha256'),
+            'path': factory.make_name('path'),
+            }
+        self.assertEqual(
+            {'md5': item['md5'], 'sha256': item['sha256']},
+            get_item_checksums(item))
+
+
+class TestProgressReporter(PservTestCase):
+
+    def make_reporter(self):
+        reporter = ProgressReporter(
+            factory.make_name('url'), ('a', 'b', 'c'),
+            factory.make_name('uuid'))
+        self.patch(reporter, 'post')
+        return reporter
+
+    def test_does_nothing_without_credentials(self):
+        reporter = ProgressReporter(factory.make_name('url'))
+        post = self.patch(reporter, 'post')
+        reporter.start('file')
+        reporter.finish('file', 10)
+        reporter.flush()
+        self.assertEqual([], post.call_args_list)
+
+    def test_from_environment_reads_credentials(self):
+        reporter = ProgressReporter.from_environment({
+            'MAAS_URL': 'http://maas.example.com/',
+            'MAAS_API_CREDENTIALS': 'a:b:c',
+            'CLUSTER_UUID': 'uuid',
+            })
+        self.assertEqual(
+            ('http://maas.example.com/', ('a', 'b', 'c'), 'uuid'),
+            (reporter.maas_url, reporter.api_credentials,
+             reporter.cluster_uuid))
+
+    def test_sends_first_report_straight_away(self):
+        reporter = self.make_reporter()
+        reporter.start('file', 100)
+        self.assertEqual(
+            [call([{'filename': 'file', 'size': 100}])],
+            reporter.post.call_args_list)
+
+    def test_batches_reports_within_interval(self):
+        reporter = self.make_reporter()
+        reporter.start('file', 100)
+        reporter.start('other')
+        reporter.finish('file', 100)
+        self.assertEqual(1, len(reporter.post.call_args_list))
+        reporter.flush()
+        self.assertEqual(
+            call([
+                {'filename': 'other'},
+                {'filename': 'file', 'bytes_downloaded': 100, 'size': 100},
+            ]),
+            reporter.post.call_args)
+
+    def test_sends_batch_after_interval(self):
+        self.patch(download, 'PROGRESS_INTERVAL', 0)
+        reporter = self.make_reporter()
+        reporter.start('file')
+        reporter.update('file', 10, 100)
+        self.assertEqual(
+            call([{'filename': 'file', 'bytes_downloaded': 10, 'size': 100}]),
+            reporter.post.call_args)
+
+    def test_sends_only_latest_update_of_a_download(self):
+        reporter = self.make_reporter()
+        reporter.start('file')
+        reporter.start('other')
+        reporter.update('file', 10)
+        reporter.update('other', 20)
+        reporter.update('file', 30)
+        reporter.flush()
+        self.assertEqual(
+            call([
+                {'filename': 'other'},
+                {'filename': 'file', 'bytes_downloaded': 30},
+                {'filename': 'other', 'bytes_downloaded': 20},
+            ]),
+            reporter.post.call_args)
+
+    def test_keeps_start_of_new_download(self):
+        reporter = self.make_reporter()
+        reporter.start('other')
+        reporter.update('file', 10)
+        reporter.start('file')
+        reporter.update('file', 0)
+        reporter.flush()
+        self.assertEqual(
+            call([
+                {'filename': 'file', 'bytes_downloaded': 10},
+                {'filename': 'file'},
+                {'filename': 'file', 'bytes_downloaded': 0},
+            ]),
+            reporter.post.call_args)
+
+    def test_flush_sends_nothing_if_nothing_is_queued(self):
+        reporter = self.make_reporter()
+        reporter.flush()
+        self.assertEqual([], reporter.post.call_args_list)
+
+    def test_reports_failure(self):
+        reporter = self.make_reporter()
+        reporter.fail('file', Exception("Broken"))
+        self.assertEqual(
+            call([
+                {'filename': 'file', 'bytes_downloaded': 0,
+                 'error': "Broken"},
+            ]),
+            reporter.post.call_args)
+
+    def test_post_sends_batch_to_region(self):
+        reporter = ProgressReporter(
+            'http://maas.example.com/', ('a', 'b', 'c'), 'uuid')
+        client_post = self.patch(download.MAASClient, 'post')
+        reports = [{'filename': 'file'}]
+        reporter.post(reports)
+        client_post.assert_called_once_with(
+            'api/1.0/nodegroups/uuid/', 'report_download_progress_batch',
+            reports=json.dumps(reports))
+
+
+class TestImportPipeline(LocalMirrorTestCase):
+
+    def test_downloads_and_processes_files(self):
+        directory = self.make_dir()
+        processed = []
+        pipeline = ImportPipeline(concurrency=2)
+        contents = {}
+        for index in range(5):
+            content = factory.getRandomString(100).encode('ascii')
+            destination = os.path.join(directory, '%d' % index)
+            contents[destination] = content
+            pipeline.add(
+                self.serve(content), destination,
+                lambda destination=destination: processed.append(
+                    destination),
+                checksums={'sha256': sha256(content)})
+        pipeline.run()
+        self.assertItemsEqual(contents.keys(), processed)
+        for destination, content in contents.items():
+            self.assertThat(destination, FileContains(content))
+
+    def test_skips_download_of_file_already_in_place(self):
+        content = factory.getRandomString(100).encode('ascii')
+        url = self.serve(content)
+        destination = factory.make_file(self.make_dir(), contents=content)
+        process = Mock()
+        pipeline = ImportPipeline()
+        pipeline.add(
+            url, destination, process, checksums={'sha256': sha256(content)})
+        pipeline.run()
+        self.assertEqual([], self.server.requests)
+        process.assert_called_once_with()
+
+    def test_removes_seed_of_file_already_in_place(self):
+        content = factory.getRandomString(100).encode('ascii')
+        directory = self.make_dir()
+        destination = factory.make_file(directory, contents=content)
+        seed = factory.make_file(directory, contents=content)
+        pipeline = ImportPipeline()
+        pipeline.add(
+            self.serve(content), destination, Mock(),
+            checksums={'sha256': sha256(content)}, seed=seed)
+        pipeline.run()
+        self.assertThat(seed, Not(FileExists()))
+
+    def test_removes_seed_if_download_fails(self):
+        directory = self.make_dir()
+        seed = factory.make_file(directory)
+        pipeline = ImportPipeline()
+        pipeline.add(
+            self.serve(), os.path.join(directory, 'file'), Mock(),
+            checksums={'sha256': sha256(b'other')}, seed=seed)
+        self.assertRaises(ChecksumMismatch, pipeline.run)
+        self.assertThat(seed, Not(FileExists()))
+
+    def test_processes_other_files_if_a_download_fails(self):
+        directory = self.make_dir()
+        pipeline = ImportPipeline()
+        broken = Mock()
+        pipeline.add(
+            self.serve(), os.path.join(directory, 'broken'), broken,
+            checksums={'sha256': sha256(b'other')})
+        working = Mock()
+        pipeline.add(self.serve(), os.path.join(directory, 'working'), working)
+        self.assertRaises(ChecksumMismatch, pipeline.run)
+        self.assertEqual([], broken.call_args_list)
+        working.assert_called_once_with()
+
+    def test_reports_progress(self):
+        reporter = ProgressReporter()
+        self.patch(reporter, 'start')
+        self.patch(reporter, 'finish')
+        pipeline = ImportPipeline(reporter=reporter)
+        content = factory.getRandomString(100).encode('ascii')
+        pipeline.add(
+            self.serve(content), os.path.join(self.make_dir(), 'file'),
+            Mock(), name='file')
+        pipeline.run()
+        reporter.start.assert_called_once_with('file')
+        reporter.finish.assert_called_once_with('file', len(content))
+
+    def test_flushes_progress_reports(self):
+        reporter = ProgressReporter()
+        self.patch(reporter, 'flush')
+        pipeline = ImportPipeline(reporter=reporter)
+        pipeline.add(
+            self.serve(), os.path.join(self.make_dir(), 'file'), Mock())
+        pipeline.run()
+        reporter.flush.assert_called_once_with()
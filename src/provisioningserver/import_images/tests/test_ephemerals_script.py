@@ -27,6 +27,11 @@ from textwrap import dedent
 
 from fixtures import EnvironmentVariableFixture
 from maastesting.factory import factory
+from mock import (
+    ANY,
+    Mock,
+    sentinel,
+    )
 from provisioningserver.config import Config
 from provisioningserver.import_images import (
     config as config_module,
@@ -39,6 +44,7 @@ from provisioningserver.import_images.ephemerals_script import (
     extract_image_tarball,
     install_image_from_simplestreams,
     make_arg_parser,
+    MAASMirrorWriter,
     )
 from provisioningserver.pxe.tftppath import (
     compose_image_path,
@@ -396,6 +402,100 @@ def install_legacy_config(testcase, contents):
     return legacy_file
 
 
+class TestMAASMirrorWriter(PservTestCase):
+    """Tests for `MAASMirrorWriter`."""
+
+    def test_insert_item_queues_download_in_pipeline(self):
+        self.patch(ephemerals_script.util, 'products_exdata')
+        pipeline = Mock()
+        writer = MAASMirrorWriter(
+            self.make_dir(), source_url='http://mirror.example.com/images',
+            pipeline=pipeline)
+        path = '%s/root.tar.gz' % factory.make_name('path')
+        checksum = factory.make_name('sha256')
+        contentsource = Mock()
+
+        writer.insert_item(
+            {'path': path, 'sha256': checksum}, sentinel.src,
+            sentinel.target, sentinel.pedigree, contentsource)
+
+        contentsource.close.assert_called_once_with()
+        pipeline.add.assert_called_once_with(
+            'http://mirror.example.com/images/' + path,
+            os.path.join(writer._simplestreams_path(), path), ANY,
+            checksums={'sha256': checksum}, name=path, seed=None)
+
+    def test_make_seed_links_latest_earlier_version(self):
+        writer = MAASMirrorWriter(self.make_dir())
+        product_dir = os.path.join(writer._simplestreams_path(), 'product')
+        for version in ['20130101', '20130301', '20130501']:
+            os.makedirs(os.path.join(product_dir, version))
+            factory.make_file(
+                os.path.join(product_dir, version), 'root.tar.gz', version)
+        destination = os.path.join(product_dir, '20130401', 'root.tar.gz')
+
+        seed = writer._make_seed(destination)
+
+        self.assertEqual(destination + '.seed', seed)
+        self.assertThat(seed, FileContains('20130301'))
+
+    def test_make_seed_returns_None_without_earlier_version(self):
+        writer = MAASMirrorWriter(self.make_dir())
+        destination = os.path.join(
+            writer._simplestreams_path(), 'product', '20130401', 'root.tar.gz')
+        self.assertIsNone(writer._make_seed(destination))
+
+    def test_insert_products_runs_pipeline_first(self):
+        calls = []
+        pipeline = Mock()
+        pipeline.run.side_effect = lambda: calls.append('run')
+        self.patch(
+            ephemerals_script.mirrors.ObjectStoreMirrorWriter,
+            'insert_products').side_effect = (
+                lambda *args: calls.append('insert_products'))
+        writer = MAASMirrorWriter(self.make_dir(), pipeline=pipeline)
+
+        writer.insert_products(
+            sentinel.path, sentinel.target, sentinel.content)
+
+        self.assertEqual(['run', 'insert_products'], calls)
+
+    def test_remove_item_waits_for_pipeline(self):
+        calls = []
+        pipeline = Mock()
+        pipeline.run.side_effect = lambda: calls.append('run')
+        self.patch(
+            ephemerals_script.mirrors.ObjectStoreMirrorWriter,
+            'insert_products')
+        writer = MAASMirrorWriter(
+            self.make_dir(), delete=True, pipeline=pipeline)
+        self.patch(writer, '_remove_item').side_effect = (
+            lambda *args: calls.append('remove'))
+
+        writer.remove_item(
+            sentinel.data, sentinel.src, sentinel.target, sentinel.pedigree)
+        self.assertEqual([], calls)
+        writer.insert_products(
+            sentinel.path, sentinel.target, sentinel.content)
+
+        self.assertEqual(['run', 'remove'], calls)
+
+    def test_remove_item_keeps_items_if_pipeline_fails(self):
+        pipeline = Mock()
+        pipeline.run.side_effect = RuntimeError(factory.make_name('error'))
+        writer = MAASMirrorWriter(
+            self.make_dir(), delete=True, pipeline=pipeline)
+        remove_item = self.patch(writer, '_remove_item')
+
+        writer.remove_item(
+            sentinel.data, sentinel.src, sentinel.target, sentinel.pedigree)
+        self.assertRaises(
+            RuntimeError, writer.insert_products,
+            sentinel.path, sentinel.target, sentinel.content)
+
+        self.assertEqual([], remove_item.mock_calls)
+
+
 class TestMakeArgParser(PservTestCase):
 
     def test_creates_parser(self):
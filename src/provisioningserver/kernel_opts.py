@@ -21,8 +21,8 @@ __all__ = [
 from collections import namedtuple
 import os
 
+from provisioningserver import image_index
 from provisioningserver.config import Config
-from provisioningserver.utils import parse_key_value_file
 
 
 class EphemeralImagesDirectoryNotFound(Exception):
@@ -95,22 +95,20 @@ ISCSI_TARGET_NAME_PREFIX = "iqn.2004-05.com.ubuntu:maas"
 def get_ephemeral_name(release, arch):
     """Return the name of the most recent ephemeral image.
 
-    That information is read from the config file named 'info' in the
-    ephemeral directory e.g:
+    That information is looked up in the index of the ephemeral images
+    directory, which the import script keeps up to date.  The index is
+    built from the config file named 'info' in each ephemeral directory
+    if need be, e.g.:
     /var/lib/maas/ephemeral/precise/ephemeral/i386/20120424/info
     """
-    config = Config.load_from_cache()
-    root = os.path.join(
-        config["boot"]["ephemeral"]["images_directory"],
-        release, 'ephemeral', arch)
-    try:
-        filename = os.path.join(get_last_directory(root), 'info')
-    except OSError:
+    images_directory = Config.get_snapshot().ephemeral_images_directory
+    name = image_index.get_ephemeral_name(images_directory, release, arch)
+    if name is None:
+        root = os.path.join(images_directory, release, 'ephemeral', arch)
         raise EphemeralImagesDirectoryNotFound(
             "The directory containing the ephemeral images/info is missing "
             "(%r).  Make sure to run the script "
             "'maas-import-pxe-files'." % root)
-    name = parse_key_value_file(filename, separator="=")['name']
     return name
 
 
@@ -16,13 +16,17 @@ __all__ = []
 
 from provisioningserver.amqpclient import AMQFactory
 from provisioningserver.config import Config
+from provisioningserver.http_boot import make_http_boot_site
 from provisioningserver.services import (
+    ConfigReloadService,
     LogService,
     OOPSService,
     )
-from provisioningserver.tftp import TFTPBackend
+from provisioningserver.tftp import (
+    TFTPBackend,
+    TFTPProtocol,
+    )
 from provisioningserver.utils import get_all_interface_addresses
-from tftp.protocol import TFTP
 from twisted.application import internet
 from twisted.application.internet import (
     TCPClient,
@@ -150,21 +154,33 @@ class ProvisioningServiceMaker(object):
         client_service.setName("amqp")
         return client_service
 
-    def _makeTFTPService(self, tftp_config):
+    def _makeTFTPService(self, tftp_config, http_boot_port=None):
         """Create the dynamic TFTP service."""
-        backend = TFTPBackend(tftp_config["root"], tftp_config["generator"])
+        backend = TFTPBackend(
+            tftp_config["root"], tftp_config["generator"], http_boot_port)
         # Create a UDP server individually for each discovered network
         # interface, so that we can detect the interface via which we have
         # received a datagram.
         tftp_services = MultiService()
         tftp_services.setName("tftp")
         for address in get_all_interface_addresses():
+            protocol = TFTPProtocol(
+                backend, tftp_config["max_block_size"],
+                tftp_config["max_window_size"])
             tftp_service = internet.UDPServer(
-                tftp_config["port"], TFTP(backend), interface=address)
+                tftp_config["port"], protocol, interface=address)
             tftp_service.setName(address)
             tftp_service.setServiceParent(tftp_services)
         return tftp_services
 
+    def _makeHTTPBootService(self, tftp_config, http_boot_config):
+        """Create the HTTP boot service, serving the TFTP tree over HTTP."""
+        backend = TFTPBackend(tftp_config["root"], tftp_config["generator"])
+        site = make_http_boot_site(tftp_config["root"], backend)
+        http_boot_service = TCPServer(http_boot_config["port"], site)
+        http_boot_service.setName("http_boot")
+        return http_boot_service
+
     def makeService(self, options):
         """Construct a service."""
         services = MultiService()
@@ -176,6 +192,9 @@ class ProvisioningServiceMaker(object):
         oops_service = self._makeOopsService(log_service, config["oops"])
         oops_service.setServiceParent(services)
 
+        config_service = ConfigReloadService()
+        config_service.setServiceParent(services)
+
         broker_config = config["broker"]
         # Connecting to RabbitMQ is not yet a required component of a running
         # MAAS installation; skip unless the password has been set explicitly.
@@ -183,7 +202,16 @@ class ProvisioningServiceMaker(object):
             client_service = self._makeBroker(broker_config)
             client_service.setServiceParent(services)
 
-        tftp_service = self._makeTFTPService(config["tftp"])
+        http_boot_config = config["http_boot"]
+        if http_boot_config["enabled"]:
+            http_boot_port = http_boot_config["port"]
+            http_boot_service = self._makeHTTPBootService(
+                config["tftp"], http_boot_config)
+            http_boot_service.setServiceParent(services)
+        else:
+            http_boot_port = None
+
+        tftp_service = self._makeTFTPService(config["tftp"], http_boot_port)
         tftp_service.setServiceParent(services)
 
         return services
@@ -0,0 +1,334 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Concurrent execution of power actions on the cluster.
+
+Power scripts spend nearly all their time waiting for BMCs, chassis or
+PDUs to answer, so a cluster can run many of them at once.  What it must
+not do is hammer a single device: a SeaMicro chassis or a fence_cdu PDU
+controls many nodes but will happily time out, or worse, if it gets
+several commands at once.  The :class:`PowerActionExecutor` therefore
+runs actions in a bounded pool of threads, but serialises the actions
+sent to any one target device, spacing them out by a minimum interval.
+The actions on a target are serialised with a lock file, so that this
+holds across all the processes on the cluster, such as the Celery
+workers, and not just within each of them.
+"""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = [
+    'get_power_action_executor',
+    'get_power_action_stats',
+    'get_power_target',
+    'PowerActionExecutor',
+    ]
+
+from collections import defaultdict
+import fcntl
+import hashlib
+from logging import getLogger
+import os
+from Queue import Queue
+from threading import (
+    Lock,
+    Thread,
+    )
+import time
+
+from celery.app import app_or_default
+from provisioningserver.enum import POWER_TYPE
+from provisioningserver.power.poweraction import (
+    PowerAction,
+    PowerActionFail,
+    )
+from provisioningserver.utils import ensure_dir
+
+
+logger = getLogger(__name__)
+
+
+def get_power_target(power_type, power_parameters):
+    """Identify the device that a power action gets sent to.
+
+    Actions for the same target are serialised.  Wake-on-LAN has no target
+    device: the magic packet goes straight to the node.  All other power
+    types talk to the device at `power_address`: a BMC, a chassis, a PDU or
+    a hypervisor.
+
+    :return: A hashable identifier for the target, or None if the action
+        needs not be serialised with any other.
+    """
+    if power_type == POWER_TYPE.WAKE_ON_LAN:
+        return None
+    power_address = power_parameters.get('power_address')
+    if not power_address:
+        return None
+    return power_type, power_address
+
+
+class PowerActionStats:
+    """Latency metrics for power actions, per power type."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.stats = defaultdict(lambda: {
+            'count': 0,
+            'failures': 0,
+            'total_time': 0.0,
+            'max_time': 0.0,
+            })
+
+    def record(self, power_type, duration, failed):
+        """Record the outcome of one power action."""
+        with self.lock:
+            stats = self.stats[power_type]
+            stats['count'] += 1
+            if failed:
+                stats['failures'] += 1
+            stats['total_time'] += duration
+            stats['max_time'] = max(stats['max_time'], duration)
+
+    def snapshot(self):
+        """Return a copy of the metrics, keyed by power type.
+
+        Each entry also includes the mean latency, in seconds.
+        """
+        with self.lock:
+            snapshot = {}
+            for power_type, stats in self.stats.items():
+                stats = dict(stats)
+                stats['mean_time'] = stats['total_time'] / stats['count']
+                snapshot[power_type] = stats
+            return snapshot
+
+
+# Metrics for all the power actions executed by this process.
+power_action_stats = PowerActionStats()
+
+
+def get_power_action_stats():
+    """Return latency metrics for this process' power actions."""
+    return power_action_stats.snapshot()
+
+
+class TargetThrottle:
+    """Serialise, and space out, the actions sent to one target.
+
+    The throttle holds an exclusive lock on the target's lock file while
+    an action runs.  The file records when the last action finished.
+
+    :param path: The path to the target's lock file.
+    :param min_interval: The minimum delay, in seconds, between the end of
+        an action and the start of the next one.
+    """
+
+    def __init__(self, path, min_interval):
+        self.path = path
+        self.min_interval = min_interval
+        self.lock_file = None
+
+    def __enter__(self):
+        self.lock_file = open(self.path, 'a+')
+        fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_EX)
+        self.lock_file.seek(0)
+        last_finished = self.lock_file.read()
+        if last_finished != '':
+            delay = float(last_finished) + self.min_interval - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.lock_file.truncate(0)
+            self.lock_file.write('%f' % time.time())
+            self.lock_file.flush()
+        finally:
+            # Closing the file releases the lock.
+            self.lock_file.close()
+
+
+class PowerActionExecutor:
+    """Execute power actions concurrently, in a bounded pool of threads.
+
+    :param max_workers: The maximum number of power actions running at
+        the same time.
+    :param timeout: The number of seconds after which a power action is
+        aborted, and considered failed.
+    :param min_interval: The minimum delay, in seconds, between the end of
+        an action and the start of the next one on the same target.
+    :param lock_dir: The directory holding the targets' lock files.  All
+        the processes that send power actions must use the same.
+
+    Any parameter that is not given is taken from the Celery
+    configuration.
+    """
+
+    def __init__(self, max_workers=None, timeout=None, min_interval=None,
+                 lock_dir=None):
+        config = app_or_default().conf
+        if max_workers is None:
+            max_workers = config.POWER_ACTION_CONCURRENCY
+        if timeout is None:
+            timeout = config.POWER_ACTION_TIMEOUT
+        if min_interval is None:
+            min_interval = config.POWER_ACTION_TARGET_INTERVAL
+        if lock_dir is None:
+            lock_dir = config.POWER_ACTION_LOCK_DIR
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self.lock_dir = lock_dir
+
+    def get_throttle(self, target):
+        """Return a :class:`TargetThrottle` for one action on `target`."""
+        power_type, power_address = target
+        ensure_dir(self.lock_dir)
+        digest = hashlib.sha1(power_address.encode('utf-8')).hexdigest()
+        lock_name = '%s-%s' % (power_type, digest)
+        return TargetThrottle(
+            os.path.join(self.lock_dir, lock_name), self.min_interval)
+
+    def run_throttled(self, power_type, power_parameters, function):
+        """Call `function`, throttled per target.
+
+        :return: A tuple of the function's result, and the number of seconds
+            it took, not counting any time spent waiting for the target.
+        """
+        target = get_power_target(power_type, power_parameters)
+        if target is None:
+            start = time.time()
+            result = function()
+        else:
+            with self.get_throttle(target):
+                start = time.time()
+                result = function()
+        return result, time.time() - start
+
+    def execute_one(self, power_change, power_type, power_parameters):
+        """Execute a single power action, throttled per target.
+
+        :return: None if the action succeeded, or the `PowerActionFail`
+            describing its failure.
+        """
+        kwargs = dict(power_parameters, power_change=power_change)
+        power_action = PowerAction(power_type, timeout=self.timeout)
+        start = time.time()
+        error = None
+        try:
+            _, duration = self.run_throttled(
+                power_type, power_parameters,
+                lambda: power_action.execute(**kwargs))
+        except PowerActionFail as e:
+            error = e
+            duration = time.time() - start
+        power_action_stats.record(power_type, duration, error is not None)
+        if error is None:
+            logger.debug(
+                "Power %s (%s) took %.2f seconds.",
+                power_change, power_type, duration)
+        else:
+            logger.error("Power action failed: %s", error)
+        return error
+
+    def query_one(self, power_type, power_parameters):
+        """Query a node's power state, throttled per target.
+
+        :return: `POWER_STATE.ON` or `POWER_STATE.OFF`.
+        :raises: :class:`PowerActionFail` if the state could not be found.
+        """
+        power_action = PowerAction(power_type, timeout=self.timeout)
+        state, duration = self.run_throttled(
+            power_type, power_parameters,
+            lambda: power_action.query(**power_parameters))
+        logger.debug(
+            "Power query (%s) took %.2f seconds.", power_type, duration)
+        return state
+
+    def map(self, function, power_actions):
+        """Call `function` concurrently for each of `power_actions`.
+
+        :param function: A callable taking a power type and power
+            parameters.
+        :param power_actions: A sequence of (power_type, power_parameters)
+            pairs.
+        :return: A list holding, for each action in `power_actions` and in
+            the same order, the value returned by `function`, or the
+            exception it raised.
+        """
+        power_actions = list(power_actions)
+        results = [None] * len(power_actions)
+        work = Queue()
+        for index, (power_type, power_parameters) in enumerate(power_actions):
+            work.put((index, power_type, power_parameters))
+
+        def worker():
+            while True:
+                item = work.get()
+                if item is None:
+                    return
+                index, power_type, power_parameters = item
+                try:
+                    results[index] = function(power_type, power_parameters)
+                except Exception as e:
+                    # Anything else, like an unknown power type, fails
+                    # this one action but not the others.
+                    if not isinstance(e, PowerActionFail):
+                        logger.exception("Power action crashed.")
+                    results[index] = e
+
+        num_workers = max(1, min(self.max_workers, len(power_actions)))
+        for counter in range(num_workers):
+            work.put(None)
+        workers = [Thread(target=worker) for counter in range(num_workers)]
+        for thread in workers:
+            thread.daemon = True
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return results
+
+    def execute(self, power_change, power_actions):
+        """Execute power actions concurrently, and wait for them to finish.
+
+        :param power_change: The change to request: 'on' or 'off'.
+        :param power_actions: A sequence of (power_type, power_parameters)
+            pairs.
+        :return: A list holding, for each action in `power_actions` and in
+            the same order, None if it succeeded or the exception
+            describing its failure (usually a `PowerActionFail`).
+        """
+        return self.map(
+            lambda power_type, power_parameters: self.execute_one(
+                power_change, power_type, power_parameters),
+            power_actions)
+
+    def query(self, power_actions):
+        """Query power states concurrently, and wait for the answers.
+
+        :param power_actions: A sequence of (power_type, power_parameters)
+            pairs.
+        :return: A list holding, for each node in `power_actions` and in
+            the same order, its power state or the exception describing why
+            it could not be queried.
+        """
+        return self.map(self.query_one, power_actions)
+
+
+# The executor shared by all the power tasks run by this process.
+power_action_executor = None
+
+
+def get_power_action_executor():
+    """Return this process' :class:`PowerActionExecutor`."""
+    global power_action_executor
+    if power_action_executor is None:
+        power_action_executor = PowerActionExecutor()
+    return power_action_executor
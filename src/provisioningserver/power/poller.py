@@ -0,0 +1,167 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Periodic polling of the nodes' power states, on the cluster.
+
+The region periodically sends each cluster the list of its nodes.  The
+cluster queries their power states concurrently, through the
+:class:`PowerActionExecutor`, and keeps the results, with the time at
+which they were obtained, in the shared cache.  Only the states that
+changed since the previous poll are reported back to the region, in a
+single API call.  The region stores them on the nodes, so that reading a
+node's power state never has to wait for a BMC.
+
+Queries on the same target device are serialised, so a poll of many nodes
+behind one hypervisor or chassis can outlast the polling interval.  A poll
+that finds the previous one still running is skipped, rather than piling
+up behind it.
+"""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = [
+    'get_cached_power_states',
+    'poll_power_states',
+    ]
+
+import errno
+import fcntl
+import json
+from logging import getLogger
+import os
+import time
+
+from apiclient.maas_client import (
+    MAASClient,
+    MAASDispatcher,
+    MAASOAuth,
+    )
+from provisioningserver import cache
+from provisioningserver.auth import get_recorded_api_credentials
+from provisioningserver.cluster_config import (
+    get_cluster_uuid,
+    get_maas_url,
+    )
+from provisioningserver.enum import (
+    POWER_STATE,
+    QUERYABLE_POWER_TYPES,
+    )
+from provisioningserver.power.executor import get_power_action_executor
+from provisioningserver.utils import ensure_dir
+
+
+logger = getLogger(__name__)
+
+
+# Key, in the shared cache, of the last known power states.
+POWER_STATES_CACHE_KEY = 'power_states'
+
+# Name of the lock file that a poll holds while it runs, in the directory
+# of the power actions' lock files.
+POLL_LOCK_NAME = 'poll'
+
+
+def get_cached_power_states():
+    """Return the power states found by the last poll.
+
+    :return: A dict mapping each polled node's system_id to a tuple of its
+        power state, and the time at which it was queried.
+    """
+    return cache.cache.get(POWER_STATES_CACHE_KEY) or {}
+
+
+def query_power_states(nodes):
+    """Query the power states of `nodes`, concurrently.
+
+    :param nodes: A sequence of dicts describing the nodes, with keys
+        `system_id`, `power_type` and `power_parameters`.
+    :return: A dict mapping each node's system_id to its power state.  The
+        state of a node that could not be queried is `POWER_STATE.UNKNOWN`.
+    """
+    nodes = [
+        node for node in nodes
+        if node['power_type'] in QUERYABLE_POWER_TYPES
+        ]
+    results = get_power_action_executor().query(
+        (node['power_type'], node['power_parameters']) for node in nodes)
+    power_states = {}
+    for node, result in zip(nodes, results):
+        if isinstance(result, Exception):
+            logger.warning(
+                "Could not query the power state of %s: %s",
+                node['system_id'], result)
+            result = POWER_STATE.UNKNOWN
+        power_states[node['system_id']] = result
+    return power_states
+
+
+def report_power_states(power_states):
+    """Report changed power states to the region.
+
+    :return: Whether the states were reported.
+    """
+    maas_url = get_maas_url()
+    api_credentials = get_recorded_api_credentials()
+    if maas_url is None or api_credentials is None:
+        logger.debug(
+            "Not reporting power states: don't have API URL or key yet.")
+        return False
+    client = MAASClient(
+        MAASOAuth(*api_credentials), MAASDispatcher(), maas_url)
+    client.post(
+        'api/1.0/nodegroups/%s/' % get_cluster_uuid(), 'report_power_states',
+        power_states=json.dumps(power_states))
+    return True
+
+
+def poll_power_states(nodes):
+    """Query the power states of `nodes`, and report those that changed.
+
+    The cache of power states is only updated once the changes have been
+    reported, so that changes that could not be reported get reported by
+    the next poll.  Nothing is done while another poll is running, in any
+    process on the cluster.
+
+    :param nodes: A sequence of dicts describing the nodes, with keys
+        `system_id`, `power_type` and `power_parameters`.
+    :return: A dict of the power states that changed, keyed by system_id.
+    """
+    lock_dir = get_power_action_executor().lock_dir
+    ensure_dir(lock_dir)
+    with open(os.path.join(lock_dir, POLL_LOCK_NAME), 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError as error:
+            if error.errno not in (errno.EAGAIN, errno.EACCES):
+                raise
+            logger.warning(
+                "Skipping power poll: the previous one is still running.")
+            return {}
+        # Closing the file releases the lock.
+        return update_power_states(nodes)
+
+
+def update_power_states(nodes):
+    """Do the work of `poll_power_states`, without locking."""
+    now = time.time()
+    previous_states = get_cached_power_states()
+    power_states = query_power_states(nodes)
+    changes = {
+        system_id: state
+        for system_id, state in power_states.items()
+        if previous_states.get(system_id, (None, None))[0] != state
+        }
+    if len(changes) != 0 and not report_power_states(changes):
+        return {}
+    cache.cache.set(POWER_STATES_CACHE_KEY, {
+        system_id: (state, now)
+        for system_id, state in power_states.items()
+        })
+    return changes
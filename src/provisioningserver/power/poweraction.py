@@ -20,9 +20,15 @@ __all__ = [
 
 
 import os
+import signal
 import subprocess
+from threading import Timer
 
 from celery.app import app_or_default
+from provisioningserver.enum import (
+    POWER_STATE,
+    QUERYABLE_POWER_TYPES,
+    )
 from provisioningserver.utils import (
     locate_config,
     ShellTemplate,
@@ -63,19 +69,23 @@ class PowerAction:
     """Actions for power-related operations.
 
     :param power_type: A value from :class:`POWER_TYPE`.
+    :param timeout: Optional number of seconds after which the power script
+        is killed, and the action fails.
 
     The class is intended to be used in two phases:
     1. Instantiation, passing the power_type.
-    2. .execute(), passing any template parameters required by the template.
+    2. .execute(), passing any template parameters required by the template;
+       or .query(), to find out the node's current power state.
     """
 
-    def __init__(self, power_type):
+    def __init__(self, power_type, timeout=None):
         self.path = os.path.join(
             self.template_basedir, power_type + ".template")
         if not os.path.exists(self.path):
             raise UnknownPowerType(power_type)
 
         self.power_type = power_type
+        self.timeout = timeout
 
     @property
     def template_basedir(self):
@@ -114,14 +124,54 @@ class PowerAction:
         """
         # This might need retrying but it could be better to leave that
         # to the individual scripts.
-        try:
-            output = subprocess.check_output(
-                commands, shell=True, stderr=subprocess.STDOUT, close_fds=True)
-        except subprocess.CalledProcessError as e:
-            raise PowerActionFail(self, e)
+        if self.timeout is None:
+            try:
+                output = subprocess.check_output(
+                    commands, shell=True, stderr=subprocess.STDOUT,
+                    close_fds=True)
+            except subprocess.CalledProcessError as e:
+                raise PowerActionFail(self, e)
+        else:
+            output = self._run_shell_with_timeout(commands)
         # This output is only examined in tests, execute just ignores it
         return output
 
+    def _run_shell_with_timeout(self, commands):
+        """Execute raw shell script, killing it if it exceeds the timeout.
+
+        The script runs in its own process group, so that the commands it
+        spawned get killed along with it.
+
+        :raises: :class:`PowerActionFail`
+        """
+        process = subprocess.Popen(
+            commands, shell=True, stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT, close_fds=True, preexec_fn=os.setsid)
+        timed_out = []
+
+        def kill():
+            timed_out.append(True)
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                # The process finished in the meantime.
+                pass
+
+        timer = Timer(self.timeout, kill)
+        timer.start()
+        try:
+            output, _ = process.communicate()
+        finally:
+            timer.cancel()
+        if len(timed_out) != 0:
+            raise PowerActionFail(
+                self, "timed out after %s seconds" % self.timeout)
+        if process.returncode != 0:
+            raise PowerActionFail(
+                self, subprocess.CalledProcessError(
+                    process.returncode, commands, output=output))
+        return output
+
     def execute(self, **kwargs):
         """Execute the template.
 
@@ -131,3 +181,25 @@ class PowerAction:
         template = self.get_template()
         rendered = self.render_template(template, **kwargs)
         self.run_shell(rendered)
+
+    def query(self, **kwargs):
+        """Query the node's power state through the template.
+
+        The template is rendered with `power_change` set to 'query', and
+        must print the state, 'on' or 'off', on the last line of its output.
+
+        :return: `POWER_STATE.ON` or `POWER_STATE.OFF`.
+        :raises: :class:`PowerActionFail` if the power type cannot be
+            queried, if the script fails, or if it reports an unknown state.
+        """
+        if self.power_type not in QUERYABLE_POWER_TYPES:
+            raise PowerActionFail(
+                self, "power type does not support querying the power state")
+        kwargs['power_change'] = 'query'
+        template = self.get_template()
+        rendered = self.render_template(template, **kwargs)
+        lines = self.run_shell(rendered).strip().splitlines()
+        state = lines[-1].strip() if len(lines) != 0 else ''
+        if state not in (POWER_STATE.ON, POWER_STATE.OFF):
+            raise PowerActionFail(self, "unknown power state: %r" % state)
+        return state
@@ -0,0 +1,272 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for `provisioningserver.power.executor`."""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = []
+
+import fcntl
+from threading import (
+    Event,
+    Lock,
+    )
+
+from maastesting.factory import factory
+from maastesting.testcase import MAASTestCase
+from provisioningserver.enum import (
+    POWER_STATE,
+    POWER_TYPE,
+    )
+from provisioningserver.power import executor as executor_module
+from provisioningserver.power.executor import (
+    get_power_action_executor,
+    get_power_target,
+    PowerActionExecutor,
+    PowerActionStats,
+    )
+from provisioningserver.power.poweraction import (
+    PowerAction,
+    PowerActionFail,
+    )
+
+
+class TestGetPowerTarget(MAASTestCase):
+
+    def test_returns_None_for_wake_on_lan(self):
+        self.assertIsNone(
+            get_power_target(
+                POWER_TYPE.WAKE_ON_LAN,
+                {'power_address': factory.getRandomIPAddress()}))
+
+    def test_returns_power_address_for_other_types(self):
+        address = factory.getRandomIPAddress()
+        self.assertEqual(
+            (POWER_TYPE.SEAMICRO15K, address),
+            get_power_target(
+                POWER_TYPE.SEAMICRO15K, {'power_address': address}))
+
+    def test_returns_None_without_power_address(self):
+        self.assertIsNone(get_power_target(POWER_TYPE.IPMI, {}))
+
+
+class TestPowerActionStats(MAASTestCase):
+
+    def test_snapshot_summarises_recorded_actions(self):
+        stats = PowerActionStats()
+        stats.record(POWER_TYPE.IPMI, 1.0, failed=False)
+        stats.record(POWER_TYPE.IPMI, 3.0, failed=True)
+        self.assertEqual(
+            {
+                POWER_TYPE.IPMI: {
+                    'count': 2,
+                    'failures': 1,
+                    'total_time': 4.0,
+                    'max_time': 3.0,
+                    'mean_time': 2.0,
+                },
+            },
+            stats.snapshot())
+
+
+class FakeTime:
+    """Stand-in for the `time` module, with a clock that only `sleep`s."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+def is_locked(path):
+    """Is the lock file at `path` locked, by any process?"""
+    with open(path, 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+            return True
+        else:
+            return False
+
+
+class TestPowerActionExecutor(MAASTestCase):
+
+    def setUp(self):
+        super(TestPowerActionExecutor, self).setUp()
+        self.patch(executor_module, 'power_action_stats', PowerActionStats())
+
+    def patch_execute(self, execute):
+        self.patch(PowerAction, 'execute', execute)
+
+    def make_executor(self, **kwargs):
+        kwargs.setdefault('max_workers', 4)
+        kwargs.setdefault('timeout', 10)
+        kwargs.setdefault('min_interval', 0)
+        kwargs.setdefault('lock_dir', self.make_dir())
+        return PowerActionExecutor(**kwargs)
+
+    def test_execute_runs_all_actions(self):
+        executed = []
+        self.patch_execute(
+            lambda power_action, **kwargs: executed.append(kwargs))
+        power_actions = [
+            (POWER_TYPE.WAKE_ON_LAN, {'mac_address': mac})
+            for mac in factory.make_names('mac', 'mac', 'mac')]
+        results = self.make_executor().execute('on', power_actions)
+        self.assertEqual([None] * 3, results)
+        self.assertItemsEqual(
+            [dict(params, power_change='on') for _, params in power_actions],
+            executed)
+
+    def test_execute_reports_failures_in_order(self):
+        def execute(power_action, **kwargs):
+            if kwargs['fail']:
+                raise PowerActionFail(power_action, "Failed.")
+
+        self.patch_execute(execute)
+        results = self.make_executor().execute('on', [
+            (POWER_TYPE.WAKE_ON_LAN, {'fail': False}),
+            (POWER_TYPE.WAKE_ON_LAN, {'fail': True}),
+            ])
+        self.assertEqual(
+            [type(None), PowerActionFail], [type(error) for error in results])
+
+    def test_execute_reports_unknown_power_type_as_failure(self):
+        power_type = factory.make_name('power_type', sep='')
+        [error] = self.make_executor().execute('on', [(power_type, {})])
+        self.assertIsInstance(error, Exception)
+
+    def test_execute_runs_actions_concurrently(self):
+        lock = Lock()
+        started = []
+        all_started = Event()
+        overlapped = []
+
+        def execute(power_action, **kwargs):
+            with lock:
+                started.append(True)
+                if len(started) == 4:
+                    all_started.set()
+            # Each action can only finish once all of them have started.
+            overlapped.append(all_started.wait(5))
+
+        self.patch_execute(execute)
+        power_actions = [
+            (POWER_TYPE.IPMI, {'power_address': factory.getRandomIPAddress()})
+            for counter in range(4)]
+        self.make_executor(max_workers=4).execute('on', power_actions)
+        self.assertEqual([True] * 4, overlapped)
+
+    def test_execute_locks_target_while_action_runs(self):
+        executor = self.make_executor(max_workers=3)
+        address = factory.getRandomIPAddress()
+        lock_path = executor.get_throttle(
+            (POWER_TYPE.SEAMICRO15K, address)).path
+        locked = []
+        self.patch_execute(
+            lambda power_action, **kwargs: locked.append(is_locked(lock_path)))
+        power_actions = [
+            (POWER_TYPE.SEAMICRO15K, {'power_address': address})
+            for counter in range(3)]
+        executor.execute('on', power_actions)
+        self.assertEqual(([True] * 3, False), (locked, is_locked(lock_path)))
+
+    def test_execute_spaces_out_actions_on_the_same_target(self):
+        fake_time = self.patch(executor_module, 'time', FakeTime())
+        timestamps = []
+        self.patch_execute(
+            lambda power_action, **kwargs: timestamps.append(fake_time.now))
+        address = factory.getRandomIPAddress()
+        power_actions = [
+            (POWER_TYPE.CDU, {'power_address': address})
+            for counter in range(2)]
+        self.make_executor(min_interval=0.2, max_workers=1).execute(
+            'on', power_actions)
+        self.assertEqual([0.2], fake_time.sleeps)
+        self.assertGreaterEqual(timestamps[1] - timestamps[0], 0.2)
+
+    def test_execute_spaces_out_actions_across_executors(self):
+        # The executors of other processes use the same lock files.
+        fake_time = self.patch(executor_module, 'time', FakeTime())
+        self.patch_execute(lambda power_action, **kwargs: None)
+        lock_dir = self.make_dir()
+        power_actions = [
+            (POWER_TYPE.CDU, {'power_address': factory.getRandomIPAddress()})]
+        for counter in range(2):
+            self.make_executor(min_interval=0.2, lock_dir=lock_dir).execute(
+                'on', power_actions)
+        self.assertEqual([0.2], fake_time.sleeps)
+
+    def test_execute_does_not_space_out_actions_on_different_targets(self):
+        fake_time = self.patch(executor_module, 'time', FakeTime())
+        self.patch_execute(lambda power_action, **kwargs: None)
+        power_actions = [
+            (POWER_TYPE.CDU, {'power_address': factory.getRandomIPAddress()})
+            for counter in range(2)]
+        self.make_executor(min_interval=0.2, max_workers=1).execute(
+            'on', power_actions)
+        self.assertEqual([], fake_time.sleeps)
+
+    def test_execute_one_passes_timeout_to_power_action(self):
+        timeouts = []
+        self.patch_execute(
+            lambda power_action, **kwargs: timeouts.append(
+                power_action.timeout))
+        executor = self.make_executor(timeout=42)
+        executor.execute_one('off', POWER_TYPE.WAKE_ON_LAN, {})
+        self.assertEqual([42], timeouts)
+
+    def test_execute_one_records_latency(self):
+        self.patch_execute(lambda power_action, **kwargs: None)
+        self.make_executor().execute_one('on', POWER_TYPE.VIRSH, {})
+        stats = executor_module.get_power_action_stats()
+        self.assertEqual(
+            (1, 0), (
+                stats[POWER_TYPE.VIRSH]['count'],
+                stats[POWER_TYPE.VIRSH]['failures'],
+            ))
+
+    def test_query_returns_states_and_failures_in_order(self):
+        def query(power_action, **kwargs):
+            if kwargs['fail']:
+                raise PowerActionFail(power_action, "Failed.")
+            return POWER_STATE.ON
+
+        self.patch(PowerAction, 'query', query)
+        results = self.make_executor().query([
+            (POWER_TYPE.VIRSH, {'fail': False}),
+            (POWER_TYPE.VIRSH, {'fail': True}),
+            ])
+        self.assertEqual(POWER_STATE.ON, results[0])
+        self.assertIsInstance(results[1], PowerActionFail)
+
+    def test_query_one_is_throttled_per_target(self):
+        fake_time = self.patch(executor_module, 'time', FakeTime())
+        self.patch(
+            PowerAction, 'query',
+            lambda power_action, **kwargs: POWER_STATE.OFF)
+        address = factory.getRandomIPAddress()
+        self.make_executor(min_interval=0.2, max_workers=1).query([
+            (POWER_TYPE.IPMI, {'power_address': address})
+            for counter in range(2)])
+        self.assertEqual([0.2], fake_time.sleeps)
+
+    def test_get_power_action_executor_returns_shared_executor(self):
+        self.patch(executor_module, 'power_action_executor', None)
+        self.assertIs(
+            get_power_action_executor(), get_power_action_executor())
+
@@ -0,0 +1,141 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for `provisioningserver.power.poller`."""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = []
+
+import fcntl
+import json
+import os.path
+
+from apiclient.maas_client import MAASClient
+from maastesting.factory import factory
+from mock import Mock
+from provisioningserver.enum import (
+    POWER_STATE,
+    POWER_TYPE,
+    )
+from provisioningserver.power import poller
+from provisioningserver.power.executor import PowerActionExecutor
+from provisioningserver.power.poller import (
+    get_cached_power_states,
+    poll_power_states,
+    POLL_LOCK_NAME,
+    query_power_states,
+    )
+from provisioningserver.power.poweraction import PowerActionFail
+from provisioningserver.testing.testcase import PservTestCase
+
+
+def make_node(power_type=POWER_TYPE.VIRSH):
+    """Describe a node the way the region sends it to the cluster."""
+    return {
+        'system_id': factory.make_name('system_id'),
+        'power_type': power_type,
+        'power_parameters': {
+            'power_address': factory.getRandomIPAddress(),
+            },
+        }
+
+
+class TestPowerPoller(PservTestCase):
+
+    def setUp(self):
+        super(TestPowerPoller, self).setUp()
+        self.executor = PowerActionExecutor(
+            max_workers=4, timeout=10, min_interval=0,
+            lock_dir=self.make_dir())
+        self.patch(
+            poller, 'get_power_action_executor',
+            Mock(return_value=self.executor))
+        self.patch(poller, 'get_cluster_uuid', Mock(return_value='uuid'))
+        self.patch(MAASClient, 'post')
+
+    def patch_query(self, states):
+        """Make power queries return `states`, in order."""
+        self.patch(self.executor, 'query', Mock(return_value=states))
+
+    def get_reported_states(self):
+        """Return the power states posted to the region, per call."""
+        return [
+            json.loads(kwargs['power_states'])
+            for args, kwargs in MAASClient.post.call_args_list]
+
+    def test_query_power_states_skips_power_types_that_cannot_be_queried(self):
+        node = make_node()
+        self.patch_query([POWER_STATE.ON])
+        states = query_power_states(
+            [node, make_node(power_type=POWER_TYPE.WAKE_ON_LAN)])
+        self.assertEqual({node['system_id']: POWER_STATE.ON}, states)
+        [power_actions] = self.executor.query.call_args[0]
+        self.assertEqual(
+            [(node['power_type'], node['power_parameters'])],
+            list(power_actions))
+
+    def test_query_power_states_reports_failures_as_unknown(self):
+        node = make_node()
+        self.patch_query([PowerActionFail(Mock(), "Failed.")])
+        self.assertEqual(
+            {node['system_id']: POWER_STATE.UNKNOWN},
+            query_power_states([node]))
+
+    def test_poll_power_states_reports_and_caches_new_states(self):
+        self.set_secrets()
+        node = make_node()
+        self.patch_query([POWER_STATE.ON])
+        changes = poll_power_states([node])
+        self.assertEqual({node['system_id']: POWER_STATE.ON}, changes)
+        self.assertEqual([changes], self.get_reported_states())
+        state, timestamp = get_cached_power_states()[node['system_id']]
+        self.assertEqual(POWER_STATE.ON, state)
+
+    def test_poll_power_states_reports_only_changes(self):
+        self.set_secrets()
+        unchanged_node = make_node()
+        changed_node = make_node()
+        self.patch_query([POWER_STATE.ON, POWER_STATE.OFF])
+        poll_power_states([unchanged_node, changed_node])
+        self.patch_query([POWER_STATE.ON, POWER_STATE.ON])
+        poll_power_states([unchanged_node, changed_node])
+        self.assertEqual(
+            {changed_node['system_id']: POWER_STATE.ON},
+            self.get_reported_states()[-1])
+
+    def test_poll_power_states_does_not_report_if_nothing_changed(self):
+        self.set_secrets()
+        node = make_node()
+        self.patch_query([POWER_STATE.OFF])
+        poll_power_states([node])
+        poll_power_states([node])
+        self.assertEqual(1, MAASClient.post.call_count)
+
+    def test_poll_power_states_keeps_unreported_changes(self):
+        # Without API credentials, the changes cannot be reported.  They
+        # are not cached either, so that the next poll reports them.
+        node = make_node()
+        self.patch_query([POWER_STATE.ON])
+        self.assertEqual({}, poll_power_states([node]))
+        self.assertEqual({}, get_cached_power_states())
+        self.set_secrets()
+        self.assertEqual(
+            {node['system_id']: POWER_STATE.ON}, poll_power_states([node]))
+
+    def test_poll_power_states_skips_poll_while_another_runs(self):
+        self.set_secrets()
+        self.patch_query([POWER_STATE.ON])
+        lock_path = os.path.join(self.executor.lock_dir, POLL_LOCK_NAME)
+        with open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            self.assertEqual({}, poll_power_states([make_node()]))
+        self.assertEqual(0, self.executor.query.call_count)
+        self.assertEqual(0, MAASClient.post.call_count)
@@ -17,11 +17,15 @@ __all__ = []
 
 import os
 import re
+import time
 
 from maastesting.factory import factory
 from maastesting.testcase import MAASTestCase
 from mock import Mock
-from provisioningserver.enum import POWER_TYPE
+from provisioningserver.enum import (
+    POWER_STATE,
+    POWER_TYPE,
+    )
 import provisioningserver.power.poweraction
 from provisioningserver.power.poweraction import (
     PowerAction,
@@ -153,6 +157,25 @@ class TestPowerAction(MAASTestCase):
             Raises(
                 MatchesException(PowerActionFail, ".*:\nreason for failure")))
 
+    def test_run_shell_kills_script_after_timeout(self):
+        action = PowerAction(POWER_TYPE.WAKE_ON_LAN, timeout=0.1)
+        start = time.time()
+        self.assertThat(
+            lambda: action.run_shell("sleep 5"),
+            Raises(MatchesException(PowerActionFail, ".*timed out")))
+        self.assertLess(time.time() - start, 5)
+
+    def test_run_shell_with_timeout_returns_output(self):
+        action = PowerAction(POWER_TYPE.WAKE_ON_LAN, timeout=5)
+        self.assertEqual("done\n", action.run_shell("echo done"))
+
+    def test_run_shell_with_timeout_raises_PowerActionFail_with_output(self):
+        action = PowerAction(POWER_TYPE.WAKE_ON_LAN, timeout=5)
+        self.assertThat(
+            lambda: action.run_shell("echo reason for failure; exit 1"),
+            Raises(
+                MatchesException(PowerActionFail, ".*:\nreason for failure")))
+
     def test_wake_on_lan_cannot_shut_down_node(self):
         pa = PowerAction(POWER_TYPE.WAKE_ON_LAN)
         self.assertRaises(
@@ -187,6 +210,48 @@ class TestPowerAction(MAASTestCase):
         output = action.run_shell(script)
         self.assertIn("Got unknown power state from fence_cdu", output)
 
+    def make_query_action(self, script):
+        action = PowerAction(POWER_TYPE.VIRSH)
+        action.path = self._create_template_file(script)
+        return action
+
+    def test_query_returns_reported_power_state(self):
+        action = self.make_query_action(
+            "echo checking {{power_change}}; echo on")
+        self.assertEqual(POWER_STATE.ON, action.query())
+
+    def test_query_raises_PowerActionFail_for_unknown_state(self):
+        action = self.make_query_action("echo sleepy")
+        self.assertThat(
+            action.query,
+            Raises(MatchesException(PowerActionFail, ".*unknown power state")))
+
+    def test_query_refuses_power_types_that_cannot_be_queried(self):
+        # The SeaMicro template would power the node off when asked for
+        # anything other than 'on'.
+        action = PowerAction(POWER_TYPE.SEAMICRO15K)
+        self.patch(action, 'run_shell')
+        self.assertRaises(PowerActionFail, action.query)
+        self.assertEqual(0, action.run_shell.call_count)
+
+    def test_virsh_query_checks_vm_state(self):
+        action = PowerAction(POWER_TYPE.VIRSH)
+        self.assertRaises(
+            PowerActionFail, action.query,
+            power_address='qemu://example.com/', power_id='mysystem',
+            virsh='echo')
+
+    def test_virsh_query_reports_shut_off_vm_as_off(self):
+        # virsh reports a powered-off domain's state in two words.
+        virsh = self.make_file('virsh', b"#!/bin/sh\necho 'shut off'\n")
+        os.chmod(virsh, 0o755)
+        action = PowerAction(POWER_TYPE.VIRSH)
+        self.assertEqual(
+            POWER_STATE.OFF,
+            action.query(
+                power_address='qemu://example.com/', power_id='mysystem',
+                virsh=virsh))
+
     def configure_power_config_dir(self, path=None):
         """Configure POWER_CONFIG_DIR to `path`."""
         self.patch(
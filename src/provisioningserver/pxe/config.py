@@ -22,63 +22,58 @@ __all__ = [
     ]
 
 
-from errno import ENOENT
-from os import path
-
 from maasserver.enum import DISTRO_SERIES
 from provisioningserver.kernel_opts import (
     compose_kernel_command_line,
     compose_kernel_command_line_centos)
 from provisioningserver.pxe.tftppath import compose_image_path
+from provisioningserver.template_cache import template_cache
 from provisioningserver.utils import locate_config
-import tempita
 
 # Location of PXE templates, relative to the configuration directory.
 TEMPLATES_DIR = 'templates/pxe'
 
 
-def gen_pxe_template_filenames(purpose, arch, subarch):
+def gen_pxe_template_filenames(purpose, arch, subarch, prefix="config"):
     """List possible PXE template filenames.
 
     :param purpose: The boot purpose, e.g. "local".
     :param arch: Main machine architecture.
     :param subarch: Sub-architecture, or "generic" if there is none.
-    :param release: The Ubuntu release to be used.
+    :param prefix: The kind of template: "config" for PXELINUX
+        configurations, "chainload" for PXELINUX configurations that
+        chainload iPXE, or "ipxe" for iPXE scripts.
 
     Returns a list of possible PXE template filenames using the following
     lookup order:
 
-      config.{purpose}.{arch}.{subarch}.template
-      config.{purpose}.{arch}.template
-      config.{purpose}.template
-      config.template
+      {prefix}.{purpose}.{arch}.{subarch}.template
+      {prefix}.{purpose}.{arch}.template
+      {prefix}.{purpose}.template
+      {prefix}.template
 
     """
     elements = [purpose, arch, subarch]
     while len(elements) >= 1:
-        yield "config.%s.template" % ".".join(elements)
+        yield "%s.%s.template" % (prefix, ".".join(elements))
         elements.pop()
-    yield "config.template"
+    yield "%s.template" % prefix
 
 
-def get_pxe_template(purpose, arch, subarch):
+def get_pxe_template(purpose, arch, subarch, prefix="config"):
     pxe_templates_dir = locate_config(TEMPLATES_DIR)
-    # Templates are loaded each time here so that they can be changed on
-    # the fly without restarting the provisioning server.
-    for filename in gen_pxe_template_filenames(purpose, arch, subarch):
-        template_name = path.join(pxe_templates_dir, filename)
-        try:
-            return tempita.Template.from_filename(
-                template_name, encoding="UTF-8")
-        except IOError as error:
-            if error.errno != ENOENT:
-                raise
-    else:
+    # Templates are looked up each time here so that they can be changed on
+    # the fly without restarting the provisioning server.  The cache only
+    # saves reading and parsing templates that did not change.
+    filenames = gen_pxe_template_filenames(purpose, arch, subarch, prefix)
+    template_name = template_cache.find([pxe_templates_dir], filenames)
+    if template_name is None:
         raise AssertionError(
             "No PXE template found in %r!" % pxe_templates_dir)
+    return template_cache.get(template_name, encoding="UTF-8")
 
 
-def render_pxe_config(kernel_params, **extra):
+def render_pxe_config(kernel_params, prefix="config", boot_url="", **extra):
     BOOT_FILES = {
         DISTRO_SERIES.centos6: {
             'initrd': 'initrd.img',
@@ -96,13 +91,17 @@ def render_pxe_config(kernel_params, **extra):
     """Render a PXE configuration file as a unicode string.
 
     :param kernel_params: An instance of `KernelParameters`.
+    :param prefix: The kind of template to render; see
+        `gen_pxe_template_filenames`.
+    :param boot_url: The URL of the HTTP boot service, for templates that
+        fetch the boot images over HTTP.
     :param extra: Allow for other arguments. This is a safety valve;
         parameters generated in another component (for example, see
         `TFTPBackend.get_config_reader`) won't cause this to break.
     """
     template = get_pxe_template(
         kernel_params.purpose, kernel_params.arch,
-        kernel_params.subarch)
+        kernel_params.subarch, prefix)
 
     # The locations of the kernel image and the initrd are defined by
     # update_install_files(), in scripts/maas-import-pxe-files.
@@ -131,6 +130,7 @@ def render_pxe_config(kernel_params, **extra):
         return compose_method(params)
 
     namespace = {
+        "boot_url": boot_url,
         "initrd_path": initrd_path,
         "kernel_command": kernel_command,
         "kernel_params": kernel_params,
@@ -0,0 +1,168 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Content-addressed store for the files of netboot images.
+
+Many images share files: ARM kernels are installed for both the generic
+and the highbank sub-architectures, and the same kernel and initrd often
+serve several purposes.  Rather than copying each image's files into its
+directory, they are stored once in a hidden directory of the TFTP root,
+named after their SHA-256 hashes, and image directories hold hard links
+to them.
+
+This also makes it cheap to tell whether a downloaded image is already
+installed: an installed file is the same as a new one if it is a link to
+the blob with the new file's hash.  Blobs that are no longer linked from
+any image are removed by `collect_garbage`.  A blob that was just stored
+is not linked from any image yet either, so storing files, linking them
+and collecting garbage must all be done while holding the store's lock,
+from `get_store_lock`.
+"""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = [
+    'collect_garbage',
+    'get_store_dir',
+    'get_store_lock',
+    'link_tree',
+    'matches_tree',
+    'store_tree',
+    ]
+
+from functools import partial
+import hashlib
+import os
+from shutil import copyfile
+
+from lockfile import FileLock
+from provisioningserver.utils import ensure_dir
+
+# Name of the store's directory in the TFTP root.  The leading dot keeps it
+# out of the way of the code looking for images.
+STORE_DIRNAME = '.image-store'
+
+# Size of the pieces files are hashed in, in bytes.
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def get_store_dir(tftproot):
+    """Return the location of the image store for `tftproot`.
+
+    It has to be on the same filesystem as the images, for hard links.
+    """
+    return os.path.join(tftproot, STORE_DIRNAME)
+
+
+def get_store_lock(store_dir):
+    """Return the lock on the image store in `store_dir`."""
+    return FileLock(store_dir)
+
+
+def hash_file(path):
+    """Return the SHA-256 hash of the file at `path`, in hexadecimal."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as input_file:
+        for data in iter(partial(input_file.read, HASH_CHUNK_SIZE), b''):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def get_blob_path(store_dir, digest):
+    return os.path.join(store_dir, digest)
+
+
+def store_file(store_dir, path):
+    """Store a copy of the file at `path`, unless it is stored already.
+
+    :return: The file's SHA-256 hash, which identifies it in the store.
+    """
+    digest = hash_file(path)
+    blob = get_blob_path(store_dir, digest)
+    if not os.path.isfile(blob):
+        ensure_dir(store_dir)
+        temp_blob = '%s.%d.tmp' % (blob, os.getpid())
+        copyfile(path, temp_blob)
+        os.chmod(temp_blob, 0644)
+        os.rename(temp_blob, blob)
+    return digest
+
+
+def store_tree(store_dir, directory):
+    """Store all the files in `directory` and its subdirectories.
+
+    :return: A dict mapping the files' paths, relative to `directory`, to
+        their SHA-256 hashes.
+    """
+    digests = {}
+    for dirpath, dirnames, filenames in os.walk(directory):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            digests[os.path.relpath(path, directory)] = store_file(
+                store_dir, path)
+    return digests
+
+
+def list_files(directory):
+    """List the files in `directory` and its subdirectories."""
+    return {
+        os.path.relpath(os.path.join(dirpath, filename), directory)
+        for dirpath, dirnames, filenames in os.walk(directory)
+        for filename in filenames
+        }
+
+
+def matches_tree(directory, store_dir, digests):
+    """Does `directory` hold exactly the stored files `digests`?
+
+    Only the links are checked, not the files' contents.  A symlinked
+    directory never matches: its files are not its own.
+
+    :param digests: A dict as returned by `store_tree`.
+    """
+    if os.path.islink(directory) or not os.path.isdir(directory):
+        return False
+    if list_files(directory) != set(digests):
+        return False
+    return all(
+        os.path.samefile(
+            os.path.join(directory, path), get_blob_path(store_dir, digest))
+        for path, digest in digests.items())
+
+
+def link_tree(store_dir, digests, directory):
+    """Create `directory`, holding hard links to the stored `digests`.
+
+    :param digests: A dict as returned by `store_tree`.
+    """
+    for path, digest in digests.items():
+        destination = os.path.join(directory, path)
+        ensure_dir(os.path.dirname(destination))
+        os.chmod(os.path.dirname(destination), 0755)
+        os.link(get_blob_path(store_dir, digest), destination)
+    ensure_dir(directory)
+    os.chmod(directory, 0755)
+
+
+def collect_garbage(store_dir):
+    """Remove the stored files that no image links to any more.
+
+    The caller must hold the store's lock, so that no file is collected
+    between being stored and being linked.
+    """
+    if not os.path.isdir(store_dir):
+        return
+    for name in os.listdir(store_dir):
+        if name.endswith('.tmp'):
+            # Being stored as we speak.
+            continue
+        blob = os.path.join(store_dir, name)
+        if os.stat(blob).st_nlink == 1:
+            os.remove(blob)
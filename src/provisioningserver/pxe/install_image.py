@@ -18,7 +18,6 @@ __all__ = [
     "run",
     ]
 
-from filecmp import cmpfiles
 import os.path
 from shutil import (
     copytree,
@@ -26,6 +25,15 @@ from shutil import (
     )
 
 from provisioningserver.config import Config
+from provisioningserver.image_index import add_boot_image
+from provisioningserver.pxe.image_store import (
+    collect_garbage,
+    get_store_dir,
+    get_store_lock,
+    link_tree,
+    matches_tree,
+    store_tree,
+    )
 from provisioningserver.pxe.tftppath import (
     compose_image_path,
     locate_tftp_path,
@@ -55,29 +63,7 @@ def make_destination(tftproot, arch, subarch, release, purpose):
     return dest
 
 
-def are_identical_dirs(old, new):
-    """Do directories `old` and `new` contain identical files?
-
-    It's OK for `old` not to exist; that is considered a difference rather
-    than an error.  But `new` is assumed to exist - if it doesn't, you
-    shouldn't have come far enough to call this function.
-
-    If `old` is a symlink, this always returns False.
-    """
-    assert os.path.isdir(new)
-    if os.path.islink(old):
-        return False
-    elif os.path.isdir(old):
-        files = set(os.listdir(old) + os.listdir(new))
-        # The shallow=False is needed to make cmpfiles() compare file
-        # contents.  Otherwise it only compares os.stat() results,
-        match, mismatch, errors = cmpfiles(old, new, files, shallow=False)
-        return len(match) == len(files)
-    else:
-        return False
-
-
-def install_dir(new, old):
+def install_dir(new, old, store_dir=None, digests=None):
     """Install directory `new`, replacing directory `old` if it exists.
 
     This works as atomically as possible, but isn't entirely.  Moreover,
@@ -93,6 +79,12 @@ def install_dir(new, old):
     This function makes no promises about whether it moves or copies
     `new` into place.  The caller should make an attempt to clean it up,
     but be prepared for it not being there.
+
+    :param store_dir: Optional image store directory (see `image_store`).
+        If given, the installed files are hard links to the stored copies
+        of `new`'s files.
+    :param digests: The files of `new`, as returned by `store_tree`, if
+        they are in the store already.
     """
     # Get rid of any leftover temporary directories from potential
     # interrupted previous runs.
@@ -110,14 +102,20 @@ def install_dir(new, old):
     # certain, copy instead.  It's not particularly fast, but the extra
     # work happens outside the critical window so it shouldn't matter
     # much.
-    copytree(new, '%s.new' % old)
-
-    # Normalise permissions.
-    for filepath in FilePath('%s.new' % old).walk():
-        if filepath.isdir():
-            filepath.chmod(0755)
-        else:
-            filepath.chmod(0644)
+    if store_dir is None:
+        copytree(new, '%s.new' % old)
+
+        # Normalise permissions.
+        for filepath in FilePath('%s.new' % old).walk():
+            if filepath.isdir():
+                filepath.chmod(0755)
+            else:
+                filepath.chmod(0644)
+    else:
+        # Stored files have normalised permissions already.
+        if digests is None:
+            digests = store_tree(store_dir, new)
+        link_tree(store_dir, digests, '%s.new' % old)
 
     # Start of critical window.
     if os.path.exists(old):
@@ -164,20 +162,35 @@ def install_image(image_dir, arch, subarch, release, purpose, config_file=None,
     This is the function-call equivalent to a command-line invocation calling
     `add_arguments` and `run`.
     """
-    config = Config.load_from_cache(config_file)
-    tftproot = config["tftp"]["root"]
+    tftproot = Config.get_snapshot(config_file).tftp_root
     destination = make_destination(tftproot, arch, subarch, release, purpose)
-    if not are_identical_dirs(destination, image_dir):
-        # Image has changed.  Move the new version into place.
-        install_dir(image_dir, destination)
+    store_dir = get_store_dir(tftproot)
+    lock = get_store_lock(store_dir)
+    lock.acquire()
+    try:
+        digests = store_tree(store_dir, image_dir)
+        if not matches_tree(destination, store_dir, digests):
+            # Image has changed.  Link the new version into place.
+            install_dir(
+                image_dir, destination, store_dir=store_dir, digests=digests)
+    finally:
+        lock.release()
 
     if alternate_purpose is not None:
         # Symlink the new image directory under the alternate purpose name.
         alternate_destination = make_destination(
             tftproot, arch, subarch, release, alternate_purpose)
         install_symlink(destination, alternate_destination)
+        add_boot_image(tftproot, arch, subarch, release, alternate_purpose)
 
+    add_boot_image(tftproot, arch, subarch, release, purpose)
     rmtree(image_dir, ignore_errors=True)
+    # Drop the files of any image that this replaced.
+    lock.acquire()
+    try:
+        collect_garbage(store_dir)
+    finally:
+        lock.release()
 
 
 def add_arguments(parser):
@@ -15,7 +15,6 @@ __metaclass__ = type
 __all__ = []
 
 from collections import OrderedDict
-import errno
 import os
 import re
 
@@ -29,7 +28,6 @@ from provisioningserver.pxe import config
 from provisioningserver.pxe.config import render_pxe_config
 from provisioningserver.pxe.tftppath import compose_image_path
 from provisioningserver.tests.test_kernel_opts import make_kernel_parameters
-from provisioningserver.utils import locate_config
 import tempita
 from testtools.matchers import (
     Contains,
@@ -55,10 +53,21 @@ class TestFunctions(MAASTestCase):
         observed = config.gen_pxe_template_filenames(purpose, arch, subarch)
         self.assertSequenceEqual(expected, list(observed))
 
+    def test_gen_pxe_template_filenames_with_prefix(self):
+        purpose = factory.make_name("purpose")
+        arch, subarch = factory.make_names("arch", "subarch")
+        observed = config.gen_pxe_template_filenames(
+            purpose, arch, subarch, prefix="ipxe")
+        self.assertEqual(
+            ["ipxe.%s.template" % purpose, "ipxe.template"],
+            list(observed)[-2:])
+
     def test_get_pxe_template(self):
         purpose = factory.make_name("purpose")
         arch, subarch = factory.make_names("arch", "subarch")
         filename = factory.make_name("filename")
+        templates_dir = self.make_fake_templates_dir()
+        template_path = factory.make_file(templates_dir, filename)
         # Set up the mocks that we've patched in.
         gen_filenames = self.patch(config, "gen_pxe_template_filenames")
         gen_filenames.return_value = [filename]
@@ -68,11 +77,12 @@ class TestFunctions(MAASTestCase):
         template = config.get_pxe_template(purpose, arch, subarch)
         self.assertEqual(mock.sentinel.template, template)
         # gen_pxe_template_filenames is called to obtain filenames.
-        gen_filenames.assert_called_once_with(purpose, arch, subarch)
-        # Tempita.from_filename is called with an absolute path derived from
-        # the filename returned from gen_pxe_template_filenames.
+        gen_filenames.assert_called_once_with(
+            purpose, arch, subarch, "config")
+        # Tempita.from_filename is called with the path of the template
+        # found among the filenames returned from gen_pxe_template_filenames.
         from_filename.assert_called_once_with(
-            locate_config(config.TEMPLATES_DIR, filename), encoding="UTF-8")
+            template_path, encoding="UTF-8")
 
     def make_fake_templates_dir(self):
         """Set up a fake PXE templates dir, and return its path."""
@@ -103,15 +113,24 @@ class TestFunctions(MAASTestCase):
             AssertionError, config.get_pxe_template,
             *factory.make_names("purpose", "arch", "subarch"))
 
-    def test_get_pxe_templates_only_suppresses_ENOENT(self):
-        # The IOError arising from trying to load a template that doesn't
-        # exist is suppressed, but other errors are not.
-        from_filename = self.patch(tempita.Template, "from_filename")
-        from_filename.side_effect = IOError()
-        from_filename.side_effect.errno = errno.EACCES
-        self.assertRaises(
-            IOError, config.get_pxe_template,
-            *factory.make_names("purpose", "arch", "subarch"))
+    def test_get_pxe_template_does_not_reload_unchanged_template(self):
+        templates_dir = self.make_fake_templates_dir()
+        factory.make_file(templates_dir, 'config.template')
+        names = factory.make_names("purpose", "arch", "subarch")
+        self.assertIs(
+            config.get_pxe_template(*names), config.get_pxe_template(*names))
+
+    def test_get_pxe_template_sees_new_specific_template(self):
+        templates_dir = self.make_fake_templates_dir()
+        factory.make_file(templates_dir, 'config.template')
+        purpose, arch, subarch = factory.make_names(
+            "purpose", "arch", "subarch")
+        config.get_pxe_template(purpose, arch, subarch)
+        specific_template = factory.make_file(
+            templates_dir, 'config.%s.template' % purpose)
+        self.assertEqual(
+            specific_template,
+            config.get_pxe_template(purpose, arch, subarch).name)
 
 
 def parse_pxe_config(text):
@@ -234,6 +253,33 @@ class TestRenderPXEConfig(MAASTestCase):
         self.assertIn("chain.c32", output)
         self.assertNotIn("LOCALBOOT", output)
 
+    def test_render_chainload_config(self):
+        # The chainload config boots iPXE, and has it fetch its script from
+        # the HTTP boot service.
+        params = make_kernel_parameters(purpose="install")
+        output = render_pxe_config(
+            kernel_params=params, prefix="chainload",
+            boot_url="http://10.0.0.1:5248/")
+        self.assertThat(output, ContainsAll([
+            "KERNEL ipxe.lkrn",
+            "chain http://10.0.0.1:5248/ipxe.cfg/%s/%s/" % (
+                params.arch, params.subarch),
+            ]))
+
+    def test_render_ipxe_config(self):
+        # The iPXE script fetches the kernel and initrd over HTTP.
+        params = make_kernel_parameters(purpose="install")
+        output = render_pxe_config(
+            kernel_params=params, prefix="ipxe",
+            boot_url="http://10.0.0.1:5248/")
+        image_dir = compose_image_path(
+            arch=params.arch, subarch=params.subarch,
+            release=params.release, purpose=params.purpose)
+        self.assertThat(output, MatchesAll(
+            StartsWith("#!ipxe\n"),
+            Contains("kernel http://10.0.0.1:5248/%s/linux " % image_dir),
+            Contains("initrd http://10.0.0.1:5248/%s/initrd.gz" % image_dir)))
+
 
 class TestRenderArmhfSubarchScenarios(MAASTestCase):
     """See bug https://bugs.launchpad.net/maas/+bug/1166994"""
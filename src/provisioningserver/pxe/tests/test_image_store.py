@@ -0,0 +1,128 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for the content-addressed image store."""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = []
+
+import hashlib
+import os
+
+from maastesting.factory import factory
+from maastesting.testcase import MAASTestCase
+from provisioningserver.pxe.image_store import (
+    collect_garbage,
+    get_blob_path,
+    link_tree,
+    matches_tree,
+    store_tree,
+    )
+from testtools.matchers import (
+    FileContains,
+    FileExists,
+    Not,
+    )
+
+
+class TestImageStore(MAASTestCase):
+
+    def make_image(self, contents=None):
+        """Create an image directory with a kernel and an initrd."""
+        if contents is None:
+            contents = [factory.getRandomString() for i in range(2)]
+        image = self.make_dir()
+        for name, content in zip(['linux', 'initrd.gz'], contents):
+            factory.make_file(image, name, content)
+        return image
+
+    def test_store_tree_stores_files_by_hash(self):
+        store_dir = os.path.join(self.make_dir(), 'store')
+        image = self.make_image(['kernel', 'initrd'])
+        digests = store_tree(store_dir, image)
+        self.assertEqual(
+            {
+                'linux': hashlib.sha256(b'kernel').hexdigest(),
+                'initrd.gz': hashlib.sha256(b'initrd').hexdigest(),
+            },
+            digests)
+        self.assertThat(
+            get_blob_path(store_dir, digests['linux']),
+            FileContains('kernel'))
+
+    def test_store_tree_stores_identical_files_once(self):
+        store_dir = os.path.join(self.make_dir(), 'store')
+        store_tree(store_dir, self.make_image(['kernel', 'initrd']))
+        store_tree(store_dir, self.make_image(['kernel', 'initrd']))
+        self.assertEqual(2, len(os.listdir(store_dir)))
+
+    def test_link_tree_links_stored_files(self):
+        store_dir = os.path.join(self.make_dir(), 'store')
+        digests = store_tree(store_dir, self.make_image())
+        installed = os.path.join(self.make_dir(), 'installed')
+        link_tree(store_dir, digests, installed)
+        self.assertTrue(os.path.samefile(
+            get_blob_path(store_dir, digests['linux']),
+            os.path.join(installed, 'linux')))
+
+    def test_matches_tree_recognises_installed_image(self):
+        store_dir = os.path.join(self.make_dir(), 'store')
+        contents = ['kernel', 'initrd']
+        installed = os.path.join(self.make_dir(), 'installed')
+        link_tree(
+            store_dir, store_tree(store_dir, self.make_image(contents)),
+            installed)
+        digests = store_tree(store_dir, self.make_image(contents))
+        self.assertTrue(matches_tree(installed, store_dir, digests))
+
+    def test_matches_tree_sees_changed_file(self):
+        store_dir = os.path.join(self.make_dir(), 'store')
+        installed = os.path.join(self.make_dir(), 'installed')
+        link_tree(
+            store_dir, store_tree(store_dir, self.make_image(['a', 'b'])),
+            installed)
+        digests = store_tree(store_dir, self.make_image(['a', 'c']))
+        self.assertFalse(matches_tree(installed, store_dir, digests))
+
+    def test_matches_tree_sees_added_file(self):
+        store_dir = os.path.join(self.make_dir(), 'store')
+        contents = ['kernel', 'initrd']
+        installed = os.path.join(self.make_dir(), 'installed')
+        link_tree(
+            store_dir, store_tree(store_dir, self.make_image(contents)),
+            installed)
+        factory.make_file(installed)
+        digests = store_tree(store_dir, self.make_image(contents))
+        self.assertFalse(matches_tree(installed, store_dir, digests))
+
+    def test_matches_tree_sees_copied_files_as_different(self):
+        store_dir = os.path.join(self.make_dir(), 'store')
+        contents = ['kernel', 'initrd']
+        copied = self.make_image(contents)
+        digests = store_tree(store_dir, self.make_image(contents))
+        self.assertFalse(matches_tree(copied, store_dir, digests))
+
+    def test_matches_tree_sees_missing_dir_as_different(self):
+        store_dir = os.path.join(self.make_dir(), 'store')
+        digests = store_tree(store_dir, self.make_image())
+        missing = os.path.join(self.make_dir(), 'missing')
+        self.assertFalse(matches_tree(missing, store_dir, digests))
+
+    def test_collect_garbage_removes_unlinked_files_only(self):
+        store_dir = os.path.join(self.make_dir(), 'store')
+        linked = store_tree(store_dir, self.make_image())
+        link_tree(store_dir, linked, os.path.join(self.make_dir(), 'image'))
+        unlinked = store_tree(store_dir, self.make_image())
+        collect_garbage(store_dir)
+        self.assertThat(
+            get_blob_path(store_dir, linked['linux']), FileExists())
+        self.assertThat(
+            get_blob_path(store_dir, unlinked['linux']), Not(FileExists()))
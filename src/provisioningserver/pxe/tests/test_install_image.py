@@ -18,9 +18,12 @@ import os
 
 from maastesting.factory import factory
 from maastesting.testcase import MAASTestCase
+from provisioningserver.pxe.image_store import (
+    get_store_dir,
+    get_store_lock,
+    )
 import provisioningserver.pxe.install_image
 from provisioningserver.pxe.install_image import (
-    are_identical_dirs,
     install_dir,
     install_image,
     install_symlink,
@@ -115,53 +118,6 @@ class TestInstallPXEImage(MAASTestCase):
         dest = make_destination(tftproot, arch, subarch, release, purpose)
         self.assertThat(os.path.join(dest, testfile), FileContains(contents))
 
-    def test_are_identical_dirs_sees_missing_old_dir_as_different(self):
-        self.assertFalse(
-            are_identical_dirs(
-                os.path.join(self.make_dir(), factory.getRandomString()),
-                os.path.dirname(self.make_file())))
-
-    def test_are_identical_dirs_sees_symlink_as_different_from_dir(self):
-        images = self.make_dir()
-        link = os.path.join(images, 'symlink')
-        new_image = os.path.dirname(self.make_file())
-        os.symlink(new_image, os.path.join(images, link))
-
-        self.assertFalse(are_identical_dirs(link, new_image))
-
-    def test_are_identical_dirs_returns_true_if_identical(self):
-        name = factory.getRandomString()
-        contents = factory.getRandomString()
-        self.assertTrue(are_identical_dirs(
-            os.path.dirname(self.make_file(name=name, contents=contents)),
-            os.path.dirname(self.make_file(name=name, contents=contents))))
-
-    def test_are_identical_dirs_returns_false_if_file_has_changed(self):
-        name = factory.getRandomString()
-        old = os.path.dirname(self.make_file(name=name))
-        new = os.path.dirname(self.make_file(name=name))
-        self.assertFalse(are_identical_dirs(old, new))
-
-    def test_are_identical_dirs_returns_false_if_file_was_added(self):
-        shared_file = factory.getRandomString()
-        contents = factory.getRandomString()
-        old = os.path.dirname(
-            self.make_file(name=shared_file, contents=contents))
-        new = os.path.dirname(
-            self.make_file(name=shared_file, contents=contents))
-        factory.make_file(new)
-        self.assertFalse(are_identical_dirs(old, new))
-
-    def test_are_identical_dirs_returns_false_if_file_was_removed(self):
-        shared_file = factory.getRandomString()
-        contents = factory.getRandomString()
-        old = os.path.dirname(
-            self.make_file(name=shared_file, contents=contents))
-        new = os.path.dirname(
-            self.make_file(name=shared_file, contents=contents))
-        factory.make_file(old)
-        self.assertFalse(are_identical_dirs(old, new))
-
     def test_install_dir_moves_dir_into_place(self):
         download_image = os.path.join(self.make_dir(), 'download-image')
         published_image = os.path.join(self.make_dir(), 'published-image')
@@ -310,3 +266,65 @@ class TestInstallPXEImage(MAASTestCase):
         self.assertThat(
             os.path.join(alternate_image, 'linux'),
             FileContains(kernel_content))
+
+    def install_kernel(self, tftp_root, kernel_content, subarch=None):
+        """Install an image holding a kernel, and return its directory."""
+        image = os.path.join(self.make_dir(), 'image')
+        os.makedirs(image)
+        factory.make_file(image, 'linux', kernel_content)
+        if subarch is None:
+            subarch = factory.make_name('subarch')
+        install_image(image, 'arch', subarch, 'release', 'purpose')
+        return os.path.join(tftp_root, 'arch', subarch, 'release', 'purpose')
+
+    def test_install_image_links_identical_files(self):
+        tftp_root = self.make_dir()
+        self.useFixture(ConfigFixture({'tftp': {'root': tftp_root}}))
+        kernel_content = factory.getRandomString()
+        generic = self.install_kernel(tftp_root, kernel_content)
+        highbank = self.install_kernel(tftp_root, kernel_content)
+        self.assertTrue(os.path.samefile(
+            os.path.join(generic, 'linux'), os.path.join(highbank, 'linux')))
+
+    def test_install_image_leaves_identical_image_in_place(self):
+        tftp_root = self.make_dir()
+        self.useFixture(ConfigFixture({'tftp': {'root': tftp_root}}))
+        kernel_content = factory.getRandomString()
+        installed = self.install_kernel(tftp_root, kernel_content, 'generic')
+        inode = os.stat(installed).st_ino
+        self.install_kernel(tftp_root, kernel_content, 'generic')
+        self.assertEqual(inode, os.stat(installed).st_ino)
+
+    def test_install_image_drops_files_of_replaced_image(self):
+        tftp_root = self.make_dir()
+        self.useFixture(ConfigFixture({'tftp': {'root': tftp_root}}))
+        self.install_kernel(tftp_root, factory.getRandomString(), 'generic')
+        installed = self.install_kernel(
+            tftp_root, factory.getRandomString(), 'generic')
+        store_dir = get_store_dir(tftp_root)
+        self.assertEqual(
+            [os.stat(os.path.join(installed, 'linux')).st_ino],
+            [
+                os.stat(os.path.join(store_dir, name)).st_ino
+                for name in os.listdir(store_dir)
+            ])
+
+    def test_install_image_holds_store_lock(self):
+        tftp_root = self.make_dir()
+        self.useFixture(ConfigFixture({'tftp': {'root': tftp_root}}))
+        store_lock = get_store_lock(get_store_dir(tftp_root))
+        locked = []
+
+        def recording_lock_state(function):
+            def record(*args, **kwargs):
+                locked.append(store_lock.is_locked())
+                return function(*args, **kwargs)
+            return record
+
+        install_image_module = provisioningserver.pxe.install_image
+        for name in ('store_tree', 'link_tree', 'collect_garbage'):
+            self.patch(
+                install_image_module, name,
+                recording_lock_state(getattr(install_image_module, name)))
+        self.install_kernel(tftp_root, factory.getRandomString())
+        self.assertEqual([True, True, True], locked)
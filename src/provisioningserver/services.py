@@ -13,6 +13,7 @@ str = None
 
 __metaclass__ = type
 __all__ = [
+    "ConfigReloadService",
     "LogService",
     "OOPSService",
     ]
@@ -27,6 +28,7 @@ from oops_twisted import (
     defer_publisher,
     OOPSObserver,
     )
+from provisioningserver.config import Config
 from twisted.application.service import Service
 from twisted.internet import reactor
 from twisted.python.log import (
@@ -107,3 +109,26 @@ class OOPSService(Service):
         removeObserver(self.observer.emit)
         self.observer = None
         self.config = None
+
+
+class ConfigReloadService(Service):
+    """Have the configuration read again when the process gets SIGHUP.
+
+    The configuration files are also read again when they change, but a
+    SIGHUP forces it, as with other daemons.
+    """
+
+    name = "config"
+
+    def _signal_handler(self, sig, frame):
+        Config.reload_snapshots()
+
+    def startService(self):
+        Service.startService(self)
+        self.__previous_signal_handler = signal.signal(
+            signal.SIGHUP, self._signal_handler)
+
+    def stopService(self):
+        Service.stopService(self)
+        signal.signal(signal.SIGHUP, self.__previous_signal_handler)
+        del self.__previous_signal_handler
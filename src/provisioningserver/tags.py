@@ -19,6 +19,7 @@ __all__ = [
     'merge_details_cleanly',
     'MissingCredentials',
     'process_node_tags',
+    'ZLIB_DETAILS_SUBTYPE',
     ]
 
 
@@ -27,6 +28,7 @@ from functools import partial
 import httplib
 from logging import getLogger
 import urllib2
+import zlib
 
 from apiclient.maas_client import (
     MAASClient,
@@ -81,6 +83,11 @@ def get_cached_knowledge():
     return client, nodegroup_uuid
 
 
+# The BSON binary subtype of node details that the region sends still
+# compressed with zlib, as they are stored.
+ZLIB_DETAILS_SUBTYPE = bson.binary.USER_DEFINED_SUBTYPE
+
+
 # A content-type: function mapping that can decode data of that type.
 decoders = {
     "application/json": lambda data: json.loads(data),
@@ -132,8 +139,26 @@ def get_details_for_nodes(client, nodegroup_uuid, system_ids):
     :return: Dictionary mapping node UUIDs to details, e.g. LLDP output
     """
     path = '/api/1.0/nodegroups/%s/' % (nodegroup_uuid,)
-    return process_response(client.post(
-        path, op='details', system_ids=system_ids))
+    details = process_response(client.post(
+        path, op='details', system_ids=system_ids, compression='zlib'))
+    return {
+        system_id: {
+            name: decompress_detail(value)
+            for name, value in node_details.iteritems()
+            }
+        for system_id, node_details in details.iteritems()
+        }
+
+
+def decompress_detail(value):
+    """Decompress a node detail, if the region sent it compressed."""
+    is_compressed = (
+        isinstance(value, bson.binary.Binary) and
+        value.subtype == ZLIB_DETAILS_SUBTYPE)
+    if is_compressed:
+        return zlib.decompress(value)
+    else:
+        return value
 
 
 def post_updated_nodes(client, tag_name, tag_definition, uuid, added, removed):
@@ -14,7 +14,10 @@ str = None
 __metaclass__ = type
 __all__ = [
     'power_off',
+    'power_off_nodes',
     'power_on',
+    'power_on_nodes',
+    'query_power_states',
     'refresh_secrets',
     'rndc_command',
     'setup_rndc_configuration',
@@ -36,6 +39,7 @@ from provisioningserver import (
     tags,
     )
 from provisioningserver.auth import (
+    get_recorded_api_credentials,
     record_api_credentials,
     record_nodegroup_uuid,
     )
@@ -56,10 +60,8 @@ from provisioningserver.dns.config import (
     setup_rndc,
     )
 from provisioningserver.omshell import Omshell
-from provisioningserver.power.poweraction import (
-    PowerAction,
-    PowerActionFail,
-    )
+from provisioningserver.power.executor import get_power_action_executor
+from provisioningserver.power.poller import poll_power_states
 from provisioningserver.utils import (
     call_and_check,
     find_ip_via_arp,
@@ -135,16 +137,14 @@ def issue_power_action(power_type, power_change, **kwargs):
     """
     assert power_change in ('on', 'off'), (
         "Unknown power change keyword: %s" % power_change)
-    kwargs['power_change'] = power_change
-    try:
-        pa = PowerAction(power_type)
-        pa.execute(**kwargs)
-    except PowerActionFail:
+    error = get_power_action_executor().execute_one(
+        power_change, power_type, kwargs)
+    if error is not None:
         # TODO: signal to webapp that it failed
 
         # Re-raise, so the job is marked as failed.  Only currently
         # useful for tests.
-        raise
+        raise error
 
     # TODO: signal to webapp that it worked.
 
@@ -161,6 +161,55 @@ def power_off(power_type, **kwargs):
     issue_power_action(power_type, 'off', **kwargs)
 
 
+def issue_power_actions(power_change, power_actions):
+    """Issue the same power action to several nodes.
+
+    The actions run concurrently, within the limits of the cluster's
+    :class:`PowerActionExecutor`.  They are all attempted, even if some
+    of them fail; the first failure is re-raised once they have all
+    finished, so that the job is marked as failed.
+
+    :param power_change: The change to request: 'on' or 'off'.
+    :param power_actions: A sequence of (power_type, power_parameters)
+        pairs, one per node.  The power parameters are a dict of keyword
+        arguments for :class:`PowerAction`.
+    """
+    assert power_change in ('on', 'off'), (
+        "Unknown power change keyword: %s" % power_change)
+    errors = get_power_action_executor().execute(power_change, power_actions)
+    failures = [error for error in errors if error is not None]
+    if len(failures) != 0:
+        raise failures[0]
+
+
+@task
+def power_on_nodes(power_actions):
+    """Turn several nodes on.
+
+    :param power_actions: A list of (power_type, power_parameters) pairs.
+    """
+    issue_power_actions('on', power_actions)
+
+
+@task
+def power_off_nodes(power_actions):
+    """Turn several nodes off.
+
+    :param power_actions: A list of (power_type, power_parameters) pairs.
+    """
+    issue_power_actions('off', power_actions)
+
+
+@task
+def query_power_states(nodes):
+    """Query the power states of nodes, and report any changes.
+
+    :param nodes: A list of dicts describing the nodes, with keys
+        `system_id`, `power_type` and `power_parameters`.
+    """
+    poll_power_states(nodes)
+
+
 # =====================================================================
 # DNS-related tasks
 # =====================================================================
@@ -398,7 +447,7 @@ def update_node_tags(tag_name, tag_definition, tag_nsmap, retry=True):
 
 @task
 def import_boot_images(http_proxy=None, main_archive=None, ports_archive=None,
-                       cloud_images_archive=None):
+                       cloud_images_archive=None, ephemerals_archive=None):
     env = dict(os.environ)
     if http_proxy is not None:
         env['http_proxy'] = http_proxy
@@ -409,6 +458,12 @@ def import_boot_images(http_proxy=None, main_archive=None, ports_archive=None,
         env['PORTS_ARCHIVE'] = ports_archive
     if cloud_images_archive is not None:
         env['CLOUD_IMAGES_ARCHIVE'] = cloud_images_archive
+    if ephemerals_archive is not None:
+        env['EPHEMERALS_ARCHIVE'] = ephemerals_archive
+    api_credentials = get_recorded_api_credentials()
+    if api_credentials is not None:
+        # For the import script to report its download progress.
+        env['MAAS_API_CREDENTIALS'] = ':'.join(api_credentials)
     call_and_check(['sudo', '-n', '-E', 'maas-import-pxe-files'], env=env)
 
 
@@ -0,0 +1,117 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Cache of compiled Tempita templates.
+
+Templates are read whenever they are needed, so that they can be edited
+without restarting anything.  Reading and parsing them each time is
+wasteful though, and so is probing for every candidate filename of a
+fallback chain.  This keeps compiled templates, and the outcome of
+lookups (including failed ones), in memory.  They are revalidated with a
+`stat` of the template file, or of the directories that were searched:
+editing a template changes its modification time, and adding or removing
+a template changes its directory's.
+"""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = [
+    'template_cache',
+    'TemplateCache',
+    ]
+
+from errno import ENOENT
+import os
+
+import tempita
+
+
+def get_stamp(path):
+    """Return a value that changes whenever the file at `path` changes.
+
+    :return: A tuple of the file's modification time, size and inode
+        number, or None if there is no such file.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError as error:
+        if error.errno == ENOENT:
+            return None
+        raise
+    return stat.st_mtime, stat.st_size, stat.st_ino
+
+
+class TemplateCache:
+    """Compiled templates and template lookups, by path.
+
+    Entries are replaced, never updated in place, so an instance can be
+    shared between threads.
+    """
+
+    def __init__(self):
+        self._lookups = {}
+        self._templates = {}
+
+    def clear(self):
+        """Forget all cached templates and lookups."""
+        self._lookups = {}
+        self._templates = {}
+
+    def find(self, directories, filenames):
+        """Find the first of `filenames` that exists in `directories`.
+
+        The directories are searched in order, and each of them for each
+        of the filenames, in order.
+
+        :return: The path to the template, or None if there is none.
+        """
+        directories = tuple(directories)
+        key = directories, tuple(filenames)
+        stamp = tuple(get_stamp(directory) for directory in directories)
+        cached = self._lookups.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        found = None
+        for directory in directories:
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                if os.path.isfile(path):
+                    found = path
+                    break
+            if found is not None:
+                break
+        self._lookups[key] = stamp, found
+        return found
+
+    def get(self, path, template_class=tempita.Template, encoding=None):
+        """Return the template at `path`, compiled.
+
+        Compiled templates are shared: do not modify them.
+
+        :param template_class: The class of template to compile, a
+            subclass of `tempita.Template`.
+        :param encoding: The template's encoding, or None to compile it
+            from a byte string.
+        :raise IOError: If the template cannot be read.
+        """
+        key = path, template_class, encoding
+        # Take the stamp before reading: if the template changes while it
+        # is being read, the next call will read it again.
+        stamp = get_stamp(path)
+        cached = self._templates.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        template = template_class.from_filename(path, encoding=encoding)
+        self._templates[key] = stamp, template
+        return template
+
+
+# The cache shared by the templates of the whole process.
+template_cache = TemplateCache()
@@ -0,0 +1,86 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Local HTTP mirror, for testing image downloads."""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = [
+    'LocalMirrorTestCase',
+    ]
+
+from BaseHTTPServer import (
+    BaseHTTPRequestHandler,
+    HTTPServer,
+    )
+import httplib
+import re
+import threading
+
+from maastesting.factory import factory
+from provisioningserver.testing.testcase import PservTestCase
+
+
+class MirrorRequestHandler(BaseHTTPRequestHandler):
+    """Serve `server.files`, honouring range requests if `server.ranges`."""
+
+    def do_GET(self):
+        self.server.requests.append(self.headers.get('Range'))
+        content = self.server.files.get(self.path.lstrip('/'))
+        if content is None:
+            self.send_error(httplib.NOT_FOUND)
+            return
+        match = re.match(
+            r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if match is None or not self.server.ranges:
+            self.send_response(httplib.OK)
+        else:
+            start = int(match.group(1))
+            if start >= len(content):
+                self.send_error(httplib.REQUESTED_RANGE_NOT_SATISFIABLE)
+                return
+            end = len(content) - 1
+            if match.group(2) != '':
+                end = min(int(match.group(2)), end)
+            self.send_response(httplib.PARTIAL_CONTENT)
+            self.send_header(
+                'Content-Range', 'bytes %d-%d/%d' % (start, end, len(content)))
+            content = content[start:end + 1]
+        self.send_header('Content-Length', '%d' % len(content))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalMirrorTestCase(PservTestCase):
+    """Test case serving files from a local HTTP mirror."""
+
+    def setUp(self):
+        super(LocalMirrorTestCase, self).setUp()
+        self.server = HTTPServer(('127.0.0.1', 0), MirrorRequestHandler)
+        self.server.files = {}
+        self.server.ranges = True
+        self.server.requests = []
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def serve(self, content=None, name=None):
+        """Serve `content` from the mirror, and return its URL."""
+        if content is None:
+            content = factory.getRandomString(1000).encode('ascii')
+        if name is None:
+            name = factory.make_name('file')
+        self.server.files[name] = content
+        return 'http://127.0.0.1:%d/%s' % (self.server.server_port, name)
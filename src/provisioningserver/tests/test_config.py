@@ -142,6 +142,10 @@ class TestConfig(MAASTestCase):
             'password': 'test',
             'vhost': '/',
             },
+        'http_boot': {
+            'enabled': False,
+            'port': 5248,
+            },
         'logfile': 'pserv.log',
         'oops': {
             'directory': '',
@@ -149,6 +153,8 @@ class TestConfig(MAASTestCase):
             },
         'tftp': {
             'generator': 'http://localhost/MAAS/api/1.0/pxeconfig/',
+            'max_block_size': 1468,
+            'max_window_size': 16,
             'port': 69,
             'root': "/var/lib/maas/tftp",
             },
@@ -252,6 +258,42 @@ class TestConfig(MAASTestCase):
             first_load['boot']['architectures'],
             second_load['boot']['architectures'])
 
+    def test_get_snapshot_loads_config(self):
+        tftp_root = self.make_dir()
+        filename = self.make_file(
+            name="config.yaml",
+            contents=yaml.safe_dump({'tftp': {'root': tftp_root}}))
+        snapshot = Config.get_snapshot(filename)
+        self.assertEqual(
+            (tftp_root, Config.get_defaults()['windows']['remote_path']),
+            (snapshot.tftp_root, snapshot.windows_remote_path))
+
+    def test_get_snapshot_shares_snapshot(self):
+        filename = self.make_file(name="config.yaml", contents='')
+        self.assertIs(
+            Config.get_snapshot(filename), Config.get_snapshot(filename))
+
+    def test_get_snapshot_reloads_changed_file(self):
+        filename = self.make_file(name="config.yaml", contents='')
+        old_snapshot = Config.get_snapshot(filename)
+        images_directory = self.make_dir()
+        Config.save(
+            {'boot': {'ephemeral': {'images_directory': images_directory}}},
+            filename)
+        new_snapshot = Config.get_snapshot(filename)
+        self.assertEqual(
+            (images_directory, old_snapshot.version + 1),
+            (new_snapshot.ephemeral_images_directory, new_snapshot.version))
+
+    def test_reload_snapshots_makes_get_snapshot_reload_file(self):
+        self.patch(Config, '_snapshot_generation', 0)
+        filename = self.make_file(name="config.yaml", contents='')
+        old_snapshot = Config.get_snapshot(filename)
+        Config.reload_snapshots()
+        new_snapshot = Config.get_snapshot(filename)
+        self.assertIsNot(old_snapshot, new_snapshot)
+        self.assertEqual(old_snapshot.version + 1, new_snapshot.version)
+
     def test_oops_directory_without_reporter(self):
         # It is an error to omit the OOPS reporter if directory is specified.
         config = (
@@ -0,0 +1,99 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for the HTTP boot service."""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = []
+
+import httplib
+import json
+
+from maastesting.factory import factory
+from maastesting.testcase import MAASTestCase
+from provisioningserver import http_boot
+from provisioningserver.http_boot import (
+    BootFilesResource,
+    IPXEConfigResource,
+    make_http_boot_site,
+    )
+from provisioningserver.tests.test_kernel_opts import make_kernel_parameters
+from provisioningserver.tftp import TFTPBackend
+from twisted.internet.address import IPv4Address
+from twisted.internet.defer import succeed
+from twisted.web.resource import ForbiddenResource
+from twisted.web.test.test_web import DummyRequest
+
+
+class TestIPXEConfigResource(MAASTestCase):
+
+    def make_request(self, *postpath):
+        request = DummyRequest(list(postpath))
+        request.client = IPv4Address(
+            "TCP", factory.getRandomIPAddress(), factory.getRandomPort())
+        return request
+
+    def make_resource(self, kernel_params):
+        backend = TFTPBackend(self.make_dir(), b"http://example.com/")
+        self.patch(backend, "get_page").return_value = succeed(
+            json.dumps(kernel_params._asdict()))
+        self.patch(backend, "render_pxe_config").return_value = "#!ipxe"
+        return IPXEConfigResource(backend)
+
+    def test_renders_ipxe_script(self):
+        cluster_uuid = factory.getRandomUUID()
+        self.patch(http_boot, "get_cluster_uuid").return_value = cluster_uuid
+        kernel_params = make_kernel_parameters()
+        resource = self.make_resource(kernel_params)
+        mac = factory.getRandomMACAddress("-")
+        request = self.make_request("amd64", "generic", mac)
+        resource.render(request)
+        self.assertEqual(
+            ([b"#!ipxe"], True), (request.written, bool(request.finished)))
+        host = request.getHost()
+        resource.backend.render_pxe_config.assert_called_once_with(
+            kernel_params=kernel_params, prefix="ipxe",
+            boot_url="http://%s:%d/" % (host.host, host.port),
+            arch="amd64", subarch="generic", mac=mac, local=host.host,
+            remote=request.client.host, cluster_uuid=cluster_uuid)
+
+    def test_refuses_other_paths(self):
+        resource = self.make_resource(make_kernel_parameters())
+        request = self.make_request("amd64", factory.make_name("mac"))
+        resource.render(request)
+        self.assertEqual(httplib.NOT_FOUND, request.responseCode)
+        self.assertEqual(
+            [], resource.backend.get_page.call_args_list)
+
+
+class TestBootFilesResource(MAASTestCase):
+
+    def test_does_not_list_directories(self):
+        resource = BootFilesResource(self.make_dir())
+        self.assertIsInstance(resource.directoryListing(), ForbiddenResource)
+
+    def test_serves_subdirectories_in_the_same_way(self):
+        root = self.make_dir()
+        factory.make_file(root, "linux")
+        resource = BootFilesResource(root)
+        self.assertIsInstance(
+            resource.getChild(b"linux", DummyRequest([])), BootFilesResource)
+
+
+class TestMakeHTTPBootSite(MAASTestCase):
+
+    def test_serves_tftp_tree_and_ipxe_scripts(self):
+        root = self.make_dir()
+        backend = TFTPBackend(root, b"http://example.com/")
+        site = make_http_boot_site(root, backend)
+        self.assertEqual(root, site.resource.path)
+        self.assertIsInstance(
+            site.resource.children[b"ipxe.cfg"], IPXEConfigResource)
@@ -0,0 +1,210 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for `provisioningserver.image_index`."""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = []
+
+import errno
+import json
+import os
+
+from lockfile import LockTimeout
+from maastesting.factory import factory
+from maastesting.testcase import MAASTestCase
+from provisioningserver import image_index
+from provisioningserver.image_index import (
+    add_boot_image,
+    add_ephemeral,
+    get_boot_images,
+    get_ephemeral_name,
+    INDEX_FILENAME,
+    read_index,
+    remove_ephemeral,
+    )
+from provisioningserver.pxe import tftppath
+from provisioningserver.pxe.tftppath import (
+    compose_image_path,
+    locate_tftp_path,
+    )
+from provisioningserver.testing.boot_images import make_boot_image_params
+
+
+def make_ephemeral_dir(images_directory, release, arch, version, name):
+    """Create an ephemeral image directory, with its info file."""
+    directory = os.path.join(
+        images_directory, release, 'ephemeral', arch, version)
+    os.makedirs(directory)
+    factory.make_file(directory, name='info', contents="name=%s\n" % name)
+    return directory
+
+
+class TestReadIndex(MAASTestCase):
+
+    def setUp(self):
+        super(TestReadIndex, self).setUp()
+        self.addCleanup(image_index.clear_cache)
+
+    def test_scans_and_writes_index_if_there_is_none(self):
+        directory = self.make_dir()
+        index = [factory.make_name('image')]
+        self.assertEqual(index, read_index(directory, lambda path: index))
+        with open(os.path.join(directory, INDEX_FILENAME), 'rb') as f:
+            self.assertEqual(index, json.load(f))
+
+    def test_writes_new_index_under_lock(self):
+        directory = self.make_dir()
+        file_lock = self.patch(image_index, 'FileLock')
+        read_index(directory, lambda path: [])
+        file_lock.assert_called_once_with(
+            os.path.join(directory, INDEX_FILENAME))
+        self.assertEqual(
+            (1, 1),
+            (
+                file_lock.return_value.acquire.call_count,
+                file_lock.return_value.release.call_count,
+            ))
+
+    def test_returns_scan_if_lock_is_not_free(self):
+        directory = self.make_dir()
+        file_lock = self.patch(image_index, 'FileLock')
+        file_lock.return_value.acquire.side_effect = LockTimeout()
+        index = [factory.make_name('image')]
+        self.assertEqual(index, read_index(directory, lambda path: index))
+        file_lock.return_value.acquire.assert_called_once_with(
+            timeout=image_index.READ_LOCK_TIMEOUT)
+        self.assertFalse(
+            os.path.exists(os.path.join(directory, INDEX_FILENAME)))
+
+    def test_returns_scan_if_index_cannot_be_written(self):
+        directory = self.make_dir()
+        self.patch(image_index, 'write_index').side_effect = OSError(
+            errno.EPERM, "Operation not permitted")
+        index = [factory.make_name('image')]
+        self.assertEqual(index, read_index(directory, lambda path: index))
+        self.assertFalse(
+            os.path.exists(os.path.join(directory, INDEX_FILENAME)))
+
+    def test_scans_without_writing_if_directory_is_missing(self):
+        directory = os.path.join(self.make_dir(), 'missing')
+        self.assertEqual([], read_index(directory, lambda path: []))
+        self.assertFalse(os.path.exists(directory))
+
+    def test_does_not_scan_if_there_is_an_index(self):
+        directory = self.make_dir()
+        index = [factory.make_name('image')]
+        factory.make_file(
+            directory, name=INDEX_FILENAME, contents=json.dumps(index))
+        self.assertEqual(index, read_index(directory, None))
+
+    def test_rereads_index_when_it_changes(self):
+        directory = self.make_dir()
+        read_index(directory, lambda path: ['old'])
+        # Another process updates the index.
+        factory.make_file(
+            directory, name=INDEX_FILENAME, contents=json.dumps(['newer']))
+        self.assertEqual(['newer'], read_index(directory, None))
+
+
+class TestBootImages(MAASTestCase):
+
+    def setUp(self):
+        super(TestBootImages, self).setUp()
+        self.addCleanup(image_index.clear_cache)
+
+    def make_image_dir(self, tftproot, image):
+        os.makedirs(locate_tftp_path(
+            compose_image_path(
+                image['architecture'], image['subarchitecture'],
+                image['release'], image['purpose']),
+            tftproot=tftproot))
+
+    def test_get_boot_images_scans_tftproot_initially(self):
+        tftproot = self.make_dir()
+        image = make_boot_image_params()
+        self.make_image_dir(tftproot, image)
+        self.assertEqual([image], get_boot_images(tftproot))
+
+    def test_get_boot_images_copes_with_missing_tftproot(self):
+        tftproot = os.path.join(self.make_dir(), 'missing')
+        self.assertEqual([], get_boot_images(tftproot))
+
+    def test_get_boot_images_uses_index_once_built(self):
+        tftproot = self.make_dir()
+        get_boot_images(tftproot)
+        image = make_boot_image_params()
+        self.make_image_dir(tftproot, image)
+        self.patch(tftppath, 'list_boot_images')
+        self.assertEqual([], get_boot_images(tftproot))
+        self.assertEqual([], tftppath.list_boot_images.call_args_list)
+
+    def test_add_boot_image_records_image(self):
+        tftproot = self.make_dir()
+        image = make_boot_image_params()
+        add_boot_image(
+            tftproot, image['architecture'], image['subarchitecture'],
+            image['release'], image['purpose'])
+        self.assertEqual([image], get_boot_images(tftproot))
+
+    def test_add_boot_image_is_idempotent(self):
+        tftproot = self.make_dir()
+        params = [factory.make_name('param') for i in range(4)]
+        add_boot_image(tftproot, *params)
+        add_boot_image(tftproot, *params)
+        self.assertEqual(1, len(get_boot_images(tftproot)))
+
+
+class TestEphemerals(MAASTestCase):
+
+    def setUp(self):
+        super(TestEphemerals, self).setUp()
+        self.addCleanup(image_index.clear_cache)
+
+    def test_get_ephemeral_name_scans_directory_initially(self):
+        images_directory = self.make_dir()
+        name = factory.make_name('ephemeral')
+        make_ephemeral_dir(
+            images_directory, 'precise', 'i386', '20120424', name)
+        self.assertEqual(
+            name, get_ephemeral_name(images_directory, 'precise', 'i386'))
+
+    def test_get_ephemeral_name_returns_most_recent_image(self):
+        images_directory = self.make_dir()
+        make_ephemeral_dir(
+            images_directory, 'precise', 'i386', '20120301', 'old')
+        make_ephemeral_dir(
+            images_directory, 'precise', 'i386', '20120424', 'new')
+        self.assertEqual(
+            'new', get_ephemeral_name(images_directory, 'precise', 'i386'))
+
+    def test_get_ephemeral_name_returns_None_if_no_image(self):
+        images_directory = self.make_dir()
+        self.assertIsNone(
+            get_ephemeral_name(images_directory, 'precise', 'i386'))
+
+    def test_add_ephemeral_records_image(self):
+        images_directory = self.make_dir()
+        get_ephemeral_name(images_directory, 'precise', 'i386')
+        add_ephemeral(images_directory, 'precise', 'i386', '20120424', 'new')
+        self.assertEqual(
+            'new', get_ephemeral_name(images_directory, 'precise', 'i386'))
+
+    def test_remove_ephemeral_forgets_image(self):
+        images_directory = self.make_dir()
+        add_ephemeral(images_directory, 'precise', 'i386', '20120301', 'old')
+        add_ephemeral(images_directory, 'precise', 'i386', '20120424', 'new')
+        remove_ephemeral(images_directory, 'precise', 'i386', '20120424')
+        self.assertEqual(
+            'old', get_ephemeral_name(images_directory, 'precise', 'i386'))
+        remove_ephemeral(images_directory, 'precise', 'i386', '20120301')
+        self.assertIsNone(
+            get_ephemeral_name(images_directory, 'precise', 'i386'))
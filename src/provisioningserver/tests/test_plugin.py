@@ -26,7 +26,10 @@ from provisioningserver.plugin import (
     ProvisioningServiceMaker,
     SingleUsernamePasswordChecker,
     )
-from provisioningserver.tftp import TFTPBackend
+from provisioningserver.tftp import (
+    TFTPBackend,
+    TFTPProtocol,
+    )
 from testtools.deferredruntest import (
     assert_fails_with,
     AsynchronousDeferredRunTest,
@@ -40,14 +43,17 @@ from testtools.matchers import (
     MatchesException,
     Raises,
     )
-from tftp.protocol import TFTP
-from twisted.application.internet import UDPServer
+from twisted.application.internet import (
+    TCPServer,
+    UDPServer,
+    )
 from twisted.application.service import MultiService
 from twisted.cred.credentials import UsernamePassword
 from twisted.cred.error import UnauthorizedLogin
 from twisted.internet.defer import inlineCallbacks
 from twisted.python.usage import UsageError
 from twisted.web.resource import IResource
+from twisted.web.server import Site
 import yaml
 
 
@@ -102,7 +108,7 @@ class TestProvisioningServiceMaker(MAASTestCase):
         service = service_maker.makeService(options)
         self.assertIsInstance(service, MultiService)
         self.assertSequenceEqual(
-            ["log", "oops", "tftp"],
+            ["config", "log", "oops", "tftp"],
             sorted(service.namedServices))
         self.assertEqual(
             len(service.namedServices), len(service.services),
@@ -120,7 +126,7 @@ class TestProvisioningServiceMaker(MAASTestCase):
         service = service_maker.makeService(options)
         self.assertIsInstance(service, MultiService)
         self.assertSequenceEqual(
-            ["amqp", "log", "oops", "tftp"],
+            ["amqp", "config", "log", "oops", "tftp"],
             sorted(service.namedServices))
         self.assertEqual(
             len(service.namedServices), len(service.services),
@@ -140,6 +146,8 @@ class TestProvisioningServiceMaker(MAASTestCase):
                 "generator": "http://candlemass/solitude",
                 "root": self.tempdir,
                 "port": factory.getRandomPort(),
+                "max_block_size": 1024,
+                "max_window_size": 8,
                 },
             }
         options = Options()
@@ -163,10 +171,14 @@ class TestProvisioningServiceMaker(MAASTestCase):
                 lambda backend: backend.generator_url.geturl(),
                 Equals(config["tftp"]["generator"])))
         expected_protocol = MatchesAll(
-            IsInstance(TFTP),
+            IsInstance(TFTPProtocol),
             AfterPreprocessing(
                 lambda protocol: protocol.backend,
-                expected_backend))
+                expected_backend),
+            AfterPreprocessing(
+                lambda protocol: (
+                    protocol.max_block_size, protocol.max_window_size),
+                Equals((1024, 8))))
         expected_service = MatchesAll(
             IsInstance(UDPServer),
             AfterPreprocessing(
@@ -184,6 +196,32 @@ class TestProvisioningServiceMaker(MAASTestCase):
             [svc.kwargs for svc in services],
             [{"interface": interface} for interface in interfaces])
 
+    def test_http_boot_service(self):
+        # With HTTP boot enabled, an HTTP boot service is added, and the
+        # TFTP backend chainloads it.
+        self.patch(plugin, "get_all_interface_addresses", lambda: [])
+        port = factory.getRandomPort()
+        options = Options()
+        options["config-file"] = self.write_config(
+            {"http_boot": {"enabled": True, "port": port}})
+        service_maker = ProvisioningServiceMaker("Harry", "Hill")
+        make_tftp_service = self.patch(service_maker, "_makeTFTPService")
+        service = service_maker.makeService(options)
+        http_boot_service = service.getServiceNamed("http_boot")
+        self.assertIsInstance(http_boot_service, TCPServer)
+        self.assertEqual(port, http_boot_service.args[0])
+        self.assertIsInstance(http_boot_service.args[1], Site)
+        self.assertEqual(port, make_tftp_service.call_args[0][1])
+
+    def test_http_boot_service_is_disabled_by_default(self):
+        options = Options()
+        options["config-file"] = self.write_config({})
+        service_maker = ProvisioningServiceMaker("Harry", "Hill")
+        make_tftp_service = self.patch(service_maker, "_makeTFTPService")
+        service = service_maker.makeService(options)
+        self.assertNotIn("http_boot", service.namedServices)
+        self.assertIsNone(make_tftp_service.call_args[0][1])
+
 
 class TestSingleUsernamePasswordChecker(MAASTestCase):
     """Tests for `SingleUsernamePasswordChecker`."""
@@ -21,7 +21,9 @@ import sys
 from maastesting.factory import factory
 from maastesting.testcase import MAASTestCase
 from oops_twisted import OOPSObserver
+from provisioningserver.config import Config
 from provisioningserver.services import (
+    ConfigReloadService,
     LogService,
     OOPSService,
     )
@@ -119,3 +121,22 @@ class TestOOPSService(TestServicesBase, MAASTestCase):
         self.assertIsInstance(observer, OOPSObserver)
         self.assertEqual(1, len(observer.config.publishers))
         self.assertEqual({"reporter": "Sidebottom"}, observer.config.template)
+
+
+class TestConfigReloadService(MAASTestCase):
+    """Tests for `provisioningserver.services.ConfigReloadService`."""
+
+    def test_reloads_config_on_SIGHUP(self):
+        self.patch(Config, '_snapshot_generation', 0)
+        service = ConfigReloadService()
+        service.startService()
+        self.addCleanup(service.stopService)
+        signal.getsignal(signal.SIGHUP)(signal.SIGHUP, None)
+        self.assertEqual(1, Config._snapshot_generation)
+
+    def test_restores_signal_handler_when_stopped(self):
+        previous_handler = signal.getsignal(signal.SIGHUP)
+        service = ConfigReloadService()
+        service.startService()
+        service.stopService()
+        self.assertEqual(previous_handler, signal.getsignal(signal.SIGHUP))
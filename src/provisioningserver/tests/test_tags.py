@@ -21,6 +21,7 @@ from itertools import chain
 import json
 from textwrap import dedent
 import urllib2
+import zlib
 
 from apiclient.maas_client import MAASClient
 import bson
@@ -560,7 +561,24 @@ class TestTagUpdating(PservTestCase):
         self.assertEqual(data, result)
         url = '/api/1.0/nodegroups/%s/' % (uuid,)
         post.assert_called_once_with(
-            url, op='details', system_ids=["system-1", "system-2"])
+            url, op='details', system_ids=["system-1", "system-2"],
+            compression='zlib')
+
+    def test_get_details_decompresses_compressed_details(self):
+        client, uuid = self.fake_cached_knowledge()
+        lshw = b"<lshw><data1 /></lshw>"
+        data = {
+            "system-1": {
+                "lshw": bson.binary.Binary(
+                    zlib.compress(lshw), tags.ZLIB_DETAILS_SUBTYPE),
+                "lldp": None,
+            },
+        }
+        content = bson.BSON.encode(data)
+        response = make_response(httplib.OK, content, 'application/bson')
+        self.patch(client, 'post').return_value = response
+        result = tags.get_details_for_nodes(client, uuid, ['system-1'])
+        self.assertEqual({"system-1": {"lshw": lshw, "lldp": None}}, result)
 
     def test_post_updated_nodes_calls_correct_api_and_parses_result(self):
         client, uuid = self.fake_cached_knowledge()
@@ -62,7 +62,10 @@ from provisioningserver.dns.config import (
     MAAS_RNDC_CONF_NAME,
     )
 from provisioningserver.enum import POWER_TYPE
-from provisioningserver.power.poweraction import PowerActionFail
+from provisioningserver.power.poweraction import (
+    PowerAction,
+    PowerActionFail,
+    )
 from provisioningserver.pxe import tftppath
 from provisioningserver.tags import MissingCredentials
 from provisioningserver.tasks import (
@@ -70,7 +73,9 @@ from provisioningserver.tasks import (
     import_boot_images,
     Omshell,
     power_off,
+    power_off_nodes,
     power_on,
+    power_on_nodes,
     refresh_secrets,
     remove_dhcp_host_map,
     report_boot_images,
@@ -157,6 +162,67 @@ class TestPowerTasks(PservTestCase):
             POWER_TYPE.WAKE_ON_LAN, mac=arbitrary_mac)
 
 
+class TestBatchedPowerTasks(PservTestCase):
+
+    resources = (
+        ("celery", FixtureResource(CeleryFixture())),
+        )
+
+    def patch_power_action_execute(self):
+        executed = []
+
+        def execute(power_action, **kwargs):
+            executed.append((power_action.power_type, kwargs))
+
+        self.patch(PowerAction, 'execute', execute)
+        return executed
+
+    def make_power_actions(self, count=3):
+        return [
+            (
+                POWER_TYPE.WAKE_ON_LAN,
+                {'mac_address': factory.getRandomMACAddress()},
+            )
+            for counter in range(count)]
+
+    def test_power_on_nodes_issues_power_on_for_each_node(self):
+        executed = self.patch_power_action_execute()
+        power_actions = self.make_power_actions()
+        result = power_on_nodes.delay(power_actions)
+        self.assertTrue(result.successful())
+        self.assertItemsEqual(
+            [
+                (power_type, dict(params, power_change='on'))
+                for power_type, params in power_actions
+            ],
+            executed)
+
+    def test_power_off_nodes_issues_power_off_for_each_node(self):
+        executed = self.patch_power_action_execute()
+        power_actions = self.make_power_actions()
+        power_off_nodes.delay(power_actions)
+        self.assertEqual(
+            ['off'] * len(power_actions),
+            [params['power_change'] for _, params in executed])
+
+    def test_power_on_nodes_attempts_all_actions_then_fails(self):
+        # The action without parameters fails; the others still get
+        # attempted.
+        executed = []
+
+        def execute(power_action, **kwargs):
+            executed.append(kwargs)
+            if 'mac_address' not in kwargs:
+                raise PowerActionFail(power_action, "No MAC address.")
+
+        self.patch(PowerAction, 'execute', execute)
+        power_actions = [(POWER_TYPE.WAKE_ON_LAN, {})]
+        power_actions.extend(self.make_power_actions(2))
+        self.assertRaises(
+            PowerActionFail, power_on_nodes.delay, power_actions)
+        self.assertEqual(3, len(executed))
+
+
 class TestDHCPTasks(PservTestCase):
 
     resources = (
@@ -562,6 +628,15 @@ class TestImportPxeFiles(PservTestCase):
         recorder.assert_called_once_with(
             ['sudo', '-n', '-E', 'maas-import-pxe-files'], env=os.environ)
 
+    def test_import_boot_images_passes_api_credentials(self):
+        recorder = self.patch(tasks, 'call_and_check')
+        self.set_api_credentials()
+        import_boot_images()
+        env = recorder.call_args[1]['env']
+        self.assertEqual(
+            auth.get_recorded_api_credentials(),
+            tuple(env['MAAS_API_CREDENTIALS'].split(':')))
+
     def test_import_boot_images_sets_proxy(self):
         recorder = self.patch(tasks, 'call_and_check')
         proxy = factory.getRandomString()
@@ -576,6 +651,7 @@ class TestImportPxeFiles(PservTestCase):
             'main_archive': self.make_archive_url('main'),
             'ports_archive': self.make_archive_url('ports'),
             'cloud_images_archive': self.make_archive_url('cloud-images'),
+            'ephemerals_archive': self.make_archive_url('ephemerals'),
         }
         expected_settings = {
             parameter.upper(): value
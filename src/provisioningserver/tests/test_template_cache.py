@@ -0,0 +1,95 @@
+# Copyright 2013 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for `provisioningserver.template_cache`."""
+
+from __future__ import (
+    absolute_import,
+    print_function,
+    unicode_literals,
+    )
+
+str = None
+
+__metaclass__ = type
+__all__ = []
+
+import os
+
+from maastesting.factory import factory
+from maastesting.testcase import MAASTestCase
+from provisioningserver.template_cache import TemplateCache
+import tempita
+
+
+class TestTemplateCache(MAASTestCase):
+
+    def test_find_returns_first_existing_filename(self):
+        directory = self.make_dir()
+        factory.make_file(directory, 'b')
+        factory.make_file(directory, 'c')
+        self.assertEqual(
+            os.path.join(directory, 'b'),
+            TemplateCache().find([directory], ['a', 'b', 'c']))
+
+    def test_find_searches_directories_in_order(self):
+        first, second = self.make_dir(), self.make_dir()
+        factory.make_file(first, 'b')
+        factory.make_file(second, 'a')
+        self.assertEqual(
+            os.path.join(first, 'b'),
+            TemplateCache().find([first, second], ['a', 'b']))
+
+    def test_find_returns_None_if_nothing_found(self):
+        self.assertIsNone(
+            TemplateCache().find([self.make_dir()], ['a', 'b']))
+
+    def test_find_does_not_probe_unchanged_directories(self):
+        directory = self.make_dir()
+        cache = TemplateCache()
+        cache.find([directory], ['a'])
+        isfile = self.patch(os.path, 'isfile')
+        self.assertIsNone(cache.find([directory], ['a']))
+        self.assertEqual(0, isfile.call_count)
+
+    def test_find_sees_new_files(self):
+        directory = self.make_dir()
+        cache = TemplateCache()
+        cache.find([directory], ['a'])
+        path = factory.make_file(directory, 'a')
+        self.assertEqual(path, cache.find([directory], ['a']))
+
+    def test_get_compiles_template(self):
+        path = self.make_file(contents=b'{{x}}')
+        template = TemplateCache().get(path)
+        self.assertEqual(
+            (path, 'y'), (template.name, template.substitute(x='y')))
+
+    def test_get_returns_cached_template(self):
+        path = self.make_file(contents=b'{{x}}')
+        cache = TemplateCache()
+        self.assertIs(cache.get(path), cache.get(path))
+
+    def test_get_reloads_changed_template(self):
+        path = self.make_file(contents=b'{{x}}')
+        cache = TemplateCache()
+        cache.get(path)
+        with open(path, 'wb') as stream:
+            stream.write(b'{{x}}{{x}}')
+        self.assertEqual('yy', cache.get(path).substitute(x='y'))
+
+    def test_get_compiles_with_given_class_and_encoding(self):
+
+        class FakeTemplate(tempita.Template):
+            pass
+
+        path = self.make_file(contents='\xe9'.encode('utf-8'))
+        template = TemplateCache().get(
+            path, template_class=FakeTemplate, encoding='utf-8')
+        self.assertEqual(
+            (FakeTemplate, '\xe9'), (type(template), template.content))
+
+    def test_get_raises_IOError_for_missing_template(self):
+        self.assertRaises(
+            IOError, TemplateCache().get,
+            os.path.join(self.make_dir(), 'missing'))
@@ -14,9 +14,11 @@ str = None
 __metaclass__ = type
 __all__ = []
 
+from collections import OrderedDict
 from functools import partial
 import json
 from os import path
+import struct
 from urllib import urlencode
 from urlparse import (
     parse_qsl,
@@ -25,19 +27,35 @@ from urlparse import (
 
 from maastesting.factory import factory
 from maastesting.testcase import MAASTestCase
+from mock import Mock
 from provisioningserver import tftp as tftp_module
 from provisioningserver.pxe.tftppath import compose_config_path
 from provisioningserver.tests.test_kernel_opts import make_kernel_parameters
 from provisioningserver.tftp import (
     BytesReader,
+    DEFAULT_TIMEOUT,
+    MAX_RETRANSMITS,
     TFTPBackend,
+    TFTPProtocol,
+    TFTPReadSession,
     )
 from testtools.deferredruntest import AsynchronousDeferredRunTest
 from tftp.backend import IReader
+from tftp.datagram import (
+    DATADatagram,
+    ERR_FILE_NOT_FOUND,
+    ERRORDatagram,
+    OACKDatagram,
+    )
+from tftp.errors import FileNotFound
+from tftp.protocol import TFTP
+from twisted.internet.address import IPv4Address
 from twisted.internet.defer import (
+    fail,
     inlineCallbacks,
     succeed,
     )
+from twisted.internet.task import Clock
 from twisted.python import context
 from zope.interface.verify import verifyObject
 
@@ -288,3 +306,248 @@ class TestTFTPBackend(MAASTestCase):
         self.assertEqual(fake_render_result.encode("utf-8"), output)
         backend.render_pxe_config.assert_called_once_with(
             kernel_params=fake_kernel_params, **fake_params)
+
+    @inlineCallbacks
+    def test_get_config_reader_chainloads_http_boot_service(self):
+        # With the HTTP boot service enabled, the PXE configuration
+        # chainloads iPXE, pointed at the service.
+        port = factory.getRandomPort()
+        backend = TFTPBackend(
+            self.make_dir(), b"http://example.com/", http_boot_port=port)
+        params = {
+            "mac": factory.getRandomMACAddress("-"),
+            "local": factory.getRandomIPAddress(),
+            }
+        kernel_params = make_kernel_parameters(arch="amd64", purpose="install")
+        self.patch(backend, "get_page").return_value = succeed(
+            json.dumps(kernel_params._asdict()))
+        render_patch = self.patch(backend, "render_pxe_config")
+        render_patch.return_value = factory.make_name("render")
+        yield backend.get_config_reader(params)
+        backend.render_pxe_config.assert_called_once_with(
+            kernel_params=kernel_params, prefix="chainload",
+            boot_url="http://%s:%d/" % (params["local"], port), **params)
+
+    def test_boots_over_http_only_if_enabled(self):
+        backend = TFTPBackend(self.make_dir(), b"http://example.com/")
+        self.assertFalse(
+            backend.boots_over_http(make_kernel_parameters(arch="amd64")))
+
+    def test_boots_over_http_except_for_local_boot(self):
+        backend = TFTPBackend(
+            self.make_dir(), b"http://example.com/", http_boot_port=5248)
+        self.assertEqual(
+            (True, False),
+            (
+                backend.boots_over_http(
+                    make_kernel_parameters(arch="i386", purpose="install")),
+                backend.boots_over_http(
+                    make_kernel_parameters(arch="i386", purpose="local")),
+            ))
+
+    def test_boots_over_http_only_on_ipxe_architectures(self):
+        backend = TFTPBackend(
+            self.make_dir(), b"http://example.com/", http_boot_port=5248)
+        self.assertFalse(
+            backend.boots_over_http(
+                make_kernel_parameters(arch="armhf", purpose="install")))
+
+
+class FakeDatagramTransport:
+    """A UDP transport that records what is sent through it."""
+
+    def __init__(self, host="127.0.0.1", port=69):
+        self.host = IPv4Address("UDP", host, port)
+        self.written = []
+        self.connected_to = None
+        self.listening = True
+
+    def write(self, datagram, addr=None):
+        self.written.append(datagram)
+
+    def connect(self, host, port):
+        self.connected_to = host, port
+
+    def getHost(self):
+        return self.host
+
+    def stopListening(self):
+        self.listening = False
+
+
+def ack(block):
+    return struct.pack(b"!HH", 4, block)
+
+
+def data(block, content):
+    return DATADatagram(block, content).to_wire()
+
+
+class TestTFTPReadSession(MAASTestCase):
+    """Tests for `provisioningserver.tftp.TFTPReadSession`."""
+
+    remote = ("10.0.0.1", 1234)
+
+    def start_session(self, content, **options):
+        options = OrderedDict(
+            (name, b"%d" % value) for name, value in options.items())
+        session = TFTPReadSession(
+            self.remote, BytesReader(content), "file", options or None,
+            _clock=Clock())
+        session.transport = FakeDatagramTransport()
+        session.startProtocol()
+        return session
+
+    def send_ack(self, session, block):
+        session.transport.written = []
+        session.datagramReceived(ack(block), self.remote)
+        return session.transport.written
+
+    def test_sends_file_in_lock_step_by_default(self):
+        content = factory.getRandomString(600).encode("ascii")
+        session = self.start_session(content)
+        self.assertEqual(self.remote, session.transport.connected_to)
+        self.assertEqual(
+            [data(1, content[:512])], session.transport.written)
+        self.assertEqual([data(2, content[512:])], self.send_ack(session, 1))
+        self.assertEqual([], self.send_ack(session, 2))
+        self.assertFalse(session.transport.listening)
+        self.assertEqual(600, session.bytes_sent)
+
+    def test_sends_options_then_windows_of_blocks(self):
+        content = b"0123456789abcdefXYZ"
+        session = self.start_session(content, blksize=8, windowsize=2)
+        self.assertEqual(
+            [OACKDatagram(session.options).to_wire()],
+            session.transport.written)
+        self.assertEqual(
+            [data(1, content[:8]), data(2, content[8:16])],
+            self.send_ack(session, 0))
+        self.assertEqual([data(3, content[16:])], self.send_ack(session, 2))
+        self.send_ack(session, 3)
+        self.assertFalse(session.transport.listening)
+
+    def test_sends_empty_block_after_file_of_whole_blocks(self):
+        session = self.start_session(b"01234567", blksize=8)
+        self.send_ack(session, 0)
+        self.assertEqual([data(2, b"")], self.send_ack(session, 1))
+
+    def test_resends_window_after_lost_block(self):
+        content = b"0123456789abcdefXYZ"
+        session = self.start_session(content, blksize=8, windowsize=2)
+        self.send_ack(session, 0)
+        self.assertEqual(
+            [data(2, content[8:16]), data(3, content[16:])],
+            self.send_ack(session, 1))
+
+    def test_ignores_stale_acks(self):
+        session = self.start_session(b"0123456789abcdefXYZ", blksize=8)
+        self.send_ack(session, 0)
+        self.send_ack(session, 1)
+        self.assertEqual([], self.send_ack(session, 3))
+        self.assertEqual(1, session.acked)
+
+    def test_ignores_duplicate_acks_in_lock_step(self):
+        content = factory.getRandomString(1200).encode("ascii")
+        session = self.start_session(content)
+        self.send_ack(session, 1)
+        session.clock.advance(DEFAULT_TIMEOUT)
+        self.assertEqual([], self.send_ack(session, 1))
+        self.assertEqual(1, session.retransmits)
+
+    def test_counts_repeated_acks_in_window_as_retransmits(self):
+        session = self.start_session(
+            b"0123456789abcdefXYZ", blksize=8, windowsize=2)
+        self.send_ack(session, 0)
+        for _ in range(MAX_RETRANSMITS + 1):
+            self.send_ack(session, 0)
+        self.assertFalse(session.transport.listening)
+
+    def test_resends_window_on_timeout(self):
+        content = factory.getRandomString(600).encode("ascii")
+        session = self.start_session(content)
+        session.transport.written = []
+        session.clock.advance(DEFAULT_TIMEOUT)
+        self.assertEqual(
+            [data(1, content[:512])], session.transport.written)
+
+    def test_gives_up_after_retransmits(self):
+        session = self.start_session(b"content")
+        for _ in range(MAX_RETRANSMITS + 1):
+            session.clock.advance(DEFAULT_TIMEOUT)
+        self.assertFalse(session.transport.listening)
+        self.assertEqual([], session.clock.getDelayedCalls())
+
+
+class TestTFTPProtocol(MAASTestCase):
+    """Tests for `provisioningserver.tftp.TFTPProtocol`."""
+
+    remote = ("10.0.0.1", 1234)
+
+    def make_protocol(self, reader=None, **kwargs):
+        backend = Mock()
+        backend.get_reader.return_value = succeed(reader)
+        protocol = TFTPProtocol(backend, _clock=Clock(), **kwargs)
+        protocol.transport = FakeDatagramTransport()
+        return protocol
+
+    def test_negotiate_limits_block_and_window_size(self):
+        protocol = self.make_protocol(max_block_size=1024, max_window_size=8)
+        self.assertEqual(
+            OrderedDict([(b"blksize", b"1024"), (b"windowsize", b"8")]),
+            protocol.negotiate(
+                OrderedDict([(b"blksize", b"1468"), (b"windowsize", b"64")]),
+                BytesReader(b"")))
+
+    def test_negotiate_accepts_smaller_sizes(self):
+        protocol = self.make_protocol()
+        self.assertEqual(
+            OrderedDict([(b"blksize", b"1024"), (b"windowsize", b"4")]),
+            protocol.negotiate(
+                OrderedDict([(b"BLKSIZE", b"1024"), (b"windowsize", b"4")]),
+                BytesReader(b"")))
+
+    def test_negotiate_leaves_out_unknown_and_invalid_options(self):
+        protocol = self.make_protocol()
+        self.assertEqual(
+            OrderedDict(),
+            protocol.negotiate(
+                {b"blksize": b"4", b"windowsize": b"many", b"colour": b"1"},
+                BytesReader(b"")))
+
+    def test_negotiate_reports_transfer_size(self):
+        protocol = self.make_protocol()
+        self.assertEqual(
+            OrderedDict([(b"tsize", b"7")]),
+            protocol.negotiate({b"tsize": b"0"}, BytesReader(b"content")))
+
+    def test_starts_read_session_with_negotiated_options(self):
+        listen_udp = self.patch(tftp_module.reactor, "listenUDP")
+        reader = BytesReader(b"content")
+        protocol = self.make_protocol(reader)
+        protocol.datagramReceived(
+            b"\x00\x01file\x00octet\x00blksize\x001024\x00", self.remote)
+        protocol.backend.get_reader.assert_called_once_with(b"file")
+        [session] = [args[1] for args, kwargs in listen_udp.call_args_list]
+        self.assertEqual(
+            (self.remote, reader, 1024),
+            (session.remote, session.reader, session.block_size))
+        self.assertEqual(
+            {"interface": protocol.transport.host.host},
+            listen_udp.call_args[1])
+
+    def test_reports_missing_file(self):
+        protocol = self.make_protocol()
+        protocol.backend.get_reader.return_value = fail(FileNotFound("file"))
+        protocol.datagramReceived(b"\x00\x01file\x00octet\x00", self.remote)
+        self.assertEqual(
+            [ERRORDatagram.from_code(ERR_FILE_NOT_FOUND).to_wire()],
+            protocol.transport.written)
+
+    def test_leaves_other_requests_to_tftp_protocol(self):
+        datagram_received = self.patch(TFTP, "datagramReceived")
+        protocol = self.make_protocol()
+        request = b"\x00\x02file\x00octet\x00"
+        protocol.datagramReceived(request, self.remote)
+        datagram_received.assert_called_once_with(
+            protocol, request, self.remote)
@@ -14,8 +14,10 @@ str = None
 __metaclass__ = type
 __all__ = [
     "TFTPBackend",
+    "TFTPProtocol",
 ]
 
+from collections import OrderedDict
 import httplib
 from io import BytesIO
 from itertools import repeat
@@ -30,6 +32,7 @@ from urlparse import (
 
 from provisioningserver.cluster_config import get_cluster_uuid
 from provisioningserver.enum import ARP_HTYPE
+from provisioningserver.http_boot import get_http_boot_url
 from provisioningserver.kernel_opts import KernelParameters
 from provisioningserver.pxe.config import render_pxe_config
 from provisioningserver.utils import (
@@ -42,8 +45,32 @@ from tftp.backend import (
     FilesystemReader,
     IReader,
 )
-from tftp.errors import FileNotFound
-from twisted.python.context import get
+from tftp.datagram import (
+    DATADatagram,
+    ERR_ACCESS_VIOLATION,
+    ERR_FILE_NOT_FOUND,
+    ERR_NOT_DEFINED,
+    ERRORDatagram,
+    OACKDatagram,
+    OP_ACK,
+    OP_ERROR,
+    OP_RRQ,
+    split_opcode,
+    TFTPDatagramFactory,
+)
+from tftp.errors import (
+    AccessViolation,
+    FileNotFound,
+    WireProtocolError,
+)
+from tftp.protocol import TFTP
+from twisted.internet import reactor
+from twisted.internet.defer import inlineCallbacks
+from twisted.internet.protocol import DatagramProtocol
+from twisted.python.context import (
+    call,
+    get,
+)
 from twisted.web.client import getPage
 import twisted.web.error
 from twisted.python import log
@@ -51,6 +78,24 @@ from zope.interface import implementer
 from twisted.python.filepath import FilePath
 from provisioningserver.config import Config
 
+# The block size of a transfer without options, and the bounds on the one
+# a client may negotiate (RFC 2348).  The default maximum is the largest
+# block that fits in an Ethernet frame, so that blocks are not fragmented.
+DEFAULT_BLOCK_SIZE = 512
+MIN_BLOCK_SIZE = 8
+MAX_BLOCK_SIZE = 1468
+
+# The number of blocks sent before waiting for an acknowledgement, without
+# options, and the default maximum a client may negotiate (RFC 7440).
+DEFAULT_WINDOW_SIZE = 1
+MAX_WINDOW_SIZE = 16
+
+# How long to wait for an acknowledgement before sending a window again,
+# in seconds, and how many times to send it before giving up.  Clients may
+# negotiate the timeout (RFC 2349).
+DEFAULT_TIMEOUT = 2
+MAX_RETRANSMITS = 5
+
 
 @implementer(IReader)
 class BytesReader:
@@ -86,6 +131,10 @@ class TFTPBackend(FilesystemSynchronousBackend):
     failures cause the boot process to halt. This is why the expression for
     matching the MAC address is so narrowly defined: PXELINUX attempts to
     fetch files at many similar paths which must not be passed on.
+
+    When the HTTP boot service is enabled, the PXE configurations for the
+    architectures in `http_boot_arches` chainload iPXE, which fetches the
+    kernel and initrd from that service instead.
     """
 
     get_page = staticmethod(getPage)
@@ -122,16 +171,22 @@ class TFTPBackend(FilesystemSynchronousBackend):
         htype=ARP_HTYPE.ETHERNET, re_mac_address=re_mac_address)
     re_config_file = re.compile(re_config_file, re.VERBOSE)
 
-    def __init__(self, base_path, generator_url):
+    # Architectures that iPXE, in the form of ipxe.lkrn, can boot.
+    http_boot_arches = frozenset(["amd64", "i386"])
+
+    def __init__(self, base_path, generator_url, http_boot_port=None):
         """
         :param base_path: The root directory for this TFTP server.
         :param generator_url: The URL which can be queried for the PXE
             config. See `get_generator_url` for the types of queries it is
             expected to accept.
+        :param http_boot_port: The port of the HTTP boot service, or None if
+            it is not enabled.
         """
         super(TFTPBackend, self).__init__(
             base_path, can_read=True, can_write=False)
         self.generator_url = urlparse(generator_url)
+        self.http_boot_port = http_boot_port
         self.clients = {}
 
     def get_generator_url(self, params):
@@ -174,8 +229,7 @@ class TFTPBackend(FilesystemSynchronousBackend):
                 self.clients[r]['base'] = self.base
             else:
                 self.is_windows = False
-                self.base = FilePath(
-                    Config.load_from_cache()['tftp']['root'])
+                self.base = FilePath(Config.get_snapshot().tftp_root)
                 self.clients[r]['base'] = self.base
                 path = "pxelinux.0"
             return path.encode('utf-8')
@@ -191,7 +245,7 @@ class TFTPBackend(FilesystemSynchronousBackend):
         data = client['data']
 
         loadoptions = '%s;%s;%s' % \
-            (Config.load_from_cache()['windows']['remote_path'],
+            (Config.get_snapshot().windows_remote_path,
              "%s\\source" % data['release'],
              data['preseed_url'].replace('/', '\\'))
         return (loadoptions, params)
@@ -248,6 +302,16 @@ class TFTPBackend(FilesystemSynchronousBackend):
         d.addCallback(reassemble)
         return d
 
+    def boots_over_http(self, kernel_params):
+        """Should the node fetch its kernel and initrd over HTTP?
+
+        :param kernel_params: An instance of `KernelParameters`.
+        """
+        return (
+            self.http_boot_port is not None and
+            kernel_params.purpose != "local" and
+            kernel_params.arch in self.http_boot_arches)
+
     @deferred
     def get_config_reader(self, params):
         """Return an `IReader` for a PXE config.
@@ -256,8 +320,15 @@ class TFTPBackend(FilesystemSynchronousBackend):
             path requested.
         """
         def generate_config(kernel_params):
-            config = self.render_pxe_config(
-                kernel_params=kernel_params, **params)
+            if self.boots_over_http(kernel_params):
+                config = self.render_pxe_config(
+                    kernel_params=kernel_params, prefix="chainload",
+                    boot_url=get_http_boot_url(
+                        params["local"], self.http_boot_port),
+                    **params)
+            else:
+                config = self.render_pxe_config(
+                    kernel_params=kernel_params, **params)
             return config.encode("utf-8")
 
         d = self.get_kernel_params(params)
@@ -343,3 +414,225 @@ class TFTPBackend(FilesystemSynchronousBackend):
             d = self.get_config_reader(params)
             d.addErrback(self.get_page_errback, file_name)
             return d
+
+
+class TFTPReadSession(DatagramProtocol):
+    """Sends a file to a TFTP client, a window of blocks at a time.
+
+    With a window size of one this is the lock-step transfer of RFC 1350.
+    Larger windows work as in RFC 7440: the client acknowledges the last
+    block of each window, or the last block it received in sequence if
+    any went missing, and the next window starts after that block.
+    """
+
+    def __init__(self, remote, reader, file_name, options=None,
+                 _clock=None):
+        """
+        :param remote: The client's address, as a (host, port) tuple.
+        :param reader: An `IReader` for the file.
+        :param file_name: The name of the file, for logging.
+        :param options: The options accepted for the transfer, to be
+            acknowledged before sending the file, or None.
+        """
+        self.remote = remote
+        self.reader = reader
+        self.file_name = file_name
+        self.options = options
+        self.clock = reactor if _clock is None else _clock
+        self.block_size = DEFAULT_BLOCK_SIZE
+        self.window_size = DEFAULT_WINDOW_SIZE
+        self.timeout = DEFAULT_TIMEOUT
+        if options is not None:
+            self.block_size = int(options.get(b"blksize", self.block_size))
+            self.window_size = int(
+                options.get(b"windowsize", self.window_size))
+            self.timeout = int(options.get(b"timeout", self.timeout))
+        # The blocks sent but not yet acknowledged, and the number of
+        # blocks acknowledged before them.
+        self.window = []
+        self.acked = 0
+        self.read_all = False
+        self.bytes_sent = 0
+        self.retransmits = 0
+        self.timeout_call = None
+        self.started = None
+
+    def startProtocol(self):
+        self.transport.connect(*self.remote)
+        self.started = self.clock.seconds()
+        if self.options:
+            self.send_options()
+        else:
+            self.options = None
+            self.send_window()
+
+    def send_options(self):
+        self.transport.write(OACKDatagram(self.options).to_wire())
+        self.wait_for_ack()
+
+    def send_window(self):
+        while len(self.window) < self.window_size and not self.read_all:
+            data = self.reader.read(self.block_size)
+            self.window.append(data)
+            self.read_all = len(data) < self.block_size
+        for offset, data in enumerate(self.window):
+            block = (self.acked + offset + 1) % 0x10000
+            self.transport.write(DATADatagram(block, data).to_wire())
+        self.wait_for_ack()
+
+    def wait_for_ack(self):
+        if self.timeout_call is not None and self.timeout_call.active():
+            self.timeout_call.cancel()
+        self.timeout_call = self.clock.callLater(
+            self.timeout, self.retransmit)
+
+    def retransmit(self):
+        self.retransmits += 1
+        if self.retransmits > MAX_RETRANSMITS:
+            self.finish("timed out")
+        elif self.options is not None:
+            self.send_options()
+        else:
+            self.send_window()
+
+    def datagramReceived(self, datagram, addr):
+        # The transport is connected to the client, so only its datagrams
+        # arrive here.
+        try:
+            datagram = TFTPDatagramFactory(*split_opcode(datagram))
+        except WireProtocolError:
+            return
+        if datagram.opcode == OP_ERROR:
+            self.finish("aborted by client: %s" % datagram.errmsg)
+        elif datagram.opcode == OP_ACK:
+            self.ack_received(datagram.blocknum)
+
+    def ack_received(self, block):
+        if self.options is not None:
+            # The client acknowledges the options with block zero.
+            if block == 0:
+                self.options = None
+                self.retransmits = 0
+                self.send_window()
+            return
+        acked = (block - self.acked) % 0x10000
+        if acked > len(self.window):
+            # A stray from an earlier window.
+            return
+        if acked == 0:
+            if self.window_size > 1:
+                # The client lost the first block of the window, and asks
+                # for it again (RFC 7440).  This counts as a retransmission,
+                # so that duplicates cannot keep the session going forever.
+                self.retransmit()
+            # In lock-step, a duplicate acknowledgement is ignored: sending
+            # the block again would double the traffic with every delayed
+            # duplicate (the Sorcerer's Apprentice bug, RFC 1123 4.2.3.1).
+            # Lost blocks are sent again on timeout.
+            return
+        self.bytes_sent += sum(len(data) for data in self.window[:acked])
+        del self.window[:acked]
+        self.acked += acked
+        self.retransmits = 0
+        if self.read_all and len(self.window) == 0:
+            self.finish()
+        else:
+            # Blocks after the acknowledged one were lost, if any remain
+            # in the window; they go out again with the next window.
+            self.send_window()
+
+    def finish(self, failure=None):
+        if self.timeout_call is not None and self.timeout_call.active():
+            self.timeout_call.cancel()
+        self.reader.finish()
+        self.transport.stopListening()
+        duration = self.clock.seconds() - self.started
+        rate = self.bytes_sent / max(duration, 0.001) / 1024
+        log.msg(
+            "TFTP transfer of %s to %s %s: %d bytes in %.2fs (%.1f KiB/s, "
+            "blksize %d, windowsize %d)" % (
+                self.file_name, self.remote[0],
+                "completed" if failure is None else "failed, " + failure,
+                self.bytes_sent, duration, rate, self.block_size,
+                self.window_size))
+
+
+class TFTPProtocol(TFTP):
+    """The TFTP server protocol, with options for faster transfers.
+
+    Read requests are answered by a `TFTPReadSession`, after negotiating
+    the block size (RFC 2348), the timeout and transfer size (RFC 2349),
+    and the window size (RFC 7440).  Other requests are left to python-tx-
+    tftp's `TFTP`, which refuses writes to `TFTPBackend`.
+    """
+
+    def __init__(self, backend, max_block_size=MAX_BLOCK_SIZE,
+                 max_window_size=MAX_WINDOW_SIZE, _clock=None):
+        """
+        :param backend: The `TFTPBackend` that opens the files.
+        :param max_block_size: The largest block size to accept.
+        :param max_window_size: The largest window size to accept.
+        """
+        TFTP.__init__(self, backend)
+        self.max_block_size = max_block_size
+        self.max_window_size = max_window_size
+        self.clock = reactor if _clock is None else _clock
+
+    def datagramReceived(self, datagram, addr):
+        try:
+            request = TFTPDatagramFactory(*split_opcode(datagram))
+        except WireProtocolError:
+            request = None
+        if (request is None or request.opcode != OP_RRQ or
+                request.mode.lower() != b"octet"):
+            return TFTP.datagramReceived(self, datagram, addr)
+        return self.start_read_session(request, addr)
+
+    def negotiate(self, options, reader):
+        """Return the options to accept for a transfer, with their values.
+
+        Options that are unknown or invalid are left out, as RFC 2347 asks.
+
+        :param options: The options requested by the client.
+        :param reader: The `IReader` for the file to be sent.
+        """
+        size = getattr(reader, "size", None)
+        accepted = OrderedDict()
+        for name, value in options.items():
+            name = name.lower()
+            try:
+                value = int(value)
+            except ValueError:
+                continue
+            if name == b"blksize" and value >= MIN_BLOCK_SIZE:
+                accepted[name] = min(value, self.max_block_size)
+            elif name == b"windowsize" and value >= 1:
+                accepted[name] = min(value, self.max_window_size)
+            elif name == b"timeout" and 1 <= value <= 255:
+                accepted[name] = value
+            elif name == b"tsize" and size is not None:
+                accepted[name] = size
+        return OrderedDict(
+            (name, b"%d" % value) for name, value in accepted.items())
+
+    @inlineCallbacks
+    def start_read_session(self, request, addr):
+        local = self.transport.getHost()
+        call_context = {"local": (local.host, local.port), "remote": addr}
+        try:
+            reader = yield call(
+                call_context, self.backend.get_reader, request.filename)
+        except FileNotFound:
+            error = ERRORDatagram.from_code(ERR_FILE_NOT_FOUND)
+        except AccessViolation:
+            error = ERRORDatagram.from_code(ERR_ACCESS_VIOLATION)
+        except Exception:
+            log.err(None, "Failed to open %s for TFTP" % request.filename)
+            error = ERRORDatagram.from_code(ERR_NOT_DEFINED)
+        else:
+            options = self.negotiate(request.options, reader)
+            session = TFTPReadSession(
+                addr, reader, request.filename, options, _clock=self.clock)
+            reactor.listenUDP(0, session, interface=local.host)
+            return
+        self.transport.write(error.to_wire(), addr)